@@ -1,3 +1,4 @@
+import copy
 import json
 import logging
 import os
@@ -19,7 +20,7 @@ from open_webui.env import (
     log,
 )
 from open_webui.internal.db import Base, get_db
-from beyond_the_loop.socket.main import COMPANY_CONFIG_CACHE
+from beyond_the_loop.socket.main import COMPANY_CONFIG_CACHE, COMPANY_CONFIG_LOCAL_CACHE
 
 
 class EndpointFilter(logging.Filter):
@@ -200,25 +201,37 @@ DEFAULT_CONFIG = {
     },
 }
 
-def get_config(company_id):
-    # If company_id is None, return the default config directly
-    if company_id is None:
-        return DEFAULT_CONFIG
-
+def _load_config(company_id):
     cached = COMPANY_CONFIG_CACHE.get(company_id)
+    if cached is not None:
+        return cached
 
     with get_db() as db:
         config_entry = db.query(Config).filter_by(company_id=company_id).order_by(Config.id.desc()).first()
 
-        if not config_entry and not cached:
-            # If no config exists for this company, return the default config
-            return DEFAULT_CONFIG
+    if not config_entry:
+        # If no config exists for this company, return the default config
+        return DEFAULT_CONFIG
 
-        if cached:
-            return cached
-        else:
-            COMPANY_CONFIG_CACHE[company_id] = config_entry.data
-            return config_entry.data
+    COMPANY_CONFIG_CACHE[company_id] = config_entry.data
+    return config_entry.data
+
+
+def _company_config(company_id):
+    """Shared, cached config object — read-only; see get_config."""
+    # If company_id is None, return the default config directly
+    if company_id is None:
+        return DEFAULT_CONFIG
+
+    return COMPANY_CONFIG_LOCAL_CACHE.get_or_load(
+        company_id, lambda: _load_config(company_id)
+    )
+
+
+def get_config(company_id):
+    # Callers modify the result before save_config(); never hand out the
+    # cached object itself.
+    return copy.deepcopy(_company_config(company_id))
 
 
 # Initialize with the default config
@@ -227,12 +240,14 @@ CONFIG_DATA = DEFAULT_CONFIG
 
 def get_config_value(config_path: str, company_id):
     path_parts = config_path.split(".")
-    cur_config = get_config(company_id)
+    cur_config = _company_config(company_id)
     for key in path_parts:
         if key in cur_config:
             cur_config = cur_config[key]
         else:
             return None
+    if isinstance(cur_config, (dict, list)):
+        return copy.deepcopy(cur_config)
     return cur_config
 
 
@@ -242,6 +257,8 @@ PERSISTENT_CONFIG_REGISTRY = []
 def invalidate_company_config_cache(company_id: str) -> None:
     if company_id in COMPANY_CONFIG_CACHE:
         del COMPANY_CONFIG_CACHE[company_id]
+    # Drops the parsed config here and, via pub/sub, on every other pod.
+    COMPANY_CONFIG_LOCAL_CACHE.invalidate(company_id)
 
 
 def save_config(config, company_id):
@@ -249,12 +266,12 @@ def save_config(config, company_id):
     if company_id is None:
         return False
 
-    invalidate_company_config_cache(company_id)
-
     global CONFIG_DATA
     global PERSISTENT_CONFIG_REGISTRY
     try:
         save_to_db(config, company_id)
+        # After the commit, so no pod can re-cache the old row in between.
+        invalidate_company_config_cache(company_id)
 
         # Trigger updates on all registered PersistentConfig entries
         for config_entry in PERSISTENT_CONFIG_REGISTRY:
@@ -1,19 +1,20 @@
+import json
 import logging
 import time
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
 log = logging.getLogger(__name__)
 
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP, insert as pg_insert
 
 from open_webui.internal.db import Base, get_db
 from open_webui.models.tags import TagModel, Tags
 
 
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, String, Text, JSON
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Index, String, Text, JSON
 from sqlalchemy import or_, and_, text
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -28,7 +29,9 @@ class Chat(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String, nullable=False)
     title = Column(Text, nullable=False)
-    chat = Column(JSON, nullable=False)
+    # JSONB on Postgres so streaming writes can merge a single message
+    # server-side instead of rewriting the whole document from Python.
+    chat = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
 
     created_at = Column(BigInteger, nullable=False)
     updated_at = Column(BigInteger, nullable=False)
@@ -41,6 +44,24 @@ class Chat(Base):
     folder_id = Column(Text, ForeignKey("folder.id", ondelete="CASCADE"), nullable=True)
 
 
+class PiiAnalyzeCacheEntry(Base):
+    """PII analyze results for one chat, keyed by the sha256 of the analyzed
+    text. Spans are packed as [[entity_type, start, end, score], ...]."""
+
+    __tablename__ = "pii_analyze_cache"
+
+    chat_id = Column(
+        String, ForeignKey("chat.id", ondelete="CASCADE"), primary_key=True
+    )
+    text_hash = Column(String, primary_key=True)
+    spans = Column(JSON, nullable=False)
+    last_used_at = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("pii_analyze_cache_chat_last_used_idx", "chat_id", "last_used_at"),
+    )
+
+
 class ChatModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -60,6 +81,22 @@ class ChatModel(BaseModel):
     folder_id: Optional[str] = None
 
 
+def _strip_nul(value):
+    """`value` without NUL characters in any of its strings — Postgres JSONB
+    cannot store them. Only real NULs go; the text `\\u0000` stays as is."""
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, dict):
+        return {_strip_nul(k): _strip_nul(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_nul(v) for v in value]
+    return value
+
+
+def _dump_jsonb(value: dict) -> str:
+    return json.dumps(_strip_nul(value))
+
+
 ####################
 # Forms
 ####################
@@ -109,16 +146,17 @@ class ChatTable:
     def insert_new_chat(self, user_id: str, form_data: ChatForm) -> Optional[ChatModel]:
         with get_db() as db:
             id = str(uuid.uuid4())
+            chat_data = _strip_nul(form_data.chat)
             chat = ChatModel(
                 **{
                     "id": id,
                     "user_id": user_id,
                     "title": (
-                        form_data.chat["title"]
-                        if "title" in form_data.chat
+                        chat_data["title"]
+                        if "title" in chat_data
                         else "New chat"
                     ),
-                    "chat": form_data.chat,
+                    "chat": chat_data,
                     "created_at": int(time.time()),
                     "updated_at": int(time.time()),
                 }
@@ -135,16 +173,17 @@ class ChatTable:
     ) -> Optional[ChatModel]:
         with get_db() as db:
             id = str(uuid.uuid4())
+            chat_data = _strip_nul(form_data.chat)
             chat = ChatModel(
                 **{
                     "id": id,
                     "user_id": user_id,
                     "title": (
-                        form_data.chat["title"]
-                        if "title" in form_data.chat
+                        chat_data["title"]
+                        if "title" in chat_data
                         else "New chat"
                     ),
-                    "chat": form_data.chat,
+                    "chat": chat_data,
                     "meta": form_data.meta,
                     "pinned": form_data.pinned,
                     "folder_id": form_data.folder_id,
@@ -164,6 +203,7 @@ class ChatTable:
             with get_db() as db:
                 chat_item = db.get(Chat, id)
 
+                chat = _strip_nul(chat)
                 chat_item.chat = chat
                 chat_item.title = chat["title"] if "title" in chat else "New chat"
                 chat_item.updated_at = int(time.time())
@@ -222,18 +262,128 @@ class ChatTable:
     def get_message_by_id_and_message_id(
         self, id: str, message_id: str
     ) -> Optional[dict]:
+        with get_db() as db:
+            if db.bind.dialect.name == "postgresql":
+                # Only the one message leaves the database, not the whole chat.
+                row = db.execute(
+                    text(
+                        """
+                        SELECT chat #> ARRAY['history', 'messages', :message_id]
+                        FROM chat
+                        WHERE id = :id
+                        """
+                    ),
+                    {"id": id, "message_id": message_id},
+                ).first()
+                if row is None:
+                    return None
+                return row[0] or {}
+
         chat = self.get_chat_by_id(id)
         if chat is None:
             return None
 
         return chat.chat.get("history", {}).get("messages", {}).get(message_id, {})
 
+    def get_message_branch_by_id_and_message_id(
+        self, id: str, message_id: str
+    ) -> Optional[list[dict]]:
+        """
+        Returns the messages from the root down to `message_id` by following
+        `parentId` links, i.e. the active branch only. On Postgres the walk
+        runs in the database so sibling branches are never transferred;
+        the messages map is extracted from the chat document once and the
+        walk recurses over that value.
+        """
+        with get_db() as db:
+            if db.bind.dialect.name == "postgresql":
+                rows = db.execute(
+                    text(
+                        """
+                        WITH RECURSIVE messages(map) AS (
+                            -- Referenced twice, so evaluated (and the chat
+                            -- detoasted) once.
+                            SELECT chat #> '{history,messages}'
+                            FROM chat
+                            WHERE id = :id
+                        ),
+                        branch(message, depth) AS (
+                            SELECT m.map -> :message_id, 0
+                            FROM messages m
+                            UNION ALL
+                            SELECT m.map -> (b.message ->> 'parentId'), b.depth + 1
+                            FROM branch b, messages m
+                            WHERE b.message ->> 'parentId' IS NOT NULL
+                              AND b.depth < :max_depth
+                        )
+                        SELECT message FROM branch
+                        WHERE message IS NOT NULL
+                        ORDER BY depth DESC
+                        """
+                    ),
+                    {"id": id, "message_id": message_id, "max_depth": 10000},
+                ).all()
+                return [row[0] for row in rows] or None
+
+        message_map = self.get_messages_by_chat_id(id)
+        if not message_map:
+            return None
+
+        messages = []
+        current = message_map.get(message_id)
+        while current:
+            messages.insert(0, current)
+            parent_id = current.get("parentId")
+            current = message_map.get(parent_id) if parent_id else None
+        return messages or None
+
     def upsert_message_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, message: dict
-    ) -> Optional[ChatModel]:
+    ) -> bool:
+        """
+        Merges `message` into `history.messages[message_id]` and points
+        `history.currentId` at it. On Postgres this is a single UPDATE whose
+        payload is the message delta only; the chat document is never read
+        back into Python.
+        """
+        with get_db() as db:
+            if db.bind.dialect.name == "postgresql":
+                result = db.execute(
+                    text(
+                        """
+                        UPDATE chat
+                        SET chat = chat || jsonb_build_object(
+                                'history',
+                                COALESCE(chat -> 'history', '{}'::jsonb) || jsonb_build_object(
+                                    'messages',
+                                    COALESCE(chat #> '{history,messages}', '{}'::jsonb)
+                                    || jsonb_build_object(
+                                        CAST(:message_id AS text),
+                                        COALESCE(
+                                            chat #> ARRAY['history', 'messages', :message_id],
+                                            '{}'::jsonb
+                                        ) || CAST(:message AS jsonb)
+                                    ),
+                                    'currentId', CAST(:message_id AS text)
+                                )
+                            ),
+                            updated_at = :updated_at
+                        WHERE id = :id
+                        """
+                    ),
+                    {
+                        "id": id,
+                        "message_id": message_id,
+                        "message": _dump_jsonb(message),
+                        "updated_at": int(time.time()),
+                    },
+                )
+                db.commit()
+                return result.rowcount > 0
+
         chat = self.get_chat_by_id(id)
         if chat is None:
-            return None
+            return False
 
         chat = chat.chat
         history = chat.get("history", {})
@@ -249,25 +399,66 @@ class ChatTable:
         history["currentId"] = message_id
 
         chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+        return self.update_chat_by_id(id, chat) is not None
 
     def add_message_status_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, status: dict
-    ) -> Optional[ChatModel]:
+    ) -> bool:
+        return self.add_message_statuses_to_chat_by_id_and_message_id(
+            id, message_id, [status]
+        )
+
+    def add_message_statuses_to_chat_by_id_and_message_id(
+        self, id: str, message_id: str, statuses: List[dict]
+    ) -> bool:
+        """Appends `statuses` to `history.messages[message_id].statusHistory`
+        in one UPDATE."""
+        if not statuses:
+            return False
+
+        with get_db() as db:
+            if db.bind.dialect.name == "postgresql":
+                result = db.execute(
+                    text(
+                        """
+                        UPDATE chat
+                        SET chat = jsonb_set(
+                                chat,
+                                ARRAY['history', 'messages', :message_id, 'statusHistory'],
+                                COALESCE(
+                                    chat #> ARRAY['history', 'messages', :message_id, 'statusHistory'],
+                                    '[]'::jsonb
+                                ) || CAST(:statuses AS jsonb)
+                            ),
+                            updated_at = :updated_at
+                        WHERE id = :id
+                          AND chat #> ARRAY['history', 'messages', :message_id] IS NOT NULL
+                        """
+                    ),
+                    {
+                        "id": id,
+                        "message_id": message_id,
+                        "statuses": _dump_jsonb(statuses),
+                        "updated_at": int(time.time()),
+                    },
+                )
+                db.commit()
+                return result.rowcount > 0
+
         chat = self.get_chat_by_id(id)
         if chat is None:
-            return None
+            return False
 
         chat = chat.chat
         history = chat.get("history", {})
 
         if message_id in history.get("messages", {}):
             status_history = history["messages"][message_id].get("statusHistory", [])
-            status_history.append(status)
+            status_history.extend(statuses)
             history["messages"][message_id]["statusHistory"] = status_history
 
         chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+        return self.update_chat_by_id(id, chat) is not None
 
     def insert_shared_chat_by_chat_id(
         self, chat_id: str, share_company_id: Optional[str] = None
@@ -531,6 +722,18 @@ class ChatTable:
             log.error(f"Error getting chat by id and user_id: {e}")
             return None
 
+    def is_chat_owned_by_user_id(self, id: str, user_id: str) -> bool:
+        """Ownership check that never loads the chat document."""
+        try:
+            with get_db() as db:
+                return (
+                    db.query(Chat.id).filter_by(id=id, user_id=user_id).first()
+                    is not None
+                )
+        except Exception as e:
+            log.error(f"Error checking chat ownership: {e}")
+            return False
+
     def get_chats(self, skip: int = 0, limit: int = 50) -> list[ChatModel]:
         with get_db() as db:
             all_chats = (
@@ -691,7 +894,7 @@ class ChatTable:
                             """
                             EXISTS (
                                 SELECT 1
-                                FROM json_array_elements(Chat.chat->'messages') AS message
+                                FROM jsonb_array_elements(Chat.chat->'messages') AS message
                                 WHERE LOWER(message->>'content') LIKE '%' || :search_text || '%'
                             )
                             """
@@ -952,4 +1155,58 @@ class ChatTable:
             flag_modified(chat_item, "chat")
             db.commit()
 
+    def get_pii_analyze_cache(self, chat_id: str) -> Dict[str, List[list]]:
+        """All cached PII analyze results of a chat: text hash -> packed spans."""
+        with get_db() as db:
+            rows = db.query(
+                PiiAnalyzeCacheEntry.text_hash, PiiAnalyzeCacheEntry.spans
+            ).filter(PiiAnalyzeCacheEntry.chat_id == chat_id)
+            return {text_hash: spans for text_hash, spans in rows}
+
+    def save_pii_analyze_cache(
+        self,
+        chat_id: str,
+        entries: Dict[str, List[list]],
+        touched: Iterable[str],
+        max_entries: int,
+    ) -> None:
+        """Stores new `entries`, marks `touched` hashes as used, then drops
+        the least recently used entries beyond `max_entries`."""
+        now = int(time.time())
+        touched = [text_hash for text_hash in touched if text_hash not in entries]
+        with get_db() as db:
+            if entries:
+                stmt = pg_insert(PiiAnalyzeCacheEntry.__table__)
+                db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["chat_id", "text_hash"],
+                        set_={"last_used_at": stmt.excluded.last_used_at},
+                    ),
+                    [
+                        {
+                            "chat_id": chat_id,
+                            "text_hash": text_hash,
+                            "spans": spans,
+                            "last_used_at": now,
+                        }
+                        for text_hash, spans in entries.items()
+                    ],
+                )
+            if touched:
+                db.query(PiiAnalyzeCacheEntry).filter(
+                    PiiAnalyzeCacheEntry.chat_id == chat_id,
+                    PiiAnalyzeCacheEntry.text_hash.in_(touched),
+                ).update({"last_used_at": now}, synchronize_session=False)
+            if entries:
+                db.execute(
+                    text(
+                        "DELETE FROM pii_analyze_cache WHERE chat_id = :chat_id "
+                        "AND text_hash IN (SELECT text_hash FROM pii_analyze_cache "
+                        "WHERE chat_id = :chat_id "
+                        "ORDER BY last_used_at DESC, text_hash OFFSET :max_entries)"
+                    ),
+                    {"chat_id": chat_id, "max_entries": max_entries},
+                )
+            db.commit()
+
 Chats = ChatTable()
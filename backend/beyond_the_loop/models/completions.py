@@ -129,6 +129,34 @@ class CompletionTable:
             log.error(f"Error fetching completions count by models: {e}")
             return {}
 
+    def get_recent_completions_by_user_and_models(
+            self,
+            user_id: str,
+            model_names: list[str],
+            since: int,
+    ) -> Optional[list[tuple[str, str, int]]]:
+        """Returns (id, model, created_at) of the user's chat completions for
+        `model_names` created at or after `since`, or None if the query
+        failed. Seeds the fair-usage counters in Redis."""
+        try:
+            with get_db() as db:
+                rows = (
+                    db.query(Completion.id, Completion.model, Completion.created_at)
+                    .filter(
+                        Completion.user_id == user_id,
+                        Completion.model.in_(model_names),
+                        Completion.created_at >= since,
+                        # See get_completions_last_three_hours_by_user_and_model
+                        # for the rationale.
+                        Completion.kind == 'chat',
+                    )
+                    .all()
+                )
+                return [(row.id, row.model, row.created_at) for row in rows]
+        except Exception as e:
+            log.error(f"Error fetching recent completions by models: {e}")
+            return None
+
 
 def calculate_saved_time_in_seconds(last_message, response_message):
     # log.debug(f"{last_message} ----- {response_message}")
@@ -0,0 +1,172 @@
+import logging
+import time
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import BigInteger, Column, Float, ForeignKey, Index, String, Text, insert, text
+
+from open_webui.internal.db import get_db, Base
+
+log = logging.getLogger(__name__)
+
+####################
+# Credit Ledger DB Schema
+####################
+
+
+class CreditLedgerEntry(Base):
+    __tablename__ = "credit_ledger"
+
+    id = Column(String, primary_key=True)
+    company_id = Column(String, ForeignKey("company.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String, nullable=True)
+    amount = Column(Float, nullable=False)
+    # Same values as Completion.kind: 'chat', 'stt', 'tts'.
+    kind = Column(Text, nullable=False)
+    created_at = Column(BigInteger, nullable=False)
+    # Set by the settler once `amount` has been applied to the company balance.
+    settled_at = Column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        Index("credit_ledger_pending_idx", "created_at", postgresql_where=text("settled_at IS NULL")),
+        Index("credit_ledger_company_created_idx", "company_id", "created_at"),
+    )
+
+
+class CreditSettlement(BaseModel):
+    """One company's share of a settle batch, with its balances afterwards."""
+
+    company_id: str
+    amount: float
+    events: int
+    # Author of the newest settled event — auto-recharge runs on their behalf.
+    user_id: Optional[str] = None
+    credit_balance: float
+    flex_credit_balance: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CreditLedgerReportRow(BaseModel):
+    company_id: str
+    events: int
+    amount: float
+    settled_amount: float
+    pending_events: int
+    pending_amount: float
+    oldest_pending_at: Optional[int] = None
+    last_settled_at: Optional[int] = None
+
+
+####################
+# Table Operations
+####################
+
+
+class CreditLedgerTable:
+    def append(self, company_id: str, user_id: Optional[str], amount: float, kind: str = "chat") -> None:
+        """Records usage to be subtracted from the company balance. A single
+        INSERT — no lock on the company row. Raises if the INSERT fails, so a
+        charge is never dropped without the caller knowing."""
+        try:
+            with get_db() as db:
+                db.execute(
+                    insert(CreditLedgerEntry).values(
+                        id=str(uuid.uuid4()),
+                        company_id=company_id,
+                        user_id=user_id,
+                        amount=amount,
+                        kind=kind,
+                        created_at=int(time.time()),
+                    )
+                )
+                db.commit()
+        except Exception as e:
+            log.error(f"Error appending credit ledger entry for company {company_id}: {e}")
+            raise
+
+    def settle_pending(self, limit: int) -> list[CreditSettlement]:
+        """
+        Applies up to `limit` of the oldest unsettled entries to their
+        companies' balances and marks them settled, in one statement.
+
+        Each company's total is taken from `credit_balance` first and the
+        rest from `flex_credit_balance`, neither going below zero — the same
+        split `Companies.subtract_credit_balance` applies per charge. Rows
+        are claimed with SKIP LOCKED, so settlers on several pods never
+        block each other or settle an entry twice.
+        """
+        with get_db() as db:
+            rows = db.execute(
+                text(
+                    """
+                    WITH pending AS (
+                        SELECT id FROM credit_ledger
+                        WHERE settled_at IS NULL
+                        ORDER BY created_at
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    ), settled AS (
+                        UPDATE credit_ledger AS entry
+                        SET settled_at = :now
+                        FROM pending
+                        WHERE entry.id = pending.id
+                        RETURNING entry.company_id, entry.user_id, entry.amount, entry.created_at
+                    ), totals AS (
+                        SELECT company_id,
+                               SUM(amount) AS amount,
+                               COUNT(*) AS events,
+                               (ARRAY_AGG(user_id ORDER BY created_at DESC))[1] AS user_id
+                        FROM settled
+                        GROUP BY company_id
+                    )
+                    UPDATE company AS c
+                    SET credit_balance = GREATEST(c.credit_balance - totals.amount, 0),
+                        flex_credit_balance = CASE
+                            WHEN c.credit_balance >= totals.amount THEN c.flex_credit_balance
+                            ELSE GREATEST(
+                                COALESCE(c.flex_credit_balance, 0) - (totals.amount - c.credit_balance),
+                                0
+                            )
+                        END
+                    FROM totals
+                    WHERE c.id = totals.company_id
+                    RETURNING c.id AS company_id, totals.amount, totals.events, totals.user_id,
+                              c.credit_balance, c.flex_credit_balance
+                    """
+                ),
+                {"limit": limit, "now": int(time.time())},
+            ).mappings().all()
+            db.commit()
+            return [CreditSettlement(**row) for row in rows]
+
+    def get_reconciliation_report(self, since: int, company_id: Optional[str] = None) -> list[CreditLedgerReportRow]:
+        """Per-company ledger totals for entries created at or after `since`:
+        how much was charged, how much of it reached the balance and what is
+        still pending (and since when)."""
+        with get_db() as db:
+            rows = db.execute(
+                text(
+                    """
+                    SELECT company_id,
+                           COUNT(*) AS events,
+                           COALESCE(SUM(amount), 0) AS amount,
+                           COALESCE(SUM(amount) FILTER (WHERE settled_at IS NOT NULL), 0) AS settled_amount,
+                           COUNT(*) FILTER (WHERE settled_at IS NULL) AS pending_events,
+                           COALESCE(SUM(amount) FILTER (WHERE settled_at IS NULL), 0) AS pending_amount,
+                           MIN(created_at) FILTER (WHERE settled_at IS NULL) AS oldest_pending_at,
+                           MAX(settled_at) AS last_settled_at
+                    FROM credit_ledger
+                    WHERE created_at >= :since
+                      AND (CAST(:company_id AS VARCHAR) IS NULL OR company_id = :company_id)
+                    GROUP BY company_id
+                    ORDER BY pending_amount DESC, amount DESC
+                    """
+                ),
+                {"since": since, "company_id": company_id},
+            ).mappings().all()
+            return [CreditLedgerReportRow(**row) for row in rows]
+
+
+CreditLedger = CreditLedgerTable()
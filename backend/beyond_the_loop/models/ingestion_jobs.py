@@ -0,0 +1,247 @@
+import logging
+import time
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import BigInteger, Column, Index, Integer, JSON, String, Text, text
+from sqlalchemy.dialects.postgresql import insert
+
+from open_webui.internal.db import get_db, Base
+
+log = logging.getLogger(__name__)
+
+####################
+# Ingestion Job DB Schema
+####################
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_job"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    # 'file' (process one uploaded file) or 'knowledge_files' (add files to a knowledge base).
+    kind = Column(Text, nullable=False)
+    payload = Column(JSON, nullable=False)
+    idempotency_key = Column(String, nullable=True, unique=True)
+
+    # 'queued', 'running', 'completed' or 'failed'.
+    status = Column(Text, nullable=False)
+    # Last stage reported by the running handler, e.g. 'extracting', 'embedding'.
+    stage = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+
+    # A queued job is not claimed before this time (retry backoff).
+    run_after = Column(BigInteger, nullable=False)
+    # Refreshed by the worker while the job runs; a stale one gets reclaimed.
+    heartbeat_at = Column(BigInteger, nullable=True)
+
+    created_at = Column(BigInteger, nullable=False)
+    updated_at = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ingestion_job_queued_idx", "run_after", postgresql_where=text("status = 'queued'")),
+        Index("ingestion_job_running_idx", "heartbeat_at", postgresql_where=text("status = 'running'")),
+        Index("ingestion_job_user_created_idx", "user_id", "created_at"),
+    )
+
+
+class IngestionJobModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    user_id: str
+    kind: str
+    payload: dict
+    idempotency_key: Optional[str] = None
+
+    status: str
+    stage: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+
+    run_after: int
+    heartbeat_at: Optional[int] = None
+
+    created_at: int  # timestamp in epoch
+    updated_at: int  # timestamp in epoch
+
+
+class IngestionJobResponse(BaseModel):
+    """What clients see of a job — the payload stays internal."""
+
+    id: str
+    kind: str
+    status: str
+    stage: Optional[str] = None
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: int
+    updated_at: int
+
+
+####################
+# Table Operations
+####################
+
+
+class IngestionJobsTable:
+    def enqueue(
+        self,
+        user_id: str,
+        kind: str,
+        payload: dict,
+        max_attempts: int,
+        idempotency_key: Optional[str] = None,
+    ) -> IngestionJobModel:
+        """Queues a job. A job already queued under `idempotency_key` is
+        returned instead of a new one."""
+        id = str(uuid.uuid4())
+        now = int(time.time())
+        with get_db() as db:
+            db.execute(
+                insert(IngestionJob)
+                .values(
+                    id=id,
+                    user_id=user_id,
+                    kind=kind,
+                    payload=payload,
+                    idempotency_key=idempotency_key,
+                    status="queued",
+                    attempts=0,
+                    max_attempts=max_attempts,
+                    run_after=now,
+                    created_at=now,
+                    updated_at=now,
+                )
+                .on_conflict_do_nothing(index_elements=["idempotency_key"])
+            )
+            db.commit()
+
+            job = db.get(IngestionJob, id)
+            if job is None:
+                job = db.query(IngestionJob).filter_by(idempotency_key=idempotency_key).first()
+            return IngestionJobModel.model_validate(job)
+
+    def claim_next(self, stale_after: int) -> Optional[IngestionJobModel]:
+        """
+        Marks the oldest runnable job as running and returns it, or None.
+
+        Runnable are queued jobs whose `run_after` has passed and running jobs
+        whose heartbeat is older than `stale_after` seconds (their worker
+        died) with attempts left. A stale job without attempts left is marked
+        failed instead — a file that kills its worker (OOM) must not take down
+        worker after worker. Rows are claimed with SKIP LOCKED, so workers on
+        several pods never block each other or run a job twice.
+        """
+        now = int(time.time())
+        with get_db() as db:
+            db.execute(
+                text(
+                    """
+                    UPDATE ingestion_job
+                    SET status = 'failed',
+                        error = 'The worker stopped responding on every attempt',
+                        updated_at = :now
+                    WHERE status = 'running'
+                      AND heartbeat_at < :stale_before
+                      AND attempts >= max_attempts
+                    """
+                ),
+                {"now": now, "stale_before": now - stale_after},
+            )
+            row = db.execute(
+                text(
+                    """
+                    WITH next AS (
+                        SELECT id FROM ingestion_job
+                        WHERE (status = 'queued' AND run_after <= :now)
+                           OR (status = 'running' AND heartbeat_at < :stale_before
+                               AND attempts < max_attempts)
+                        ORDER BY run_after
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE ingestion_job AS job
+                    SET status = 'running',
+                        stage = NULL,
+                        attempts = job.attempts + 1,
+                        heartbeat_at = :now,
+                        updated_at = :now
+                    FROM next
+                    WHERE job.id = next.id
+                    RETURNING job.*
+                    """
+                ),
+                {"now": now, "stale_before": now - stale_after},
+            ).mappings().first()
+            db.commit()
+            return IngestionJobModel(**row) if row else None
+
+    def update_stage(self, id: str, stage: str) -> None:
+        now = int(time.time())
+        with get_db() as db:
+            db.query(IngestionJob).filter_by(id=id, status="running").update(
+                {"stage": stage, "heartbeat_at": now, "updated_at": now}
+            )
+            db.commit()
+
+    def heartbeat(self, id: str) -> None:
+        with get_db() as db:
+            db.query(IngestionJob).filter_by(id=id, status="running").update(
+                {"heartbeat_at": int(time.time())}
+            )
+            db.commit()
+
+    def complete(self, id: str, result: Optional[dict] = None) -> Optional[IngestionJobModel]:
+        now = int(time.time())
+        with get_db() as db:
+            db.query(IngestionJob).filter_by(id=id).update(
+                {"status": "completed", "result": result, "error": None, "updated_at": now}
+            )
+            db.commit()
+            return IngestionJobModel.model_validate(db.get(IngestionJob, id))
+
+    def fail(self, id: str, error: str, retry_delay: int) -> Optional[IngestionJobModel]:
+        """Requeues the job `retry_delay` seconds from now, or marks it failed
+        once it has used up its attempts."""
+        now = int(time.time())
+        with get_db() as db:
+            job = db.get(IngestionJob, id)
+            if job is None:
+                return None
+
+            if job.attempts < job.max_attempts:
+                job.status = "queued"
+                job.run_after = now + retry_delay
+            else:
+                job.status = "failed"
+            job.error = error
+            job.updated_at = now
+            db.commit()
+            db.refresh(job)
+            return IngestionJobModel.model_validate(job)
+
+    def get_job_by_id(self, id: str) -> Optional[IngestionJobModel]:
+        try:
+            with get_db() as db:
+                job = db.get(IngestionJob, id)
+                return IngestionJobModel.model_validate(job) if job else None
+        except Exception as e:
+            log.error(f"Error getting ingestion job {id}: {e}")
+            return None
+
+    def get_job_by_idempotency_key(self, idempotency_key: str) -> Optional[IngestionJobModel]:
+        with get_db() as db:
+            job = db.query(IngestionJob).filter_by(idempotency_key=idempotency_key).first()
+            return IngestionJobModel.model_validate(job) if job else None
+
+
+IngestionJobs = IngestionJobsTable()
@@ -225,6 +225,34 @@ class KnowledgeTable:
             log.exception(e)
             return None
 
+    def add_file_ids_by_id(
+        self, id: str, file_ids: list[str]
+    ) -> Optional[KnowledgeModel]:
+        """Appends the `file_ids` not yet in the knowledge's file list. The
+        row is locked for the read-modify-write, so concurrent ingestion jobs
+        for one knowledge base don't overwrite each other's ids."""
+        try:
+            with get_db() as db:
+                knowledge = (
+                    db.query(Knowledge).filter_by(id=id).with_for_update().first()
+                )
+                if knowledge is None:
+                    return None
+                data = dict(knowledge.data or {})
+                existing_ids = list(data.get("file_ids", []))
+                data["file_ids"] = existing_ids + [
+                    file_id
+                    for file_id in dict.fromkeys(file_ids)
+                    if file_id not in existing_ids
+                ]
+                knowledge.data = data
+                knowledge.updated_at = int(time.time())
+                db.commit()
+                return KnowledgeModel.model_validate(knowledge)
+        except Exception as e:
+            log.exception(e)
+            return None
+
     def delete_knowledge_by_id(self, id: str) -> bool:
         try:
             with get_db() as db:
@@ -9,9 +9,15 @@ for the service URL), not a generic OAuth2 access token. In production
 (service account on GCE/Cloud Run), this is minted via the metadata server.
 For local development with user credentials, we fall back to `gcloud auth
 print-identity-token` since user-mode ADC cannot mint identity tokens.
+Local stand-in servers (tests, offline dev) need no token at all: set
+PII_INFERENCE_AUTH=none.
+
+`apredict` is the async variant used by the batched analysis path; it keeps
+one pooled httpx.AsyncClient per event loop.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import subprocess
@@ -31,7 +37,12 @@ _TOKEN_TTL_SECONDS = 50 * 60
 
 
 class PiiInferenceClient:
-    def __init__(self, predict_url: str | None = None, timeout: float = 600.0) -> None:
+    def __init__(
+        self,
+        predict_url: str | None = None,
+        timeout: float = 600.0,
+        auth: str | None = None,
+    ) -> None:
         url = predict_url or os.environ.get("PII_INFERENCE_URL")
         if not url:
             raise RuntimeError(
@@ -44,7 +55,11 @@ class PiiInferenceClient:
         parsed = urlparse(url)
         self._audience = f"{parsed.scheme}://{parsed.netloc}"
         self._timeout = timeout
+        # "google" (Cloud Run identity token) or "none" (local stand-ins).
+        self._auth = (auth or os.environ.get("PII_INFERENCE_AUTH", "google")).lower()
         self._http = httpx.Client(timeout=timeout)
+        self._ahttp: Optional[httpx.AsyncClient] = None
+        self._ahttp_loop: Optional[asyncio.AbstractEventLoop] = None
         self._cached_token: Optional[str] = None
         self._token_expires_at: float = 0.0
 
@@ -63,6 +78,11 @@ class PiiInferenceClient:
         self._token_expires_at = time.time() + _TOKEN_TTL_SECONDS
         return token
 
+    def _headers(self) -> dict:
+        if self._auth == "none":
+            return {}
+        return {"Authorization": f"Bearer {self._id_token()}"}
+
     def predict(self, texts: List[str]) -> List[List[dict]]:
         if not texts:
             return []
@@ -70,7 +90,33 @@ class PiiInferenceClient:
         resp = self._http.post(
             self._url,
             json={"instances": texts},
-            headers={"Authorization": f"Bearer {self._id_token()}"},
+            headers=self._headers(),
         )
         resp.raise_for_status()
         return resp.json()["predictions"]
+
+    async def apredict(self, texts: List[str]) -> List[List[dict]]:
+        if not texts:
+            return []
+
+        if self._auth == "none" or (
+            self._cached_token and time.time() < self._token_expires_at
+        ):
+            headers = self._headers()
+        else:
+            # Minting a token may shell out to gcloud; keep it off the loop.
+            headers = await asyncio.to_thread(self._headers)
+
+        resp = await self._async_http().post(
+            self._url, json={"instances": texts}, headers=headers
+        )
+        resp.raise_for_status()
+        return resp.json()["predictions"]
+
+    def _async_http(self) -> httpx.AsyncClient:
+        # An AsyncClient's connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._ahttp is None or self._ahttp_loop is not loop:
+            self._ahttp = httpx.AsyncClient(timeout=self._timeout)
+            self._ahttp_loop = loop
+        return self._ahttp
@@ -0,0 +1,177 @@
+"""
+Linear-time matchers for PIISession's sweep and deanonymization paths.
+
+Why: `_sweep_known` used to compile an alternation regex over every known
+original on each call, and `deanonymize`, `StreamingDeanonymizer` and
+`calculate_shifted_index` did one scan of the text per placeholder. With
+hundreds of entities in a chat that is O(entities x text) per message and per
+streamed chunk.
+
+- `EntityMatcher` is an Aho-Corasick automaton over the known originals. It
+  finds every whole-word occurrence in one pass over the text and picks the
+  same leftmost-longest matches the old alternation regex did. Originals can
+  be added incrementally; failure links are recomputed lazily on the next
+  scan.
+- Placeholders all have the `[[...]]` shape, so a single compiled token regex
+  plus a dict lookup finds the known ones in one pass. Unknown tokens are
+  left untouched, as before.
+"""
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Callable, Container, Dict, Iterable, List, Optional, Tuple
+
+# Any `[[...]]` token; known placeholders are resolved by dict lookup.
+PLACEHOLDER_PATTERN = re.compile(r"\[\[[^\[\]]+\]\]")
+PLACEHOLDER_PATTERN_BYTES = re.compile(rb"\[\[[^\[\]]+\]\]")
+
+
+def _is_word_char(char: str) -> bool:
+    # Same definition as `\w` in a str regex.
+    return char.isalnum() or char == "_"
+
+
+class EntityMatcher:
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        # Trie: goto transitions, failure links and, per state, the patterns
+        # ending there (own pattern first, then those along the failure chain).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[Optional[str]] = [None]
+        self._out: List[Tuple[str, ...]] = [()]
+        self._patterns: set = set()
+        self._dirty = False
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._patterns
+
+    def add(self, pattern: str) -> None:
+        if not pattern or pattern in self._patterns:
+            return
+        self._patterns.add(pattern)
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append(None)
+                self._out.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._own[state] = pattern
+        self._dirty = True
+
+    def _build(self) -> None:
+        goto, fail, own, out = self._goto, self._fail, self._own, self._out
+        queue = deque()
+        for state in goto[0].values():
+            fail[state] = 0
+            out[state] = (own[state],) if own[state] else ()
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                inherited = out[fail[child]]
+                out[child] = ((own[child],) + inherited) if own[child] else inherited
+                queue.append(child)
+        self._root_skip = re.compile(
+            "[" + "".join(re.escape(char) for char in goto[0]) + "]"
+        ).search
+        self._dirty = False
+
+    def find_words(
+        self, text: str, exclude: Container[str] = ()
+    ) -> List[Tuple[int, int, str]]:
+        """Non-overlapping (start, end, pattern) whole-word matches in `text`,
+        leftmost first and longest at each start. Patterns in `exclude` are
+        ignored, so a shorter pattern at the same position can still match.
+        """
+        if not self._patterns or not text:
+            return []
+        if self._dirty:
+            self._build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        skip = self._root_skip
+        candidates = []
+        length = len(text)
+        index = 0
+        state = 0
+        while index < length:
+            if not state:
+                # At the root, jump straight to the next character that can
+                # start a pattern instead of stepping through the rest.
+                match = skip(text, index)
+                if match is None:
+                    break
+                index = match.start()
+                state = root[text[index]]
+            else:
+                char = text[index]
+                next_state = goto[state].get(char)
+                while next_state is None and state:
+                    state = fail[state]
+                    next_state = goto[state].get(char)
+                state = next_state or 0
+            index += 1
+            if out[state]:
+                for pattern in out[state]:
+                    candidates.append((index - len(pattern), index, pattern))
+        if not candidates:
+            return []
+
+        matches = []
+        last_end = 0
+        candidates.sort(key=lambda match: (match[0], -match[1]))
+        for start, end, pattern in candidates:
+            if start < last_end or pattern in exclude:
+                continue
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < length and _is_word_char(text[end]):
+                continue
+            matches.append((start, end, pattern))
+            last_end = end
+        return matches
+
+    def replace_words(
+        self,
+        text: str,
+        replacement: Callable[[str], str],
+        exclude: Container[str] = (),
+    ) -> Tuple[str, List[str]]:
+        """`text` with every match from `find_words` replaced by
+        `replacement(pattern)`; also returns the matched patterns in order."""
+        matches = self.find_words(text, exclude)
+        if not matches:
+            return text, []
+        parts = []
+        position = 0
+        for start, end, pattern in matches:
+            parts.append(text[position:start])
+            parts.append(replacement(pattern))
+            position = end
+        parts.append(text[position:])
+        return "".join(parts), [pattern for _, _, pattern in matches]
+
+
+def replace_placeholders(text: str, reverse_map: Dict[str, str]) -> str:
+    """Replace every known placeholder in `text` with its original, in one pass."""
+    if not text or not reverse_map or "[[" not in text:
+        return text
+    return PLACEHOLDER_PATTERN.sub(
+        lambda match: reverse_map.get(match.group(0), match.group(0)), text
+    )
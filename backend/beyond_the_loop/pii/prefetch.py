@@ -0,0 +1,137 @@
+"""
+DraftPrefetcher — speculative PII analysis of the composer draft.
+
+Why: anonymization in `process_chat_payload` only starts once the user hits
+send, and NER over the new prompt and attached files blocks compression, RAG
+and the LLM call behind an "Anonymizing personal data" status.
+
+While the user types or attaches files, the composer posts its draft to
+`POST /api/v1/pii/prefetch` (debounced client-side). The draft is analyzed in
+the background and the results land in the chat's PII analyze cache, so the
+real request is mostly cache hits. Per chat only the latest draft matters:
+
+- a draft identical to the one in flight (or last analyzed) is ignored;
+- a newer draft cancels the superseded one, including its `predict` calls;
+- each draft first waits PII_DRAFT_DEBOUNCE_SECONDS, so keystroke bursts that
+  get past the client debounce are cancelled before costing anything.
+
+Only the analyze cache is written — never the placeholder maps, which belong
+to the real request. `process_chat_payload` waits up to
+PII_DRAFT_WAIT_SECONDS for a still-running draft of the same chat before
+anonymizing. State is per process; with several workers a draft analyzed
+elsewhere is still picked up from the cache table once it has finished.
+
+Usage:
+    status = get_draft_prefetcher().schedule(chat_id, draft_key, load_texts)
+    ...
+    await get_draft_prefetcher().wait(chat_id)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+
+from beyond_the_loop.pii.session import PIISession
+
+log = logging.getLogger(__name__)
+
+DRAFT_DEBOUNCE_SECONDS: float = float(os.environ.get("PII_DRAFT_DEBOUNCE_SECONDS", "0.3"))
+DRAFT_WAIT_SECONDS: float = float(os.environ.get("PII_DRAFT_WAIT_SECONDS", "5"))
+# Upper bound on the characters analyzed per draft (prompt + file contents).
+DRAFT_MAX_CHARS: int = int(os.environ.get("PII_DRAFT_MAX_CHARS", "200000"))
+
+
+def _open_session(chat_id: str) -> PIISession:
+    session = PIISession(chat_id)
+    # Load the cache here, in the worker thread, not on the event loop.
+    session._loaded_analyze_cache()
+    return session
+
+
+class DraftPrefetcher:
+    def __init__(
+        self,
+        open_session: Callable[[str], PIISession] = _open_session,
+        debounce: float = DRAFT_DEBOUNCE_SECONDS,
+        max_chars: int = DRAFT_MAX_CHARS,
+    ) -> None:
+        self.open_session = open_session
+        self.debounce = debounce
+        self.max_chars = max_chars
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # chat_id -> key of the draft in flight or last analyzed
+        self._draft_keys: TTLCache = TTLCache(maxsize=10000, ttl=3600)
+
+    def schedule(
+        self,
+        chat_id: str,
+        draft_key: str,
+        load_texts: Callable[[], List[str]],
+    ) -> str:
+        """Analyze the draft identified by `draft_key` in the background.
+        `load_texts` runs in a worker thread and returns the texts to analyze.
+        Returns "duplicate" or "scheduled"."""
+        if self._draft_keys.get(chat_id) == draft_key:
+            return "duplicate"
+
+        superseded = self._tasks.get(chat_id)
+        if superseded is not None and not superseded.done():
+            superseded.cancel()
+
+        self._draft_keys[chat_id] = draft_key
+        self._tasks[chat_id] = asyncio.create_task(
+            self._run(chat_id, draft_key, load_texts)
+        )
+        return "scheduled"
+
+    async def wait(self, chat_id: str, timeout: float = DRAFT_WAIT_SECONDS) -> None:
+        """Wait (bounded) for the chat's running draft analysis, if any."""
+        task = self._tasks.get(chat_id)
+        if task is not None and not task.done():
+            await asyncio.wait({task}, timeout=timeout)
+
+    async def _run(
+        self, chat_id: str, draft_key: str, load_texts: Callable[[], List[str]]
+    ) -> None:
+        try:
+            await asyncio.sleep(self.debounce)
+            texts = self._within_budget(await asyncio.to_thread(load_texts))
+            session = await asyncio.to_thread(self.open_session, chat_id)
+            await session.prefetch(texts)
+            await asyncio.to_thread(session.save_analyze_cache)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("[pii] draft analysis for chat %s failed", chat_id)
+            # Let the same draft be retried.
+            if self._draft_keys.get(chat_id) == draft_key:
+                self._draft_keys.pop(chat_id, None)
+        finally:
+            if self._tasks.get(chat_id) is asyncio.current_task():
+                del self._tasks[chat_id]
+
+    def _within_budget(self, texts: List[str]) -> List[str]:
+        kept = []
+        budget = self.max_chars
+        for text in texts:
+            if not text or not text.strip():
+                continue
+            if len(text) > budget:
+                break
+            kept.append(text)
+            budget -= len(text)
+        return kept
+
+
+_prefetcher: Optional[DraftPrefetcher] = None
+
+
+def get_draft_prefetcher() -> DraftPrefetcher:
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = DraftPrefetcher()
+    return _prefetcher
@@ -13,9 +13,14 @@ Supported entity categories:
   private_url, private_date, account_number, secret
 
 Configure the endpoint via the `PII_INFERENCE_URL` env var.
+
+`analyze_many` is the batched path: texts are deduped, packed into `predict`
+calls of up to PII_PREDICT_BATCH_SIZE instances / PII_PREDICT_BATCH_MAX_CHARS
+characters, and up to PII_PREDICT_CONCURRENCY calls run at once.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import threading
@@ -29,6 +34,10 @@ from .inference_client import PiiInferenceClient
 # Override via PII_MIN_SCORE env var.
 MIN_PII_SCORE: float = float(os.environ.get("PII_MIN_SCORE", "0.85"))
 
+PREDICT_BATCH_SIZE: int = int(os.environ.get("PII_PREDICT_BATCH_SIZE", "16"))
+PREDICT_BATCH_MAX_CHARS: int = int(os.environ.get("PII_PREDICT_BATCH_MAX_CHARS", "20000"))
+PREDICT_CONCURRENCY: int = int(os.environ.get("PII_PREDICT_CONCURRENCY", "4"))
+
 log = logging.getLogger(__name__)
 
 SUPPORTED_ENTITIES: List[str] = [
@@ -55,8 +64,8 @@ class PrivacyFilterService:
     _instance: Optional["PrivacyFilterService"] = None
     _lock = threading.Lock()
 
-    def __init__(self) -> None:
-        self._client = PiiInferenceClient()
+    def __init__(self, client: Optional[PiiInferenceClient] = None) -> None:
+        self._client = client if client is not None else PiiInferenceClient()
 
     @classmethod
     def instance(cls) -> "PrivacyFilterService":
@@ -72,7 +81,39 @@ class PrivacyFilterService:
         if not text or not text.strip():
             return []
 
-        raw = self._client.predict([text])[0]
+        return self._filter_spans(text, self._client.predict([text])[0])
+
+    async def analyze_many(self, texts: List[str]) -> List[List[PiiSpan]]:
+        """Spans for every text, in order, from as few `predict` calls as possible."""
+        unique = list(dict.fromkeys(t for t in texts if t and t.strip()))
+        results: dict = {}
+
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        chars = 0
+        for text in unique:
+            if batch and (
+                len(batch) >= PREDICT_BATCH_SIZE or chars + len(text) > PREDICT_BATCH_MAX_CHARS
+            ):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            batches.append(batch)
+
+        semaphore = asyncio.Semaphore(PREDICT_CONCURRENCY)
+
+        async def run(batch: List[str]) -> None:
+            async with semaphore:
+                predictions = await self._client.apredict(batch)
+            for text, raw in zip(batch, predictions):
+                results[text] = self._filter_spans(text, raw)
+
+        await asyncio.gather(*(run(batch) for batch in batches))
+        return [results.get(text, []) for text in texts]
+
+    def _filter_spans(self, text: str, raw) -> List[PiiSpan]:
         spans = self._decode_bioes(raw)
         result = []
         for s in spans:
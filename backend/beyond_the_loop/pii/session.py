@@ -3,6 +3,9 @@ PIISession — per-chat bidirectional mapping between PII originals and placehol
 
 State is persisted in the chat row's `chat` JSON column under the
 `pii_session` key. Loads at construction, writes via explicit save().
+NER results are cached separately (table `pii_analyze_cache`), keyed by the
+sha256 of the analyzed text and capped at PII_ANALYZE_CACHE_MAX_ENTRIES per
+chat, so the chat row does not carry a second copy of its own text.
 Placeholder format: [[TYPE_N]] where TYPE is a short entity label and N is a
 per-type counter within the session. Counters start at 1.
 
@@ -14,15 +17,28 @@ or add a row-level lock.
 """
 from __future__ import annotations
 
+import hashlib
 import logging
-import re
-from typing import Any, Dict, Iterable, List, Optional, Protocol, Set, Tuple
-
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+from beyond_the_loop.pii.matcher import (
+    PLACEHOLDER_PATTERN,
+    PLACEHOLDER_PATTERN_BYTES,
+    EntityMatcher,
+    replace_placeholders,
+)
 from beyond_the_loop.pii.service import PiiSpan, PrivacyFilterService
 from beyond_the_loop.prompts import PII_PLACEHOLDER_NOTE
 
 log = logging.getLogger(__name__)
 
+# Per-chat cap on cached analyze results; least recently used go first.
+ANALYZE_CACHE_MAX_ENTRIES: int = int(
+    os.environ.get("PII_ANALYZE_CACHE_MAX_ENTRIES", "500")
+)
+
 
 def pii_note_prefix(pii_active: bool) -> str:
     """Prepend to a system prompt when the chat runs under PII anonymization."""
@@ -56,6 +72,13 @@ _PLACEHOLDER_LABEL: Dict[str, str] = {
 class PIIStorage(Protocol):
     def load(self, chat_id: str) -> Optional[dict]: ...
     def save(self, chat_id: str, data: dict) -> None: ...
+    def load_analyze_cache(self, chat_id: str) -> Dict[str, List[list]]: ...
+    def save_analyze_cache(
+        self,
+        chat_id: str,
+        entries: Dict[str, List[list]],
+        touched: Iterable[str],
+    ) -> None: ...
 
 
 class DBPIIStorage:
@@ -67,12 +90,29 @@ class DBPIIStorage:
         from beyond_the_loop.models.chats import Chats
         Chats.save_pii_session(chat_id, data)
 
+    def load_analyze_cache(self, chat_id: str) -> Dict[str, List[list]]:
+        from beyond_the_loop.models.chats import Chats
+        return Chats.get_pii_analyze_cache(chat_id)
+
+    def save_analyze_cache(
+        self,
+        chat_id: str,
+        entries: Dict[str, List[list]],
+        touched: Iterable[str],
+    ) -> None:
+        from beyond_the_loop.models.chats import Chats
+        Chats.save_pii_analyze_cache(
+            chat_id, entries, touched, ANALYZE_CACHE_MAX_ENTRIES
+        )
+
 
 class InMemoryPIIStorage:
     """For tests."""
 
-    def __init__(self) -> None:
+    def __init__(self, max_cache_entries: Optional[int] = None) -> None:
         self._data: Dict[str, dict] = {}
+        self._analyze_cache: Dict[str, "OrderedDict[str, List[list]]"] = {}
+        self.max_cache_entries = max_cache_entries or ANALYZE_CACHE_MAX_ENTRIES
 
     def load(self, chat_id: str) -> Optional[dict]:
         return self._data.get(chat_id)
@@ -80,6 +120,25 @@ class InMemoryPIIStorage:
     def save(self, chat_id: str, data: dict) -> None:
         self._data[chat_id] = data
 
+    def load_analyze_cache(self, chat_id: str) -> Dict[str, List[list]]:
+        return dict(self._analyze_cache.get(chat_id, {}))
+
+    def save_analyze_cache(
+        self,
+        chat_id: str,
+        entries: Dict[str, List[list]],
+        touched: Iterable[str],
+    ) -> None:
+        cache = self._analyze_cache.setdefault(chat_id, OrderedDict())
+        for text_hash in touched:
+            if text_hash in cache:
+                cache.move_to_end(text_hash)
+        for text_hash, spans in entries.items():
+            cache[text_hash] = spans
+            cache.move_to_end(text_hash)
+        while len(cache) > self.max_cache_entries:
+            cache.popitem(last=False)
+
 
 _default_storage: Optional[PIIStorage] = None
 
@@ -111,15 +170,18 @@ class PIISession:
         self.sources: Dict[str, Set[str]] = {
             k: set(v) for k, v in data.get("sources", {}).items()
         }
-        # Cache of analyze results keyed by raw text. Re-anonymizing the same
-        # prior-turn message on every send (anonymize_messages iterates the
-        # whole history) would otherwise rerun the transformer on text we've
-        # already analyzed — the dominant cost. Cache values are plain dicts
-        # so they round-trip through JSON storage; spans are rebuilt as
-        # PiiSpan on read.
-        self.analyze_cache: Dict[str, List[Dict[str, Any]]] = data.get(
-            "analyze_cache", {}
-        )
+        # Cache of analyze results keyed by sha256 of the text. Re-anonymizing
+        # the same prior-turn message on every send (anonymize_messages
+        # iterates the whole history) would otherwise rerun the transformer on
+        # text we've already analyzed — the dominant cost. Values are packed
+        # [entity_type, start, end, score] lists; loaded on first use, new and
+        # hit entries are written back on save().
+        self._analyze_cache: Optional[Dict[str, List[list]]] = None
+        self._new_cache_entries: Dict[str, List[list]] = {}
+        self._touched_cache_entries: Set[str] = set()
+        # Aho-Corasick automaton over the known originals, built on first
+        # sweep and extended as placeholders are created.
+        self._matcher: Optional[EntityMatcher] = None
 
     def save(self) -> None:
         self.storage.save(
@@ -129,9 +191,26 @@ class PIISession:
                 "reverse": self.reverse,
                 "counters": self.counters,
                 "sources": {k: sorted(v) for k, v in self.sources.items()},
-                "analyze_cache": self.analyze_cache,
             },
         )
+        self.save_analyze_cache()
+
+    def save_analyze_cache(self) -> None:
+        """Persist only new / hit analyze cache entries, leaving the
+        placeholder maps alone (used by speculative draft analysis, which
+        must not overwrite a concurrent request's placeholders)."""
+        if self._new_cache_entries or self._touched_cache_entries:
+            try:
+                self.storage.save_analyze_cache(
+                    self.chat_id,
+                    self._new_cache_entries,
+                    self._touched_cache_entries,
+                )
+            except Exception as e:
+                # Losing cache entries only costs a re-analysis later.
+                log.warning("[pii] cannot persist analyze cache for %s: %s", self.chat_id, e)
+            self._new_cache_entries = {}
+            self._touched_cache_entries = set()
 
     def sources_serialized(self) -> Dict[str, List[str]]:
         """Sources as a JSON-friendly {original: [source, ...]} map."""
@@ -222,13 +301,7 @@ class PIISession:
         return out, []
 
     def deanonymize(self, text: str) -> str:
-        if not text or not self.reverse:
-            return text
-        # Sort by placeholder length descending so longer labels get replaced
-        # before any that might be a prefix substring.
-        for placeholder in sorted(self.reverse.keys(), key=len, reverse=True):
-            text = text.replace(placeholder, self.reverse[placeholder])
-        return text
+        return replace_placeholders(text, self.reverse)
 
     def streaming_deanonymizer(self):
         """Return a StreamingDeanonymizer bound to this session's reverse map."""
@@ -261,28 +334,60 @@ class PIISession:
         return sorted(result, key=lambda s: s.start)
 
     def _analyze_cached(self, text: str) -> List[PiiSpan]:
-        cached = self.analyze_cache.get(text)
+        cached = self._cached_spans(text)
         if cached is not None:
-            return [
-                PiiSpan(
-                    entity_type=s["entity_type"],
-                    start=s["start"],
-                    end=s["end"],
-                    score=s["score"],
-                )
-                for s in cached
-            ]
+            return cached
         spans = self.service.analyze(text)
-        self.analyze_cache[text] = [
-            {
-                "entity_type": s.entity_type,
-                "start": int(s.start),
-                "end": int(s.end),
-                "score": float(s.score),
-            }
+        self._cache_spans(text, spans)
+        return spans
+
+    async def prefetch(self, texts: Iterable[str]) -> None:
+        """Analyze every not-yet-cached text in `texts` through the batched
+        `analyze_many` path, so the `anonymize` calls that follow are all
+        cache hits instead of one `predict` round trip each."""
+        misses = [
+            text
+            for text in dict.fromkeys(texts)
+            if text and text.strip() and self._cached_spans(text) is None
+        ]
+        if not misses:
+            return
+        for text, spans in zip(misses, await self.service.analyze_many(misses)):
+            self._cache_spans(text, spans)
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _loaded_analyze_cache(self) -> Dict[str, List[list]]:
+        if self._analyze_cache is None:
+            try:
+                self._analyze_cache = self.storage.load_analyze_cache(self.chat_id)
+            except Exception as e:
+                log.warning("[pii] cannot load analyze cache for %s: %s", self.chat_id, e)
+                self._analyze_cache = {}
+        return self._analyze_cache
+
+    def _cached_spans(self, text: str) -> Optional[List[PiiSpan]]:
+        text_hash = self._text_hash(text)
+        packed = self._loaded_analyze_cache().get(text_hash)
+        if packed is None:
+            return None
+        if text_hash not in self._new_cache_entries:
+            self._touched_cache_entries.add(text_hash)
+        return [
+            PiiSpan(entity_type=entity_type, start=start, end=end, score=score)
+            for entity_type, start, end, score in packed
+        ]
+
+    def _cache_spans(self, text: str, spans: List[PiiSpan]) -> None:
+        text_hash = self._text_hash(text)
+        packed = [
+            [s.entity_type, int(s.start), int(s.end), round(float(s.score), 4)]
             for s in spans
         ]
-        return spans
+        self._loaded_analyze_cache()[text_hash] = packed
+        self._new_cache_entries[text_hash] = packed
 
     def _sweep_known(
         self,
@@ -291,28 +396,20 @@ class PIISession:
         released_set: Set[str],
     ) -> Tuple[str, int]:
         # Released originals stay verbatim by design — exclude them from the sweep.
-        originals = sorted(
-            (o for o in self.forward if o and o not in released_set),
-            key=len,
-            reverse=True,
-        )
-        if not originals:
+        if not self.forward:
             return text, 0
-
-        pattern = re.compile(
-            r"(?<!\w)(?:" + "|".join(re.escape(o) for o in originals) + r")(?!\w)"
+        out, matched = self._known_matcher().replace_words(
+            text, self.forward.__getitem__, exclude=released_set
         )
-
-        count = 0
-
-        def repl(match: re.Match) -> str:
-            nonlocal count
-            original = match.group(0)
+        for original in matched:
             self.sources.setdefault(original, set()).add(source)
-            count += 1
-            return self.forward[original]
+        return out, len(matched)
 
-        return pattern.sub(repl, text), count
+    def _known_matcher(self) -> EntityMatcher:
+        # Rebuild if `forward` was changed behind our back (e.g. in tests).
+        if self._matcher is None or len(self._matcher) != len(self.forward):
+            self._matcher = EntityMatcher(self.forward)
+        return self._matcher
 
     def _get_or_create_placeholder(self, entity_type: str, original: str) -> str:
         existing = self.forward.get(original)
@@ -324,7 +421,10 @@ class PIISession:
         placeholder = f"[[{label}_{self.counters[label]}]]"
         self.forward[original] = placeholder
         self.reverse[placeholder] = original
+        if self._matcher is not None:
+            self._matcher.add(original)
         return placeholder
+
     def calculate_shifted_index(
         self,
         anonymized_text: str,
@@ -334,29 +434,31 @@ class PIISession:
         if not self.forward or not anonymized_text:
             return anon_end_index
 
+        placeholders = {
+            placeholder: original for original, placeholder in self.forward.items()
+        }
         if utf8:
             work = anonymized_text.encode("utf-8")
-            enc = lambda s: s.encode("utf-8")
+            pattern = PLACEHOLDER_PATTERN_BYTES
+            decode = lambda b: b.decode("utf-8", errors="replace")
+            size = lambda s: len(s.encode("utf-8"))
         else:
             work = anonymized_text
-            enc = lambda s: s
+            pattern = PLACEHOLDER_PATTERN
+            decode = lambda s: s
+            size = len
 
         shift = 0
-        for original, placeholder in self.forward.items():
-            orig_enc = enc(original)
-            ph_enc   = enc(placeholder)
-            delta = len(orig_enc) - len(ph_enc)
-            if delta == 0:
-                continue
-            search_from = 0
-            while True:
-                idx = work.find(ph_enc, search_from)
-                if idx == -1 or idx >= anon_end_index:
-                    break
-                shift += delta
-                search_from = idx + len(ph_enc)
+        for match in pattern.finditer(work):
+            if match.start() >= anon_end_index:
+                break
+            placeholder = decode(match.group(0))
+            original = placeholders.get(placeholder)
+            if original is not None:
+                shift += size(original) - size(placeholder)
         return anon_end_index + shift
 
+
 def anonymize_messages(
     messages: List[dict],
     session: PIISession,
@@ -402,6 +504,37 @@ def anonymize_messages(
     return released_used
 
 
+def message_analysis_texts(messages: List[dict]) -> List[str]:
+    """The texts `anonymize_messages` will run NER on: user message contents
+    and their multimodal text parts (assistant messages are sweep-only)."""
+    texts: List[str] = []
+    for msg in messages:
+        if msg.get("role") != "user":
+            continue
+        content = msg.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(
+                part.get("text", "")
+                for part in content
+                if isinstance(part, dict) and part.get("type") == "text"
+            )
+    return texts
+
+
+async def aanonymize_messages(
+    messages: List[dict],
+    session: PIISession,
+    released: Optional[Iterable[str]] = None,
+    source: str = "prompt",
+) -> List[str]:
+    """`anonymize_messages` with all NER misses analyzed up front in batched,
+    concurrent `predict` calls. Same result, same in-place mutation."""
+    await session.prefetch(message_analysis_texts(messages))
+    return anonymize_messages(messages, session, released=released, source=source)
+
+
 def anonymize_filename(name: str, session: Optional[PIISession]) -> str:
     """Replace PII in a filename, sharing placeholders with the chat session.
 
@@ -17,17 +17,13 @@ from __future__ import annotations
 
 from typing import Dict, Tuple
 
+from beyond_the_loop.pii.matcher import replace_placeholders
+
 
 class StreamingDeanonymizer:
     def __init__(self, reverse_map: Dict[str, str]) -> None:
         self.reverse_map = reverse_map
         self.buffer = ""
-        # Precompute sorted placeholders once — longest-first avoids a short
-        # placeholder matching a prefix of a longer one (e.g. PERSON_1 vs
-        # PERSON_11).
-        self._sorted_placeholders = sorted(
-            reverse_map.keys(), key=len, reverse=True
-        )
 
     def feed(self, chunk: str) -> str:
         if not chunk:
@@ -42,12 +38,8 @@ class StreamingDeanonymizer:
         return self._replace(remaining)
 
     def _replace(self, text: str) -> str:
-        if not text or not self.reverse_map:
-            return text
-        for placeholder in self._sorted_placeholders:
-            if placeholder in text:
-                text = text.replace(placeholder, self.reverse_map[placeholder])
-        return text
+        # One pass over the text whatever the number of placeholders.
+        return replace_placeholders(text, self.reverse_map)
 
     @staticmethod
     def _safe_split(buffer: str) -> Tuple[str, str]:
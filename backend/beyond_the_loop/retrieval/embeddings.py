@@ -0,0 +1,215 @@
+"""
+EmbeddingPipeline — concurrent, token-packed calls to the embeddings API.
+
+Why: large documents used to be embedded in RAG_EMBEDDING_BATCH_SIZE slices
+(default 1) strictly one after another, each through a freshly built
+AzureOpenAI client, so indexing a big PDF meant hundreds of sequential round
+trips, each with its own TLS handshake.
+
+Texts are now packed into batches by token count (RAG_EMBEDDING_BATCH_MAX_TOKENS,
+at most MAX_BATCH_INPUTS inputs) and up to RAG_EMBEDDING_CONCURRENCY batches
+are in flight at once across all callers, all over one pooled
+AsyncAzureOpenAI client. A 429 on
+any batch pauses every worker until the server's retry-after (or an
+exponential backoff) has passed, rather than letting the others keep
+hammering the rate limit. A batch over the API's request size is split in half
+and retried, as before.
+
+Callers are synchronous (they run in worker threads), so the pipeline owns a
+private event loop on a daemon thread and `embed()` blocks on it.
+
+Usage:
+    embeddings = get_embedding_pipeline().embed(model, texts)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+import tiktoken
+from openai import AsyncAzureOpenAI, BadRequestError, RateLimitError
+
+from open_webui.env import (
+    RAG_EMBEDDING_BATCH_MAX_TOKENS,
+    RAG_EMBEDDING_CONCURRENCY,
+    RAG_EMBEDDING_MAX_RETRIES,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Hard API limit on the number of inputs per embeddings request.
+MAX_BATCH_INPUTS = 2048
+
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 60.0
+
+
+def pack_batches(
+    token_counts: List[int], max_tokens: int, max_items: int = MAX_BATCH_INPUTS
+) -> List[range]:
+    """
+    Splits consecutive texts into batches of at most `max_tokens` tokens and
+    `max_items` texts. A single text above `max_tokens` gets a batch of its
+    own. Order is preserved.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for index, count in enumerate(token_counts):
+        if index > start and (tokens + count > max_tokens or index - start >= max_items):
+            batches.append(range(start, index))
+            start = index
+            tokens = 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+
+def _count_tokens(texts: List[str]) -> List[int]:
+    try:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding file is downloaded on first use; without it, pack by
+        # a conservative ~3 characters per token estimate.
+        log.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return [len(text) // 3 + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+
+def _retry_after(error: RateLimitError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        client_factory: Optional[Callable[[], object]] = None,
+        concurrency: int = RAG_EMBEDDING_CONCURRENCY,
+        max_batch_tokens: int = RAG_EMBEDDING_BATCH_MAX_TOKENS,
+        max_retries: int = RAG_EMBEDDING_MAX_RETRIES,
+        count_tokens: Callable[[List[str]], List[int]] = _count_tokens,
+    ) -> None:
+        # Retries are handled here, across all workers, not per request by
+        # the SDK.
+        self.client_factory = client_factory or (
+            lambda: AsyncAzureOpenAI(api_version="2023-05-15", max_retries=0)
+        )
+        self.concurrency = concurrency
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.count_tokens = count_tokens
+
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Monotonic time before which no request may be sent (set on 429).
+        self._paused_until = 0.0
+        # Shared by every aembed call, so concurrent uploads together stay
+        # within `concurrency` requests. Created on the loop that uses it.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Blocking entry point for synchronous callers. Raises on failure."""
+        if not texts:
+            return []
+        future = asyncio.run_coroutine_threadsafe(
+            self.aembed(model, texts), self._get_loop()
+        )
+        return future.result()
+
+    async def aembed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Embeddings for `texts`, in order. Must run on the pipeline's loop."""
+        if not texts:
+            return []
+
+        batches = pack_batches(self.count_tokens(texts), self.max_batch_tokens)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: range) -> List[List[float]]:
+            async with self._semaphore:
+                return await self._embed_batch(model, [texts[i] for i in batch])
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        log.debug(
+            f"Embedded {len(texts)} texts in {len(batches)} batches "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return [embedding for result in results for embedding in result]
+
+    async def _embed_batch(self, model: str, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                response = await self._get_client().embeddings.create(
+                    input=texts, model=model
+                )
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except RateLimitError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(
+                        _BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)
+                    ) * random.uniform(1.0, 1.5)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                log.warning(
+                    f"Embedding rate limited, pausing {delay:.1f}s "
+                    f"(attempt {attempt}/{self.max_retries})"
+                )
+            except BadRequestError as e:
+                # Over the per-request size cap: split and retry — a single
+                # chunk is always small enough on its own. The halves run one
+                # after the other in the caller's semaphore slot, so a split
+                # never exceeds `concurrency` requests in flight.
+                if len(texts) > 1 and "maximum request size" in str(e):
+                    mid = len(texts) // 2
+                    first = await self._embed_batch(model, texts[:mid])
+                    second = await self._embed_batch(model, texts[mid:])
+                    return first + second
+                raise
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="embedding-pipeline", daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+
+
+_pipeline: Optional[EmbeddingPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_embedding_pipeline() -> EmbeddingPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = EmbeddingPipeline()
+        return _pipeline
@@ -0,0 +1,184 @@
+"""
+ExtractedTextCache — the text extracted from an uploaded file, by version.
+
+Why: files attached in "full" context mode are handed to the model as their
+whole text, and `extract_file_content_with_loader` produced it on every chat
+turn — a full object-store download followed by `Loader.load` (PDF / DOCX /
+XLSX parsing, OCR for scans) — although the text only changes when the file
+or the loader does.
+
+Entries are addressed by file id, file hash (set by `process_file`; the
+upload time until then) and `LOADER_VERSION`, so a re-processed file or a
+loader change simply misses and is extracted again. Two tiers:
+
+- local disk under CACHE_DIR, at most EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES,
+  least recently read entries evicted first; writes are atomic renames, so
+  concurrent readers never see a partial entry;
+- Redis, zlib-compressed, expiring after EXTRACTED_TEXT_CACHE_TTL, shared by
+  all pods; a hit there is copied to the local tier.
+
+Either tier failing only costs a re-extraction.
+
+Usage:
+    text = extracted_text_cache.get(file)
+    if text is None:
+        text = extract(file)
+        extracted_text_cache.put(file, text)
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+from typing import Optional
+
+import redis
+
+from beyond_the_loop.config import CACHE_DIR
+from beyond_the_loop.models.files import FileModel
+from beyond_the_loop.retrieval.loaders.main import LOADER_VERSION
+from open_webui.env import (
+    EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES,
+    EXTRACTED_TEXT_CACHE_TTL,
+    REDIS_URL,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class ExtractedTextCache:
+    def __init__(
+        self,
+        directory: str = os.path.join(CACHE_DIR, "extracted_text"),
+        max_disk_bytes: int = EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES,
+        redis_url: Optional[str] = REDIS_URL,
+        client=None,
+        ttl: int = EXTRACTED_TEXT_CACHE_TTL,
+        loader_version: int = LOADER_VERSION,
+    ) -> None:
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.loader_version = loader_version
+        self._client = client
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def client(self):
+        if self._client is None and self.redis_url:
+            self._client = redis.Redis.from_url(
+                self.redis_url,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+            )
+        return self._client
+
+    def key(self, file: FileModel) -> str:
+        version = file.hash or file.updated_at
+        return hashlib.sha256(
+            f"{file.id}:{version}:{self.loader_version}".encode()
+        ).hexdigest()
+
+    def get(self, file: FileModel) -> Optional[str]:
+        key = self.key(file)
+
+        text = self._read_local(key)
+        if text is not None:
+            return text
+
+        text = self._read_shared(key)
+        if text is not None:
+            self._write_local(key, text)
+        return text
+
+    def put(self, file: FileModel, text: str) -> None:
+        key = self.key(file)
+        self._write_local(key, text)
+        self._write_shared(key, text)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _read_local(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            # Eviction goes by mtime (atime is often not maintained).
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"Could not read cached extracted text {key}: {e}")
+            return None
+
+    def _write_local(self, key: str, text: str) -> None:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._evict()
+        except Exception as e:
+            log.warning(f"Could not cache extracted text {key} on disk: {e}")
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".txt"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_disk_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def _read_shared(self, key: str) -> Optional[str]:
+        if self.client is None:
+            return None
+        try:
+            payload = self.client.get(f"extracted_text:{key}")
+            if payload is None:
+                return None
+            return zlib.decompress(payload).decode("utf-8")
+        except Exception as e:
+            log.warning(f"Could not read extracted text {key} from Redis: {e}")
+            return None
+
+    def _write_shared(self, key: str, text: str) -> None:
+        if self.client is None:
+            return
+        try:
+            self.client.set(
+                f"extracted_text:{key}",
+                zlib.compress(text.encode("utf-8")),
+                ex=self.ttl,
+            )
+        except Exception as e:
+            log.warning(f"Could not cache extracted text {key} in Redis: {e}")
+
+
+extracted_text_cache = ExtractedTextCache()
@@ -0,0 +1,42 @@
+"""
+OCR of single PDF pages, run in the worker processes of PDFLoader.
+
+Kept free of app imports: every worker process imports this module, and
+only a file path and a page number are sent to it. The page is rendered in
+the worker, in grayscale, and dropped after recognition, so a worker holds at
+most one page raster at a time.
+"""
+import os
+
+import pymupdf
+import pytesseract
+from PIL import Image
+
+# The document last opened by this worker — consecutive pages of one PDF
+# mostly land on the same worker.
+_open_document = (None, None)
+
+
+def _document(file_path: str) -> pymupdf.Document:
+    global _open_document
+
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if _open_document[0] != key:
+        if _open_document[1] is not None:
+            _open_document[1].close()
+        _open_document = (key, pymupdf.open(file_path))
+    return _open_document[1]
+
+
+def ocr_page(file_path: str, page_number: int, dpi: int, lang: str) -> str:
+    page = _document(file_path)[page_number]
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY, alpha=False)
+    image = Image.frombuffer(
+        "L", (pixmap.width, pixmap.height), pixmap.samples, "raw", "L", pixmap.stride, 1
+    )
+    try:
+        return pytesseract.image_to_string(image, lang=lang)
+    finally:
+        image.close()
+        del pixmap
@@ -0,0 +1,138 @@
+"""
+PDFLoader — text of a PDF in one pass, page by page, OCR only where needed.
+
+Why: `Loader` opened every PDF twice — pymupdf to decide whether any page
+had text, then `PyPDFLoader` to extract it. A PDF without any text was
+rasterized completely at 300 DPI in memory (`convert_from_path`) and OCR'd
+page after page in the request thread; a PDF with text on some pages got no
+OCR at all, so its scanned pages were lost.
+
+PDFLoader opens the document once with pymupdf and classifies each page as
+it reads it: a page with less than `min_text_chars` of text that carries
+images is an image page, every other page a text page. Only image pages are
+OCR'd, in a shared process pool of PDF_OCR_WORKERS processes; the workers
+render the page themselves (`ocr.ocr_page`), so a raster never crosses a
+process boundary and at most one per worker exists. At most `max_pending`
+pages are OCR'd ahead of the page being yielded, which bounds memory for
+large scans while the text pages in between keep flowing.
+
+Pages come out in document order, one Document per page, with the
+metadata PyPDFLoader used (`source`, 0-based `page`, `total_pages`).
+
+Usage:
+    for doc in PDFLoader(file_path).lazy_load():
+        ...
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+import pymupdf
+from langchain_core.documents import Document
+
+from beyond_the_loop.retrieval.loaders.ocr import ocr_page
+from open_webui.env import PDF_OCR_DPI, PDF_OCR_WORKERS, SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+_ocr_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """The process pool shared by all PDF loads. Spawned, not forked: the app
+    process runs threads, and forking them can deadlock the child. Workers are
+    replaced after a number of pages so leaks in tesseract / MuPDF stay
+    bounded."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        _ocr_executor = ProcessPoolExecutor(
+            max_workers=PDF_OCR_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=200,
+        )
+    return _ocr_executor
+
+
+class PDFLoader:
+    def __init__(
+        self,
+        file_path: str,
+        executor: Optional[Executor] = None,
+        ocr: Callable[[str, int, int, str], str] = ocr_page,
+        dpi: int = PDF_OCR_DPI,
+        lang: str = "eng",
+        min_text_chars: int = 32,
+        max_pending: int = max(PDF_OCR_WORKERS, 1) * 2,
+    ) -> None:
+        self.file_path = file_path
+        self._executor = executor
+        self.ocr = ocr
+        self.dpi = dpi
+        self.lang = lang
+        self.min_text_chars = min_text_chars
+        self.max_pending = max_pending
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = get_ocr_executor()
+        return self._executor
+
+    def is_image_page(self, page: pymupdf.Page, text: str) -> bool:
+        return len(text.strip()) < self.min_text_chars and bool(page.get_images())
+
+    def lazy_load(self) -> Iterator[Document]:
+        # Pages in document order; OCR'd ones as futures until they are done.
+        pending: deque = deque()
+        ocr_pending = 0
+
+        with pymupdf.open(self.file_path) as pdf:
+            total_pages = pdf.page_count
+
+            for page in pdf:
+                text = page.get_text("text")
+                if self.is_image_page(page, text):
+                    future = self.executor.submit(
+                        self.ocr, self.file_path, page.number, self.dpi, self.lang
+                    )
+                    pending.append((page.number, text, future))
+                    ocr_pending += 1
+                else:
+                    pending.append((page.number, text, None))
+
+                # Yield what is ready; wait for the oldest OCR once too many run.
+                while pending and (
+                    pending[0][2] is None
+                    or pending[0][2].done()
+                    or ocr_pending > self.max_pending
+                ):
+                    number, text, future = pending.popleft()
+                    if future is not None:
+                        ocr_pending -= 1
+                    yield self._document(number, text, future, total_pages)
+
+            while pending:
+                yield self._document(*pending.popleft(), total_pages)
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+    def _document(
+        self, number: int, text: str, future: Optional[Future], total_pages: int
+    ) -> Document:
+        if future is not None:
+            try:
+                text = future.result()
+            except Exception as e:
+                # Keep whatever text layer the page has rather than failing the file.
+                log.warning(f"OCR failed for page {number + 1} of {self.file_path}: {e}")
+
+        return Document(
+            page_content=text,
+            metadata={"source": self.file_path, "page": number, "total_pages": total_pages},
+        )
@@ -1,17 +1,21 @@
+import hashlib
 import logging
 import os
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Union
+from cachetools import TTLCache
 from huggingface_hub import snapshot_download
 from langchain_classic.retrievers import ContextualCompressionRetriever, EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
+from beyond_the_loop.retrieval.embeddings import get_embedding_pipeline
 from beyond_the_loop.retrieval.vector.connector import VECTOR_DB_CLIENT
 
 from open_webui.env import (
     SRC_LOG_LEVELS,
     OFFLINE_MODE,
+    RAG_QUERY_EMBEDDING_CACHE_SIZE,
+    RAG_QUERY_EMBEDDING_CACHE_TTL,
 )
 
 log = logging.getLogger(__name__)
@@ -22,7 +26,6 @@ from typing import Any
 
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.retrievers import BaseRetriever
-from openai import AzureOpenAI, BadRequestError
 
 
 class VectorSearchRetriever(BaseRetriever):
@@ -58,6 +61,32 @@ class VectorSearchRetriever(BaseRetriever):
         return results
 
 
+class LexicalSearchRetriever(BaseRetriever):
+    collection_name: Any
+    top_k: int
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        # Top-k from the persistent full-text index; the collection itself is
+        # never loaded.
+        result = VECTOR_DB_CLIENT.lexical_search(
+            collection_name=self.collection_name,
+            queries=[query],
+            limit=self.top_k,
+        )
+        if result is None:
+            return []
+
+        return [
+            Document(metadata=metadata, page_content=document)
+            for document, metadata in zip(result.documents[0], result.metadatas[0])
+        ]
+
+
 def query_doc(
     collection_name: str, query_embedding: list[float], k: int
 ):
@@ -85,18 +114,13 @@ def query_doc_with_hybrid_search(
     try:
         t_start = time.perf_counter()
 
-        # Step 1: Load ALL documents from collection for BM25
-        result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
-        num_chunks = len(result.documents[0]) if result and result.documents else 0
-
-        # Step 2: Build BM25 index from all loaded documents
-        bm25_retriever = BM25Retriever.from_texts(
-            texts=result.documents[0],
-            metadatas=result.metadatas[0],
+        # Step 1: Lexical retriever — top-k from the full-text index on document_chunk
+        lexical_retriever = LexicalSearchRetriever(
+            collection_name=collection_name,
+            top_k=k,
         )
-        bm25_retriever.k = k
 
-        # Step 3: Vector retriever — uses pre-computed query_embedding, no API call
+        # Step 2: Vector retriever — uses pre-computed query_embedding, no API call
         vector_search_retriever = VectorSearchRetriever(
             collection_name=collection_name,
             query_embedding=query_embedding,
@@ -104,7 +128,7 @@ def query_doc_with_hybrid_search(
         )
 
         ensemble_retriever = EnsembleRetriever(
-            retrievers=[bm25_retriever, vector_search_retriever], weights=[0.5, 0.5]
+            retrievers=[lexical_retriever, vector_search_retriever], weights=[0.5, 0.5]
         )
         compressor = RerankCompressor(
             embedding_function=embedding_function,  # for document embeddings
@@ -118,7 +142,7 @@ def query_doc_with_hybrid_search(
             base_compressor=compressor, base_retriever=ensemble_retriever
         )
 
-        # Step 4: Run the full ensemble + rerank pipeline
+        # Step 3: Run the full ensemble + rerank pipeline
         result = compression_retriever.invoke(query)
 
         t_end = time.perf_counter()
@@ -165,27 +189,51 @@ def merge_and_sort_query_results(
     }
 
 
+def query_collections(
+    collection_names: list[str],
+    query_embeddings: list,  # one embedding per query
+    k: int,
+) -> dict[str, dict]:
+    """
+    Top-k chunks per collection over all query embeddings, fetched with one
+    `search_many` statement. Collections without hits are left out.
+    """
+    collection_names = [name for name in dict.fromkeys(collection_names) if name]
+    if not collection_names or not query_embeddings:
+        return {}
+
+    try:
+        result = VECTOR_DB_CLIENT.search_many(
+            collection_names=collection_names,
+            vectors=query_embeddings,
+            limit=k,
+        )
+    except Exception as e:
+        log.exception(f"Error when querying the collections: {e}")
+        return {}
+
+    if result is None:
+        return {}
+
+    return {
+        collection_name: {
+            "distances": [result.distances[idx]],
+            "documents": [result.documents[idx]],
+            "metadatas": [result.metadatas[idx]],
+        }
+        for idx, collection_name in enumerate(collection_names)
+        if result.ids[idx]
+    }
+
+
 def query_collection(
     collection_names: list[str],
     query_embeddings: list,  # one embedding per query
     k: int,
 ) -> dict:
-    results = []
-    for query_embedding in query_embeddings:
-        for collection_name in collection_names:
-            if collection_name:
-                try:
-                    result = query_doc(
-                        collection_name=collection_name,
-                        k=k,
-                        query_embedding=query_embedding,
-                    )
-                    if result is not None:
-                        results.append(result.model_dump())
-                except Exception as e:
-                    log.exception(f"Error when querying the collection: {e}")
-
-    return merge_and_sort_query_results(results, k=k, reverse=True)
+    results = query_collections(collection_names, query_embeddings, k)
+    # Cosine distances: closest first
+    return merge_and_sort_query_results(list(results.values()), k=k)
 
 
 def query_collection_with_hybrid_search(
@@ -226,12 +274,75 @@ def query_collection_with_hybrid_search(
     return merge_and_sort_query_results(results, k=k, reverse=True)
 
 
+def embed_with_cache(model: str, texts: list[str], embed) -> list[list[float]]:
+    """
+    Embeds `texts` through the persistent (model, sha256(text)) cache: only
+    texts not embedded before, by any collection, are passed to `embed` (in
+    one call, duplicates collapsed), and their results are cached.
+    """
+    hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+    embeddings = VECTOR_DB_CLIENT.get_cached_embeddings(model, list(set(hashes)))
+
+    misses = {}
+    for text_hash, text in zip(hashes, texts):
+        if text_hash not in embeddings:
+            misses.setdefault(text_hash, text)
+
+    log.info(
+        f"Embedding cache: {len(texts) - len(misses)} of {len(texts)} texts cached, "
+        f"embedding {len(misses)}"
+    )
+
+    if misses:
+        fresh = dict(zip(misses.keys(), embed(list(misses.values()))))
+        VECTOR_DB_CLIENT.put_cached_embeddings(model, fresh)
+        embeddings.update(fresh)
+
+    return [embeddings[text_hash] for text_hash in hashes]
+
+
+_query_embedding_cache = TTLCache(
+    maxsize=RAG_QUERY_EMBEDDING_CACHE_SIZE, ttl=RAG_QUERY_EMBEDDING_CACHE_TTL
+)
+_query_embedding_cache_lock = threading.Lock()
+
+
+def embed_with_query_cache(model: str, texts: list[str], embed) -> list[list[float]]:
+    """
+    Like `embed_with_cache`, but backed by the in-process (model, text) LRU
+    for query-time embeddings, which are few, short and repeat across
+    regenerations, edits and follow-up turns.
+    """
+    with _query_embedding_cache_lock:
+        embeddings = {
+            text: _query_embedding_cache[(model, text)]
+            for text in texts
+            if (model, text) in _query_embedding_cache
+        }
+
+    misses = list(dict.fromkeys(text for text in texts if text not in embeddings))
+    if misses:
+        fresh = dict(zip(misses, embed(misses)))
+        with _query_embedding_cache_lock:
+            for text, embedding in fresh.items():
+                _query_embedding_cache[(model, text)] = embedding
+        embeddings.update(fresh)
+
+    return [embeddings[text] for text in texts]
+
+
 def get_embedding_function(
     embedding_engine,
     embedding_model,
     embedding_function,
     embedding_batch_size,
+    cache: bool = False,
 ):
+    """
+    With `cache=True` (document ingestion), list inputs to the "openai"
+    engine go through `embed_with_cache`; otherwise (queries) through
+    `embed_with_query_cache`.
+    """
     if embedding_engine == "":
         return lambda query, user=None: embedding_function.encode(query).tolist()
     elif embedding_engine == "openai":
@@ -242,19 +353,38 @@ def get_embedding_function(
 
         def generate_multiple(query, user, func):
             if isinstance(query, list):
-                embeddings = []
-                for i in range(0, len(query), embedding_batch_size):
-                    batch_result = func(query[i : i + embedding_batch_size], user=user)
-                    if batch_result is None:
-                        raise RuntimeError(
-                            "Embedding generation failed for a batch (see preceding logs)."
-                        )
-                    embeddings.extend(batch_result)
+                # Batching by tokens and concurrency are up to the pipeline;
+                # embedding_batch_size no longer applies to this engine.
+                embeddings = func(query, user=user)
+                if embeddings is None:
+                    raise RuntimeError(
+                        "Embedding generation failed (see preceding logs)."
+                    )
                 return embeddings
             else:
                 return func(query, user)
 
-        return lambda query, user=None: generate_multiple(query, user, func)
+        if cache:
+            return lambda query, user=None: (
+                embed_with_cache(
+                    embedding_model,
+                    query,
+                    lambda texts: generate_multiple(texts, user, func),
+                )
+                if isinstance(query, list)
+                else generate_multiple(query, user, func)
+            )
+
+        def generate_with_query_cache(query, user):
+            texts = query if isinstance(query, list) else [query]
+            embeddings = embed_with_query_cache(
+                embedding_model,
+                texts,
+                lambda misses: generate_multiple(misses, user, func),
+            )
+            return embeddings if isinstance(query, list) else embeddings[0]
+
+        return lambda query, user=None: generate_with_query_cache(query, user)
     else:
         raise ValueError(f"Unknown embedding engine: {embedding_engine}")
 
@@ -312,35 +442,24 @@ def get_sources_from_files(
     # embedding_function accepts a list and returns a list of vectors.
     query_embeddings = embedding_function(queries) if queries else []
 
-    def search_one(file, collection_names):
-        """Worker function executed in a thread for each file."""
-        if collection_names is None:
-            return file.get("content")
-
-        return query_collection(
-            collection_names=collection_names,
-            query_embeddings=query_embeddings,
-            k=k,
-        )
-
-    max_workers = min(len(search_tasks), 10)
-
-    # Preserve original order so results stay deterministic
-    ordered_results = [None] * len(search_tasks)
-
-    if search_tasks:
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_idx = {
-                executor.submit(search_one, file, coll): i
-                for i, (file, coll) in enumerate(search_tasks)
-            }
-
-            for future in as_completed(future_to_idx):
-                idx = future_to_idx[future]
-                try:
-                    ordered_results[idx] = future.result()
-                except Exception as e:
-                    log.exception(f"Search task {idx} failed: {e}")
+    # One statement for every attached collection instead of one search per
+    # file and collection on a thread pool.
+    results_by_collection = query_collections(
+        collection_names=[
+            name for _, collection_names in search_tasks for name in collection_names
+        ],
+        query_embeddings=query_embeddings,
+        k=k,
+    )
+
+    ordered_results = []
+    for _, collection_names in search_tasks:
+        results = [
+            results_by_collection[name]
+            for name in collection_names
+            if name in results_by_collection
+        ]
+        ordered_results.append(merge_and_sort_query_results(results, k=k))
 
     relevant_contexts = []
 
@@ -425,29 +544,7 @@ def generate_openai_batch_embeddings(
     if not texts:
         return []
     try:
-        client = AzureOpenAI(
-            api_version="2023-05-15"
-        )
-
-        response = client.embeddings.create(
-            input=texts,
-            model=model,
-        )
-
-        return [response.data[i].embedding for i in range(len(texts))]
-    except BadRequestError as e:
-        # OpenAI caps each embeddings request at 300k tokens total. If we hit
-        # that with a multi-text batch, split and retry — a single chunk is
-        # always small enough on its own, so the recursion converges.
-        if len(texts) > 1 and "maximum request size" in str(e):
-            mid = len(texts) // 2
-            first = generate_openai_batch_embeddings(model, texts[:mid])
-            second = generate_openai_batch_embeddings(model, texts[mid:])
-            if first is None or second is None:
-                return None
-            return first + second
-        log.exception(e)
-        return None
+        return get_embedding_pipeline().embed(model, texts)
     except Exception as e:
         log.exception(e)
         return None
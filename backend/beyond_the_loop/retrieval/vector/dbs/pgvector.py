@@ -1,9 +1,20 @@
+import hashlib
+import io
+import json
+import math
+import re
+import struct
+import threading
 import time
 import logging
 from typing import Optional, List, Dict, Any
 from sqlalchemy import (
+    BigInteger,
     cast,
     column,
+    func,
+    literal,
+    Computed,
     create_engine,
     Column,
     Integer,
@@ -12,6 +23,7 @@ from sqlalchemy import (
     text,
     Text,
     Table,
+    union_all,
     values,
 )
 from sqlalchemy.sql import true
@@ -19,8 +31,10 @@ from sqlalchemy.pool import NullPool
 
 log = logging.getLogger(__name__)
 
-from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
-from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.orm import declarative_base, deferred, scoped_session, sessionmaker
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, array, insert as pg_insert
+import numpy as np
+from cachetools import TTLCache
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.exc import NoSuchTableError
@@ -31,9 +45,141 @@ from beyond_the_loop.retrieval.vector.main import VectorItem, SearchResult, GetR
 
 VECTOR_LENGTH = os.getenv("PGVECTOR_INITIALIZE_MAX_VECTOR_LENGTH", 1536)
 
+# Postgres text search configuration for the lexical (hybrid search) index.
+# "simple" only lowercases, which suits mixed German/English knowledge bases.
+TEXT_SEARCH_CONFIG = os.getenv("PGVECTOR_TEXT_SEARCH_CONFIG", "simple")
+if not re.fullmatch(r"[a-z_]+", TEXT_SEARCH_CONFIG):
+    raise ValueError(f"Invalid PGVECTOR_TEXT_SEARCH_CONFIG: {TEXT_SEARCH_CONFIG!r}")
+
+TEXT_TSV_EXPRESSION = f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(text, ''))"
+
+# Rows per statement for upserts and per COPY chunk for inserts.
+INSERT_BATCH_SIZE = max(1, int(os.getenv("PGVECTOR_INSERT_BATCH_SIZE", "500")))
+
+# ANN index on document_chunk.vector: "ivfflat", "hnsw" or "none" (exact scans).
+# Changing it does not touch an existing index; run
+# `python -m beyond_the_loop.scripts.rebuild_pgvector_index` to switch.
+VECTOR_INDEX_TYPE = os.getenv("PGVECTOR_INDEX_TYPE", "ivfflat").lower()
+if VECTOR_INDEX_TYPE not in ("ivfflat", "hnsw", "none"):
+    raise ValueError(f"Invalid PGVECTOR_INDEX_TYPE: {VECTOR_INDEX_TYPE!r}")
+
+# "auto" sizes lists from the row count at build time (see ivfflat_lists_for).
+IVFFLAT_LISTS = os.getenv("PGVECTOR_IVFFLAT_LISTS", "auto")
+# An auto-sized ivfflat index built on an (almost) empty table would keep a
+# single list forever, so it is only built once the table has this many rows;
+# until then searches scan exactly, which is fast at that size.
+IVFFLAT_MIN_ROWS = int(os.getenv("PGVECTOR_IVFFLAT_MIN_ROWS", "10000"))
+IVFFLAT_PROBES = int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "10"))
+HNSW_M = int(os.getenv("PGVECTOR_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("PGVECTOR_HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "40"))
+
+# Collections with at least this many chunks get their own partial ANN index
+# (WHERE collection_name = ...), so the collection filter no longer throws
+# away most of the global index's candidates. 0 disables partial indexes.
+PARTIAL_INDEX_MIN_ROWS = int(os.getenv("PGVECTOR_PARTIAL_INDEX_MIN_ROWS", "0"))
+
+VECTOR_INDEX_NAME = "idx_document_chunk_vector"
+
+# Seconds a search_many result may be served from the per-process cache; 0
+# disables it. Writes through this client invalidate the affected collections
+# immediately, writes from other processes are picked up after the TTL.
+RESULT_CACHE_TTL = float(os.getenv("PGVECTOR_RESULT_CACHE_TTL", "0"))
+RESULT_CACHE_SIZE = int(os.getenv("PGVECTOR_RESULT_CACHE_SIZE", "512"))
+
+# The embedding cache keeps at most EMBEDDING_CACHE_MAX_ROWS entries and drops
+# entries unused for EMBEDDING_CACHE_TTL seconds (0: no TTL), least recently
+# used first. Pruning runs after writes, at most every PRUNE_INTERVAL seconds.
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("PGVECTOR_EMBEDDING_CACHE_MAX_ROWS", "1000000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("PGVECTOR_EMBEDDING_CACHE_TTL", str(90 * 24 * 3600)))
+EMBEDDING_CACHE_PRUNE_INTERVAL = int(
+    os.getenv("PGVECTOR_EMBEDDING_CACHE_PRUNE_INTERVAL", "3600")
+)
+# Hits refresh last_used_at only if it is older than this, so reads don't
+# turn into a write per chunk.
+EMBEDDING_CACHE_TOUCH_AFTER = 24 * 3600
+
 Base = declarative_base()
 
 
+def ivfflat_lists_for(row_count: int) -> int:
+    """pgvector's sizing guidance: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def defers_vector_index(index_type: str, row_count: int) -> bool:
+    """Whether an `index_type` index on `row_count` rows waits for more rows."""
+    return (
+        index_type == "ivfflat"
+        and IVFFLAT_LISTS == "auto"
+        and row_count < IVFFLAT_MIN_ROWS
+    )
+
+
+def vector_index_ddl(
+    table_name: str,
+    index_name: str,
+    index_type: str,
+    row_count: int = 0,
+    where: Optional[str] = None,
+    concurrently: bool = False,
+) -> str:
+    """CREATE INDEX statement for an `index_type` ANN index on `vector`."""
+    if index_type == "hnsw":
+        options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    elif index_type == "ivfflat":
+        lists = (
+            ivfflat_lists_for(row_count)
+            if IVFFLAT_LISTS == "auto"
+            else int(IVFFLAT_LISTS)
+        )
+        options = f"lists = {lists}"
+    else:
+        raise ValueError(f"Unsupported vector index type: {index_type!r}")
+
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name} "
+        f"ON {table_name} USING {index_type} (vector vector_cosine_ops) "
+        f"WITH ({options})" + (f" WHERE {where}" if where else "")
+    )
+
+
+def collection_index_name(collection_name: str) -> str:
+    digest = hashlib.md5(collection_name.encode()).hexdigest()[:16]
+    return f"{VECTOR_INDEX_NAME}_{digest}"
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+_COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_BINARY_TRAILER = struct.pack(">h", -1)
+
+
+def _copy_binary_field(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return struct.pack(">i", -1)
+    return struct.pack(">i", len(value)) + value
+
+
+def _copy_binary_row(
+    id: str, vector: bytes, collection_name: str, text: Optional[str], metadata: Any
+) -> bytes:
+    return struct.pack(">h", 5) + b"".join(
+        (
+            _copy_binary_field(id.encode()),
+            _copy_binary_field(vector),
+            _copy_binary_field(collection_name.encode()),
+            _copy_binary_field(None if text is None else text.encode()),
+            # jsonb binary input is a version byte followed by the JSON text
+            _copy_binary_field(b"\x01" + json.dumps(metadata).encode()),
+        )
+    )
+
+
 class DocumentChunk(Base):
     __tablename__ = "document_chunk"
 
@@ -42,11 +188,47 @@ class DocumentChunk(Base):
     collection_name = Column(Text, nullable=False)
     text = Column(Text, nullable=True)
     vmetadata = Column(MutableDict.as_mutable(JSONB), nullable=True)
+    # Maintained by Postgres on every insert/update; deferred so regular
+    # reads don't ship it.
+    text_tsv = deferred(
+        Column(TSVECTOR, Computed(TEXT_TSV_EXPRESSION, persisted=True))
+    )
+
+
+class EmbeddingCacheEntry(Base):
+    """
+    Embeddings by (model, sha256 of the embedded text), shared by every
+    collection, so re-uploads and duplicated knowledge bases skip the
+    embedding API. Dimensionless vector column: models differ in size.
+    """
+
+    __tablename__ = "embedding_cache"
+
+    model = Column(Text, primary_key=True)
+    text_hash = Column(Text, primary_key=True)
+    embedding = Column(Vector(), nullable=False)
+    created_at = Column(BigInteger, nullable=False)
+    last_used_at = Column(BigInteger, nullable=False, index=True)
 
 
 class PgvectorClient:
     def __init__(self) -> None:
 
+        self._result_cache = (
+            TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+            if RESULT_CACHE_TTL > 0
+            else None
+        )
+        self._result_cache_lock = threading.Lock()
+        # Bumped on every write to a collection; part of the cache key, so
+        # results computed before the write are never served after it.
+        self._collection_generations: Dict[str, int] = {}
+        # Set while the global index is missing or invalid and waits to be
+        # built in the background (for ivfflat, until IVFFLAT_MIN_ROWS rows).
+        self._vector_index_deferred = False
+        self._vector_index_build_lock = threading.Lock()
+        self._embedding_cache_pruned_at = 0.0
+
         pgvector_db_url = os.getenv("PGVECTOR_DB_URL")
 
         # if no pgvector uri, use the existing database connection
@@ -76,17 +258,27 @@ class PgvectorClient:
             connection = self.session.connection()
             Base.metadata.create_all(bind=connection)
 
-            # Create an index on the vector column if it doesn't exist
+            self._ensure_vector_index()
+            self._ensure_embedding_cache_last_used()
             self.session.execute(
                 text(
-                    "CREATE INDEX IF NOT EXISTS idx_document_chunk_vector "
-                    "ON document_chunk USING ivfflat (vector vector_cosine_ops) WITH (lists = 100);"
+                    "CREATE INDEX IF NOT EXISTS idx_document_chunk_collection_name "
+                    "ON document_chunk (collection_name);"
                 )
             )
+
+            # Lexical index for hybrid search. Tables created before the
+            # column existed get it added (one-time rewrite of the table).
             self.session.execute(
                 text(
-                    "CREATE INDEX IF NOT EXISTS idx_document_chunk_collection_name "
-                    "ON document_chunk (collection_name);"
+                    "ALTER TABLE document_chunk ADD COLUMN IF NOT EXISTS text_tsv tsvector "
+                    f"GENERATED ALWAYS AS ({TEXT_TSV_EXPRESSION}) STORED;"
+                )
+            )
+            self.session.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS idx_document_chunk_text_tsv "
+                    "ON document_chunk USING gin (text_tsv);"
                 )
             )
             self.session.commit()
@@ -95,6 +287,295 @@ class PgvectorClient:
             self.session.rollback()
             log.error(f"Error during initialization: {e}")
             raise
+        self._schedule_vector_index_build()
+
+    def _index_info(self, index_name: str, connection=None) -> Optional[Any]:
+        """
+        Access method, reloptions and validity of `index_name`, None if it
+        doesn't exist. An index left behind by a failed CONCURRENTLY build
+        exists but has indisvalid = false and is never used by the planner.
+        """
+        return (connection or self.session).execute(
+            text(
+                "SELECT am.amname, c.reloptions, i.indisvalid FROM pg_class c "
+                "JOIN pg_am am ON am.oid = c.relam "
+                "JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.oid = to_regclass(:index_name)"
+            ),
+            {"index_name": index_name},
+        ).first()
+
+    def _ensure_vector_index(self) -> None:
+        existing = self._index_info(VECTOR_INDEX_NAME)
+        if existing is not None and not existing.indisvalid:
+            if VECTOR_INDEX_TYPE != "none":
+                log.warning(
+                    f"{VECTOR_INDEX_NAME} is invalid (failed concurrent build); "
+                    "rebuilding it in the background."
+                )
+                self._vector_index_deferred = True
+            return
+        if existing is None:
+            if VECTOR_INDEX_TYPE == "none":
+                return
+            row_count = self.session.execute(
+                text("SELECT count(*) FROM document_chunk")
+            ).scalar()
+            if defers_vector_index(VECTOR_INDEX_TYPE, row_count):
+                log.info(
+                    f"{VECTOR_INDEX_NAME} is built once document_chunk has "
+                    f"{IVFFLAT_MIN_ROWS} rows ({row_count} now)."
+                )
+                self._vector_index_deferred = True
+                return
+            self.session.execute(
+                text(
+                    vector_index_ddl(
+                        "document_chunk", VECTOR_INDEX_NAME, VECTOR_INDEX_TYPE, row_count
+                    )
+                )
+            )
+            return
+
+        # Never rebuild at startup: on a large table that takes minutes.
+        if existing.amname != VECTOR_INDEX_TYPE:
+            log.warning(
+                f"{VECTOR_INDEX_NAME} is {existing.amname} but PGVECTOR_INDEX_TYPE is "
+                f"{VECTOR_INDEX_TYPE}; run beyond_the_loop.scripts.rebuild_pgvector_index to switch."
+            )
+        elif existing.amname == "ivfflat" and IVFFLAT_LISTS == "auto":
+            options = dict(option.split("=", 1) for option in existing.reloptions or [])
+            lists = int(options.get("lists", 100))
+            row_count = self.session.execute(
+                text(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = to_regclass('document_chunk')"
+                )
+            ).scalar()
+            wanted = ivfflat_lists_for(max(row_count or 0, 0))
+            if wanted > 4 * lists or lists > 4 * wanted:
+                log.warning(
+                    f"{VECTOR_INDEX_NAME} has {lists} lists, about {wanted} suit "
+                    f"{row_count} rows; run beyond_the_loop.scripts.rebuild_pgvector_index."
+                )
+
+    def _ensure_embedding_cache_last_used(self) -> None:
+        # embedding_cache tables created before last_used_at existed get it,
+        # backfilled from created_at (once).
+        has_column = self.session.execute(
+            text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'embedding_cache' AND column_name = 'last_used_at'"
+            )
+        ).first()
+        if has_column:
+            return
+        self.session.execute(
+            text("ALTER TABLE embedding_cache ADD COLUMN last_used_at BIGINT")
+        )
+        self.session.execute(text("UPDATE embedding_cache SET last_used_at = created_at"))
+        self.session.execute(
+            text("ALTER TABLE embedding_cache ALTER COLUMN last_used_at SET NOT NULL")
+        )
+        self.session.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_used_at "
+                "ON embedding_cache (last_used_at)"
+            )
+        )
+
+    def _schedule_vector_index_build(self) -> None:
+        """Builds the deferred global index in a background thread, so the
+        write that triggers it doesn't wait on the DDL. At most one build
+        runs per process; cheap while the table is still small."""
+        if not self._vector_index_deferred:
+            return
+        if not self._vector_index_build_lock.acquire(blocking=False):
+            return
+        threading.Thread(
+            target=self._run_vector_index_build,
+            name="pgvector-index-build",
+            daemon=True,
+        ).start()
+
+    def _run_vector_index_build(self) -> None:
+        try:
+            self._build_deferred_vector_index()
+        except Exception as e:
+            # The flag stays set, so the next write retries.
+            log.error(f"Error building {VECTOR_INDEX_NAME}: {e}")
+        finally:
+            # self.session is thread-scoped; don't leak this thread's session.
+            self.session.remove()
+            self._vector_index_build_lock.release()
+
+    def _build_deferred_vector_index(self) -> None:
+        """Builds the global index once the table is big enough, replacing an
+        invalid one. Clears `_vector_index_deferred` only on success."""
+        row_count = self.session.execute(
+            text("SELECT count(*) FROM document_chunk")
+        ).scalar()
+        self.session.commit()
+        if defers_vector_index(VECTOR_INDEX_TYPE, row_count):
+            return
+
+        engine = self.session.get_bind()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # One build across all workers; the others retry on a later write
+            # and then find the finished index.
+            if not conn.execute(
+                text("SELECT pg_try_advisory_lock(hashtext(:name))"),
+                {"name": VECTOR_INDEX_NAME},
+            ).scalar():
+                return
+            try:
+                existing = self._index_info(VECTOR_INDEX_NAME, conn)
+                if existing is None or not existing.indisvalid:
+                    if existing is not None:
+                        conn.execute(
+                            text(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}")
+                        )
+                    conn.execute(
+                        text(
+                            vector_index_ddl(
+                                "document_chunk",
+                                VECTOR_INDEX_NAME,
+                                VECTOR_INDEX_TYPE,
+                                row_count,
+                                concurrently=True,
+                            )
+                        )
+                    )
+                    log.info(f"Built {VECTOR_INDEX_NAME} for {row_count} rows.")
+            finally:
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(hashtext(:name))"),
+                    {"name": VECTOR_INDEX_NAME},
+                )
+        self._vector_index_deferred = False
+
+    def _execute_autocommit(self, statements: List[str]) -> None:
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction.
+        self.session.commit()
+        engine = self.session.get_bind()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+
+    def rebuild_vector_index(self, index_type: str = VECTOR_INDEX_TYPE) -> bool:
+        """
+        Replaces the global ANN index with an `index_type` one built for the
+        current row count. The new index is built CONCURRENTLY under a
+        temporary name and swapped in, so writes are not blocked meanwhile.
+        Returns False, changing nothing, for an auto-sized ivfflat index on
+        fewer than PGVECTOR_IVFFLAT_MIN_ROWS rows.
+        """
+        statements = [f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}_new"]
+        if index_type != "none":
+            row_count = self.session.execute(
+                text("SELECT count(*) FROM document_chunk")
+            ).scalar()
+            if defers_vector_index(index_type, row_count):
+                log.warning(
+                    f"Not rebuilding {VECTOR_INDEX_NAME}: an auto-sized ivfflat index "
+                    f"needs {IVFFLAT_MIN_ROWS} rows, document_chunk has {row_count}."
+                )
+                return False
+            statements.append(
+                vector_index_ddl(
+                    "document_chunk",
+                    f"{VECTOR_INDEX_NAME}_new",
+                    index_type,
+                    row_count,
+                    concurrently=True,
+                )
+            )
+        statements.append(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}")
+        if index_type != "none":
+            statements.append(
+                f"ALTER INDEX {VECTOR_INDEX_NAME}_new RENAME TO {VECTOR_INDEX_NAME}"
+            )
+
+        self._execute_autocommit(statements)
+        log.info(f"Rebuilt {VECTOR_INDEX_NAME} as {index_type}.")
+        return True
+
+    def ensure_collection_indexes(
+        self, min_rows: int = PARTIAL_INDEX_MIN_ROWS
+    ) -> List[str]:
+        """
+        Builds a partial ANN index (WHERE collection_name = ...) for every
+        collection with at least `min_rows` chunks that doesn't have one yet.
+        Queries filtered to such a collection search only its own graph/lists
+        instead of post-filtering the global index. Returns the collections
+        that were indexed.
+        """
+        if min_rows <= 0:
+            return []
+
+        index_type = VECTOR_INDEX_TYPE if VECTOR_INDEX_TYPE != "none" else "hnsw"
+        rows = self.session.execute(
+            text(
+                "SELECT collection_name, count(*) AS row_count FROM document_chunk "
+                "GROUP BY collection_name HAVING count(*) >= :min_rows"
+            ),
+            {"min_rows": min_rows},
+        ).all()
+
+        indexed = []
+        for row in rows:
+            index_name = collection_index_name(row.collection_name)
+            existing = self._index_info(index_name)
+            if existing is not None and existing.indisvalid:
+                continue
+            # An invalid index is a failed earlier build: drop and rebuild it.
+            self._execute_autocommit(
+                [
+                    f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}",
+                    vector_index_ddl(
+                        "document_chunk",
+                        index_name,
+                        index_type,
+                        row.row_count,
+                        where=f"collection_name = {_sql_literal(row.collection_name)}",
+                        concurrently=True,
+                    )
+                ]
+            )
+            log.info(
+                f"Built {index_type} index {index_name} for collection "
+                f"'{row.collection_name}' ({row.row_count} chunks)."
+            )
+            indexed.append(row.collection_name)
+        return indexed
+
+    def _invalidate_results(self, collection_name: Optional[str] = None) -> None:
+        """Drops cached search results for `collection_name` (all if None)."""
+        if self._result_cache is None:
+            return
+        with self._result_cache_lock:
+            if collection_name is None:
+                self._result_cache.clear()
+            else:
+                self._collection_generations[collection_name] = (
+                    self._collection_generations.get(collection_name, 0) + 1
+                )
+
+    def _set_search_params(
+        self, ef_search: Optional[int] = None, probes: Optional[int] = None
+    ) -> None:
+        # Transaction-local, so per-query values never leak into other
+        # sessions sharing the connection pool.
+        self.session.execute(
+            text(
+                "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+                "set_config('ivfflat.probes', :probes, true)"
+            ),
+            {
+                "ef_search": str(ef_search or HNSW_EF_SEARCH),
+                "probes": str(probes or IVFFLAT_PROBES),
+            },
+        )
 
     def check_vector_length(self) -> None:
         """
@@ -135,8 +616,8 @@ class PgvectorClient:
         # Adjust vector to have length VECTOR_LENGTH
         current_length = len(vector)
         if current_length < VECTOR_LENGTH:
-            # Pad the vector with zeros
-            vector += [0.0] * (VECTOR_LENGTH - current_length)
+            # Pad the vector with zeros (on a copy: callers may cache it)
+            vector = list(vector) + [0.0] * (VECTOR_LENGTH - current_length)
         elif current_length > VECTOR_LENGTH:
             raise Exception(
                 f"Vector length {current_length} not supported. Max length must be <= {VECTOR_LENGTH}"
@@ -144,68 +625,116 @@ class PgvectorClient:
         return vector
 
     def insert(self, collection_name: str, items: List[VectorItem]) -> None:
+        """
+        Loads new chunks with binary COPY. Like a plain INSERT this fails on
+        duplicate ids; use `upsert` for re-indexing.
+        """
         try:
-            new_items = []
-            for item in items:
-                vector = self.adjust_vector_length(item["vector"])
-                new_chunk = DocumentChunk(
-                    id=item["id"],
-                    vector=vector,
-                    collection_name=collection_name,
-                    text=item["text"],
-                    vmetadata=item["metadata"],
-                )
-                new_items.append(new_chunk)
-            self.session.bulk_save_objects(new_items)
+            self._copy_items("document_chunk", collection_name, items)
             self.session.commit()
-            log.debug(f"Inserted {len(new_items)} items into collection '{collection_name}'.")
+            self._invalidate_results(collection_name)
+            log.debug(f"Inserted {len(items)} items into collection '{collection_name}'.")
         except Exception as e:
             self.session.rollback()
             log.error(f"Error during insert: {e}")
             raise
+        self._schedule_vector_index_build()
 
     def upsert(self, collection_name: str, items: List[VectorItem]) -> None:
+        """
+        COPYs the items into a transaction-scoped staging table and merges
+        them with a single `INSERT ... SELECT ... ON CONFLICT (id) DO UPDATE`,
+        instead of one SELECT per item.
+        """
         try:
-            for item in items:
-                vector = self.adjust_vector_length(item["vector"])
-                existing = (
-                    self.session.query(DocumentChunk)
-                    .filter(DocumentChunk.id == item["id"])
-                    .first()
+            # Duplicate ids within one statement would make ON CONFLICT fail;
+            # the last occurrence wins, as it did with the per-item loop.
+            items = list({item["id"]: item for item in items}.values())
+
+            self.session.execute(
+                text(
+                    "CREATE TEMP TABLE IF NOT EXISTS document_chunk_staging "
+                    "(LIKE document_chunk INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
                 )
-                if existing:
-                    existing.vector = vector
-                    existing.text = item["text"]
-                    existing.vmetadata = item["metadata"]
-                    existing.collection_name = (
-                        collection_name  # Update collection_name if necessary
-                    )
-                else:
-                    new_chunk = DocumentChunk(
-                        id=item["id"],
-                        vector=vector,
-                        collection_name=collection_name,
-                        text=item["text"],
-                        vmetadata=item["metadata"],
-                    )
-                    self.session.add(new_chunk)
+            )
+            self._copy_items("document_chunk_staging", collection_name, items)
+            self.session.execute(
+                text(
+                    "INSERT INTO document_chunk (id, vector, collection_name, text, vmetadata) "
+                    "SELECT id, vector, collection_name, text, vmetadata FROM document_chunk_staging "
+                    "ON CONFLICT (id) DO UPDATE SET "
+                    "vector = EXCLUDED.vector, "
+                    "collection_name = EXCLUDED.collection_name, "
+                    "text = EXCLUDED.text, "
+                    "vmetadata = EXCLUDED.vmetadata"
+                )
+            )
             self.session.commit()
+            self._invalidate_results(collection_name)
             log.debug(f"Upserted {len(items)} items into collection '{collection_name}'.")
         except Exception as e:
             self.session.rollback()
             log.error(f"Error during upsert: {e}")
             raise
+        self._schedule_vector_index_build()
+
+    def _copy_items(
+        self, table_name: str, collection_name: str, items: List[VectorItem]
+    ) -> None:
+        """Binary COPY of `items` into `table_name`, INSERT_BATCH_SIZE rows per COPY."""
+        cursor = self.session.connection().connection.cursor()
+        try:
+            for start in range(0, len(items), INSERT_BATCH_SIZE):
+                buffer = io.BytesIO()
+                buffer.write(_COPY_BINARY_HEADER)
+                for item in items[start : start + INSERT_BATCH_SIZE]:
+                    buffer.write(
+                        _copy_binary_row(
+                            item["id"],
+                            self._vector_binary(item["vector"]),
+                            collection_name,
+                            item["text"],
+                            item["metadata"],
+                        )
+                    )
+                buffer.write(_COPY_BINARY_TRAILER)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table_name} (id, vector, collection_name, text, vmetadata) "
+                    "FROM STDIN WITH (FORMAT binary)",
+                    buffer,
+                )
+        finally:
+            cursor.close()
+
+    def _vector_binary(self, vector: List[float]) -> bytes:
+        # pgvector's binary input: int16 dim, int16 unused, dim x float4 (big-endian)
+        if len(vector) > VECTOR_LENGTH:
+            raise Exception(
+                f"Vector length {len(vector)} not supported. Max length must be <= {VECTOR_LENGTH}"
+            )
+        padded = np.zeros(VECTOR_LENGTH, dtype=">f4")
+        padded[: len(vector)] = vector
+        return struct.pack(">hh", VECTOR_LENGTH, 0) + padded.tobytes()
 
     def search(
         self,
         collection_name: str,
         vectors: List[List[float]],
         limit: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> Optional[SearchResult]:
+        """
+        `ef_search` / `probes` override PGVECTOR_HNSW_EF_SEARCH /
+        PGVECTOR_IVFFLAT_PROBES for this query only.
+        """
         try:
             if not vectors:
                 return None
 
+            self._set_search_params(ef_search, probes)
+
             # Adjust query vectors to VECTOR_LENGTH
             vectors = [self.adjust_vector_length(vector) for vector in vectors]
             num_queries = len(vectors)
@@ -287,6 +816,221 @@ class PgvectorClient:
             log.error(f"Error during search: {e}")
             return None
 
+    def search_many(
+        self,
+        collection_names: List[str],
+        vectors: List[List[float]],
+        limit: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> Optional[SearchResult]:
+        """
+        Searches several collections with several query vectors in one
+        statement. Each (query vector, collection) pair is an index-backed
+        LATERAL top-`limit`, one UNION ALL branch per collection with the
+        collection name as a literal, so a collection's partial index
+        (`ensure_collection_indexes`) is used where it has one instead of
+        post-filtering the global index. Chunks hit by more than one query vector keep
+        their smallest distance, and every collection is then cut back to its
+        own top-`limit` server-side.
+
+        Unlike `search`, the returned lists are indexed by collection (same
+        order as `collection_names`), not by query vector, ordered by
+        ascending distance. `ef_search` / `probes` work as in `search`.
+
+        With PGVECTOR_RESULT_CACHE_TTL set, results are cached per
+        (collections, query vectors, limit, search params).
+        """
+        if not collection_names or not vectors:
+            return None
+
+        if self._result_cache is None:
+            return self._search_many(collection_names, vectors, limit, ef_search, probes)
+
+        with self._result_cache_lock:
+            key = (
+                tuple(
+                    (name, self._collection_generations.get(name, 0))
+                    for name in collection_names
+                ),
+                hashlib.sha1(np.asarray(vectors, dtype=np.float32).tobytes()).hexdigest(),
+                limit,
+                ef_search,
+                probes,
+            )
+            cached = self._result_cache.get(key)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+
+        result = self._search_many(collection_names, vectors, limit, ef_search, probes)
+        if result is not None:
+            with self._result_cache_lock:
+                self._result_cache[key] = result.model_copy(deep=True)
+        return result
+
+    def _search_many(
+        self,
+        collection_names: List[str],
+        vectors: List[List[float]],
+        limit: Optional[int],
+        ef_search: Optional[int],
+        probes: Optional[int],
+    ) -> Optional[SearchResult]:
+        try:
+
+            self._set_search_params(ef_search, probes)
+
+            vectors = [self.adjust_vector_length(vector) for vector in vectors]
+
+            qid_col = column("qid", Integer)
+            q_vector_col = column("q_vector", Vector(VECTOR_LENGTH))
+            # A CTE, so the vectors are sent once however many branches use them.
+            query_vectors = select(
+                values(qid_col, q_vector_col)
+                .data(
+                    [
+                        (idx, cast(array(vector), Vector(VECTOR_LENGTH)))
+                        for idx, vector in enumerate(vectors)
+                    ]
+                )
+                .alias("query_vectors_values")
+            ).cte("query_vectors")
+
+            distance = DocumentChunk.vector.cosine_distance(query_vectors.c.q_vector)
+            branches = []
+            for cid, name in enumerate(collection_names):
+                # The planner matches a partial index's predicate only against
+                # a constant, not against a value joined in from elsewhere.
+                hits = (
+                    select(
+                        DocumentChunk.id,
+                        DocumentChunk.text,
+                        DocumentChunk.vmetadata,
+                        distance.label("distance"),
+                    )
+                    .where(DocumentChunk.collection_name == literal(name, Text))
+                    .order_by(distance)
+                )
+                if limit is not None:
+                    hits = hits.limit(limit)
+                hits = hits.lateral(f"hits_{cid}")
+                branches.append(
+                    select(
+                        literal(cid, Integer).label("cid"),
+                        hits.c.id,
+                        hits.c.text,
+                        hits.c.vmetadata,
+                        hits.c.distance,
+                    )
+                    .select_from(query_vectors)
+                    .join(hits, true())
+                )
+            all_hits = (
+                union_all(*branches) if len(branches) > 1 else branches[0]
+            ).subquery("hits")
+
+            # One row per (collection, chunk), at its best distance
+            best = (
+                select(all_hits)
+                .distinct(all_hits.c.cid, all_hits.c.id)
+                .order_by(all_hits.c.cid, all_hits.c.id, all_hits.c.distance)
+                .subquery("best")
+            )
+            ranked = select(
+                best,
+                func.row_number()
+                .over(partition_by=best.c.cid, order_by=best.c.distance)
+                .label("rank"),
+            ).subquery("ranked")
+
+            stmt = select(
+                ranked.c.cid,
+                ranked.c.id,
+                ranked.c.text,
+                ranked.c.vmetadata,
+                ranked.c.distance,
+            ).order_by(ranked.c.cid, ranked.c.distance)
+            if limit is not None:
+                stmt = stmt.where(ranked.c.rank <= limit)
+
+            num_collections = len(collection_names)
+            ids = [[] for _ in range(num_collections)]
+            distances = [[] for _ in range(num_collections)]
+            documents = [[] for _ in range(num_collections)]
+            metadatas = [[] for _ in range(num_collections)]
+
+            for row in self.session.execute(stmt).all():
+                cid = int(row.cid)
+                ids[cid].append(row.id)
+                distances[cid].append(row.distance)
+                documents[cid].append(row.text)
+                metadatas[cid].append(row.vmetadata)
+
+            return SearchResult(
+                ids=ids, distances=distances, documents=documents, metadatas=metadatas
+            )
+        except Exception as e:
+            log.error(f"Error during search_many: {e}")
+            return None
+
+    def lexical_search(
+        self,
+        collection_name: str,
+        queries: List[str],
+        limit: Optional[int] = None,
+    ) -> Optional[SearchResult]:
+        """
+        Full-text search over the `text_tsv` GIN index. A chunk matches if it
+        contains any of the query terms (OR semantics, like BM25); results are
+        ranked by `ts_rank_cd`, so `distances` holds scores, higher is better.
+        """
+        try:
+            if not queries:
+                return None
+
+            ids = [[] for _ in range(len(queries))]
+            distances = [[] for _ in range(len(queries))]
+            documents = [[] for _ in range(len(queries))]
+            metadatas = [[] for _ in range(len(queries))]
+
+            for qid, query in enumerate(queries):
+                rows = self.session.execute(
+                    text(
+                        f"""
+                        WITH q AS (
+                            SELECT replace(
+                                plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query)::text, '&', '|'
+                            )::tsquery AS tsq
+                        )
+                        SELECT id, text, vmetadata, ts_rank_cd(text_tsv, q.tsq) AS score
+                        FROM document_chunk, q
+                        WHERE collection_name = :collection_name
+                          AND text_tsv @@ q.tsq
+                        ORDER BY score DESC
+                        LIMIT :limit
+                        """
+                    ),
+                    {
+                        "query": query,
+                        "collection_name": collection_name,
+                        "limit": limit,
+                    },
+                ).all()
+
+                for row in rows:
+                    ids[qid].append(row.id)
+                    distances[qid].append(row.score)
+                    documents[qid].append(row.text)
+                    metadatas[qid].append(row.vmetadata)
+
+            return SearchResult(
+                ids=ids, distances=distances, documents=documents, metadatas=metadatas
+            )
+        except Exception as e:
+            self.session.rollback()
+            log.error(f"Error during lexical search: {e}")
+            return None
+
     def query(
         self, collection_name: str, filter: Dict[str, Any], limit: Optional[int] = None
     ) -> Optional[GetResult]:
@@ -362,16 +1106,123 @@ class PgvectorClient:
                     )
             deleted = query.delete(synchronize_session=False)
             self.session.commit()
+            self._invalidate_results(collection_name)
             log.debug(f"Deleted {deleted} items from collection '{collection_name}'.")
         except Exception as e:
             self.session.rollback()
             log.error(f"Error during delete: {e}")
             raise
 
+    def get_cached_embeddings(
+        self, model: str, text_hashes: List[str]
+    ) -> Dict[str, List[float]]:
+        """Cached embeddings for `text_hashes` under `model`; misses are absent.
+        Hits not used for EMBEDDING_CACHE_TOUCH_AFTER seconds are marked used."""
+        found = {}
+        now = int(time.time())
+        try:
+            for start in range(0, len(text_hashes), INSERT_BATCH_SIZE):
+                rows = self.session.execute(
+                    select(
+                        EmbeddingCacheEntry.text_hash,
+                        EmbeddingCacheEntry.embedding,
+                        EmbeddingCacheEntry.last_used_at,
+                    )
+                    .where(EmbeddingCacheEntry.model == model)
+                    .where(
+                        EmbeddingCacheEntry.text_hash.in_(
+                            text_hashes[start : start + INSERT_BATCH_SIZE]
+                        )
+                    )
+                ).all()
+                stale = []
+                for row in rows:
+                    found[row.text_hash] = row.embedding.tolist()
+                    if row.last_used_at < now - EMBEDDING_CACHE_TOUCH_AFTER:
+                        stale.append(row.text_hash)
+                if stale:
+                    self.session.execute(
+                        EmbeddingCacheEntry.__table__.update()
+                        .where(EmbeddingCacheEntry.model == model)
+                        .where(EmbeddingCacheEntry.text_hash.in_(stale))
+                        .values(last_used_at=now)
+                    )
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            log.error(f"Error reading embedding cache: {e}")
+        return found
+
+    def put_cached_embeddings(
+        self, model: str, embeddings: Dict[str, List[float]]
+    ) -> None:
+        """Stores `embeddings` (text hash -> vector); existing entries are kept."""
+        now = int(time.time())
+        try:
+            rows = [
+                {
+                    "model": model,
+                    "text_hash": text_hash,
+                    "embedding": embedding,
+                    "created_at": now,
+                    "last_used_at": now,
+                }
+                for text_hash, embedding in embeddings.items()
+            ]
+            stmt = pg_insert(EmbeddingCacheEntry.__table__).on_conflict_do_nothing()
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                self.session.execute(stmt, rows[start : start + INSERT_BATCH_SIZE])
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            log.error(f"Error writing embedding cache: {e}")
+            return
+
+        if time.time() - self._embedding_cache_pruned_at >= EMBEDDING_CACHE_PRUNE_INTERVAL:
+            self._embedding_cache_pruned_at = time.time()
+            self.prune_embedding_cache()
+
+    def prune_embedding_cache(
+        self,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+        ttl: int = EMBEDDING_CACHE_TTL,
+    ) -> int:
+        """Drops entries unused for `ttl` seconds, then the least recently
+        used ones beyond `max_rows`. Returns the number of entries dropped."""
+        try:
+            deleted = 0
+            if ttl > 0:
+                deleted += self.session.execute(
+                    text("DELETE FROM embedding_cache WHERE last_used_at < :cutoff"),
+                    {"cutoff": int(time.time()) - ttl},
+                ).rowcount
+            excess = (
+                self.session.execute(text("SELECT count(*) FROM embedding_cache")).scalar()
+                - max_rows
+            )
+            if excess > 0:
+                deleted += self.session.execute(
+                    text(
+                        "DELETE FROM embedding_cache WHERE ctid IN ("
+                        "SELECT ctid FROM embedding_cache "
+                        "ORDER BY last_used_at LIMIT :excess)"
+                    ),
+                    {"excess": excess},
+                ).rowcount
+            self.session.commit()
+            if deleted:
+                log.info(f"Pruned {deleted} entries from the embedding cache.")
+            return deleted
+        except Exception as e:
+            self.session.rollback()
+            log.error(f"Error pruning embedding cache: {e}")
+            return 0
+
     def reset(self) -> None:
         try:
             deleted = self.session.query(DocumentChunk).delete()
             self.session.commit()
+            self._invalidate_results()
             log.info(f"Reset complete. Deleted {deleted} items from 'document_chunk' table.")
         except Exception as e:
             self.session.rollback()
@@ -396,4 +1247,7 @@ class PgvectorClient:
 
     def delete_collection(self, collection_name: str) -> None:
         self.delete(collection_name)
+        index_name = collection_index_name(collection_name)
+        if self._index_info(index_name) is not None:
+            self._execute_autocommit([f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"])
         log.info(f"Collection '{collection_name}' deleted.")
\ No newline at end of file
@@ -36,7 +36,7 @@ from open_webui.env import (
     DEVICE_TYPE,
 )
 from beyond_the_loop.services.credit_service import credit_service
-from beyond_the_loop.services.payments_service import payments_service
+from beyond_the_loop.services.entitlement_service import entitlement_service
 
 router = APIRouter()
 
@@ -155,7 +155,7 @@ async def update_audio_config(
 
 @router.post("/speech")
 async def speech(request: Request, user=Depends(get_verified_user)):
-    subscription = payments_service.get_subscription(user.company_id)
+    subscription = (await entitlement_service.aget(user.company_id)).subscription
 
     await credit_service.check_for_subscription_and_sufficient_balance_and_seats(user)
 
@@ -297,7 +297,7 @@ async def transcription(
 ):
     log.info(f"file.content_type: {file.content_type}")
 
-    subscription = payments_service.get_subscription(user.company_id)
+    subscription = (await entitlement_service.aget(user.company_id)).subscription
 
     await credit_service.check_for_subscription_and_sufficient_balance_and_seats(user)
 
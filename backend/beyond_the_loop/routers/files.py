@@ -1,7 +1,9 @@
+import asyncio
 import logging
+import mimetypes
 import os
+import re
 import uuid
-from pathlib import Path
 from typing import Optional
 from beyond_the_loop.utils.file_upload_validator import FileValidator
 from pydantic import BaseModel
@@ -15,12 +17,14 @@ from beyond_the_loop.models.files import (
     FileModelResponse,
     Files,
 )
+from beyond_the_loop.models.ingestion_jobs import IngestionJobResponse, IngestionJobs
 from beyond_the_loop.models.users import Users
+from beyond_the_loop.services.ingestion_worker import enqueue_ingestion_job, job_response
 from open_webui.routers.retrieval import process_file, ProcessFileForm
 from open_webui.env import SRC_LOG_LEVELS
 from open_webui.constants import ERROR_MESSAGES
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status, Request
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile, status, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from open_webui.utils.auth import get_verified_user
 
 log = logging.getLogger(__name__)
@@ -38,9 +42,28 @@ router = APIRouter()
 def upload_file(
     request: Request,
     file: UploadFile = File(...),
+    background: bool = False,
+    idempotency_key: Optional[str] = Header(None),
     user=Depends(get_verified_user)
 ):
+    """
+    Store an upload and process it for retrieval. With `background=true` the
+    processing is queued as an ingestion job and the file is returned at once
+    with its `job`; progress arrives as "ingestion-events" on the socket and
+    at GET /files/jobs/{job_id}. A repeated request with the same
+    `Idempotency-Key` header returns the first upload and its job.
+    """
     log.info(f"file.content_type: {file.content_type}")
+
+    job_key = f"{user.id}:{idempotency_key}" if idempotency_key else None
+    if background and job_key:
+        job = IngestionJobs.get_job_by_idempotency_key(job_key)
+        file_item = Files.get_file_by_id(job.payload["file_id"]) if job else None
+        if file_item:
+            return FileModelResponse(
+                **file_item.model_dump(), job=job_response(job).model_dump()
+            )
+
     try:
         unsanitized_filename = file.filename
         filename = os.path.basename(unsanitized_filename)
@@ -51,7 +74,7 @@ def upload_file(
         id = str(uuid.uuid4())
         name = filename
         filename = f"{id}_{filename}"
-        contents, file_path = Storage.upload_file(file.file, filename)
+        uploaded, file_path = Storage.upload_file(file.file, filename)
 
         file_item = Files.insert_new_file(
             user.id,
@@ -63,12 +86,26 @@ def upload_file(
                     "meta": {
                         "name": name,
                         "content_type": file.content_type,
-                        "size": len(contents),
+                        "size": uploaded.size,
+                        "sha256": uploaded.sha256,
                     },
                 }
             ),
         )
 
+        if background:
+            job = enqueue_ingestion_job(
+                user.id, "file", {"file_id": id}, idempotency_key=job_key
+            )
+            if job.payload["file_id"] != id:
+                # A concurrent request with the same key queued its upload first.
+                Files.delete_file_by_id(id)
+                Storage.delete_file(file_path)
+                file_item = Files.get_file_by_id(job.payload["file_id"])
+            return FileModelResponse(
+                **file_item.model_dump(), job=job_response(job).model_dump()
+            )
+
         try:
             process_file(request, ProcessFileForm(file_id=id), user=user)
             file_item = Files.get_file_by_id(id=id)
@@ -98,6 +135,22 @@ def upload_file(
         )
 
 
+############################
+# Get Ingestion Job By Id
+############################
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+def get_ingestion_job_by_id(job_id: str, user=Depends(get_verified_user)):
+    job = IngestionJobs.get_job_by_id(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+    return job_response(job)
+
+
 ############################
 # Get File By Id
 ############################
@@ -192,8 +245,56 @@ async def update_file_data_content_by_id(
 ############################
 
 
+_BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def _stored_file_response(request: Request, file_path: str, headers: dict) -> Response:
+    """Serve a stored file: from its local copy when there is one (FileResponse
+    answers Range requests itself), otherwise streamed from the bucket — a
+    single byte range if the client asked for one, else the whole object,
+    which also fills the local cache."""
+    stored = Storage.open(file_path)
+    if stored.local_path is not None:
+        return FileResponse(stored.local_path, headers=headers)
+
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+    # Only a single range is honored; anything else gets the whole file.
+    match = _BYTE_RANGE.fullmatch(request.headers.get("range", "").strip())
+    if match and any(match.groups()) and stored.size > 0:
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), stored.size - 1) if last else stored.size - 1
+        else:
+            start, end = max(stored.size - int(last), 0), stored.size - 1
+
+        if start > end or start >= stored.size:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{stored.size}"},
+            )
+
+        return StreamingResponse(
+            stored.read(start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers={
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{stored.size}",
+                "Content-Length": str(end - start + 1),
+            },
+        )
+
+    return StreamingResponse(
+        stored.read(0, None),
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(stored.size)},
+    )
+
+
 @router.get("/{id}/content")
-async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
+async def get_file_content_by_id(request: Request, id: str, user=Depends(get_verified_user)):
     file = Files.get_file_by_id(id)
     if file is None:
         raise HTTPException(
@@ -204,32 +305,21 @@ async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
 
     if file.user_id == user.id or (user.role == "admin" and file_user and file_user.company_id == user.company_id):
         try:
-            file_path = Storage.get_file(file.path)
-            file_path = Path(file_path)
-
-            # Check if the file already exists in the cache
-            if file_path.is_file():
-                # Handle Unicode filenames
-                filename = file.meta.get("name", file.filename)
-                encoded_filename = quote(filename)  # RFC5987 encoding
-
-                headers = {}
-                if file.meta.get("content_type") not in [
-                    "application/pdf",
-                    "text/plain",
-                ]:
-                    headers = {
-                        **headers,
-                        "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
-                    }
-
-                return FileResponse(file_path, headers=headers)
-
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=ERROR_MESSAGES.NOT_FOUND,
-                )
+            # Handle Unicode filenames
+            filename = file.meta.get("name", file.filename)
+            encoded_filename = quote(filename)  # RFC5987 encoding
+
+            headers = {}
+            if file.meta.get("content_type") not in [
+                "application/pdf",
+                "text/plain",
+            ]:
+                headers = {
+                    **headers,
+                    "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+                }
+
+            return await asyncio.to_thread(_stored_file_response, request, file.path, headers)
         except Exception as e:
             log.exception(e)
             log.error(f"Error getting file content")
@@ -245,7 +335,7 @@ async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
 
 
 @router.get("/{id}/content/{file_name}")
-async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
+async def get_file_content_by_id(request: Request, id: str, user=Depends(get_verified_user)):
     file = Files.get_file_by_id(id)
     if file is None:
         raise HTTPException(
@@ -265,13 +355,9 @@ async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
         }
 
         if file_path:
-            file_path = Storage.get_file(file_path)
-            file_path = Path(file_path)
-
-            # Check if the file already exists in the cache
-            if file_path.is_file():
-                return FileResponse(file_path, headers=headers)
-            else:
+            try:
+                return await asyncio.to_thread(_stored_file_response, request, file_path, headers)
+            except (FileNotFoundError, RuntimeError):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=ERROR_MESSAGES.NOT_FOUND,
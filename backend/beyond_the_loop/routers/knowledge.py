@@ -1,6 +1,6 @@
 from typing import List, Optional
 from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Request
 import logging
 
 from beyond_the_loop.models.knowledge import KnowledgeModel
@@ -11,12 +11,15 @@ from beyond_the_loop.models.knowledge import (
     KnowledgeUserResponse,
 )
 from beyond_the_loop.models.files import Files, FileModel
+from beyond_the_loop.models.ingestion_jobs import IngestionJobResponse
+from beyond_the_loop.services.ingestion_worker import enqueue_ingestion_job, job_response
 from beyond_the_loop.retrieval.vector.connector import VECTOR_DB_CLIENT
 from open_webui.routers.retrieval import (
     process_file,
     ProcessFileForm,
     process_files_batch,
     BatchProcessFilesForm,
+    BatchProcessFilesResult,
 )
 
 from open_webui.constants import ERROR_MESSAGES
@@ -170,6 +173,8 @@ async def create_new_knowledge(
 
 class KnowledgeFilesResponse(KnowledgeResponse):
     files: list[FileModel]
+    # Set when the files are being added by a background ingestion job.
+    job: Optional[IngestionJobResponse] = None
 
 
 @router.get("/{id}", response_model=Optional[KnowledgeFilesResponse])
@@ -493,15 +498,60 @@ async def reset_knowledge_by_id(id: str, user=Depends(get_verified_user)):
 ############################
 
 
+def process_files_into_knowledge(
+    request, id: str, files: List[FileModel], user, skip_embedded: bool = False
+):
+    """
+    Embed `files` into knowledge base `id` and add the ones that succeeded to
+    its file list. Returns the updated knowledge, its file ids and the batch
+    result. With `skip_embedded`, files whose chunks are already in the
+    knowledge collection are not embedded again but count as completed.
+    """
+    embedded_file_ids = []
+    if skip_embedded:
+        for file in files:
+            existing = VECTOR_DB_CLIENT.query(
+                collection_name=id, filter={"file_id": file.id}, limit=1
+            )
+            if existing is not None and existing.ids[0]:
+                embedded_file_ids.append(file.id)
+
+    result = process_files_batch(
+        request=request,
+        form_data=BatchProcessFilesForm(
+            files=[file for file in files if file.id not in embedded_file_ids],
+            collection_name=id,
+        ),
+        user=user,
+    )
+    result.results.extend(
+        BatchProcessFilesResult(file_id=file_id, status="completed")
+        for file_id in embedded_file_ids
+    )
+
+    # Only add files that were successfully processed. Merged under a row
+    # lock: other jobs for this knowledge base may have added files while
+    # this one was embedding.
+    successful_file_ids = [r.file_id for r in result.results if r.status == "completed"]
+    knowledge = Knowledges.add_file_ids_by_id(id=id, file_ids=successful_file_ids)
+    if not knowledge:
+        raise ValueError(f"Knowledge base {id} not found")
+
+    return knowledge, knowledge.data["file_ids"], result
+
+
 @router.post("/{id}/files/batch/add", response_model=Optional[KnowledgeFilesResponse])
 def add_files_to_knowledge_batch(
     request: Request,
     id: str,
     form_data: list[KnowledgeFileIdForm],
+    background: bool = False,
+    idempotency_key: Optional[str] = Header(None),
     user=Depends(get_verified_user),
 ):
     """
-    Add multiple files to a knowledge base
+    Add multiple files to a knowledge base. With `background=true` the files
+    are processed by an ingestion job, returned as `job`.
     """
     knowledge = Knowledges.get_knowledge_by_id(id=id)
 
@@ -520,12 +570,24 @@ def add_files_to_knowledge_batch(
             )
         files.append(file)
 
+    if background:
+        job = enqueue_ingestion_job(
+            user.id,
+            "knowledge_files",
+            {"knowledge_id": id, "file_ids": [file.id for file in files]},
+            idempotency_key=f"{user.id}:{idempotency_key}" if idempotency_key else None,
+        )
+        existing_file_ids = (knowledge.data or {}).get("file_ids", [])
+        return KnowledgeFilesResponse(
+            **knowledge.model_dump(),
+            files=Files.get_files_by_ids(existing_file_ids),
+            job=job_response(job),
+        )
+
     # Process files
     try:
-        result = process_files_batch(
-            request=request,
-            form_data=BatchProcessFilesForm(files=files, collection_name=id),
-            user=user,
+        knowledge, existing_file_ids, result = process_files_into_knowledge(
+            request, id, files, user
         )
     except Exception as e:
         log.error(
@@ -533,19 +595,6 @@ def add_files_to_knowledge_batch(
         )
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    # Add successful files to knowledge base
-    data = knowledge.data or {}
-    existing_file_ids = data.get("file_ids", [])
-
-    # Only add files that were successfully processed
-    successful_file_ids = [r.file_id for r in result.results if r.status == "completed"]
-    for file_id in successful_file_ids:
-        if file_id not in existing_file_ids:
-            existing_file_ids.append(file_id)
-
-    data["file_ids"] = existing_file_ids
-    knowledge = Knowledges.update_knowledge_data_by_id(id=id, data=data)
-
     # If there were any errors, include them in the response
     if result.errors:
         error_details = [f"{err.file_id}: {err.error}" for err in result.errors]
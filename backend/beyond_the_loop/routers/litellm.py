@@ -10,6 +10,7 @@ from pathlib import Path
 from typing import Optional
 
 import aiohttp
+import orjson
 import requests
 import os
 
@@ -19,6 +20,17 @@ from fastapi.responses import FileResponse, StreamingResponse, Response
 from starlette.background import BackgroundTask
 from openai import OpenAI
 from beyond_the_loop.models.models import Models
+from beyond_the_loop.utils.stream_events import (
+    CitationEvent,
+    CodeExecutionEvent,
+    EventStreamResponse,
+    FileRefsEvent,
+    ReasoningDelta,
+    StatusEvent,
+    TextDelta,
+    UsageEvent,
+    iter_lines,
+)
 
 
 from beyond_the_loop.config import (
@@ -46,7 +58,7 @@ from open_webui.utils.auth import get_verified_user, get_current_api_key_user
 from beyond_the_loop.models.groups import Groups
 from beyond_the_loop.utils.access_control import has_access
 from beyond_the_loop.services.credit_service import credit_service
-from beyond_the_loop.services.payments_service import payments_service
+from beyond_the_loop.services.entitlement_service import entitlement_service
 from beyond_the_loop.services.fair_model_usage_service import fair_model_usage_service
 from beyond_the_loop.socket.main import get_event_emitter
 from beyond_the_loop.utils.image_generation import (
@@ -469,7 +481,7 @@ async def generate_chat_completion(
     if tools:
         payload["tools"] = tools
 
-    subscription = payments_service.get_subscription(user.company_id)
+    subscription = (await entitlement_service.aget(user.company_id)).subscription
 
     if has_chat_id or agent_or_task_prompt:
         await credit_service.check_for_subscription_and_sufficient_balance_and_seats(user)
@@ -632,9 +644,7 @@ async def generate_chat_completion(
 
             if use_responses_api:
                 async def responses_api_stream():
-                    buffer = ""
                     event_type = None
-                    response_id = f"chatcmpl-responses-{int(time.time())}"
                     annotations = []
                     accumulated_content = ""
                     code_accumulator = {}
@@ -643,249 +653,206 @@ async def generate_chat_completion(
                     last_web_search_status = None
                     mcp_server_labels: dict[str, str] = {}
 
-                    async for chunk in r.content:
-                        chunk_str = chunk.decode("utf-8", errors="replace")
-                        buffer += chunk_str
-
-                        while "\n" in buffer:
-                            line, buffer = buffer.split("\n", 1)
-                            line = line.rstrip("\r")
-
-                            if line.startswith("event: "):
-                                event_type = line[7:].strip()
-                            elif line.startswith("data: "):
-                                data_str = line[6:]
-                                if data_str == "[DONE]":
-                                    yield b"data: [DONE]\n\n"
-                                    return
-                                try:
-                                    data = json.loads(data_str)
-                                    event = data.get("type") or event_type or ""
-
-                                    if event == "response.reasoning_summary_text.delta":
-                                        delta = data.get("delta", "")
-                                        if delta:
-                                            think_chunk = {
-                                                "id": response_id,
-                                                "object": "chat.completion.chunk",
-                                                "created": int(time.time()),
-                                                "model": model_name,
-                                                "choices": [{"index": 0, "delta": {"thinking": delta}, "finish_reason": None}],
+                    async for line in iter_lines(r.content.iter_any()):
+                        if line.startswith(b"event: "):
+                            event_type = line[7:].strip().decode()
+                        elif line.startswith(b"data: "):
+                            data_str = line[6:]
+                            if data_str == b"[DONE]":
+                                return
+                            try:
+                                data = orjson.loads(data_str)
+                                event = data.get("type") or event_type or ""
+
+                                if event == "response.reasoning_summary_text.delta":
+                                    delta = data.get("delta", "")
+                                    if delta:
+                                        yield ReasoningDelta(delta)
+
+                                elif event in (
+                                    "response.web_search_call.in_progress",
+                                    "response.web_search_call.searching",
+                                    "response.web_search_call.completed",
+                                ):
+                                    # Redundant with output_item.added/done — skip to avoid status flicker.
+                                    pass
+
+                                elif event == "response.output_item.added":
+                                    item = data.get("item", {})
+                                    item_type = item.get("type")
+                                    if item_type == "web_search_call":
+                                        web_search_active = True
+                                        last_web_search_status = {
+                                            "action": "web_search",
+                                            "done": False,
+                                            "description": "Searching the web",
+                                        }
+                                        yield StatusEvent(last_web_search_status)
+                                    elif item_type == "mcp_list_tools":
+                                        mcp_item_id = item.get("id", "")
+                                        mcp_label = item.get("server_label") or "MCP server"
+                                        if mcp_item_id:
+                                            mcp_server_labels[mcp_item_id] = mcp_label
+                                        yield StatusEvent({'action': 'mcp_list_tools', 'done': False, 'description': f'Connecting to {mcp_label}'})
+
+                                elif event == "response.mcp_list_tools.completed":
+                                    mcp_item_id = data.get("item_id", "")
+                                    mcp_label = mcp_server_labels.get(mcp_item_id, "MCP server")
+                                    yield StatusEvent({'action': 'mcp_list_tools', 'done': True, 'description': f'Connected to {mcp_label}'})
+
+                                elif event == "response.mcp_list_tools.failed":
+                                    mcp_item_id = data.get("item_id", "")
+                                    mcp_label = mcp_server_labels.get(mcp_item_id, "MCP server")
+                                    yield StatusEvent({'action': 'mcp_list_tools', 'done': True, 'description': f'Failed to connect to {mcp_label}'})
+
+                                elif event == "response.code_interpreter_call.in_progress":
+                                    yield StatusEvent({'action': 'analyzing_results', 'done': False, 'description': 'Writing code'})
+
+                                elif event == "response.code_interpreter_call_code.delta":
+                                    item_id = data.get("item_id", "")
+                                    delta = data.get("delta", "")
+                                    if item_id and delta:
+                                        code_accumulator[item_id] = code_accumulator.get(item_id, "") + delta
+
+                                elif event == "response.code_interpreter_call_code.done":
+                                    item_id = data.get("item_id", "")
+                                    code = data.get("code") or code_accumulator.get(item_id, "")
+                                    yield StatusEvent({'action': 'analyzing_results', 'done': True, 'description': 'Writing code'})
+                                    yield StatusEvent({'action': 'analyzing_results', 'done': False, 'description': 'Running code'})
+                                    if code:
+                                        yield CodeExecutionEvent({'id': item_id, 'name': 'Code', 'code': code, 'language': 'python'})
+
+                                elif event == "response.code_interpreter_call.interpreting":
+                                    yield StatusEvent({'action': 'analyzing_results', 'done': False, 'description': 'Running code'})
+
+                                elif event == "response.code_interpreter_call.completed":
+                                    item_id = data.get("item_id", "")
+                                    code = code_accumulator.get(item_id, "")
+                                    log_all_until_completed = True
+                                    yield StatusEvent({'action': 'analyzing_results', 'done': True, 'description': 'Running code'})
+                                    if item_id:
+                                        yield CodeExecutionEvent({'id': item_id, 'name': 'Code', 'code': code, 'language': 'python', 'result': {'output': ' '}})
+                                    yield StatusEvent({'action': 'generating_response', 'done': True})
+
+                                elif event == "response.output_item.done":
+                                    item = data.get("item", {})
+                                    if item.get("type") == "web_search_call":
+                                        action = item.get("action", {})
+                                        action_type = action.get("type")
+                                        if action_type == "search":
+                                            query = action.get("query") or (action.get("queries") or [""])[0]
+                                            last_web_search_status = {
+                                                "action": "web_search",
+                                                "done": False,
+                                                "description": 'Searching "{{searchQuery}}"',
+                                                "query": query,
                                             }
-                                            yield f"data: {json.dumps(think_chunk)}\n\n".encode()
-
-                                    elif event in (
-                                        "response.web_search_call.in_progress",
-                                        "response.web_search_call.searching",
-                                        "response.web_search_call.completed",
-                                    ):
-                                        # Redundant with output_item.added/done — skip to avoid status flicker.
-                                        pass
-
-                                    elif event == "response.output_item.added":
-                                        item = data.get("item", {})
-                                        item_type = item.get("type")
-                                        if item_type == "web_search_call":
-                                            web_search_active = True
+                                        elif action_type == "open_page":
+                                            url = action.get("url", "")
                                             last_web_search_status = {
                                                 "action": "web_search",
                                                 "done": False,
-                                                "description": "Searching the web",
+                                                "description": 'Opening "{{searchQuery}}"',
+                                                "query": url,
                                             }
-                                            yield f"data: {json.dumps({'status_event': last_web_search_status})}\n\n".encode()
-                                        elif item_type == "mcp_list_tools":
-                                            mcp_item_id = item.get("id", "")
-                                            mcp_label = item.get("server_label") or "MCP server"
-                                            if mcp_item_id:
-                                                mcp_server_labels[mcp_item_id] = mcp_label
-                                            yield f"data: {json.dumps({'status_event': {'action': 'mcp_list_tools', 'done': False, 'description': f'Connecting to {mcp_label}'}})}\n\n".encode()
-
-                                    elif event == "response.mcp_list_tools.completed":
-                                        mcp_item_id = data.get("item_id", "")
-                                        mcp_label = mcp_server_labels.get(mcp_item_id, "MCP server")
-                                        yield f"data: {json.dumps({'status_event': {'action': 'mcp_list_tools', 'done': True, 'description': f'Connected to {mcp_label}'}})}\n\n".encode()
-
-                                    elif event == "response.mcp_list_tools.failed":
-                                        mcp_item_id = data.get("item_id", "")
-                                        mcp_label = mcp_server_labels.get(mcp_item_id, "MCP server")
-                                        yield f"data: {json.dumps({'status_event': {'action': 'mcp_list_tools', 'done': True, 'description': f'Failed to connect to {mcp_label}'}})}\n\n".encode()
-
-                                    elif event == "response.code_interpreter_call.in_progress":
-                                        yield f"data: {json.dumps({'status_event': {'action': 'analyzing_results', 'done': False, 'description': 'Writing code'}})}\n\n".encode()
-
-                                    elif event == "response.code_interpreter_call_code.delta":
-                                        item_id = data.get("item_id", "")
-                                        delta = data.get("delta", "")
-                                        if item_id and delta:
-                                            code_accumulator[item_id] = code_accumulator.get(item_id, "") + delta
-
-                                    elif event == "response.code_interpreter_call_code.done":
-                                        item_id = data.get("item_id", "")
-                                        code = data.get("code") or code_accumulator.get(item_id, "")
-                                        yield f"data: {json.dumps({'status_event': {'action': 'analyzing_results', 'done': True, 'description': 'Writing code'}})}\n\n".encode()
-                                        yield f"data: {json.dumps({'status_event': {'action': 'analyzing_results', 'done': False, 'description': 'Running code'}})}\n\n".encode()
-                                        if code:
-                                            yield f"data: {json.dumps({'code_execution_event': {'id': item_id, 'name': 'Code', 'code': code, 'language': 'python'}})}\n\n".encode()
-
-                                    elif event == "response.code_interpreter_call.interpreting":
-                                        yield f"data: {json.dumps({'status_event': {'action': 'analyzing_results', 'done': False, 'description': 'Running code'}})}\n\n".encode()
-
-                                    elif event == "response.code_interpreter_call.completed":
-                                        item_id = data.get("item_id", "")
-                                        code = code_accumulator.get(item_id, "")
-                                        log_all_until_completed = True
-                                        yield f"data: {json.dumps({'status_event': {'action': 'analyzing_results', 'done': True, 'description': 'Running code'}})}\n\n".encode()
-                                        if item_id:
-                                            yield f"data: {json.dumps({'code_execution_event': {'id': item_id, 'name': 'Code', 'code': code, 'language': 'python', 'result': {'output': ' '}}})}\n\n".encode()
-                                        yield f"data: {json.dumps({'status_event': {'action': 'generating_response', 'done': True}})}\n\n".encode()
-
-                                    elif event == "response.output_item.done":
-                                        item = data.get("item", {})
-                                        if item.get("type") == "web_search_call":
-                                            action = item.get("action", {})
-                                            action_type = action.get("type")
-                                            if action_type == "search":
-                                                query = action.get("query") or (action.get("queries") or [""])[0]
-                                                last_web_search_status = {
-                                                    "action": "web_search",
-                                                    "done": False,
-                                                    "description": 'Searching "{{searchQuery}}"',
-                                                    "query": query,
-                                                }
-                                            elif action_type == "open_page":
-                                                url = action.get("url", "")
-                                                last_web_search_status = {
-                                                    "action": "web_search",
-                                                    "done": False,
-                                                    "description": 'Opening "{{searchQuery}}"',
-                                                    "query": url,
-                                                }
-                                            else:
-                                                last_web_search_status = {
-                                                    "action": "web_search",
-                                                    "done": False,
-                                                    "description": "Searching the web",
-                                                }
-                                            yield f"data: {json.dumps({'status_event': last_web_search_status})}\n\n".encode()
-
-                                    elif event == "response.output_text.delta":
-                                        delta = data.get("delta", "")
-                                        if delta:
-                                            if web_search_active and last_web_search_status is not None:
-                                                web_search_active = False
-                                                final_status = {**last_web_search_status, "done": True}
-                                                yield f"data: {json.dumps({'status_event': final_status})}\n\n".encode()
-                                            accumulated_content += delta
-                                            chat_chunk = {
-                                                "id": response_id,
-                                                "object": "chat.completion.chunk",
-                                                "created": int(time.time()),
-                                                "model": model_name,
-                                                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                                        else:
+                                            last_web_search_status = {
+                                                "action": "web_search",
+                                                "done": False,
+                                                "description": "Searching the web",
                                             }
-                                            yield f"data: {json.dumps(chat_chunk)}\n\n".encode()
-
-                                    elif event == "response.output_text.annotation.added":
-                                        annotation = data.get("annotation", {})
-                                        if annotation.get("type") == "container_file_citation":
-                                            annotations.append(annotation)
+                                        yield StatusEvent(last_web_search_status)
+
+                                elif event == "response.output_text.delta":
+                                    delta = data.get("delta", "")
+                                    if delta:
+                                        if web_search_active and last_web_search_status is not None:
+                                            web_search_active = False
+                                            final_status = {**last_web_search_status, "done": True}
+                                            yield StatusEvent(final_status)
+                                        accumulated_content += delta
+                                        yield TextDelta(delta)
+
+                                elif event == "response.output_text.annotation.added":
+                                    annotation = data.get("annotation", {})
+                                    if annotation.get("type") == "container_file_citation":
+                                        annotations.append(annotation)
                                             
 
-                                    elif event == "response.completed":
-                                        log_all_until_completed = False
-                                        resp = data.get("response", {})
-                                        for output in resp.get("output") or []:
-                                            action = output.get("action")
-                                            if action:
-                                                queries_used = action.get("queries")
-                                                if queries_used:
-                                                    chat_chunk = {
-                                                        "id": response_id,
-                                                        "object": "chat.completion.chunk",
-                                                        "created": int(time.time()),
-                                                        "model": model_name,
-                                                        "choices": [{"index": 0, "delta": {"openai_queries_used": queries_used}, "finish_reason": None}],
-                                                    }
-                                                    yield f"data: {json.dumps(chat_chunk)}\n\n".encode()
-                                            url_annotations = (output.get("content") or [{}])[0].get("annotations")
-                                            if url_annotations:
-                                                chat_chunk = {
-                                                    "id": response_id,
-                                                    "object": "chat.completion.chunk",
-                                                    "created": int(time.time()),
-                                                    "model": model_name,
-                                                    "choices": [{"index": 0, "delta": {"openai_url_citation": url_annotations}, "finish_reason": None}],
-                                                }
-                                                yield f"data: {json.dumps(chat_chunk)}\n\n".encode()
+                                elif event == "response.completed":
+                                    log_all_until_completed = False
+                                    resp = data.get("response", {})
+                                    for output in resp.get("output") or []:
+                                        action = output.get("action")
+                                        if action:
+                                            queries_used = action.get("queries")
+                                            if queries_used:
+                                                yield CitationEvent(queries_used=queries_used)
+                                        url_annotations = (output.get("content") or [{}])[0].get("annotations")
+                                        if url_annotations:
+                                            yield CitationEvent(url_citations=url_annotations)
                                         
-                                        usage = resp.get("usage", {})
-                                        usage_openai_format = {
-                                            "model": model_name,
-                                            "usage": {
-                                                "prompt_tokens": usage.get("input_tokens", 0),
-                                                "completion_tokens": usage.get("output_tokens", 0),
-                                                "total_tokens": usage.get("total_tokens", usage.get("input_tokens", 0) + usage.get("output_tokens", 0)),
-                                            }
+                                    usage = resp.get("usage", {})
+                                    usage_openai_format = {
+                                        "model": model_name,
+                                        "usage": {
+                                            "prompt_tokens": usage.get("input_tokens", 0),
+                                            "completion_tokens": usage.get("output_tokens", 0),
+                                            "total_tokens": usage.get("total_tokens", usage.get("input_tokens", 0) + usage.get("output_tokens", 0)),
                                         }
-                                        await credit_service.record_completion(
-                                            user, usage_openai_format, model_name,
-                                            assistant=model.name if model.base_model_id else None,
-                                            agent_or_task_prompt=agent_or_task_prompt,
-                                            subscription=subscription,
-                                        )
-                                        if annotations:
-                                            replaced_content = accumulated_content
-                                            file_refs = []
-                                            for a in annotations:
-                                                a_filename = a.get("filename", "")
-                                                a_container_id = a.get("container_id", "")
-                                                a_openai_file_id = a.get("file_id", "")
-                                                if not (a_filename and a_container_id and a_openai_file_id):
-                                                    continue
-                                                internal_id = await _download_and_store_container_file(
-                                                    a_container_id, a_openai_file_id, a_filename, user.id, model_name
+                                    }
+                                    await credit_service.record_completion(
+                                        user, usage_openai_format, model_name,
+                                        assistant=model.name if model.base_model_id else None,
+                                        agent_or_task_prompt=agent_or_task_prompt,
+                                        subscription=subscription,
+                                    )
+                                    if annotations:
+                                        replaced_content = accumulated_content
+                                        file_refs = []
+                                        for a in annotations:
+                                            a_filename = a.get("filename", "")
+                                            a_container_id = a.get("container_id", "")
+                                            a_openai_file_id = a.get("file_id", "")
+                                            if not (a_filename and a_container_id and a_openai_file_id):
+                                                continue
+                                            internal_id = await _download_and_store_container_file(
+                                                a_container_id, a_openai_file_id, a_filename, user.id, model_name
+                                            )
+                                            if internal_id:
+                                                our_url = f"/api/v1/files/{internal_id}/content/{a_filename}"
+                                                replaced_content = replaced_content.replace(
+                                                    f"(sandbox:/mnt/data/{a_filename})",
+                                                    f"({our_url})",
                                                 )
-                                                if internal_id:
-                                                    our_url = f"/api/v1/files/{internal_id}/content/{a_filename}"
-                                                    replaced_content = replaced_content.replace(
-                                                        f"(sandbox:/mnt/data/{a_filename})",
-                                                        f"({our_url})",
-                                                    )
-                                                    file_refs.append({
-                                                        "file_id": internal_id,
-                                                        "filename": a_filename,
-                                                        "url": our_url,
-                                                    })
-                                                else:
-                                                    fallback_url = f"/openai/container-files/{a_container_id}/{a_openai_file_id}?filename={a_filename}"
-                                                    replaced_content = replaced_content.replace(
-                                                        f"(sandbox:/mnt/data/{a_filename})",
-                                                        f"({fallback_url})",
-                                                    )
-                                                    file_refs.append({
-                                                        "container_id": a_container_id,
-                                                        "file_id": a_openai_file_id,
-                                                        "filename": a_filename,
-                                                    })
-                                            yield f"data: {json.dumps({'file_refs': file_refs, 'content_replacement': replaced_content})}\n\n".encode()
-                                        stop_chunk = {
-                                            "id": response_id,
-                                            "object": "chat.completion.chunk",
-                                            "created": int(time.time()),
-                                            "model": model_name,
-                                            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
-                                            **usage_openai_format,
-                                        }
-                                        yield f"data: {json.dumps(stop_chunk)}\n\n".encode()
-                                        yield b"data: [DONE]\n\n"
-                                        return
-                                except json.JSONDecodeError as e:
-                                    log.warning(f"RESPONSES API JSON decode error: {e} for: {data_str!r}")
-                            elif line == "":
-                                event_type = None
-
-                return StreamingResponse(
+                                                file_refs.append({
+                                                    "file_id": internal_id,
+                                                    "filename": a_filename,
+                                                    "url": our_url,
+                                                })
+                                            else:
+                                                fallback_url = f"/openai/container-files/{a_container_id}/{a_openai_file_id}?filename={a_filename}"
+                                                replaced_content = replaced_content.replace(
+                                                    f"(sandbox:/mnt/data/{a_filename})",
+                                                    f"({fallback_url})",
+                                                )
+                                                file_refs.append({
+                                                    "container_id": a_container_id,
+                                                    "file_id": a_openai_file_id,
+                                                    "filename": a_filename,
+                                                })
+                                        yield FileRefsEvent(file_refs, replaced_content)
+                                    yield UsageEvent(usage_openai_format["usage"])
+                                    return
+                            except orjson.JSONDecodeError as e:
+                                log.warning(f"RESPONSES API JSON decode error: {e} for: {data_str!r}")
+                        elif line == b"":
+                            event_type = None
+
+                return EventStreamResponse(
                     responses_api_stream(),
+                    response_id=f"chatcmpl-responses-{int(time.time())}",
+                    model=model_name,
                     status_code=r.status,
                     headers=dict(r.headers),
                     background=BackgroundTask(cleanup_response, response=r),
@@ -893,10 +860,10 @@ async def generate_chat_completion(
 
             async def insert_completion_if_streaming_is_done():
                 async for chunk in r.content:
-                    chunk_str = chunk.decode()
-                    if chunk_str.startswith('data: '):
+                    # Usage arrives with the last chunk; skip parsing chunks that cannot carry it.
+                    if chunk.startswith(b'data: ') and b'"usage"' in chunk:
                         try:
-                            data = json.loads(chunk_str[6:])
+                            data = orjson.loads(chunk[6:])
                             if data.get('usage'):
                                 # End of stream
                                 # Add completion to completion table if it's a chat message from the user
@@ -906,8 +873,8 @@ async def generate_chat_completion(
                                     agent_or_task_prompt=agent_or_task_prompt,
                                     subscription=subscription,
                                 )
-                        except json.JSONDecodeError:
-                            log.debug(f"JSON decode error for chunk: {chunk_str}")
+                        except orjson.JSONDecodeError:
+                            log.debug(f"JSON decode error for chunk: {chunk!r}")
 
                     yield chunk
 
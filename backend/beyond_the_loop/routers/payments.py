@@ -14,6 +14,7 @@ from open_webui.env import REDIS_URL
 from open_webui.utils.auth import get_verified_user
 from beyond_the_loop.services.payments_service import payments_service, is_flat_rate_plan
 from beyond_the_loop.services.crm_service import crm_service
+from beyond_the_loop.services.entitlement_service import entitlement_service
 from beyond_the_loop.socket.main import STRIPE_COMPANY_ACTIVE_SUBSCRIPTION_CACHE, STRIPE_COMPANY_TRIAL_SUBSCRIPTION_CACHE
 
 # Idempotency window for flex-credit invoice webhooks. Long enough to cover
@@ -140,19 +141,23 @@ async def checkout_webhook(request: Request, stripe_signature: str = Header(None
             del STRIPE_COMPANY_TRIAL_SUBSCRIPTION_CACHE[company.id]
 
 
-        if event_type == "customer.subscription.created":
-            handle_subscription_created(event_data)
-            return None
-        elif event_type == "customer.subscription.updated":
-            handle_subscription_updated(event_data, previous_attributes)
-            return None
-        elif event_type == "invoice.payment_succeeded":
-            handle_invoice_payment_succeeded(event_data)
-            return None
-        elif event_type == "customer.subscription.deleted":
-            handle_subscription_deleted(event_data)
-        else:
-            log.warning(f"Unhandled Stripe event type: {event_type}")
+        try:
+            if event_type == "customer.subscription.created":
+                handle_subscription_created(event_data)
+                return None
+            elif event_type == "customer.subscription.updated":
+                handle_subscription_updated(event_data, previous_attributes)
+                return None
+            elif event_type == "invoice.payment_succeeded":
+                handle_invoice_payment_succeeded(event_data)
+                return None
+            elif event_type == "customer.subscription.deleted":
+                handle_subscription_deleted(event_data)
+            else:
+                log.warning(f"Unhandled Stripe event type: {event_type}")
+        finally:
+            # After the handlers, which may have changed plan or credits.
+            entitlement_service.invalidate(company.id)
 
         return {"message": "Webhook processed successfully"}
 
@@ -1,22 +1,31 @@
 """
-Pre-send PII analysis endpoint.
+Pre-send PII analysis endpoints.
 
-Stateless: does NOT touch the per-chat PIISession. Used by the frontend
-composer to live-highlight detected PII so the user can see what will be
-anonymized before sending. Users with `pii.allow_disable_in_chat` can also
+`/analyze` is stateless: does NOT touch the per-chat PIISession. Used by the
+frontend composer to live-highlight detected PII so the user can see what will
+be anonymized before sending. Users with `pii.allow_disable_in_chat` can also
 selectively release individual entities (Mode B); users without it just see
 the highlights — release/disable is gated in the UI and re-enforced when the
 chat request is processed.
+
+`/prefetch` speculatively analyzes the draft (prompt + attached files) of an
+existing chat in the background and only warms that chat's analyze cache —
+see beyond_the_loop.pii.prefetch.
 """
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import logging
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 
+from beyond_the_loop.models.chats import Chats
+from beyond_the_loop.models.files import Files
+from beyond_the_loop.pii.prefetch import get_draft_prefetcher
 from beyond_the_loop.pii.service import PrivacyFilterService
 from beyond_the_loop.pii.session import is_pii_filter_enabled
 from open_webui.utils.auth import get_verified_user
@@ -42,17 +51,33 @@ class PIIAnalyzeResponse(BaseModel):
     spans: List[PIISpan]
 
 
-@router.post("/analyze", response_model=PIIAnalyzeResponse)
-async def analyze(
-    form_data: PIIAnalyzeRequest,
-    user=Depends(get_verified_user),
-):
+class PIIPrefetchRequest(BaseModel):
+    chat_id: str
+    text: str = Field(default="")
+    file_ids: List[str] = Field(default_factory=list)
+
+
+class PIIPrefetchResponse(BaseModel):
+    # "scheduled", "duplicate" (same draft already analyzed / in flight) or
+    # "skipped" (nothing to analyze)
+    status: str
+
+
+def _require_pii_filter(user) -> None:
     if not is_pii_filter_enabled(user.company_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="PII filter is disabled for this company",
         )
 
+
+@router.post("/analyze", response_model=PIIAnalyzeResponse)
+async def analyze(
+    form_data: PIIAnalyzeRequest,
+    user=Depends(get_verified_user),
+):
+    _require_pii_filter(user)
+
     text = form_data.text or ""
     if not text.strip():
         return PIIAnalyzeResponse(spans=[])
@@ -76,3 +101,53 @@ async def analyze(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="PII analysis failed",
         )
+
+
+def _draft_texts(user_id: str, text: str, file_ids: List[str]) -> List[str]:
+    """The texts process_chat_payload will run NER on for this draft: the
+    prompt and the extracted content of each attached (non-image) file."""
+    from open_webui.utils.middleware import extract_file_content_with_loader
+
+    texts = [text]
+    for file_id in file_ids:
+        file_record = Files.get_file_by_id(file_id)
+        if file_record is None or file_record.user_id != user_id:
+            continue
+        content_type = (file_record.meta or {}).get("content_type", "")
+        if content_type.startswith("image/"):
+            continue
+        texts.append(extract_file_content_with_loader(file_id))
+    return texts
+
+
+@router.post("/prefetch", response_model=PIIPrefetchResponse)
+async def prefetch(
+    form_data: PIIPrefetchRequest,
+    user=Depends(get_verified_user),
+):
+    _require_pii_filter(user)
+
+    text = form_data.text or ""
+    file_ids = list(dict.fromkeys(form_data.file_ids))
+    if not text.strip() and not file_ids:
+        return PIIPrefetchResponse(status="skipped")
+
+    # Runs on every debounced keystroke: a cheap check, off the event loop.
+    if not await asyncio.to_thread(
+        Chats.is_chat_owned_by_user_id, form_data.chat_id, user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found",
+        )
+
+    draft_key = hashlib.sha256(
+        json.dumps([text, file_ids]).encode("utf-8")
+    ).hexdigest()
+    return PIIPrefetchResponse(
+        status=get_draft_prefetcher().schedule(
+            form_data.chat_id,
+            draft_key,
+            lambda: _draft_texts(user.id, text, file_ids),
+        )
+    )
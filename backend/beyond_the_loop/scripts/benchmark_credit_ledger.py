@@ -0,0 +1,149 @@
+"""
+Benchmark: concurrent credit charges against one company.
+
+Background
+----------
+Every billed completion used to call ``Companies.subtract_credit_balance``,
+which loads the company row, adjusts the balances in Python and writes them
+back. Concurrent completions of one company therefore queue on that row's
+lock and, because nothing holds the row between the read and the write, can
+overwrite each other's subtraction. Charges are now appended to
+``credit_ledger`` (one INSERT, no shared row) and the settler applies them in
+batches with a single atomic UPDATE per company (``CreditLedger.settle_pending``).
+
+What this script does
+---------------------
+Creates a throw-away company, then for each mode runs ``--threads`` workers
+charging ``--charges`` times each:
+
+  * ``legacy`` — ``Companies.subtract_credit_balance`` per charge;
+  * ``ledger`` — ``CreditLedger.append`` per charge, followed by settling the
+    ledger (timed separately).
+
+It prints charges/sec and p50/p95/max latency per charge, and the credits
+that were charged but never left the balance (lost updates). The company and
+its ledger entries are deleted afterwards.
+
+Usage
+-----
+Against the DB configured via ``APP_DATABASE_URL``::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_credit_ledger
+
+More contention::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_credit_ledger \\
+        --threads 64 --charges 200
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+# Company's relationships resolve "Domain" by name — load its mapper.
+import beyond_the_loop.models.domains  # noqa: F401
+from beyond_the_loop.models.companies import Companies
+from beyond_the_loop.models.credit_ledger import CreditLedger
+from open_webui.internal.db import get_db
+
+START_BALANCE = 1_000_000.0
+CHARGE = 0.25
+
+
+def _create_company() -> str:
+    company_id = f"benchmark-{uuid.uuid4()}"
+    with get_db() as db:
+        db.execute(
+            text(
+                "INSERT INTO company (id, name, credit_balance, flex_credit_balance, "
+                "budget_mail_80_sent, budget_mail_100_sent) "
+                "VALUES (:id, 'Credit ledger benchmark', :balance, 0, false, false)"
+            ),
+            {"id": company_id, "balance": START_BALANCE},
+        )
+        db.commit()
+    return company_id
+
+
+def _reset_balance(company_id: str) -> None:
+    with get_db() as db:
+        db.execute(
+            text("UPDATE company SET credit_balance = :balance, flex_credit_balance = 0 WHERE id = :id"),
+            {"id": company_id, "balance": START_BALANCE},
+        )
+        db.commit()
+
+
+def _delete_company(company_id: str) -> None:
+    with get_db() as db:
+        db.execute(text("DELETE FROM credit_ledger WHERE company_id = :id"), {"id": company_id})
+        db.execute(text("DELETE FROM company WHERE id = :id"), {"id": company_id})
+        db.commit()
+
+
+def _run(threads: int, charges: int, charge_once) -> tuple[float, list[float]]:
+    def worker(_):
+        latencies = []
+        for _ in range(charges):
+            started = time.perf_counter()
+            charge_once()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = [latency for chunk in pool.map(worker, range(threads)) for latency in chunk]
+    return time.perf_counter() - started, latencies
+
+
+def _report(label: str, elapsed: float, latencies: list[float], company_id: str) -> None:
+    latencies.sort()
+    n = len(latencies)
+    p95 = latencies[int(n * 0.95) - 1]
+    charged = n * CHARGE
+    debited = START_BALANCE - Companies.get_base_credit_balance(company_id)
+    print(
+        f"  {label:<7} {n:>7} charges  {elapsed:7.2f}s  {n / elapsed:8.0f}/s  "
+        f"p50 {statistics.median(latencies) * 1000:6.1f}ms  p95 {p95 * 1000:6.1f}ms  "
+        f"max {latencies[-1] * 1000:7.1f}ms  lost {charged - debited:9.2f} of {charged:.2f} credits"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--charges", type=int, default=100, help="charges per thread")
+    parser.add_argument("--batch-size", type=int, default=5000, help="settle batch size")
+    args = parser.parse_args()
+
+    company_id = _create_company()
+    print(f"{args.threads} threads x {args.charges} charges of {CHARGE} credits, one company:")
+    try:
+        elapsed, latencies = _run(
+            args.threads, args.charges,
+            lambda: Companies.subtract_credit_balance(company_id, CHARGE),
+        )
+        _report("legacy", elapsed, latencies, company_id)
+
+        _reset_balance(company_id)
+        elapsed, latencies = _run(
+            args.threads, args.charges,
+            lambda: CreditLedger.append(company_id, None, CHARGE),
+        )
+        settle_started = time.perf_counter()
+        settled = 0
+        while batch := CreditLedger.settle_pending(args.batch_size):
+            settled += sum(s.events for s in batch)
+        settle_elapsed = time.perf_counter() - settle_started
+        _report("ledger", elapsed, latencies, company_id)
+        print(f"  settled {settled} entries in {settle_elapsed * 1000:.1f}ms")
+    finally:
+        _delete_company(company_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark: PDF text extraction, legacy loader vs. PDFLoader.
+
+Background
+----------
+``Loader`` used to open every PDF twice: pymupdf to check whether any page had
+text, then ``PyPDFLoader`` to extract it. PDFs without any text were
+rasterized completely at 300 DPI (``convert_from_path``) and OCR'd serially;
+PDFs with text on some pages were not OCR'd at all. ``PDFLoader`` reads the
+document once with pymupdf, streams its pages and OCRs image pages only, in
+a process pool (``beyond_the_loop.retrieval.loaders.pdf``).
+
+What this script does
+---------------------
+Generates fixture PDFs of ``--pages`` pages each (default 100 and 1000), with
+every ``--scanned-every``-th page a scanned image instead of text, and for each
+fixture and loader runs one extraction in a fresh process. It prints the wall
+time, pages/sec, the peak RSS of that process (OCR workers excluded) and how
+many pages came back with text.
+
+  * ``legacy`` — the previous code path (pymupdf scan + PyPDFLoader, or
+    convert_from_path + pytesseract for PDFs without any text);
+  * ``pdfloader`` — ``PDFLoader``.
+
+Scanned pages need ``tesseract`` on the PATH (the legacy OCR also pdf2image
+and ``pdftoppm``).
+
+Usage
+-----
+Text-only fixtures::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pdf_loader
+
+Every 10th page scanned, 4 OCR workers::
+
+    PDF_OCR_WORKERS=4 PYTHONPATH=backend backend/venv/bin/python \\
+        -m beyond_the_loop.scripts.benchmark_pdf_loader --scanned-every 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import pymupdf
+
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua. "
+)
+
+
+def _scan_of(text: str) -> pymupdf.Pixmap:
+    with pymupdf.open() as source:
+        page = source.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=11)
+        return page.get_pixmap(dpi=150)
+
+
+def make_fixture(path: str, pages: int, scanned_every: int) -> None:
+    scan = _scan_of(LOREM * 20) if scanned_every else None
+    with pymupdf.open() as pdf:
+        for number in range(pages):
+            page = pdf.new_page()
+            if scanned_every and number % scanned_every == scanned_every - 1:
+                page.insert_image(page.rect, pixmap=scan)
+            else:
+                page.insert_textbox(
+                    page.rect + (50, 50, -50, -50), f"Page {number + 1}. " + LOREM * 20, fontsize=11
+                )
+        pdf.save(path)
+
+
+def _legacy():
+    from langchain_community.document_loaders import PyPDFLoader
+
+    def extract(path: str) -> list:
+        with pymupdf.open(path) as pdf:
+            image_only = not any(page.get_text("text").strip() for page in pdf)
+
+        if not image_only:
+            return [doc.page_content for doc in PyPDFLoader(path).load()]
+
+        import pytesseract
+        from pdf2image import convert_from_path
+
+        return [
+            pytesseract.image_to_string(page, lang="eng")
+            for page in convert_from_path(path, dpi=300)
+        ]
+
+    return extract
+
+
+def _pdfloader():
+    from beyond_the_loop.retrieval.loaders.pdf import PDFLoader
+
+    def extract(path: str) -> list:
+        return [doc.page_content for doc in PDFLoader(path).lazy_load()]
+
+    return extract
+
+
+def _run(loader: str, path: str, results) -> None:
+    # Imports happen before the clock starts.
+    extract = {"legacy": _legacy, "pdfloader": _pdfloader}[loader]()
+    start = time.perf_counter()
+    texts = extract(path)
+    elapsed = time.perf_counter() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, peak_kib, len(texts), sum(1 for t in texts if t.strip())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--scanned-every", type=int, default=0)
+    parser.add_argument("--loaders", nargs="+", default=["legacy", "pdfloader"])
+    args = parser.parse_args()
+
+    if args.scanned_every and not shutil.which("tesseract"):
+        parser.error("--scanned-every needs tesseract on the PATH")
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.pages:
+            path = os.path.join(directory, f"fixture-{pages}.pdf")
+            make_fixture(path, pages, args.scanned_every)
+            size_mib = os.path.getsize(path) / 2**20
+            print(f"\n{pages} pages, every {args.scanned_every or '-'} scanned, {size_mib:.1f} MiB")
+
+            for loader in args.loaders:
+                results = context.Queue()
+                process = context.Process(target=_run, args=(loader, path, results))
+                process.start()
+                elapsed, peak_kib, total, with_text = results.get()
+                process.join()
+                print(
+                    f"  {loader:<10} {elapsed:7.2f}s  {total / elapsed:8.1f} pages/s  "
+                    f"peak RSS {peak_kib / 1024:7.1f} MiB  {with_text}/{total} pages with text"
+                )
+
+
+if __name__ == "__main__":
+    main()
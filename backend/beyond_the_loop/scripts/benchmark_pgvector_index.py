@@ -0,0 +1,231 @@
+"""
+Benchmark: recall and latency of pgvector ANN index settings.
+
+Background
+----------
+``document_chunk`` used to get an ivfflat index with a fixed ``lists = 100``
+whatever the table size, searched with the default ``ivfflat.probes = 1``.
+Every search is also filtered by ``collection_name``, which a global ANN index
+can only apply after the fact. The index is now configurable
+(``PGVECTOR_INDEX_TYPE``, ``PGVECTOR_IVFFLAT_LISTS``, ``PGVECTOR_HNSW_M``,
+``PGVECTOR_HNSW_EF_CONSTRUCTION``, per-collection partial indexes via
+``PGVECTOR_PARTIAL_INDEX_MIN_ROWS``) and ``ef_search`` / ``probes`` can be set
+per query. This script produces the numbers to pick those settings with.
+
+What this script does
+---------------------
+Builds a synthetic, clustered corpus in a scratch table
+(``document_chunk_index_bench``, dropped afterwards; ``document_chunk`` is not
+touched) spread over collections of skewed sizes. Exact top-k per query is
+computed in numpy. Then, for each index strategy, it builds the index, runs
+the same collection-filtered ``ORDER BY vector <=> q LIMIT k`` query that
+``PgvectorClient.search`` issues at several ``probes`` / ``ef_search`` values,
+and prints build time, index size, recall@k and p50/p95 latency.
+
+Usage
+-----
+Against the DB configured via ``PGVECTOR_DB_URL`` / ``APP_DATABASE_URL``::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pgvector_index
+
+Bigger corpus, real embedding size, only some strategies::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pgvector_index \\
+        --rows 500000 --dim 1536 --strategies ivfflat hnsw
+"""
+
+import argparse
+import io
+import struct
+import time
+
+import numpy as np
+
+from beyond_the_loop.retrieval.vector.dbs.pgvector import (
+    _COPY_BINARY_HEADER,
+    _COPY_BINARY_TRAILER,
+    _copy_binary_field,
+    PgvectorClient,
+    vector_index_ddl,
+)
+
+TABLE = "document_chunk_index_bench"
+
+STRATEGIES = {
+    "exact": None,
+    "ivfflat": ("ivfflat", [1, 5, 10, 20, 40]),
+    "hnsw": ("hnsw", [20, 40, 80, 160]),
+    "hnsw-partial": ("hnsw", [20, 40, 80, 160]),
+}
+
+
+def _make_corpus(args, rng: np.random.Generator):
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.clusters, size=args.rows)
+    vectors = centers[labels] + 0.4 * rng.normal(size=(args.rows, args.dim)).astype(
+        np.float32
+    )
+
+    # Zipf-like collection sizes: a few big knowledge bases, many small ones
+    weights = 1.0 / np.arange(1, args.collections + 1)
+    collections = rng.choice(args.collections, size=args.rows, p=weights / weights.sum())
+
+    query_collections = rng.choice(collections, size=args.queries)
+    queries = centers[rng.integers(0, args.clusters, size=args.queries)] + 0.4 * rng.normal(
+        size=(args.queries, args.dim)
+    ).astype(np.float32)
+    return vectors, collections, queries, query_collections
+
+
+def _exact_top_k(vectors, collections, queries, query_collections, k):
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    truth = []
+    for query, collection in zip(queries, query_collections):
+        members = np.flatnonzero(collections == collection)
+        scores = normed[members] @ (query / np.linalg.norm(query))
+        truth.append(set(members[np.argsort(-scores)[:k]].tolist()))
+    return truth
+
+
+def _load(cursor, vectors, collections, dim) -> None:
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(
+        f"CREATE UNLOGGED TABLE {TABLE} "
+        f"(id integer PRIMARY KEY, collection_name text NOT NULL, vector vector({dim}))"
+    )
+    buffer = io.BytesIO()
+    buffer.write(_COPY_BINARY_HEADER)
+    prefix = struct.pack(">hh", dim, 0)
+    for idx, (vector, collection) in enumerate(zip(vectors, collections)):
+        buffer.write(struct.pack(">h", 3))
+        buffer.write(_copy_binary_field(struct.pack(">i", idx)))
+        buffer.write(_copy_binary_field(f"c{collection}".encode()))
+        buffer.write(_copy_binary_field(prefix + vector.astype(">f4").tobytes()))
+    buffer.write(_COPY_BINARY_TRAILER)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {TABLE} (id, collection_name, vector) FROM STDIN WITH (FORMAT binary)",
+        buffer,
+    )
+    cursor.execute(f"CREATE INDEX ON {TABLE} (collection_name)")
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def _build(cursor, strategy: str, collections) -> tuple[float, int]:
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname LIKE %s",
+        (TABLE, f"{TABLE}_ann%"),
+    )
+    for (index_name,) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX {index_name}")
+
+    started = time.perf_counter()
+    if strategy in ("ivfflat", "hnsw"):
+        cursor.execute(
+            vector_index_ddl(TABLE, f"{TABLE}_ann", strategy, row_count=len(collections))
+        )
+    elif strategy == "hnsw-partial":
+        names, counts = np.unique(collections, return_counts=True)
+        for name, count in zip(names, counts):
+            cursor.execute(
+                vector_index_ddl(
+                    TABLE,
+                    f"{TABLE}_ann_{name}",
+                    "hnsw",
+                    row_count=int(count),
+                    where=f"collection_name = 'c{name}'",
+                )
+            )
+    elapsed = time.perf_counter() - started
+
+    cursor.execute(
+        "SELECT coalesce(sum(pg_relation_size(indexrelid)), 0) FROM pg_index "
+        "WHERE indrelid = %s::regclass "
+        "AND indexrelid::regclass::text LIKE %s",
+        (TABLE, f"{TABLE}_ann%"),
+    )
+    return elapsed, cursor.fetchone()[0]
+
+
+def _run_queries(cursor, queries, query_collections, truth, k, ef_search, probes):
+    latencies = []
+    recalls = []
+    for query, collection, expected in zip(queries, query_collections, truth):
+        literal = "[" + ",".join(map(str, query.tolist())) + "]"
+        started = time.perf_counter()
+        cursor.execute("BEGIN")
+        cursor.execute(
+            "SELECT set_config('hnsw.ef_search', %s, true), "
+            "set_config('ivfflat.probes', %s, true)",
+            (str(ef_search), str(probes)),
+        )
+        cursor.execute(
+            f"SELECT id FROM {TABLE} WHERE collection_name = %s "
+            "ORDER BY vector <=> %s::vector LIMIT %s",
+            (f"c{collection}", literal, k),
+        )
+        found = {row[0] for row in cursor.fetchall()}
+        cursor.execute("COMMIT")
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(found & expected) / max(1, min(k, len(expected))))
+    return float(np.mean(recalls)), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument(
+        "--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES)
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors, collections, queries, query_collections = _make_corpus(args, rng)
+    truth = _exact_top_k(vectors, collections, queries, query_collections, args.k)
+
+    client = PgvectorClient()
+    connection = client.session.get_bind().raw_connection()
+    connection.autocommit = True
+    cursor = connection.cursor()
+
+    try:
+        started = time.perf_counter()
+        _load(cursor, vectors, collections, args.dim)
+        print(
+            f"{args.rows} rows, dim {args.dim}, {args.collections} collections, "
+            f"loaded in {time.perf_counter() - started:.1f}s; "
+            f"{args.queries} queries, recall@{args.k}"
+        )
+        print(f"{'strategy':<14} {'param':>12} {'build s':>8} {'size MB':>8} "
+              f"{'recall':>7} {'p50 ms':>7} {'p95 ms':>7}")
+
+        for strategy in args.strategies:
+            build_seconds, size = _build(cursor, strategy, collections)
+            if STRATEGIES[strategy] is None:
+                settings = [("-", 40, 1)]
+            elif STRATEGIES[strategy][0] == "ivfflat":
+                settings = [(f"probes={p}", 40, p) for p in STRATEGIES[strategy][1]]
+            else:
+                settings = [(f"ef_search={e}", e, 1) for e in STRATEGIES[strategy][1]]
+
+            for label, ef_search, probes in settings:
+                recall, p50, p95 = _run_queries(
+                    cursor, queries, query_collections, truth, args.k, ef_search, probes
+                )
+                print(
+                    f"{strategy:<14} {label:>12} {build_seconds:8.1f} {size / 2**20:8.1f} "
+                    f"{recall:7.3f} {p50:7.2f} {p95:7.2f}"
+                )
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: write throughput of ``PgvectorClient.insert`` / ``upsert``.
+
+Background
+----------
+Re-indexing a large knowledge base used to cost one ``SELECT`` per chunk in
+``upsert`` and ORM-level object building in ``insert``. ``insert`` now loads
+through binary ``COPY`` (``PGVECTOR_INSERT_BATCH_SIZE`` rows per ``COPY``) and
+``upsert`` copies into a staging table and merges it with one
+``INSERT ... SELECT ... ON CONFLICT (id) DO UPDATE``. This script measures rows/sec for both paths (and, with
+``--legacy``, for the old per-row upsert loop) on synthetic chunks.
+
+What this script does
+---------------------
+For each requested size it writes N random chunks into a throw-away
+collection with ``insert``, then re-writes the same ids with ``upsert``
+(the re-index case), prints rows/sec and deletes the collection again.
+
+Usage
+-----
+Against the DB configured via ``PGVECTOR_DB_URL`` / ``APP_DATABASE_URL``::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pgvector_write
+
+Custom sizes, batch size and the legacy comparison (slow, keep N small)::
+
+    PGVECTOR_INSERT_BATCH_SIZE=1000 PYTHONPATH=backend backend/venv/bin/python \\
+        -m beyond_the_loop.scripts.benchmark_pgvector_write --sizes 10000 100000 1000000 --legacy
+"""
+
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from beyond_the_loop.retrieval.vector.dbs.pgvector import (
+    INSERT_BATCH_SIZE,
+    VECTOR_LENGTH,
+    DocumentChunk,
+    PgvectorClient,
+)
+
+
+def _make_items(n: int, dim: int, rng: np.random.Generator) -> list[dict]:
+    # float32 rows keep 100k x 1536 synthetic vectors at ~600 MB
+    vectors = rng.random((n, dim), dtype=np.float32)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "vector": vectors[i],
+            "text": f"Synthetic chunk {i} " + "lorem ipsum " * 40,
+            "metadata": {"file_id": "benchmark", "start_index": i * 500},
+        }
+        for i in range(n)
+    ]
+
+
+def _legacy_upsert(client: PgvectorClient, collection_name: str, items: list[dict]) -> None:
+    """The previous implementation: one SELECT plus ORM write per item."""
+    for item in items:
+        vector = client.adjust_vector_length(item["vector"].tolist())
+        existing = (
+            client.session.query(DocumentChunk)
+            .filter(DocumentChunk.id == item["id"])
+            .first()
+        )
+        if existing:
+            existing.vector = vector
+            existing.text = item["text"]
+            existing.vmetadata = item["metadata"]
+            existing.collection_name = collection_name
+        else:
+            client.session.add(
+                DocumentChunk(
+                    id=item["id"],
+                    vector=vector,
+                    collection_name=collection_name,
+                    text=item["text"],
+                    vmetadata=item["metadata"],
+                )
+            )
+    client.session.commit()
+
+
+def _timed(label: str, n: int, fn) -> None:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<8} {n:>9} rows  {elapsed:8.2f}s  {n / elapsed:10.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=VECTOR_LENGTH)
+    parser.add_argument("--legacy", action="store_true", help="also time the old per-row upsert")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = PgvectorClient()
+    rng = np.random.default_rng(args.seed)
+    print(f"batch size {INSERT_BATCH_SIZE}, dim {args.dim}")
+
+    for n in args.sizes:
+        collection_name = f"benchmark-{uuid.uuid4()}"
+        items = _make_items(n, args.dim, rng)
+        print(f"{n} chunks:")
+        try:
+            _timed("insert", n, lambda: client.insert(collection_name, items))
+            _timed("upsert", n, lambda: client.upsert(collection_name, items))
+            if args.legacy:
+                _timed("legacy", n, lambda: _legacy_upsert(client, collection_name, items))
+        finally:
+            client.delete_collection(collection_name)
+
+
+if __name__ == "__main__":
+    main()
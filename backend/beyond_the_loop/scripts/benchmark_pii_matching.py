@@ -0,0 +1,167 @@
+"""
+Benchmark: PII sweep / deanonymization cost versus number of known entities.
+
+Background
+----------
+``PIISession._sweep_known`` used to build an alternation regex over every
+known original on each ``anonymize`` / ``replace_known`` call, and
+``deanonymize``, ``StreamingDeanonymizer`` and ``calculate_shifted_index``
+scanned the text once per placeholder. Chats with hundreds of entities paid
+O(entities x text) per message and per streamed chunk. These paths now use
+``beyond_the_loop.pii.matcher``: an Aho-Corasick automaton over the originals
+and a single placeholder token regex.
+
+What this script does
+---------------------
+For 10, 100 and 1000 synthetic entities it builds a ~4k character message
+that mentions a sample of them, then times the previous implementations
+(reproduced below) against the current ``PIISession`` methods:
+
+* ``sweep``      — replace known originals (``replace_known``)
+* ``deanon``     — replace placeholders with originals (``deanonymize``)
+* ``stream``     — ``StreamingDeanonymizer`` over 20-character chunks
+* ``shift``      — ``calculate_shifted_index`` at the end of the text
+
+No network or database is used.
+
+Usage
+-----
+::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pii_matching
+
+Other entity counts / text size::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.benchmark_pii_matching \\
+        --entities 10 100 1000 5000 --chars 20000
+"""
+
+import argparse
+import random
+import re
+import time
+
+from beyond_the_loop.pii.session import InMemoryPIIStorage, PIISession
+from beyond_the_loop.pii.streaming import StreamingDeanonymizer
+
+_FIRST = ["Anna", "Max", "Jonas", "Lea", "Paul", "Mia", "Felix", "Emma", "Noah", "Lina"]
+_LAST = ["Müller", "Schmidt", "Weber", "Fischer", "Wagner", "Becker", "Hoffmann", "Koch"]
+_FILLER = "Bitte prüfe den Vertrag und melde dich bis Freitag bei".split()
+
+
+def _legacy_sweep(text, forward):
+    originals = sorted((o for o in forward if o), key=len, reverse=True)
+    pattern = re.compile(
+        r"(?<!\w)(?:" + "|".join(re.escape(o) for o in originals) + r")(?!\w)"
+    )
+    return pattern.sub(lambda m: forward[m.group(0)], text)
+
+
+def _legacy_deanonymize(text, reverse):
+    for placeholder in sorted(reverse, key=len, reverse=True):
+        text = text.replace(placeholder, reverse[placeholder])
+    return text
+
+
+def _legacy_stream(chunks, reverse):
+    placeholders = sorted(reverse, key=len, reverse=True)
+    deanonymizer = StreamingDeanonymizer(reverse)
+    out = []
+    for chunk in chunks + [None]:
+        if chunk is None:
+            safe, deanonymizer.buffer = deanonymizer.buffer, ""
+        else:
+            deanonymizer.buffer += chunk
+            safe, deanonymizer.buffer = deanonymizer._safe_split(deanonymizer.buffer)
+        for placeholder in placeholders:
+            if placeholder in safe:
+                safe = safe.replace(placeholder, reverse[placeholder])
+        out.append(safe)
+    return "".join(out)
+
+
+def _legacy_shift(forward, text, end):
+    shift = 0
+    for original, placeholder in forward.items():
+        delta = len(original) - len(placeholder)
+        search_from = 0
+        while delta:
+            idx = text.find(placeholder, search_from)
+            if idx == -1 or idx >= end:
+                break
+            shift += delta
+            search_from = idx + len(placeholder)
+    return end + shift
+
+
+def _stream(chunks, reverse):
+    deanonymizer = StreamingDeanonymizer(reverse)
+    return "".join(deanonymizer.feed(chunk) for chunk in chunks) + deanonymizer.flush()
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def _session(entities: int, rng: random.Random) -> PIISession:
+    session = PIISession("benchmark", storage=InMemoryPIIStorage(), service=object())
+    for i in range(entities):
+        name = f"{rng.choice(_FIRST)} {rng.choice(_LAST)}-{i}"
+        session._get_or_create_placeholder("private_person", name)
+    return session
+
+
+def _message(originals, chars: int, rng: random.Random) -> str:
+    words = []
+    size = 0
+    while size < chars:
+        word = rng.choice(originals) if rng.random() < 0.1 else rng.choice(_FILLER)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entities", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'entities':>8} {'op':<7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8}")
+    for entities in args.entities:
+        rng = random.Random(args.seed)
+        session = _session(entities, rng)
+        text = _message(list(session.forward), args.chars, rng)
+        anonymized = session.replace_known(text)[0]
+        chunks = [anonymized[i : i + 20] for i in range(0, len(anonymized), 20)]
+        end = len(anonymized)
+
+        cases = [
+            ("sweep", lambda: _legacy_sweep(text, session.forward),
+             lambda: session.replace_known(text)[0]),
+            ("deanon", lambda: _legacy_deanonymize(anonymized, session.reverse),
+             lambda: session.deanonymize(anonymized)),
+            ("stream", lambda: _legacy_stream(chunks, session.reverse),
+             lambda: _stream(chunks, session.reverse)),
+            ("shift", lambda: _legacy_shift(session.forward, anonymized, end),
+             lambda: session.calculate_shifted_index(anonymized, end)),
+        ]
+        for name, legacy, current in cases:
+            legacy_ms, expected = _time(legacy, args.repeat)
+            current_ms, result = _time(current, args.repeat)
+            assert result == expected, f"{name}: results differ"
+            print(
+                f"{entities:>8} {name:<7} {legacy_ms:10.3f} {current_ms:8.3f} "
+                f"{legacy_ms / current_ms:7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
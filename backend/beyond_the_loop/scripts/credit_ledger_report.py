@@ -0,0 +1,78 @@
+"""
+Reconciliation report for the credit ledger.
+
+Background
+----------
+Credit usage is appended to ``credit_ledger`` on the request path and applied
+to ``company.credit_balance`` / ``flex_credit_balance`` by the settler in
+the app process (``CreditLedgerSettler``). Every entry is settled exactly
+once; an entry that stays pending means the settler is not running or keeps
+failing, and its credits have not been taken from the balance yet.
+
+What this script does
+---------------------
+Prints, per company, the entries and credits charged since ``--hours`` ago,
+how much of that has been settled, what is still pending and how old the
+oldest pending entry is. Companies whose oldest pending entry is older than
+``--stale-seconds`` are flagged; the exit status is 1 if any are, so the
+script can back a cron check.
+
+Usage
+-----
+Last 24 hours, all companies::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.credit_ledger_report
+
+One company over the last week::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.credit_ledger_report \\
+        --hours 168 --company-id <company-id>
+"""
+
+import argparse
+import sys
+import time
+
+from beyond_the_loop.models.credit_ledger import CreditLedger
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--company-id", default=None)
+    parser.add_argument(
+        "--stale-seconds", type=int, default=300,
+        help="flag companies with entries pending for longer than this",
+    )
+    args = parser.parse_args()
+
+    now = int(time.time())
+    rows = CreditLedger.get_reconciliation_report(now - int(args.hours * 3600), args.company_id)
+
+    print(
+        f"{'company':<38} {'events':>8} {'charged':>12} {'settled':>12} "
+        f"{'pending':>8} {'pending cr':>12} {'oldest pending':>15}"
+    )
+    stale = 0
+    for row in rows:
+        age = now - row.oldest_pending_at if row.oldest_pending_at is not None else None
+        flag = ""
+        if age is not None and age > args.stale_seconds:
+            flag = "  STALE"
+            stale += 1
+        print(
+            f"{row.company_id:<38} {row.events:>8} {row.amount:>12.2f} {row.settled_amount:>12.2f} "
+            f"{row.pending_events:>8} {row.pending_amount:>12.2f} "
+            f"{(f'{age}s' if age is not None else '-'):>15}{flag}"
+        )
+
+    print(
+        f"\n{len(rows)} companies, {sum(r.events for r in rows)} entries, "
+        f"{sum(r.amount for r in rows):.2f} credits charged, "
+        f"{sum(r.pending_amount for r in rows):.2f} pending, {stale} stale"
+    )
+    sys.exit(1 if stale else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Rebuild the pgvector ANN index on ``document_chunk``.
+
+Background
+----------
+``PgvectorClient`` only creates ``idx_document_chunk_vector`` when it is
+missing and never rebuilds it at startup, since that can take minutes on a
+large table. Switching ``PGVECTOR_INDEX_TYPE``, resizing an ivfflat index after
+the table has grown (``PGVECTOR_IVFFLAT_LISTS=auto`` sizes lists from the row
+count at build time, and waits for ``PGVECTOR_IVFFLAT_MIN_ROWS`` rows before
+building one at all) or adding per-collection partial indexes is therefore an
+explicit step, done with this script.
+
+What this script does
+---------------------
+Builds the new global index CONCURRENTLY under a temporary name and swaps it
+in, so ingestion keeps working meanwhile. With ``--partial-min-rows`` it also
+builds a partial index for every collection with at least that many chunks.
+Use ``beyond_the_loop.scripts.benchmark_pgvector_index`` to choose settings.
+
+Usage
+-----
+Rebuild with the configured settings::
+
+    PGVECTOR_INDEX_TYPE=hnsw PYTHONPATH=backend backend/venv/bin/python \\
+        -m beyond_the_loop.scripts.rebuild_pgvector_index
+
+Only add partial indexes for collections with 50k+ chunks::
+
+    PYTHONPATH=backend backend/venv/bin/python -m beyond_the_loop.scripts.rebuild_pgvector_index \\
+        --skip-global --partial-min-rows 50000
+"""
+
+import argparse
+
+from beyond_the_loop.retrieval.vector.dbs.pgvector import (
+    PARTIAL_INDEX_MIN_ROWS,
+    VECTOR_INDEX_TYPE,
+    PgvectorClient,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--type", choices=["ivfflat", "hnsw", "none"], default=VECTOR_INDEX_TYPE
+    )
+    parser.add_argument("--skip-global", action="store_true")
+    parser.add_argument("--partial-min-rows", type=int, default=PARTIAL_INDEX_MIN_ROWS)
+    args = parser.parse_args()
+
+    client = PgvectorClient()
+    if not args.skip_global:
+        if client.rebuild_vector_index(args.type):
+            print(f"Rebuilt global index as {args.type}.")
+        else:
+            print("Global index left as is: too few rows for an auto-sized ivfflat index.")
+
+    indexed = client.ensure_collection_indexes(args.partial_min_rows)
+    for collection_name in indexed:
+        print(f"Built partial index for collection {collection_name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+CreditLedgerSettler — applies the credit ledger to company balances.
+
+Why: every billed completion (chat, STT, TTS) used to run
+`Companies.subtract_credit_balance`, a read-modify-write of the company row,
+followed by the threshold checks. Concurrent completions of one company
+serialized on that row lock, and each of them re-ran the 80% / auto-recharge
+logic against a balance that was about to change again.
+
+Completions now only append to `credit_ledger`. Every
+CREDIT_LEDGER_SETTLE_INTERVAL seconds the settler claims up to
+CREDIT_LEDGER_SETTLE_BATCH_SIZE pending entries, sums them per company and
+applies each sum in one UPDATE (`CreditLedger.settle_pending`). The low-balance
+handling — 80% mail, auto-recharge, entitlement invalidation — then runs once
+per settled company on the balance the UPDATE returned. Balances lag usage by
+at most one interval plus the settle time; on shutdown a final pass settles
+what is left.
+
+Usage:
+    credit_ledger_settler.start()
+    ...
+    await credit_ledger_settler.stop()
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from beyond_the_loop.models.credit_ledger import CreditLedger, CreditSettlement
+from open_webui.env import (
+    CREDIT_LEDGER_SETTLE_BATCH_SIZE,
+    CREDIT_LEDGER_SETTLE_INTERVAL,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS.get("MODELS", logging.INFO))
+
+Settle = Callable[[int], List[CreditSettlement]]
+ApplySettlement = Callable[[CreditSettlement], Awaitable[None]]
+
+
+async def _apply_settlement(settlement: CreditSettlement) -> None:
+    from beyond_the_loop.services.credit_service import credit_service
+
+    await credit_service.apply_settlement(settlement)
+
+
+class CreditLedgerSettler:
+    def __init__(
+        self,
+        settle: Optional[Settle] = None,
+        apply: Optional[ApplySettlement] = None,
+        interval: float = CREDIT_LEDGER_SETTLE_INTERVAL,
+        batch_size: int = CREDIT_LEDGER_SETTLE_BATCH_SIZE,
+    ) -> None:
+        self.settle = settle or CreditLedger.settle_pending
+        self.apply = apply or _apply_settlement
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._task: Optional[asyncio.Task] = None
+
+    async def settle_once(self) -> int:
+        """Settle everything pending, one batch at a time. Returns the number
+        of ledger entries settled."""
+        settled = 0
+        while True:
+            try:
+                settlements = await asyncio.to_thread(self.settle, self.batch_size)
+            except Exception:
+                log.exception("Failed to settle the credit ledger")
+                return settled
+
+            for settlement in settlements:
+                settled += settlement.events
+                try:
+                    await self.apply(settlement)
+                except Exception:
+                    log.exception(
+                        f"Low-balance handling failed for company {settlement.company_id}"
+                    )
+
+            # A short batch means the backlog is drained.
+            if sum(s.events for s in settlements) < self.batch_size:
+                return settled
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and settle what is still pending."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        await self.settle_once()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.settle_once()
+
+
+credit_ledger_settler = CreditLedgerSettler()
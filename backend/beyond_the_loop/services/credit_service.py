@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import stripe
@@ -9,10 +10,12 @@ from beyond_the_loop.models.users import UserModel
 from open_webui.env import SRC_LOG_LEVELS
 from beyond_the_loop.models.users import Users
 from beyond_the_loop.models.companies import Companies
+from beyond_the_loop.models.credit_ledger import CreditLedger, CreditSettlement
 from beyond_the_loop.services.email_service import EmailService
 from beyond_the_loop.config import LITELLM_MODEL_CONFIG, LITELLM_MODEL_MAP
 
-from beyond_the_loop.routers.payments import get_subscription
+from beyond_the_loop.services.entitlement_service import entitlement_service
+from beyond_the_loop.services.fair_model_usage_service import fair_model_usage_service
 from beyond_the_loop.services.payments_service import is_flat_rate_plan
 
 PROFIT_MARGIN_FACTOR = 1.25
@@ -27,9 +30,9 @@ class CreditService:
         """Initialize the CreditService."""
         pass
 
-    async def _subtract_credits_by_user_and_credits(self, user, credit_cost: float):
+    async def _subtract_credits_by_user_and_credits(self, user, credit_cost: float, kind: str = "chat"):
         """
-        Subtract credits from a company's balance and handle low balance scenarios.
+        Charge credits to a company by appending them to the credit ledger.
 
         Callers must pre-filter: this function assumes the user is on a credit-based
         plan. Flat-rate plans (free / premium / unlimited) must never reach here,
@@ -40,30 +43,54 @@ class CreditService:
           - public_api.py — check_public_api_access rejects free/premium, and
             callers wrap or pass subscription= so unlimited skips the call too
 
+        The balance itself is updated by `CreditLedgerSettler`, which also runs
+        the low-balance handling (`apply_settlement`) on the settled totals —
+        so concurrent completions of one company never wait on its row.
+
         Args:
             user: The user making the request
             credit_cost: The number of credits to subtract
+            kind: Usage kind recorded on the ledger entry ('chat', 'stt', 'tts')
 
         Returns:
             Total credit cost
         """
-        # Get current balance
-        current_base_credit_balance = Companies.get_base_credit_balance(user.company_id)
-        current_credit_balance = self.get_credit_balance(user.company_id)
+        await asyncio.to_thread(CreditLedger.append, user.company_id, user.id, credit_cost, kind)
+
+        return credit_cost
+
+    async def apply_settlement(self, settlement: CreditSettlement):
+        """
+        Low-balance handling for a company after the settler has applied a
+        batch of ledger entries: auto-recharge and the 80% mail when the base
+        balance is below 80% of the monthly allocation, and dropping the
+        cached entitlements once no credits are left.
+        """
+        company_id = settlement.company_id
+        current_base_credit_balance = settlement.credit_balance
+        current_credit_balance = settlement.credit_balance + (settlement.flex_credit_balance or 0)
+
+        if current_credit_balance <= 0:
+            # The preflight's "no credits left" check reads the cached snapshot.
+            entitlement_service.invalidate(company_id)
 
         # Get the dynamic credit limit based on subscription
-        eighty_percent_credit_limit = Companies.get_eighty_percent_credit_limit(user.company_id)
+        eighty_percent_credit_limit = Companies.get_eighty_percent_credit_limit(company_id)
 
         # Check 80% threshold
-        if current_base_credit_balance - credit_cost < eighty_percent_credit_limit:
+        if current_base_credit_balance < eighty_percent_credit_limit:
             should_send_budget_email_80 = True  # Default to sending email
 
-            company = Companies.get_company_by_id(user.company_id)
+            company = Companies.get_company_by_id(company_id)
+
+            # Recharge if base_credits + flex_credits < 80% of credit limit
+            if Companies.get_auto_recharge(company_id) and current_credit_balance < eighty_percent_credit_limit:
+                user = Users.get_user_by_id(settlement.user_id) if settlement.user_id else None
 
-            # Recharge if base_credits + flex_credits - credit_cost < 80% of credit limit
-            if Companies.get_auto_recharge(user.company_id) and current_credit_balance - credit_cost < eighty_percent_credit_limit:
                 if not company.stripe_customer_id:
-                    log.warning(f"Auto-recharge failed: No stripe customer ID for company {user.company_id}")
+                    log.warning(f"Auto-recharge failed: No stripe customer ID for company {company_id}")
+                elif user is None:
+                    log.warning(f"Auto-recharge failed: No user to recharge on behalf of for company {company_id}")
                 else:
                     try:
                         payment_methods = stripe.PaymentMethod.list(
@@ -71,12 +98,12 @@ class CreditService:
                             type="card"
                         )
                     except Exception as e:
-                        log.error(f"Error listing payment methods for company {user.company_id}: {e}")
+                        log.error(f"Error listing payment methods for company {company_id}: {e}")
                         payment_methods = None
 
                     if not payment_methods or len(payment_methods.data) == 0:
                         log.warning(
-                            f"Auto-recharge failed: No payment methods found for company {user.company_id}")
+                            f"Auto-recharge failed: No payment methods found for company {company_id}")
                     else:
                         try:
                             await self.recharge_flex_credits(user)
@@ -85,7 +112,7 @@ class CreditService:
                         except HTTPException as e:
                             # A 400 out of recharge_flex_credits is a card decline
                             # (see payments.py: stripe.error.CardError → 400).
-                            # Retrying it on every subsequent completion spams
+                            # Retrying it on every subsequent settlement spams
                             # Stripe with dozens of invoice-pay attempts within
                             # minutes; Stripe Radar then starts blocking them
                             # and the customer's Radar score suffers. Disable
@@ -93,10 +120,10 @@ class CreditService:
                             # they can fix the payment method before re-enabling.
                             if e.status_code == 400:
                                 log.error(
-                                    f"Auto-recharge card declined for company {user.company_id}; "
+                                    f"Auto-recharge card declined for company {company_id}; "
                                     f"disabling auto_recharge and notifying admins: {e.detail}"
                                 )
-                                Companies.update_auto_recharge(user.company_id, False)
+                                Companies.update_auto_recharge(company_id, False)
                                 admins = Users.get_admin_users_by_company(company.id)
                                 for admin in admins:
                                     EmailService().send_auto_recharge_disabled_mail(
@@ -106,9 +133,9 @@ class CreditService:
                                         billing_page_link=os.getenv("FRONTEND_BASE_URL") + "?modal=company-settings&tab=billing",
                                     )
                             else:
-                                log.error(f"Auto-recharge failed for company {user.company_id}: {e.detail}")
+                                log.error(f"Auto-recharge failed for company {company_id}: {e.detail}")
                         except Exception as e:
-                            log.error(f"Unexpected error during auto-recharge for company {user.company_id}: {e}")
+                            log.error(f"Unexpected error during auto-recharge for company {company_id}: {e}")
 
             if should_send_budget_email_80 and not company.budget_mail_80_sent:
                 admins = Users.get_admin_users_by_company(company.id)
@@ -124,11 +151,6 @@ class CreditService:
 
                 Companies.update_company_by_id(company.id, {"budget_mail_80_sent": True})
 
-        # Subtract credits from balance
-        Companies.subtract_credit_balance(user.company_id, credit_cost)
-
-        return credit_cost
-
     async def record_stt_usage(self, user, response, subscription: dict | None = None):
         """Compute the STT cost, conditionally subtract it, and always insert a
         Completion row.
@@ -168,7 +190,7 @@ class CreditService:
         cost = cost_usd * PROFIT_MARGIN_FACTOR * EUR_PER_DOLLAR
         flat_rate = subscription is not None and is_flat_rate_plan(subscription.get("plan"))
         if not flat_rate:
-            await self._subtract_credits_by_user_and_credits(user, cost)
+            await self._subtract_credits_by_user_and_credits(user, cost, kind='stt')
         Completions.insert_new_completion(user.id, litellm_model, cost, None, False, kind='stt')
 
     async def record_tts_usage(self, user, input_text: str, subscription: dict | None = None):
@@ -192,7 +214,7 @@ class CreditService:
         cost = cost_usd * PROFIT_MARGIN_FACTOR * EUR_PER_DOLLAR
         flat_rate = subscription is not None and is_flat_rate_plan(subscription.get("plan"))
         if not flat_rate:
-            await self._subtract_credits_by_user_and_credits(user, cost)
+            await self._subtract_credits_by_user_and_credits(user, cost, kind='tts')
         Completions.insert_new_completion(user.id, litellm_model, cost, None, False, kind='tts')
 
 
@@ -225,7 +247,7 @@ class CreditService:
 
         Returns the subscription dict so callers can branch on the plan (e.g.
         skip the credit-subtract call for flat-rate plans that came through)."""
-        subscription = get_subscription(user)
+        subscription = (await entitlement_service.aget(user.company_id)).subscription
         if subscription.get("plan") in {"free", "premium"}:
             raise HTTPException(
                 status_code=402,
@@ -236,11 +258,11 @@ class CreditService:
 
     @staticmethod
     async def check_for_subscription_and_sufficient_balance_and_seats(user):
-        # First check if the user has an active subscription in Stripe
-        company = Companies.get_company_by_id(user.company_id)
-
-        # Get the active subscription to check seat limits
-        subscription_details = get_subscription(user)
+        # Company row and subscription (seats, Stripe status) from one cached
+        # snapshot instead of two company loads and a subscription rebuild.
+        entitlements = await entitlement_service.aget(user.company_id)
+        company = entitlements.company
+        subscription_details = entitlements.subscription
 
         if not is_flat_rate_plan(subscription_details.get("plan")):
             # Get current seat count and limit
@@ -276,6 +298,7 @@ class CreditService:
                     )
 
                     Companies.update_company_by_id(user.company_id, {"budget_mail_100_sent": True})
+                    entitlement_service.invalidate(user.company_id)
 
                 raise HTTPException(
                     status_code=402,  # 402 Payment Required
@@ -311,7 +334,9 @@ class CreditService:
         else:
             credit_cost = await self.subtract_credit_cost_by_user_and_response(user, response)
 
-        Completions.insert_new_completion(user.id, model_name, credit_cost, assistant, agent_or_task_prompt)
+        completion = Completions.insert_new_completion(user.id, model_name, credit_cost, assistant, agent_or_task_prompt)
+        if completion:
+            fair_model_usage_service.record_completion(user.id, model_name, completion)
         return credit_cost
 
     @staticmethod
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from beyond_the_loop.models.companies import CompanyModel, Companies
+from beyond_the_loop.socket.main import ENTITLEMENT_CACHE
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    """Everything the completion preflight needs to know about a company:
+    its row (balances, Stripe customer, mail flags) and its subscription as
+    returned by `payments_service.get_subscription`.
+
+    Snapshots are shared between requests — do not mutate `subscription`."""
+
+    company: Optional[CompanyModel]
+    subscription: dict
+
+
+class EntitlementService:
+    """Per-company entitlement snapshots, cached in-process.
+
+    Before each completion the preflight used to load the company, rebuild
+    the subscription (company again, two Stripe lists, a user COUNT) and then
+    do it all once more for the balance/seat check. One snapshot now serves
+    both, from memory, until it expires (ENTITLEMENT_CACHE_TTL) or is
+    invalidated — by Stripe webhooks, credit recharges and credit
+    subtractions that exhaust the balance — in every process.
+    """
+
+    def get(self, company_id: str) -> Entitlements:
+        return ENTITLEMENT_CACHE.get_or_load(company_id, lambda: self._load(company_id))
+
+    async def aget(self, company_id: str) -> Entitlements:
+        """`get` that keeps a cache miss (DB + Stripe) off the event loop."""
+        entitlements = ENTITLEMENT_CACHE.get(company_id)
+        if entitlements is not None:
+            return entitlements
+        return await asyncio.to_thread(self.get, company_id)
+
+    def invalidate(self, company_id: str) -> None:
+        ENTITLEMENT_CACHE.invalidate(company_id)
+
+    @staticmethod
+    def _load(company_id: str) -> Entitlements:
+        from beyond_the_loop.services.payments_service import payments_service
+
+        return Entitlements(
+            company=Companies.get_company_by_id(company_id),
+            subscription=payments_service.get_subscription(company_id),
+        )
+
+
+entitlement_service = EntitlementService()
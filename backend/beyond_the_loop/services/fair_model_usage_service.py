@@ -1,25 +1,132 @@
+import logging
+import time
+
+import redis
 from fastapi import HTTPException
 
 from beyond_the_loop.models.completions import Completions
 from beyond_the_loop.config import LITELLM_MODEL_CONFIG
+from open_webui.env import REDIS_URL
+
+log = logging.getLogger(__name__)
+
+FAIR_USAGE_WINDOW_SECONDS = 3 * 60 * 60
+
+
+class FairUsageCounter:
+    """Sliding-window count of a user's chat completions per model, in Redis.
+
+    Each (user, model) pair has a sorted set of completion ids scored by
+    creation time; counting trims members older than the window and takes
+    the cardinality. A set is seeded once from the `completion` table —
+    tracked by a marker key that lives for one window — so a Redis flush or
+    eviction costs one query instead of wrong limits. Completion ids as
+    members keep seeding and recording idempotent where they overlap.
+
+    When Redis is unreachable, counts fall back to the COUNT over
+    `completion` that used to run on every request.
+    """
+
+    def __init__(self, redis_url=REDIS_URL, client=None, window=FAIR_USAGE_WINDOW_SECONDS):
+        self.redis_url = redis_url
+        self.window = window
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+            )
+        return self._client
+
+    @staticmethod
+    def _keys(user_id: str, model_name: str) -> tuple[str, str]:
+        key = f"fair_usage:{user_id}:{model_name}"
+        return key, f"{key}:seeded"
+
+    def record(self, user_id: str, model_name: str, completion_id: str, created_at: int):
+        key, _ = self._keys(user_id, model_name)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zadd(key, {completion_id: created_at})
+            pipe.expire(key, self.window)
+            pipe.execute()
+        except Exception as e:
+            # The next seed after the marker expires picks the row up again.
+            log.warning(f"Could not record fair usage of {model_name} for user {user_id}: {e}")
+
+    def counts(self, user_id: str, model_names: list[str]) -> dict[str, int]:
+        """Returns {model_name: completions within the window}."""
+        if not model_names:
+            return {}
+
+        try:
+            window_start = int(time.time()) - self.window
+            counts = self._read(user_id, model_names, window_start)
+            unseeded = [name for name, count in counts.items() if count is None]
+            if unseeded:
+                self._seed(user_id, unseeded, window_start)
+                counts.update(self._read(user_id, unseeded, window_start))
+            return {name: count or 0 for name, count in counts.items()}
+        except Exception as e:
+            log.warning(f"Fair usage counters unavailable, counting in the DB: {e}")
+            return Completions.get_completions_count_last_three_hours_by_user_and_models(user_id, model_names)
+
+    def _read(self, user_id: str, model_names: list[str], window_start: int) -> dict:
+        pipe = self.client.pipeline(transaction=False)
+        for name in model_names:
+            key, marker = self._keys(user_id, name)
+            pipe.zremrangebyscore(key, "-inf", f"({window_start}")
+            pipe.zcard(key)
+            pipe.exists(marker)
+        results = pipe.execute()
+
+        counts = {}
+        for i, name in enumerate(model_names):
+            _, count, seeded = results[3 * i:3 * i + 3]
+            counts[name] = count if seeded else None
+        return counts
+
+    def _seed(self, user_id: str, model_names: list[str], window_start: int):
+        rows = Completions.get_recent_completions_by_user_and_models(user_id, model_names, window_start)
+        if rows is None:
+            raise RuntimeError("could not load recent completions")
+
+        pipe = self.client.pipeline(transaction=False)
+        for completion_id, model_name, created_at in rows:
+            pipe.zadd(self._keys(user_id, model_name)[0], {completion_id: created_at})
+        for name in model_names:
+            key, marker = self._keys(user_id, name)
+            pipe.expire(key, self.window)
+            pipe.set(marker, 1, ex=self.window)
+        pipe.execute()
 
 
 class FairModelUsageService:
-    def __init__(self):
-        pass
+    def __init__(self, counter: FairUsageCounter | None = None):
+        self.counter = counter or FairUsageCounter()
+
+    @staticmethod
+    def _limit_key(plan: str) -> str | None:
+        if plan == "free":
+            return "allowed_messages_per_three_hours_free"
+        if plan == "premium":
+            return "allowed_messages_per_three_hours_premium"
+        return None
 
     def get_fair_usage_limit_reached_models(self, user, model_names: list[str], plan: str) -> set[str]:
         """Returns a set of model names that have reached their fair usage limit.
-        Uses a single DB query for all models instead of one per model.
+        Counts all models in one Redis round trip.
         """
         if not model_names:
             return set()
 
-        if plan == "free":
-            limit_key = "allowed_messages_per_three_hours_free"
-        elif plan == "premium":
-            limit_key = "allowed_messages_per_three_hours_premium"
-        else:
+        limit_key = self._limit_key(plan)
+        if limit_key is None:
             return set()
 
         model_limits = {
@@ -31,7 +138,7 @@ class FairModelUsageService:
         if not models_with_limit:
             return set()
 
-        counts = Completions.get_completions_count_last_three_hours_by_user_and_models(user.id, models_with_limit)
+        counts = self.counter.counts(user.id, models_with_limit)
 
         return {
             name for name in models_with_limit
@@ -39,20 +146,17 @@ class FairModelUsageService:
         }
 
     def check_for_fair_model_usage(self, user, model_name: str, plan: str):
-        model_config = LITELLM_MODEL_CONFIG.get(model_name, {})
-
-        if plan == "free":
-            allowed_messages_per_three_hours = model_config.get("allowed_messages_per_three_hours_free")
-        elif plan == "premium":
-            allowed_messages_per_three_hours = model_config.get("allowed_messages_per_three_hours_premium")
-        else:
+        limit_key = self._limit_key(plan)
+        if limit_key is None:
             raise HTTPException(status_code=400, detail="Invalid plan.")
 
+        allowed_messages_per_three_hours = LITELLM_MODEL_CONFIG.get(model_name, {}).get(limit_key)
+
         # If no value -> no access to model
         if not allowed_messages_per_three_hours:
             raise HTTPException(status_code=400, detail="No access to model.")
 
-        messages_last_three_hours = Completions.get_completions_last_three_hours_by_user_and_model(user.id, model_name)
+        messages_last_three_hours = self.counter.counts(user.id, [model_name]).get(model_name, 0)
 
         if messages_last_three_hours >= allowed_messages_per_three_hours:
             raise HTTPException(
@@ -60,4 +164,8 @@ class FairModelUsageService:
                 detail=f"You have reached the maximum number ({allowed_messages_per_three_hours}) of messages per three hours. Please try again later or use a different model.",
             )
 
+    def record_completion(self, user_id: str, model_name: str, completion):
+        """Count a freshly inserted chat completion row towards the window."""
+        self.counter.record(user_id, model_name, completion.id, completion.created_at)
+
 fair_model_usage_service = FairModelUsageService()
@@ -0,0 +1,307 @@
+"""
+IngestionWorker — runs queued file and knowledge-base ingestion jobs.
+
+Why: `upload_file` and `add_files_to_knowledge_batch` ran `process_file` /
+`process_files_batch` (download, parse, split, embed, pgvector insert) inside
+the HTTP request. A large PDF held a request worker for minutes and the
+request timed out at the ingress while the work went on.
+
+With `?background=true` the endpoints only store the upload, queue an
+`ingestion_job` row and return it. Workers claim jobs with SKIP LOCKED
+(`IngestionJobs.claim_next`), so any number of them — INGESTION_WORKER_CONCURRENCY
+per app process, or a separate `python -m beyond_the_loop.services.ingestion_worker`
+deployment that scales with the queue instead of chat traffic — share one
+queue. Each job:
+
+- reports its stage (`report_ingestion_stage`, called from the ingestion
+  code) to the row and to the user's sockets as "ingestion-events";
+- sends a heartbeat while it runs; a job whose worker died is claimed again
+  once its heartbeat is INGESTION_JOB_STALE_SECONDS old;
+- is retried with exponential backoff until INGESTION_JOB_MAX_ATTEMPTS;
+- is queued at most once per idempotency key.
+
+Usage:
+    job = enqueue_ingestion_job(user.id, "file", {"file_id": id}, idempotency_key=key)
+    ...
+    ingestion_worker.start(app)
+    ...
+    await ingestion_worker.stop()
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from beyond_the_loop.models.ingestion_jobs import (
+    IngestionJobModel,
+    IngestionJobResponse,
+    IngestionJobs,
+)
+from open_webui.env import (
+    INGESTION_JOB_MAX_ATTEMPTS,
+    INGESTION_JOB_POLL_INTERVAL,
+    INGESTION_JOB_RETRY_DELAY,
+    INGESTION_JOB_STALE_SECONDS,
+    INGESTION_WORKER_CONCURRENCY,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS.get("RAG", logging.INFO))
+
+Handler = Callable[[Any, IngestionJobModel, Any], Optional[dict]]
+Emit = Callable[[str, str, dict], Awaitable[None]]
+
+INGESTION_EVENT = "ingestion-events"
+
+_stage_reporter: ContextVar[Optional[Callable[[str], None]]] = ContextVar(
+    "ingestion_stage_reporter", default=None
+)
+
+
+def report_ingestion_stage(stage: str) -> None:
+    """Record that the running ingestion job reached `stage`. A no-op outside
+    of a job (e.g. a synchronous upload)."""
+    reporter = _stage_reporter.get()
+    if reporter is None:
+        return
+    try:
+        reporter(stage)
+    except Exception as e:
+        log.warning(f"Could not report ingestion stage {stage}: {e}")
+
+
+def enqueue_ingestion_job(
+    user_id: str, kind: str, payload: dict, idempotency_key: Optional[str] = None
+) -> IngestionJobModel:
+    return IngestionJobs.enqueue(
+        user_id,
+        kind,
+        payload,
+        max_attempts=INGESTION_JOB_MAX_ATTEMPTS,
+        idempotency_key=idempotency_key,
+    )
+
+
+def job_response(job: IngestionJobModel) -> IngestionJobResponse:
+    return IngestionJobResponse(**job.model_dump())
+
+
+####################
+# Handlers
+####################
+
+
+def _run_file_job(app, job: IngestionJobModel, user) -> dict:
+    from fastapi import HTTPException
+
+    from beyond_the_loop.models.files import Files
+    from open_webui.constants import ERROR_MESSAGES
+    from open_webui.routers.retrieval import ProcessFileForm, process_file
+
+    file_id = job.payload["file_id"]
+    try:
+        process_file(SimpleNamespace(app=app), ProcessFileForm(file_id=file_id), user=user)
+    except HTTPException as e:
+        # The file's own collection already holds its vectors: an earlier
+        # attempt got past embedding before it died or failed.
+        if e.detail != ERROR_MESSAGES.DUPLICATE_CONTENT:
+            raise
+        Files.update_file_metadata_by_id(file_id, {"collection_name": f"file-{file_id}"})
+    return {"file_id": file_id}
+
+
+def _run_knowledge_files_job(app, job: IngestionJobModel, user) -> dict:
+    from beyond_the_loop.models.files import Files
+    from beyond_the_loop.routers.knowledge import process_files_into_knowledge
+
+    knowledge_id = job.payload["knowledge_id"]
+    files = Files.get_files_by_ids(job.payload["file_ids"])
+    # A retry must not embed the files an earlier attempt already added.
+    _, _, result = process_files_into_knowledge(
+        SimpleNamespace(app=app), knowledge_id, files, user, skip_embedded=job.attempts > 1
+    )
+
+    completed = [r.file_id for r in result.results if r.status == "completed"]
+    errors = [f"{err.file_id}: {err.error}" for err in result.errors]
+    if errors and not completed:
+        raise RuntimeError("; ".join(errors))
+    return {"knowledge_id": knowledge_id, "file_ids": completed, "errors": errors}
+
+
+HANDLERS: Dict[str, Handler] = {
+    "file": _run_file_job,
+    "knowledge_files": _run_knowledge_files_job,
+}
+
+
+def _get_user(user_id: str):
+    from beyond_the_loop.models.users import Users
+
+    return Users.get_user_by_id(user_id)
+
+
+async def _emit_to_user(user_id: str, event: str, data: dict) -> None:
+    from beyond_the_loop.socket.main import emit_to_user
+
+    await emit_to_user(user_id, event, data)
+
+
+####################
+# Worker
+####################
+
+
+class IngestionWorker:
+    def __init__(
+        self,
+        app=None,
+        handlers: Optional[Dict[str, Handler]] = None,
+        jobs=None,
+        get_user: Optional[Callable[[str], Any]] = None,
+        emit: Optional[Emit] = None,
+        concurrency: int = INGESTION_WORKER_CONCURRENCY,
+        poll_interval: float = INGESTION_JOB_POLL_INTERVAL,
+        retry_delay: int = INGESTION_JOB_RETRY_DELAY,
+        stale_after: int = INGESTION_JOB_STALE_SECONDS,
+        shutdown_timeout: float = 30,
+    ) -> None:
+        self.app = app
+        self.handlers = handlers or HANDLERS
+        self.jobs = jobs or IngestionJobs
+        self.get_user = get_user or _get_user
+        self.emit = emit or _emit_to_user
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.shutdown_timeout = shutdown_timeout
+
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    async def run_once(self) -> bool:
+        """Claim and run one job. Returns False when none was runnable."""
+        job = await asyncio.to_thread(self.jobs.claim_next, self.stale_after)
+        if job is None:
+            return False
+        await self._run_job(job)
+        return True
+
+    async def _run_job(self, job: IngestionJobModel) -> None:
+        loop = asyncio.get_running_loop()
+        await self._notify(job)
+
+        def report(stage: str) -> None:
+            # Called from the handler's thread.
+            self.jobs.update_stage(job.id, stage)
+            asyncio.run_coroutine_threadsafe(
+                self._notify(job.model_copy(update={"stage": stage})), loop
+            )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        token = _stage_reporter.set(report)
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"Unknown ingestion job kind {job.kind!r}")
+
+            user = await asyncio.to_thread(self.get_user, job.user_id)
+            if user is None:
+                raise ValueError(f"User {job.user_id} not found")
+
+            # to_thread copies the context, so the handler sees `report`.
+            result = await asyncio.to_thread(handler, self.app, job, user)
+            finished = await asyncio.to_thread(self.jobs.complete, job.id, result)
+        except Exception as e:
+            error = str(getattr(e, "detail", None) or e)
+            log.warning(
+                f"Ingestion job {job.id} ({job.kind}) failed on attempt "
+                f"{job.attempts}/{job.max_attempts}: {error}"
+            )
+            finished = await asyncio.to_thread(
+                self.jobs.fail,
+                job.id,
+                error,
+                self.retry_delay * 2 ** max(job.attempts - 1, 0),
+            )
+        finally:
+            _stage_reporter.reset(token)
+            heartbeat.cancel()
+
+        if finished is not None:
+            await self._notify(finished)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(max(self.stale_after / 3, 1))
+            try:
+                await asyncio.to_thread(self.jobs.heartbeat, job_id)
+            except Exception as e:
+                log.warning(f"Ingestion job {job_id} heartbeat failed: {e}")
+
+    async def _notify(self, job: IngestionJobModel) -> None:
+        try:
+            await self.emit(job.user_id, INGESTION_EVENT, job_response(job).model_dump())
+        except Exception as e:
+            log.warning(f"Could not send ingestion event for job {job.id}: {e}")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                log.exception("Failed to claim an ingestion job")
+                claimed = False
+
+            if not claimed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self, app=None) -> None:
+        if app is not None:
+            self.app = app
+        if self.concurrency <= 0 or any(not task.done() for task in self._tasks):
+            return
+
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and give running ones `shutdown_timeout` seconds
+        to finish. Jobs cut off are claimed again once their heartbeat is stale."""
+        self._stopping.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+
+ingestion_worker = IngestionWorker()
+
+
+async def _serve() -> None:
+    from open_webui.main import app
+
+    worker = IngestionWorker(app=app, concurrency=max(INGESTION_WORKER_CONCURRENCY, 1))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    log.info(f"Ingestion worker running {worker.concurrency} jobs at a time")
+    worker.start()
+    await stop.wait()
+    await worker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve())
@@ -12,6 +12,7 @@ log = logging.getLogger(__name__)
 from beyond_the_loop.models.companies import Companies
 from beyond_the_loop.models.users import Users
 from beyond_the_loop.services.crm_service import crm_service
+from beyond_the_loop.services.entitlement_service import entitlement_service
 import re
 
 from beyond_the_loop.socket.main import STRIPE_COMPANY_ACTIVE_SUBSCRIPTION_CACHE, \
@@ -281,6 +282,8 @@ class PaymentsService:
             if company_id in STRIPE_COMPANY_TRIAL_SUBSCRIPTION_CACHE:
                 del STRIPE_COMPANY_TRIAL_SUBSCRIPTION_CACHE[company_id]
 
+            entitlement_service.invalidate(company_id)
+
         except Exception as e:
             log.error(f"Failed to cancel subscription for company {company_id}: {e}")
 
@@ -469,6 +472,7 @@ class PaymentsService:
                     })
 
                     _advance_next_credit_recharge_by_one_month(company)
+                    entitlement_service.invalidate(company.id)
                 else:
                     Companies.update_company_by_id(company.id, {
                         "next_credit_charge_check": None
@@ -4,23 +4,33 @@ import logging
 import sys
 
 from beyond_the_loop.models.users import Users, UserNameResponse
-from open_webui.env import REDIS_URL
+from open_webui.env import (
+    COMPANY_CONFIG_CACHE_SIZE,
+    COMPANY_CONFIG_CACHE_TTL,
+    ENTITLEMENT_CACHE_SIZE,
+    ENTITLEMENT_CACHE_TTL,
+    REDIS_URL,
+)
 from open_webui.models.channels import Channels
 from beyond_the_loop.models.chats import Chats
 
 from open_webui.env import (
     ENABLE_WEBSOCKET_SUPPORT,
     WEBSOCKET_MANAGER,
+    WEBSOCKET_STATUS_FPS,
 )
 from open_webui.utils.auth import decode_token
 from beyond_the_loop.socket.utils import (
+    BroadcastTTLCache,
     RedisDict,
     SessionStore,
+    StatusCoalescer,
     UserSessionSet,
     InMemorySessionStore,
     InMemoryUserSessionSet,
 )
 from beyond_the_loop.observability.metrics import websocket_connections
+from beyond_the_loop.utils.status_history_buffer import get_status_history_buffer
 
 from open_webui.env import (
     GLOBAL_LOG_LEVEL,
@@ -53,6 +63,21 @@ else:
     )
 
 COMPANY_CONFIG_CACHE = RedisDict("company_config_cache", redis_url=REDIS_URL)
+# In front of COMPANY_CONFIG_CACHE: parsed configs held in this process.
+COMPANY_CONFIG_LOCAL_CACHE = BroadcastTTLCache(
+    "company_config_invalidations",
+    redis_url=REDIS_URL,
+    maxsize=COMPANY_CONFIG_CACHE_SIZE,
+    ttl=COMPANY_CONFIG_CACHE_TTL,
+)
+
+# Company row + subscription per company, for the completion preflight.
+ENTITLEMENT_CACHE = BroadcastTTLCache(
+    "entitlement_invalidations",
+    redis_url=REDIS_URL,
+    maxsize=ENTITLEMENT_CACHE_SIZE,
+    ttl=ENTITLEMENT_CACHE_TTL,
+)
 
 STRIPE_COMPANY_ACTIVE_SUBSCRIPTION_CACHE = RedisDict(":stripe_company_active_subscription_cache", redis_url=REDIS_URL)
 STRIPE_COMPANY_TRIAL_SUBSCRIPTION_CACHE = RedisDict(":stripe_company_trial_subscription_cache", redis_url=REDIS_URL)
@@ -79,6 +104,11 @@ app = socketio.ASGIApp(
 )
 
 
+def _user_room(user_id):
+    """Room every socket of `user_id` joins, so per-user events are one emit."""
+    return f"user:{user_id}"
+
+
 def _register_session(sid, user):
     """Store the session in SESSION_POOL / USER_POOL. Idempotent — SADD in
     UserSessionSet deduplicates automatically, so calling this from both
@@ -101,6 +131,7 @@ async def connect(sid, environ, auth):
     if not user:
         return
     await asyncio.to_thread(_register_session, sid, user)
+    await sio.enter_room(sid, _user_room(user.id))
     log.debug(f"user {user.id} connected with session ID {sid}")
 
 
@@ -124,6 +155,7 @@ async def user_join(sid, data):
     # decode issue) this is our safety net. SADD is idempotent, so this
     # no longer produces duplicates like the old list-append code did.
     await asyncio.to_thread(_register_session, sid, user)
+    await sio.enter_room(sid, _user_room(user.id))
 
     channels = await asyncio.to_thread(Channels.get_channels_by_user_id, user.id)
     log.debug(f"{channels=}")
@@ -202,32 +234,67 @@ async def disconnect(sid):
         log.debug(f"Unknown session ID {sid} disconnected")
 
 
+# One coalescer per (session, message), shared by every emitter of a request
+# (middleware, litellm router, tools each create their own), so the statuses
+# of a message go through one queue and one timer and arrive in order.
+# Entries drop out once idle.
+_status_coalescers = {}
+
+
+def _get_status_coalescer(key, emit):
+    frame_seconds = 1 / WEBSOCKET_STATUS_FPS if WEBSOCKET_STATUS_FPS > 0 else 0
+    if frame_seconds <= 0:
+        return StatusCoalescer(emit, 0)
+
+    coalescer = _status_coalescers.get(key)
+    if coalescer is None:
+
+        def _drop():
+            if _status_coalescers.get(key) is coalescer:
+                del _status_coalescers[key]
+
+        coalescer = StatusCoalescer(emit, frame_seconds, on_idle=_drop)
+        _status_coalescers[key] = coalescer
+    return coalescer
+
+
 def get_event_emitter(request_info):
-    async def __event_emitter__(event_data):
-        user_id = request_info["user_id"]
-        session_ids_from_pool = await asyncio.to_thread(USER_POOL.get_sids, user_id)
-        session_ids = list(
-            set(session_ids_from_pool + [request_info["session_id"]])
+    # All of the user's sockets are in their user room; the requesting sid is
+    # addressed as well in case its socket never authenticated. A list of
+    # rooms is one emit (one Redis publish with AsyncRedisManager), and a sid
+    # in several of them still gets the event once.
+    rooms = [_user_room(request_info["user_id"])]
+    if request_info.get("session_id"):
+        rooms.append(request_info["session_id"])
+
+    async def _emit(event_data):
+        await sio.emit(
+            "chat-events",
+            {
+                "chat_id": request_info["chat_id"],
+                "message_id": request_info["message_id"],
+                "data": event_data,
+            },
+            room=rooms,
         )
 
-        for session_id in session_ids:
-            await sio.emit(
-                "chat-events",
-                {
-                    "chat_id": request_info["chat_id"],
-                    "message_id": request_info["message_id"],
-                    "data": event_data,
-                },
-                to=session_id,
-            )
+    coalescer_key = (request_info.get("session_id"), request_info["message_id"])
+
+    async def __event_emitter__(event_data):
+        if event_data.get("type") == "status":
+            await _get_status_coalescer(coalescer_key, _emit).push(event_data)
+        else:
+            # Queued statuses first, so the client sees events in order.
+            statuses = _status_coalescers.get(coalescer_key)
+            if statuses is not None:
+                await statuses.flush()
+            await _emit(event_data)
 
         if "type" in event_data and event_data["type"] == "status":
-            await asyncio.to_thread(
-                Chats.add_message_status_to_chat_by_id_and_message_id,
-                request_info["chat_id"],
-                request_info["message_id"],
-                event_data.get("data", {}),
-            )
+            # Persisted in one write when the message completes.
+            get_status_history_buffer(
+                request_info["chat_id"], request_info["message_id"]
+            ).add(event_data.get("data", {}))
 
         if "type" in event_data and event_data["type"] == "message":
             message = await asyncio.to_thread(
@@ -294,6 +361,12 @@ def get_event_call(request_info):
 get_event_caller = get_event_call
 
 
+async def emit_to_user(user_id, event, data):
+    """Send `event` to every socket of `user_id`. With the Redis manager this
+    works from any process, including a worker that serves no sockets."""
+    await sio.emit(event, data, room=_user_room(user_id))
+
+
 def get_user_id_from_session_pool(sid):
     user = SESSION_POOL.get(sid)
     if user:
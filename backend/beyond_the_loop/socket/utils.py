@@ -1,7 +1,15 @@
+import asyncio
 import json
+import logging
+import threading
+import time
 import redis
 import uuid
 
+from cachetools import TTLCache
+
+log = logging.getLogger(__name__)
+
 
 class RedisLock:
     def __init__(self, redis_url, lock_name, timeout_secs):
@@ -97,6 +105,163 @@ class RedisDict:
         return self[key]
 
 
+_MISSING = object()
+
+
+class BroadcastTTLCache:
+    """Per-process TTL cache whose invalidations reach every process.
+
+    Reads are served from local memory and only call `load` on a miss.
+    `invalidate(key)` drops the entry here and publishes `key` on the Redis
+    channel `name`; a daemon listener thread in every other process drops it
+    there. Messages published while a process is disconnected are lost, so
+    the whole local cache is cleared whenever its listener (re)connects; in
+    between, `ttl` bounds how stale an entry can get.
+
+    Cached values are shared between callers — do not mutate them.
+    """
+
+    def __init__(self, name, redis_url, maxsize=1024, ttl=60):
+        self.name = name
+        self.redis = redis.Redis.from_url(
+            redis_url,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            health_check_interval=30,
+        )
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with one is not
+        # stored.
+        self._generation = 0
+        self._listener = None
+
+    def get_or_load(self, key, load):
+        self._ensure_listener()
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            generation = self._generation
+        if value is not _MISSING:
+            return value
+
+        value = load()
+        with self._lock:
+            if self._generation == generation:
+                self._cache[key] = value
+        return value
+
+    def get(self, key, default=None):
+        """The locally cached value for `key`, without loading on a miss."""
+        self._ensure_listener()
+        with self._lock:
+            return self._cache.get(key, default)
+
+    def invalidate(self, key):
+        self._drop(key)
+        try:
+            self.redis.publish(self.name, key)
+        except Exception as e:
+            log.warning(f"Could not broadcast invalidation of {key} on {self.name}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def _drop(self, key):
+        with self._lock:
+            self._generation += 1
+            self._cache.pop(key, None)
+
+    def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name=f"{self.name}-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        delay = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.name)
+                self.clear()
+                delay = 1.0
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._drop(message["data"])
+            except Exception as e:
+                log.warning(f"Invalidation listener for {self.name} disconnected: {e}")
+                self.clear()
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+class StatusCoalescer:
+    """Batches consecutive status events into at most one emit per frame.
+
+    `push` queues a status event and schedules a flush `frame_seconds` later;
+    `flush` sends whatever is queued right away — call it before emitting any
+    other event so the client still sees events in order. A lone status goes
+    out unchanged; several go out as one `status:batch` event whose
+    `data.statuses` lists their payloads in order. `on_idle` is called once
+    nothing is queued or scheduled any more.
+    """
+
+    def __init__(self, emit, frame_seconds, on_idle=None):
+        self.emit = emit
+        self.frame_seconds = frame_seconds
+        self.on_idle = on_idle
+        self._pending = []
+        self._timer = None
+
+    async def push(self, event_data):
+        if self.frame_seconds <= 0:
+            await self.emit(event_data)
+            return
+        self._pending.append(event_data)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        if len(batch) == 1:
+            await self.emit(batch[0])
+        else:
+            await self.emit(
+                {
+                    "type": "status:batch",
+                    "data": {"statuses": [event.get("data", {}) for event in batch]},
+                }
+            )
+        self._check_idle()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.frame_seconds)
+        self._timer = None
+        await self.flush()
+        self._check_idle()
+
+    def _check_idle(self):
+        if self.on_idle is not None and not self._pending and self._timer is None:
+            self.on_idle()
+
+
 # Session state used to live inside two big Redis hashes (RedisDict). That had
 # two problems: (1) hash fields cannot expire individually, so any sid that
 # never reached the disconnect handler (SIGKILL, node eviction, autopilot
@@ -0,0 +1,223 @@
+"""
+ObjectCache — local copies of object-store files, by object version.
+
+Why: `S3StorageProvider.get_file` / `GCSStorageProvider.get_file` downloaded
+the whole object to UPLOAD_DIR on every call — every file download, every
+chat-time extraction and re-processing paid a full transfer, UPLOAD_DIR grew
+without bound, and concurrent calls for one file wrote to the same path at
+the same time.
+
+Entries live under `<directory>/<hash of key>/<hash of version>/<file name>`,
+where the version is the object's ETag (S3) or generation (GCS), as the
+provider reports it on a cheap metadata request. A changed object therefore
+simply misses, and the entry of its previous version is removed. Writes go to
+a temp file that is renamed into place once complete, so readers never see a
+partial file; within a process, concurrent misses for one key download once
+(single-flight). The cache holds at most STORAGE_CACHE_MAX_BYTES; the least
+recently used entries are evicted first.
+
+Usage:
+    path = cache.lookup(key, etag)
+    path = cache.fetch(key, etag, lambda dest: client.download_file(bucket, key, dest))
+    for chunk in cache.tee(key, etag, chunks): ...  # stream and cache at once
+    cache.adopt(key, etag, staged_path)  # a file just uploaded, from temp_path()
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from beyond_the_loop.config import CACHE_DIR
+from open_webui.env import SRC_LOG_LEVELS, STORAGE_CACHE_MAX_BYTES
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS.get("MODELS", logging.INFO))
+
+
+# Object file names start with a file id, never with a dot.
+_TMP_PREFIX = ".tmp-"
+
+
+def _digest(value: str, length: int = 32) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:length]
+
+
+class ObjectCache:
+    def __init__(
+        self,
+        directory: str = os.path.join(CACHE_DIR, "storage"),
+        max_bytes: int = STORAGE_CACHE_MAX_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _key_dir(self, key: str) -> str:
+        return os.path.join(self.directory, _digest(key))
+
+    def path(self, key: str, version: str) -> str:
+        return os.path.join(
+            self._key_dir(key), _digest(version, 16), os.path.basename(key) or "object"
+        )
+
+    def lookup(self, key: str, version: str) -> Optional[str]:
+        """The local copy of `version` of `key`, if there is one."""
+        path = self.path(key, version)
+        try:
+            # Eviction goes by mtime (atime is often not maintained).
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            return None
+
+    def fetch(self, key: str, version: str, download: Callable[[str], None]) -> str:
+        """The local copy of `version` of `key`, calling `download(dest)` to
+        write it on a miss. One download per key at a time in this process."""
+        path = self.lookup(key, version)
+        if path is not None:
+            return path
+
+        with self._key_lock(key):
+            path = self.lookup(key, version)
+            if path is not None:
+                return path
+
+            path = self.path(key, version)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=_TMP_PREFIX)
+            os.close(fd)
+            try:
+                download(tmp_path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._unlink(tmp_path)
+                raise
+
+        self._committed(key, path)
+        return path
+
+    def tee(self, key: str, version: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield `chunks` and keep them as the local copy of `version` of
+        `key` — if they are consumed to the end. A stream that is abandoned
+        (client gone) or fails leaves nothing behind."""
+        path = self.path(key, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=_TMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+        except BaseException:
+            self._unlink(tmp_path)
+            raise
+
+        # Everything has been sent; failing to keep the copy only costs a later miss.
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"Could not cache {key}: {e}")
+            self._unlink(tmp_path)
+            return
+        self._committed(key, path)
+
+    def temp_path(self) -> str:
+        """A new, empty temp file in the cache directory — for a file that
+        is to be `adopt`ed, since a rename cannot cross file systems."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=_TMP_PREFIX)
+        os.close(fd)
+        return tmp_path
+
+    def adopt(self, key: str, version: str, tmp_path: str) -> str:
+        """Move the complete file at `tmp_path` into place as the local copy
+        of `version` of `key`."""
+        path = self.path(key, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        self._committed(key, path)
+        return path
+
+    def discard(self, key: str) -> None:
+        """Drop every cached version of `key`."""
+        shutil.rmtree(self._key_dir(key), ignore_errors=True)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def _committed(self, key: str, path: str) -> None:
+        version_dir = os.path.dirname(path)
+        key_dir = os.path.dirname(version_dir)
+        # Older versions of the object are of no use any more.
+        for name in os.listdir(key_dir):
+            other = os.path.join(key_dir, name)
+            if other != version_dir:
+                shutil.rmtree(other, ignore_errors=True)
+
+        try:
+            self._evict(keep=path)
+        except Exception as e:
+            log.warning(f"Could not evict from the storage cache: {e}")
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(_TMP_PREFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            if path == keep:
+                continue
+            # Open handles (a response being sent) keep the data until closed.
+            version_dir = os.path.dirname(path)
+            shutil.rmtree(version_dir, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(version_dir))
+            except OSError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -1,12 +1,19 @@
+import hashlib
+import io
 import logging
 import os
+import queue
 import shutil
+import tempfile
+import threading
 from abc import ABC, abstractmethod
-from typing import BinaryIO, Optional, Tuple
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
 
 log = logging.getLogger(__name__)
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from beyond_the_loop.config import (
     S3_ACCESS_KEY_ID,
@@ -20,7 +27,126 @@ from beyond_the_loop.config import (
 )
 from google.cloud import storage
 from google.cloud.exceptions import GoogleCloudError, NotFound
+from google.cloud.storage import transfer_manager
+from beyond_the_loop.storage.cache import ObjectCache
 from open_webui.constants import ERROR_MESSAGES
+from open_webui.env import STORAGE_UPLOAD_CONCURRENCY, STORAGE_UPLOAD_PART_SIZE
+
+# Size of the pieces a file is streamed from the bucket, and an upload
+# copied to disk, in.
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class UploadedFile:
+    """What an upload wrote, measured while it was copied."""
+
+    size: int
+    sha256: str
+
+
+def _write_upload(file: BinaryIO, dest: str) -> UploadedFile:
+    """Copies `file` to `dest` chunk by chunk, sizing and hashing it on the
+    way, so an upload is never held in memory as a whole. `dest` appears only
+    once complete; an empty upload leaves nothing behind."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := file.read(STREAM_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        if not size:
+            raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return UploadedFile(size=size, sha256=digest.hexdigest())
+
+
+@dataclass
+class StoredObject:
+    """A stored file, as the download endpoints serve it."""
+
+    size: int
+    # A complete local copy, when there is one.
+    local_path: Optional[str] = None
+    # Streams bytes `start`..`end` (inclusive; None: to the end) from the
+    # bucket. A read of the whole object also fills the local cache.
+    read: Optional[Callable[[int, Optional[int]], Iterator[bytes]]] = None
+
+
+class _DownloadCancelled(Exception):
+    pass
+
+
+def _stream_download(download: Callable[[BinaryIO], None]) -> Iterator[bytes]:
+    """Runs `download(file_obj)` — a client call that writes a response into
+    a file object as it arrives — in a thread and yields what it writes, in
+    STREAM_CHUNK_SIZE pieces. At most a few pieces are buffered ahead of the
+    consumer; closing the iterator early aborts the download."""
+    chunks: queue.Queue = queue.Queue(maxsize=4)
+    cancelled = threading.Event()
+    done = object()
+
+    def put(item) -> None:
+        while not cancelled.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise _DownloadCancelled()
+
+    class Pipe(io.RawIOBase):
+        def __init__(self) -> None:
+            self.pending = bytearray()
+
+        def writable(self) -> bool:
+            return True
+
+        def write(self, data) -> int:
+            self.pending += data
+            if len(self.pending) >= STREAM_CHUNK_SIZE:
+                self.send()
+            return len(data)
+
+        def send(self) -> None:
+            if self.pending:
+                put(bytes(self.pending))
+                self.pending.clear()
+
+    def run() -> None:
+        pipe = Pipe()
+        try:
+            download(pipe)
+            pipe.send()
+            put(done)
+        except _DownloadCancelled:
+            pass
+        except BaseException as e:
+            try:
+                put(e)
+            except _DownloadCancelled:
+                pass
+
+    threading.Thread(target=run, name="storage-download", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
 
 
 class StorageProvider(ABC):
@@ -28,8 +154,14 @@ class StorageProvider(ABC):
     def get_file(self, file_path: str) -> str:
         pass
 
+    def open(self, file_path: str) -> StoredObject:
+        """The file for serving it: a local copy if one is at hand, otherwise
+        a stream from the bucket — no download before the first byte."""
+        local_path = self.get_file(file_path)
+        return StoredObject(size=os.path.getsize(local_path), local_path=local_path)
+
     @abstractmethod
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[UploadedFile, str]:
         pass
 
     @abstractmethod
@@ -46,14 +178,9 @@ class StorageProvider(ABC):
 
 class LocalStorageProvider(StorageProvider):
     @staticmethod
-    def upload_file(file: BinaryIO, filename: str) -> Tuple[bytes, str]:
-        contents = file.read()
-        if not contents:
-            raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    def upload_file(file: BinaryIO, filename: str) -> Tuple[UploadedFile, str]:
         file_path = f"{UPLOAD_DIR}/{filename}"
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        return contents, file_path
+        return _write_upload(file, file_path), file_path
 
     @staticmethod
     def get_file(file_path: str) -> str:
@@ -97,29 +224,84 @@ class S3StorageProvider(StorageProvider):
             aws_secret_access_key=S3_SECRET_ACCESS_KEY,
         )
         self.bucket_name = S3_BUCKET_NAME
+        self.cache = ObjectCache()
+        self.transfer_config = TransferConfig(
+            multipart_threshold=STORAGE_UPLOAD_PART_SIZE,
+            multipart_chunksize=STORAGE_UPLOAD_PART_SIZE,
+            max_concurrency=STORAGE_UPLOAD_CONCURRENCY,
+        )
 
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
-        """Handles uploading of the file to S3 storage."""
-        _, file_path = LocalStorageProvider.upload_file(file, filename)
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[UploadedFile, str]:
+        """Handles uploading of the file to S3 storage: staged on disk, sent
+        in concurrent multipart parts, then kept as the cached local copy."""
+        staged_path = self.cache.temp_path()
         try:
-            self.s3_client.upload_file(file_path, self.bucket_name, filename)
-            return (
-                open(file_path, "rb").read(),
-                "s3://" + self.bucket_name + "/" + filename,
+            uploaded = _write_upload(file, staged_path)
+            self.s3_client.upload_file(
+                staged_path, self.bucket_name, filename, Config=self.transfer_config
             )
+            etag, _ = self._head(self.bucket_name, filename)
+            self.cache.adopt(filename, etag, staged_path)
         except ClientError as e:
             raise RuntimeError(f"Error uploading file to S3: {e}")
+        finally:
+            if os.path.exists(staged_path):
+                os.unlink(staged_path)
+        return uploaded, "s3://" + self.bucket_name + "/" + filename
 
     def get_file(self, file_path: str) -> str:
-        """Handles downloading of the file from S3 storage."""
+        """Returns a local copy of the file, downloading it from S3 unless the
+        cached copy still has the object's ETag."""
         try:
             bucket_name, key = file_path.split("//")[1].split("/")
-            local_file_path = f"{UPLOAD_DIR}/{key}"
-            self.s3_client.download_file(bucket_name, key, local_file_path)
-            return local_file_path
+            etag, _ = self._head(bucket_name, key)
+            # Keys embed the file id and are never overwritten, so the object
+            # cannot change between the HEAD and the download.
+            return self.cache.fetch(
+                key,
+                etag,
+                lambda dest: self.s3_client.download_file(bucket_name, key, dest),
+            )
         except ClientError as e:
             raise RuntimeError(f"Error downloading file from S3: {e}")
 
+    def open(self, file_path: str) -> StoredObject:
+        try:
+            bucket_name, key = file_path.split("//")[1].split("/")
+            etag, size = self._head(bucket_name, key)
+        except ClientError as e:
+            raise RuntimeError(f"Error reading file from S3: {e}")
+
+        local_path = self.cache.lookup(key, etag)
+        if local_path is not None:
+            return StoredObject(size=size, local_path=local_path)
+
+        def read(start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+            chunks = self._iter_object(bucket_name, key, etag, start, end)
+            if start == 0 and (end is None or end >= size - 1):
+                return self.cache.tee(key, etag, chunks)
+            return chunks
+
+        return StoredObject(size=size, read=read)
+
+    def _head(self, bucket_name: str, key: str) -> Tuple[str, int]:
+        response = self.s3_client.head_object(Bucket=bucket_name, Key=key)
+        return response["ETag"], response["ContentLength"]
+
+    def _iter_object(
+        self, bucket_name: str, key: str, etag: str, start: int, end: Optional[int]
+    ) -> Iterator[bytes]:
+        kwargs = {}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self.s3_client.get_object(
+            Bucket=bucket_name, Key=key, IfMatch=etag, **kwargs
+        )["Body"]
+        try:
+            yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
     def delete_file(self, file_path: str) -> None:
         """Handles deletion of the file from S3 storage."""
         filename = file_path.split("/")[-1]
@@ -128,6 +310,8 @@ class S3StorageProvider(StorageProvider):
         except ClientError as e:
             raise RuntimeError(f"Error deleting file from S3: {e}")
 
+        self.cache.discard(filename)
+
         # Always delete from local storage
         LocalStorageProvider.delete_file(file_path)
 
@@ -143,6 +327,8 @@ class S3StorageProvider(StorageProvider):
         except ClientError as e:
             raise RuntimeError(f"Error deleting all files from S3: {e}")
 
+        self.cache.clear()
+
         # Always delete from local storage
         LocalStorageProvider.delete_all_files()
 
@@ -165,29 +351,88 @@ class GCSStorageProvider(StorageProvider):
 
         self.gcs_client = storage.Client()
         self.bucket = self.gcs_client.bucket(GCS_BUCKET_NAME)
+        self.cache = ObjectCache()
 
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
-        """Handles uploading of the file to GCS storage."""
-        contents, file_path = LocalStorageProvider.upload_file(file, filename)
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[UploadedFile, str]:
+        """Handles uploading of the file to GCS storage: staged on disk, large
+        files sent in concurrent parts, then kept as the cached local copy."""
+        staged_path = self.cache.temp_path()
         try:
+            uploaded = _write_upload(file, staged_path)
             blob = self.bucket.blob(filename)
-            blob.upload_from_filename(file_path)
-            return contents, "gs://" + self.bucket_name + "/" + filename
+            if uploaded.size >= STORAGE_UPLOAD_PART_SIZE:
+                transfer_manager.upload_chunks_concurrently(
+                    staged_path,
+                    blob,
+                    chunk_size=STORAGE_UPLOAD_PART_SIZE,
+                    max_workers=STORAGE_UPLOAD_CONCURRENCY,
+                    worker_type=transfer_manager.THREAD,
+                )
+                # The parts upload does not report the new generation.
+                blob.reload()
+            else:
+                blob.upload_from_filename(staged_path)
+            self.cache.adopt(blob.name, str(blob.generation), staged_path)
         except GoogleCloudError as e:
             raise RuntimeError(f"Error uploading file to GCS: {e}")
+        finally:
+            if os.path.exists(staged_path):
+                os.unlink(staged_path)
+        return uploaded, "gs://" + self.bucket_name + "/" + filename
 
     def get_file(self, file_path: str) -> str:
-        """Handles downloading of the file from GCS storage."""
+        """Returns a local copy of the file, downloading it from GCS unless the
+        cached copy is of the blob's current generation."""
         try:
-            filename = file_path.removeprefix("gs://").split("/")[1]
-            local_file_path = f"{UPLOAD_DIR}/{filename}"
-            blob = self.bucket.get_blob(filename)
-            blob.download_to_filename(local_file_path)
-
-            return local_file_path
-        except NotFound as e:
+            blob = self._get_blob(file_path)
+            return self.cache.fetch(
+                blob.name,
+                str(blob.generation),
+                lambda dest: blob.download_to_filename(
+                    dest, if_generation_match=blob.generation
+                ),
+            )
+        except (NotFound, GoogleCloudError) as e:
             raise RuntimeError(f"Error downloading file from GCS: {e}")
 
+    def open(self, file_path: str) -> StoredObject:
+        try:
+            blob = self._get_blob(file_path)
+        except (NotFound, GoogleCloudError) as e:
+            raise RuntimeError(f"Error reading file from GCS: {e}")
+
+        version = str(blob.generation)
+        local_path = self.cache.lookup(blob.name, version)
+        if local_path is not None:
+            return StoredObject(size=blob.size, local_path=local_path)
+
+        def read(start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+            chunks = self._iter_blob(blob, start, end)
+            if start == 0 and (end is None or end >= blob.size - 1):
+                return self.cache.tee(blob.name, version, chunks)
+            return chunks
+
+        return StoredObject(size=blob.size, read=read)
+
+    def _get_blob(self, file_path: str) -> storage.Blob:
+        filename = file_path.removeprefix("gs://").split("/")[1]
+        # Fetches the metadata (generation, size) only.
+        blob = self.bucket.get_blob(filename)
+        if blob is None:
+            raise NotFound(f"{file_path} not found")
+        return blob
+
+    def _iter_blob(self, blob: storage.Blob, start: int, end: Optional[int]) -> Iterator[bytes]:
+        # One streamed, ranged request, pinned to the generation the caller saw.
+        last = blob.size - 1 if end is None else min(end, blob.size - 1)
+        if start > last:
+            return
+        yield from _stream_download(
+            lambda file_obj: blob.download_to_file(
+                file_obj, start=start, end=last, if_generation_match=blob.generation
+            )
+        )
+
     def delete_file(self, file_path: str) -> None:
         """Handles deletion of the file from GCS storage."""
         try:
@@ -197,6 +442,8 @@ class GCSStorageProvider(StorageProvider):
         except NotFound as e:
             raise RuntimeError(f"Error deleting file from GCS: {e}")
 
+        self.cache.discard(filename)
+
         # Always delete from local storage
         LocalStorageProvider.delete_file(file_path)
 
@@ -211,6 +458,8 @@ class GCSStorageProvider(StorageProvider):
         except NotFound as e:
             raise RuntimeError(f"Error deleting all files from GCS: {e}")
 
+        self.cache.clear()
+
         # Always delete from local storage
         LocalStorageProvider.delete_all_files()
 
@@ -0,0 +1,145 @@
+"""
+Tests for BroadcastTTLCache — the per-process company config cache whose
+invalidations are broadcast to every pod over Redis pub/sub.
+
+Redis is replaced by an in-process fake broker shared by several cache
+instances, each standing in for one pod.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_broadcast_ttl_cache.py -v
+"""
+import queue
+import threading
+import time
+
+from beyond_the_loop.socket.utils import BroadcastTTLCache
+
+
+class _FakeBroker:
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def client(self):
+        return _FakeRedis(self)
+
+
+class _FakeRedis:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, channel, message):
+        with self.broker.lock:
+            subscribers = list(self.broker.subscribers)
+        for subscriber in subscribers:
+            if channel in subscriber.channels:
+                subscriber.messages.put({"type": "message", "data": message})
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        return _FakePubSub(self.broker)
+
+
+class _FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self.channels.add(channel)
+        with self.broker.lock:
+            self.broker.subscribers.append(self)
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker.lock:
+            self.broker.subscribers.remove(self)
+
+
+def _pod(broker, ttl=60):
+    cache = BroadcastTTLCache("config_invalidations", "redis://localhost:6379/0", ttl=ttl)
+    cache.redis = broker.client()
+    return cache
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _subscribed(broker, pods):
+    return _wait_until(lambda: len(broker.subscribers) == pods)
+
+
+def test_load_runs_only_on_a_miss():
+    cache = _pod(_FakeBroker())
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"privacy": {"pii_filter_enabled": True}}
+
+    for _ in range(5):
+        assert cache.get_or_load("company-1", load)["privacy"]["pii_filter_enabled"]
+    assert len(loads) == 1
+
+
+def test_invalidation_reaches_other_pods():
+    broker = _FakeBroker()
+    pod_a, pod_b = _pod(broker), _pod(broker)
+    version = {"value": 1}
+
+    pod_a.get_or_load("company-1", lambda: dict(version))
+    pod_b.get_or_load("company-1", lambda: dict(version))
+    assert _subscribed(broker, 2)
+
+    version["value"] = 2
+    pod_a.invalidate("company-1")
+
+    assert pod_a.get_or_load("company-1", lambda: dict(version)) == {"value": 2}
+    assert _wait_until(
+        lambda: pod_b.get_or_load("company-1", lambda: dict(version)) == {"value": 2}
+    )
+
+
+def test_entries_expire_after_ttl():
+    cache = _pod(_FakeBroker(), ttl=0.05)
+    cache.get_or_load("company-1", lambda: "old")
+    time.sleep(0.1)
+    assert cache.get_or_load("company-1", lambda: "new") == "new"
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache = _pod(_FakeBroker())
+
+    def stale_load():
+        # The config changes while this (old) value is being read
+        cache.invalidate("company-1")
+        return "stale"
+
+    assert cache.get_or_load("company-1", stale_load) == "stale"
+    assert cache.get_or_load("company-1", lambda: "fresh") == "fresh"
+
+
+def test_publish_failure_still_drops_the_local_entry():
+    class _DownRedis(_FakeRedis):
+        def publish(self, channel, message):
+            raise ConnectionError("redis down")
+
+    broker = _FakeBroker()
+    cache = _pod(broker)
+    cache.get_or_load("company-1", lambda: "old")
+    cache.redis = _DownRedis(broker)
+
+    cache.invalidate("company-1")
+    assert cache.get_or_load("company-1", lambda: "new") == "new"
@@ -0,0 +1,151 @@
+"""
+Tests for ContentBlockSerializer — the incremental replacement for the
+`serialize_content_blocks` closure in the streaming response handler.
+
+The property that matters is output equality with the old full re-render,
+so the reference implementation is kept here verbatim and every step of
+simulated streams is compared against it.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_content_blocks.py -v
+"""
+import random
+
+from open_webui.utils.content_blocks import ContentBlockSerializer
+
+
+def _reference(content_blocks, raw=False):
+    content = ""
+
+    for block in content_blocks:
+        if block["type"] == "text":
+            content = f"{content}{block['content'].strip()}\n"
+        elif block["type"] == "reasoning":
+            reasoning_display_content = "\n".join(
+                (f"> {line}" if not line.startswith(">") else line)
+                for line in block["content"].splitlines()
+            )
+
+            reasoning_duration = block.get("duration", None)
+
+            if reasoning_duration is not None:
+                if raw:
+                    content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
+                else:
+                    content = f'{content}\n<details type="reasoning" done="true" duration="{reasoning_duration}">\n<summary>Thought for {reasoning_duration} seconds</summary>\n{reasoning_display_content}\n</details>\n'
+            else:
+                if raw:
+                    content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
+                else:
+                    content = f'{content}\n<details type="reasoning" done="false">\n<summary>Thinking…</summary>\n{reasoning_display_content}\n</details>\n'
+
+        else:
+            block_content = str(block["content"]).strip()
+            content = f"{content}{block['type']}: {block_content}\n"
+
+    return content.strip()
+
+
+def test_empty_blocks():
+    assert ContentBlockSerializer()([]) == ""
+
+
+def test_matches_reference_for_streamed_text():
+    serialize = ContentBlockSerializer()
+    blocks = [{"type": "text", "content": ""}]
+    for token in ["Hello", " ", "world", "!\n", "\n", "Second ", "paragraph."]:
+        blocks[-1]["content"] += token
+        assert serialize(blocks) == _reference(blocks)
+
+
+def test_matches_reference_for_reasoning_then_text():
+    serialize = ContentBlockSerializer()
+    blocks = []
+    reasoning = {"type": "reasoning", "tag": "think", "attributes": {}, "content": ""}
+    blocks.append(reasoning)
+    for token in ["Let me", " think.\n", "> quoted\n", "\n", "Step 2", "\r\nStep 3"]:
+        reasoning["content"] += token
+        assert serialize(blocks) == _reference(blocks)
+
+    reasoning["duration"] = 3
+    assert serialize(blocks) == _reference(blocks)
+
+    blocks.append({"type": "text", "content": ""})
+    for token in ["Answer", ": ", "42"]:
+        blocks[-1]["content"] += token
+        assert serialize(blocks) == _reference(blocks)
+
+
+def test_mutating_a_closed_block_is_picked_up():
+    serialize = ContentBlockSerializer()
+    blocks = [
+        {"type": "text", "content": "first [1](http://a)"},
+        {"type": "text", "content": "second"},
+    ]
+    assert serialize(blocks) == _reference(blocks)
+
+    blocks[0]["content"] = "first"
+    assert serialize(blocks) == _reference(blocks)
+
+
+def test_replaced_and_removed_blocks_are_picked_up():
+    serialize = ContentBlockSerializer()
+    blocks = [{"type": "text", "content": "a"}, {"type": "text", "content": "b"}]
+    assert serialize(blocks) == _reference(blocks)
+
+    blocks.pop()
+    assert serialize(blocks) == _reference(blocks)
+
+    blocks.clear()
+    blocks.append({"type": "text", "content": "replacement"})
+    assert serialize(blocks) == _reference(blocks)
+
+
+def test_non_string_content_is_always_rerendered():
+    serialize = ContentBlockSerializer()
+    payload = {"code": "print(1)"}
+    blocks = [{"type": "code_interpreter", "content": payload}]
+    assert serialize(blocks) == _reference(blocks)
+
+    payload["code"] = "print(2)"
+    assert serialize(blocks) == _reference(blocks)
+
+
+def test_raw_mode_matches_reference():
+    serialize = ContentBlockSerializer()
+    blocks = [
+        {"type": "reasoning", "tag": "think", "content": "hmm\nok", "duration": 1},
+        {"type": "text", "content": "done"},
+    ]
+    assert serialize(blocks, raw=True) == _reference(blocks, raw=True)
+    assert serialize(blocks) == _reference(blocks)
+
+
+def test_randomized_streams_match_reference():
+    rng = random.Random(1234)
+    alphabet = ["a", "b", " ", "\n", ">", "\r\n", "x\n", "  ", "ü"]
+
+    for _ in range(200):
+        serialize = ContentBlockSerializer()
+        blocks = [{"type": "text", "content": ""}]
+
+        for _ in range(60):
+            action = rng.random()
+            if action < 0.7:
+                blocks[-1]["content"] = blocks[-1]["content"] + rng.choice(alphabet)
+            elif action < 0.8:
+                blocks.append(
+                    {"type": "reasoning", "tag": "think", "attributes": {}, "content": ""}
+                )
+            elif action < 0.87:
+                if blocks[-1]["type"] == "reasoning":
+                    blocks[-1]["duration"] = rng.randint(0, 5)
+                blocks.append({"type": "text", "content": ""})
+            elif action < 0.93 and len(blocks) > 1:
+                target = rng.randrange(len(blocks) - 1)
+                blocks[target]["content"] = blocks[target]["content"][:-1]
+            elif len(blocks) > 1:
+                blocks.pop()
+
+            assert serialize(blocks) == _reference(blocks)
@@ -0,0 +1,180 @@
+"""
+Tests for CreditLedgerSettler — the background loop that applies the credit
+ledger to company balances and runs the low-balance handling per settled
+company.
+
+`settle` and `apply` are injected fakes, so no DB or credit service is
+involved.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_credit_ledger_settler.py -v
+"""
+import asyncio
+import sys
+import threading
+import types
+
+import pytest
+
+
+# Stubbed only while the module under test is imported, then restored.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"MODELS": "INFO"},
+    CREDIT_LEDGER_SETTLE_INTERVAL=2.0,
+    CREDIT_LEDGER_SETTLE_BATCH_SIZE=5000,
+)
+_stub_module(
+    "beyond_the_loop.models.credit_ledger",
+    CreditLedger=types.SimpleNamespace(settle_pending=None),
+    CreditSettlement=types.SimpleNamespace,
+)
+_saved_modules.setdefault(
+    "beyond_the_loop.services.credit_ledger_settler",
+    sys.modules.pop("beyond_the_loop.services.credit_ledger_settler", None),
+)
+
+from beyond_the_loop.services.credit_ledger_settler import CreditLedgerSettler  # noqa: E402
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+def _settlement(company_id, events):
+    return types.SimpleNamespace(company_id=company_id, events=events, amount=float(events))
+
+
+class _FakeLedger:
+    """Hands out the queued batches, one per settle call, then nothing."""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.limits = []
+        self.threads = []
+
+    def __call__(self, limit):
+        self.limits.append(limit)
+        self.threads.append(threading.get_ident())
+        return self.batches.pop(0) if self.batches else []
+
+
+class _RecordingApply:
+    def __init__(self, fail_for=()):
+        self.applied = []
+        self.fail_for = set(fail_for)
+
+    async def __call__(self, settlement):
+        self.applied.append(settlement.company_id)
+        if settlement.company_id in self.fail_for:
+            raise RuntimeError("stripe is down")
+
+
+@pytest.mark.anyio
+async def test_applies_each_settled_company():
+    ledger = _FakeLedger([_settlement("a", 3), _settlement("b", 1)])
+    apply = _RecordingApply()
+    settler = CreditLedgerSettler(settle=ledger, apply=apply, batch_size=10)
+
+    assert await settler.settle_once() == 4
+
+    assert apply.applied == ["a", "b"]
+    assert ledger.limits == [10]
+
+
+@pytest.mark.anyio
+async def test_settle_runs_off_the_event_loop():
+    ledger = _FakeLedger()
+    settler = CreditLedgerSettler(settle=ledger, apply=_RecordingApply())
+
+    await settler.settle_once()
+
+    assert ledger.threads and ledger.threads[0] != threading.get_ident()
+
+
+@pytest.mark.anyio
+async def test_full_batches_are_drained_in_one_pass():
+    ledger = _FakeLedger(
+        [_settlement("a", 4), _settlement("b", 1)],
+        [_settlement("a", 5)],
+        [_settlement("c", 2)],
+    )
+    apply = _RecordingApply()
+    settler = CreditLedgerSettler(settle=ledger, apply=apply, batch_size=5)
+
+    assert await settler.settle_once() == 12
+
+    assert apply.applied == ["a", "b", "a", "c"]
+    assert len(ledger.limits) == 3
+
+
+@pytest.mark.anyio
+async def test_failing_apply_does_not_block_other_companies():
+    ledger = _FakeLedger([_settlement("a", 1), _settlement("b", 1)])
+    apply = _RecordingApply(fail_for={"a"})
+    settler = CreditLedgerSettler(settle=ledger, apply=apply, batch_size=10)
+
+    assert await settler.settle_once() == 2
+
+    assert apply.applied == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_failing_settle_is_logged_and_retried_next_tick():
+    calls = []
+
+    def settle(limit):
+        calls.append(limit)
+        raise RuntimeError("db unavailable")
+
+    settler = CreditLedgerSettler(settle=settle, apply=_RecordingApply())
+
+    assert await settler.settle_once() == 0
+    assert await settler.settle_once() == 0
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_loop_settles_every_interval_and_stop_settles_the_rest():
+    ledger = _FakeLedger([_settlement("a", 1)], [], [], [], [], [], [], [], [], [])
+    apply = _RecordingApply()
+    settler = CreditLedgerSettler(settle=ledger, apply=apply, interval=0.01, batch_size=10)
+
+    settler.start()
+    await asyncio.sleep(0.1)
+    assert apply.applied == ["a"]
+    ticks = len(ledger.limits)
+    assert ticks >= 2
+
+    ledger.batches = [[_settlement("b", 1)]]
+    await settler.stop()
+
+    assert apply.applied == ["a", "b"]
+    assert settler._task is None
+
+
+@pytest.mark.anyio
+async def test_start_is_idempotent():
+    settler = CreditLedgerSettler(settle=_FakeLedger(), apply=_RecordingApply(), interval=10)
+
+    settler.start()
+    task = settler._task
+    settler.start()
+
+    assert settler._task is task
+    await settler.stop()
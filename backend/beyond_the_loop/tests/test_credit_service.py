@@ -86,10 +86,18 @@ _Companies.get_credit_balance = MagicMock(return_value=1000.0)
 _Companies.get_eighty_percent_credit_limit = MagicMock(return_value=200.0)
 _Companies.get_auto_recharge = MagicMock(return_value=False)
 _Companies.get_company_by_id = MagicMock(return_value=MagicMock(stripe_customer_id="cus_1", budget_mail_80_sent=True))
-_Companies.subtract_credit_balance = MagicMock()
 _Companies.update_company_by_id = MagicMock()
 _stub_module("beyond_the_loop.models.companies", Companies=_Companies)
 
+# beyond_the_loop.models.credit_ledger stub — charges are ledger appends; the
+# settler applies them to the balance and hands back a CreditSettlement.
+_CreditLedger = MagicMock()
+_stub_module(
+    "beyond_the_loop.models.credit_ledger",
+    CreditLedger=_CreditLedger,
+    CreditSettlement=types.SimpleNamespace,
+)
+
 # beyond_the_loop.services.email_service stub — instance-shaped so tests can
 # assert on which method was called on the EmailService object created inside
 # credit_service (EmailService() returns the same return_value each time).
@@ -108,9 +116,25 @@ _stub_module(
     },
 )
 
-# beyond_the_loop.routers.payments stub (get_subscription is imported at top level)
+# beyond_the_loop.routers.payments stub (recharge_flex_credits is imported lazily)
 _stub_module("beyond_the_loop.routers.payments", get_subscription=MagicMock())
 
+# Entitlement snapshots and fair-usage counters (imported at top level)
+_entitlement_service = MagicMock()
+_stub_module("beyond_the_loop.services.entitlement_service", entitlement_service=_entitlement_service)
+_fair_model_usage_service = MagicMock()
+_stub_module("beyond_the_loop.services.fair_model_usage_service", fair_model_usage_service=_fair_model_usage_service)
+
+
+def _set_subscription(subscription, company=None):
+    """Serve `subscription` and `company` (default: the stubbed company row)
+    from the entitlement snapshot."""
+    if company is None:
+        company = _Companies.get_company_by_id.return_value
+    _entitlement_service.aget = AsyncMock(
+        return_value=types.SimpleNamespace(company=company, subscription=subscription)
+    )
+
 # beyond_the_loop.services.payments_service stub (is_flat_rate_plan is imported at top level)
 _stub_module(
     "beyond_the_loop.services.payments_service",
@@ -145,7 +169,8 @@ def anyio_backend(request):
 def reset_mocks():
     """Reset all spies and side_effects between tests so state doesn't leak."""
     _Completions.insert_new_completion.reset_mock()
-    _Companies.subtract_credit_balance.reset_mock()
+    _CreditLedger.append.reset_mock()
+    _Users.get_user_by_id.reset_mock(return_value=True)
     _Companies.update_auto_recharge.reset_mock()
     _Companies.get_base_credit_balance.return_value = 1000.0
     _Companies.get_credit_balance.return_value = 1000.0
@@ -229,7 +254,7 @@ class TestRecordCompletion:
             subscription={"plan": "flex"},
         )
 
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         _Completions.insert_new_completion.assert_called_once()
         # Completion record gets the computed cost — not zero
         args, _ = _Completions.insert_new_completion.call_args
@@ -245,7 +270,7 @@ class TestRecordCompletion:
             subscription={"plan": plan},
         )
 
-        _Companies.subtract_credit_balance.assert_not_called()
+        _CreditLedger.append.assert_not_called()
         _Completions.insert_new_completion.assert_called_once()
         args, _ = _Completions.insert_new_completion.call_args
         recorded_cost = args[2]
@@ -262,7 +287,7 @@ class TestRecordCompletion:
             subscription=subscription,
         )
 
-        _Companies.subtract_credit_balance.assert_not_called()
+        _CreditLedger.append.assert_not_called()
         _Completions.insert_new_completion.assert_called_once()
         args, _ = _Completions.insert_new_completion.call_args
         recorded_cost = args[2]
@@ -278,9 +303,23 @@ class TestRecordCompletion:
             user, usage_response, "GPT-4o",
         )
 
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         _Completions.insert_new_completion.assert_called_once()
 
+    @pytest.mark.anyio
+    async def test_failed_ledger_append_is_raised(self, user, usage_response):
+        # A charge that can't be written must fail the call, not vanish.
+        _CreditLedger.append.side_effect = RuntimeError("insert failed")
+        try:
+            with pytest.raises(RuntimeError):
+                await cs.credit_service.record_completion(
+                    user, usage_response, "GPT-4o", subscription={"plan": "flex"},
+                )
+        finally:
+            _CreditLedger.append.side_effect = None
+
+        _Completions.insert_new_completion.assert_not_called()
+
     @pytest.mark.anyio
     async def test_non_agent_call_records_from_agent_false(self, user, usage_response):
         await cs.credit_service.record_completion(
@@ -303,6 +342,21 @@ class TestRecordCompletion:
         # 1 USD * 1.25 * 0.9 = 1.125 EUR
         assert cost == pytest.approx(1.125)
 
+    @pytest.mark.anyio
+    async def test_inserted_row_counts_towards_fair_usage(self, user, usage_response):
+        completion = MagicMock(id="cmp-1", created_at=1_700_000_000)
+        _Completions.insert_new_completion.return_value = completion
+        _fair_model_usage_service.record_completion.reset_mock()
+
+        await cs.credit_service.record_completion(
+            user, usage_response, "GPT-4o",
+            subscription={"plan": "free"},
+        )
+
+        _fair_model_usage_service.record_completion.assert_called_once_with(
+            user.id, "GPT-4o", completion
+        )
+
 
 # ---------------------------------------------------------------------------
 # subtract_credit_cost_by_user_and_response — thin wrapper
@@ -312,15 +366,77 @@ class TestRecordCompletion:
 class TestSubtractCreditCost:
     @pytest.mark.anyio
     async def test_computes_then_subtracts(self, user, usage_response):
-        cs.get_subscription.return_value = {"plan": "team_monthly"}
+        _set_subscription({"plan": "team_monthly"})
         _litellm.completion_cost.return_value = 2.0
         result = await cs.CreditService.subtract_credit_cost_by_user_and_response(user, usage_response)
         # 2 USD * 1.25 * 0.9 = 2.25 EUR
         assert result == pytest.approx(2.25)
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         # Verify the amount actually subtracted matches
-        subtracted_amount = _Companies.subtract_credit_balance.call_args[0][1]
-        assert subtracted_amount == pytest.approx(2.25)
+        company_id, user_id, amount, kind = _CreditLedger.append.call_args[0]
+        assert (company_id, user_id, kind) == (user.company_id, user.id, "chat")
+        assert amount == pytest.approx(2.25)
+
+
+
+# ---------------------------------------------------------------------------
+# apply_settlement — low-balance handling on settled balances
+# ---------------------------------------------------------------------------
+
+
+def _settlement(credit_balance, flex_credit_balance=None, user_id="user-1"):
+    return cs.CreditSettlement(
+        company_id="company-1",
+        amount=5.0,
+        events=3,
+        user_id=user_id,
+        credit_balance=credit_balance,
+        flex_credit_balance=flex_credit_balance,
+    )
+
+
+class TestApplySettlement:
+    @pytest.mark.anyio
+    @pytest.mark.parametrize("balance,flex,invalidated", [
+        (1000.0, None, False),
+        (0.0, 5.0, False),
+        (0.0, None, True),
+        (0.0, 0.0, True),
+    ])
+    async def test_invalidates_entitlements_only_when_credits_run_out(self, balance, flex, invalidated):
+        # The cached snapshot only drives the "no credits left" check, so a
+        # settlement that leaves a positive balance keeps it.
+        _entitlement_service.invalidate.reset_mock()
+
+        await cs.credit_service.apply_settlement(_settlement(balance, flex))
+
+        assert _entitlement_service.invalidate.called is invalidated
+
+    @pytest.mark.anyio
+    async def test_balance_above_threshold_does_nothing(self):
+        _Companies.get_company_by_id.reset_mock()
+        _EmailServiceClass.return_value.send_budget_mail_80.reset_mock()
+
+        await cs.credit_service.apply_settlement(_settlement(500.0))
+
+        _Companies.get_company_by_id.assert_not_called()
+        _EmailServiceClass.return_value.send_budget_mail_80.assert_not_called()
+
+    @pytest.mark.anyio
+    async def test_sends_80_percent_mail_once(self, monkeypatch):
+        monkeypatch.setenv("FRONTEND_BASE_URL", "https://app.example.com")
+        company = MagicMock(id="company-1", budget_mail_80_sent=False)
+        monkeypatch.setattr(_Companies.get_company_by_id, "return_value", company)
+        _Companies.update_company_by_id.reset_mock()
+        _Users.get_admin_users_by_company.return_value = [
+            MagicMock(email="admin@acme.com", first_name="Ada"),
+        ]
+
+        await cs.credit_service.apply_settlement(_settlement(150.0))
+
+        _EmailServiceClass.return_value.send_budget_mail_80.assert_called_once()
+        _Companies.update_company_by_id.assert_called_once_with("company-1", {"budget_mail_80_sent": True})
+
 
 class TestPublicApiAccessGate:
     @pytest.mark.anyio
@@ -329,7 +445,7 @@ class TestPublicApiAccessGate:
         # Public /api/openai endpoints must reject flat-rate, scope-limited plans
         # because usage there is unmetered and would let customers bypass billing.
         from fastapi import HTTPException
-        cs.get_subscription.return_value = {"plan": plan}
+        _set_subscription({"plan": plan})
         with pytest.raises(HTTPException) as exc_info:
             await cs.CreditService.check_public_api_access(user)
         assert exc_info.value.status_code == 402
@@ -341,14 +457,14 @@ class TestPublicApiAccessGate:
         # the subscription dict so callers can branch on the plan (to skip the
         # credit-subtract call for flat-rate plans).
         subscription = {"plan": "unlimited"}
-        cs.get_subscription.return_value = subscription
+        _set_subscription(subscription)
         result = await cs.CreditService.check_public_api_access(user)
         assert result == subscription
 
     @pytest.mark.anyio
     async def test_credit_based_plan_returns_subscription(self, user):
         subscription = {"plan": "team_monthly", "status": "active", "seats": 5, "seats_taken": 1}
-        cs.get_subscription.return_value = subscription
+        _set_subscription(subscription)
         result = await cs.CreditService.check_public_api_access(user)
         assert result == subscription
 
@@ -372,7 +488,7 @@ class TestSubtractForSTT:
 
         await cs.credit_service.record_stt_usage(user, response, {"plan": "team_monthly"})
 
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         _Completions.insert_new_completion.assert_called_once()
         args, kwargs = _Completions.insert_new_completion.call_args
         # Positional: user_id, model, credits_used, assistant, from_agent
@@ -392,7 +508,7 @@ class TestSubtractForSTT:
 
         await cs.credit_service.record_stt_usage(user, response, {"plan": plan})
 
-        _Companies.subtract_credit_balance.assert_not_called()
+        _CreditLedger.append.assert_not_called()
         # Row still written so analytics can see voice activity
         _Completions.insert_new_completion.assert_called_once()
         args, kwargs = _Completions.insert_new_completion.call_args
@@ -408,7 +524,7 @@ class TestSubtractForSTT:
 
         await cs.credit_service.record_stt_usage(user, response, None)
 
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         _Completions.insert_new_completion.assert_called_once()
 
     @pytest.mark.anyio
@@ -434,7 +550,7 @@ class TestSubtractForTTS:
 
         await cs.credit_service.record_tts_usage(user, "Sag hallo.", {"plan": "team_monthly"})
 
-        _Companies.subtract_credit_balance.assert_called_once()
+        _CreditLedger.append.assert_called_once()
         _Completions.insert_new_completion.assert_called_once()
         args, kwargs = _Completions.insert_new_completion.call_args
         assert args[0] == user.id
@@ -452,7 +568,7 @@ class TestSubtractForTTS:
 
         await cs.credit_service.record_tts_usage(user, "x", {"plan": plan})
 
-        _Companies.subtract_credit_balance.assert_not_called()
+        _CreditLedger.append.assert_not_called()
         _Completions.insert_new_completion.assert_called_once()
         args, kwargs = _Completions.insert_new_completion.call_args
         assert kwargs.get("kind") == "tts"
@@ -488,8 +604,6 @@ class TestAutoRechargeCardDecline:
         # Force the recharge branch: balance below 80% threshold, auto_recharge
         # on, one card on file, budget_mail_80 already sent (so we don't fan
         # out through the warning-mail path).
-        _Companies.get_base_credit_balance.return_value = 0.0
-        _Companies.get_credit_balance.return_value = 63.0
         _Companies.get_eighty_percent_credit_limit.return_value = 90.0
         _Companies.get_auto_recharge.return_value = True
         # NB: ``name`` is reserved on MagicMock (sets the mock's display name,
@@ -513,8 +627,14 @@ class TestAutoRechargeCardDecline:
         monkeypatch.setenv("FRONTEND_BASE_URL", "https://app.example.com")
         yield
 
+    @pytest.fixture
+    def settlement(self, user):
+        # Settled down to 0 base + 63 flex credits, below the 90 threshold.
+        _Users.get_user_by_id.return_value = user
+        return _settlement(0.0, 63.0, user_id=user.id)
+
     @pytest.mark.anyio
-    async def test_card_decline_disables_auto_recharge_and_notifies_admins(self, user, usage_response):
+    async def test_card_decline_disables_auto_recharge_and_notifies_admins(self, user, settlement):
         from fastapi import HTTPException
 
         # recharge_flex_credits raises a 400 on card decline (see payments.py).
@@ -522,13 +642,9 @@ class TestAutoRechargeCardDecline:
             cs.CreditService, "recharge_flex_credits",
             side_effect=HTTPException(status_code=400, detail="Card declined: card was declined."),
         ):
-            await cs.credit_service.record_completion(
-                user, usage_response, "GPT-4o",
-                agent_or_task_prompt=False,
-                subscription={"plan": "enterprise_monthly"},
-            )
+            await cs.credit_service.apply_settlement(settlement)
 
-        # auto_recharge flipped off so the next completion doesn't try again
+        # auto_recharge flipped off so the next settlement doesn't try again
         _Companies.update_auto_recharge.assert_called_once_with(user.company_id, False)
         # Admin notified about the disable
         _EmailServiceClass.return_value.send_auto_recharge_disabled_mail.assert_called_once()
@@ -536,11 +652,9 @@ class TestAutoRechargeCardDecline:
         assert call_kwargs["to_email"] == "admin@acme.com"
         assert call_kwargs["admin_name"] == "Ada"
         assert call_kwargs["company_name"] == "ACME"
-        # Completion row is still written even though the recharge failed
-        _Completions.insert_new_completion.assert_called_once()
 
     @pytest.mark.anyio
-    async def test_non_400_recharge_error_does_not_disable(self, user, usage_response):
+    async def test_non_400_recharge_error_does_not_disable(self, user, settlement):
         # A 500 (Stripe API glitch, network, ...) is transient — don't punish
         # the customer by flipping auto_recharge off.
         from fastapi import HTTPException
@@ -549,23 +663,19 @@ class TestAutoRechargeCardDecline:
             cs.CreditService, "recharge_flex_credits",
             side_effect=HTTPException(status_code=500, detail="Failed to recharge credits"),
         ):
-            await cs.credit_service.record_completion(
-                user, usage_response, "GPT-4o",
-                agent_or_task_prompt=False,
-                subscription={"plan": "enterprise_monthly"},
-            )
+            await cs.credit_service.apply_settlement(settlement)
 
         _Companies.update_auto_recharge.assert_not_called()
         _EmailServiceClass.return_value.send_auto_recharge_disabled_mail.assert_not_called()
 
     @pytest.mark.anyio
-    async def test_successful_recharge_leaves_auto_recharge_untouched(self, user, usage_response):
-        with patch.object(cs.CreditService, "recharge_flex_credits", new=AsyncMock(return_value={"ok": True})):
-            await cs.credit_service.record_completion(
-                user, usage_response, "GPT-4o",
-                agent_or_task_prompt=False,
-                subscription={"plan": "enterprise_monthly"},
-            )
-
+    async def test_successful_recharge_leaves_auto_recharge_untouched(self, user, settlement):
+        recharge = AsyncMock(return_value={"ok": True})
+        with patch.object(cs.CreditService, "recharge_flex_credits", new=recharge):
+            await cs.credit_service.apply_settlement(settlement)
+
+        # Recharged on behalf of the user behind the latest settled charge
+        recharge.assert_awaited_once_with(user)
+        _Users.get_user_by_id.assert_called_once_with(user.id)
         _Companies.update_auto_recharge.assert_not_called()
         _EmailServiceClass.return_value.send_auto_recharge_disabled_mail.assert_not_called()
@@ -0,0 +1,208 @@
+"""
+Tests for EmbeddingPipeline — token-packed, concurrent embedding batches
+with shared 429 backoff.
+
+The embeddings client is a fake with an async `embeddings.create`, so no
+network is involved.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_embedding_pipeline.py -v
+"""
+import asyncio
+import sys
+import types
+
+import httpx
+import pytest
+from openai import BadRequestError, RateLimitError
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"RAG": "INFO"},
+    RAG_EMBEDDING_BATCH_MAX_TOKENS=100000,
+    RAG_EMBEDDING_CONCURRENCY=4,
+    RAG_EMBEDDING_MAX_RETRIES=6,
+)
+
+from beyond_the_loop.retrieval.embeddings import (  # noqa: E402
+    EmbeddingPipeline,
+    pack_batches,
+)
+
+
+def _response(status: int, headers: dict = None) -> httpx.Response:
+    return httpx.Response(
+        status, headers=headers or {}, request=httpx.Request("POST", "http://test")
+    )
+
+
+class _FakeClient:
+    def __init__(self, failures=None):
+        self.embeddings = self
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures = list(failures or [])
+
+    async def create(self, input, model):
+        self.calls.append(list(input))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                failure = self.failures.pop(0)
+                if failure is not None:
+                    raise failure(input)
+            data = [
+                types.SimpleNamespace(index=i, embedding=[float(len(text))])
+                for i, text in enumerate(input)
+            ]
+            # The API does not promise order; the pipeline sorts by index.
+            return types.SimpleNamespace(data=list(reversed(data)))
+        finally:
+            self.in_flight -= 1
+
+
+def _pipeline(client, **kwargs) -> EmbeddingPipeline:
+    kwargs.setdefault("count_tokens", lambda texts: [len(text) for text in texts])
+    return EmbeddingPipeline(client_factory=lambda: client, **kwargs)
+
+
+def test_pack_batches_respects_token_and_item_limits():
+    assert pack_batches([3, 3, 3, 3], max_tokens=6) == [range(0, 2), range(2, 4)]
+    assert pack_batches([1, 1, 1], max_tokens=100, max_items=2) == [
+        range(0, 2),
+        range(2, 3),
+    ]
+    # An oversized text still goes out, alone
+    assert pack_batches([2, 50, 2], max_tokens=10) == [
+        range(0, 1),
+        range(1, 2),
+        range(2, 3),
+    ]
+    assert pack_batches([], max_tokens=10) == []
+
+
+@pytest.mark.anyio
+async def test_results_keep_input_order_across_batches():
+    client = _FakeClient()
+    pipeline = _pipeline(client, max_batch_tokens=5, concurrency=3)
+    texts = ["a" * n for n in [1, 4, 2, 3, 5, 1]]
+
+    embeddings = await pipeline.aembed("m", texts)
+
+    assert embeddings == [[float(len(text))] for text in texts]
+    assert len(client.calls) > 1
+
+
+@pytest.mark.anyio
+async def test_batches_run_concurrently_up_to_the_limit():
+    client = _FakeClient()
+    pipeline = _pipeline(client, max_batch_tokens=1, concurrency=3)
+
+    await pipeline.aembed("m", ["x"] * 10)
+
+    assert len(client.calls) == 10
+    assert client.max_in_flight == 3
+
+
+@pytest.mark.anyio
+async def test_concurrency_limit_is_shared_by_concurrent_calls():
+    client = _FakeClient()
+    pipeline = _pipeline(client, max_batch_tokens=1, concurrency=3)
+
+    await asyncio.gather(*(pipeline.aembed("m", ["x"] * 4) for _ in range(3)))
+
+    assert len(client.calls) == 12
+    assert client.max_in_flight == 3
+
+
+@pytest.mark.anyio
+async def test_rate_limit_is_retried_after_retry_after():
+    def rate_limited(_):
+        return RateLimitError(
+            "slow down", response=_response(429, {"retry-after": "0.05"}), body=None
+        )
+
+    client = _FakeClient(failures=[rate_limited])
+    pipeline = _pipeline(client)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    embeddings = await pipeline.aembed("m", ["ab"])
+
+    assert embeddings == [[2.0]]
+    assert len(client.calls) == 2
+    assert loop.time() - started >= 0.05
+
+
+@pytest.mark.anyio
+async def test_rate_limit_gives_up_after_max_retries():
+    def rate_limited(_):
+        return RateLimitError(
+            "slow down", response=_response(429, {"retry-after": "0"}), body=None
+        )
+
+    client = _FakeClient(failures=[rate_limited] * 3)
+    pipeline = _pipeline(client, max_retries=2)
+
+    with pytest.raises(RateLimitError):
+        await pipeline.aembed("m", ["ab"])
+    assert len(client.calls) == 3
+
+
+@pytest.mark.anyio
+async def test_oversized_request_is_split():
+    def too_large(_):
+        return BadRequestError(
+            "maximum request size exceeded", response=_response(400), body=None
+        )
+
+    client = _FakeClient(failures=[too_large])
+    pipeline = _pipeline(client)
+
+    embeddings = await pipeline.aembed("m", ["a", "bb", "ccc", "dddd"])
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert client.calls[0] == ["a", "bb", "ccc", "dddd"]
+    assert sorted(map(len, client.calls[1:])) == [2, 2]
+
+
+@pytest.mark.anyio
+async def test_split_requests_stay_within_the_concurrency_limit():
+    def too_large(_):
+        return BadRequestError(
+            "maximum request size exceeded", response=_response(400), body=None
+        )
+
+    # The full batch and both halves are too large; the quarters go through.
+    client = _FakeClient(failures=[too_large, too_large, None, None, too_large])
+    pipeline = _pipeline(client, concurrency=1)
+
+    embeddings = await pipeline.aembed("m", ["a", "bb", "ccc", "dddd"])
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert len(client.calls) == 7
+    assert client.max_in_flight == 1
+
+
+def test_sync_embed_runs_on_the_pipeline_loop():
+    client = _FakeClient()
+    pipeline = _pipeline(client)
+
+    assert pipeline.embed("m", ["abc", "d"]) == [[3.0], [1.0]]
+    assert pipeline.embed("m", []) == []
+    # Same loop, hence the same pooled client, on every call
+    assert pipeline.embed("m", ["ab"]) == [[2.0]]
+    assert pipeline._client is client
@@ -0,0 +1,160 @@
+"""
+Tests for ExtractedTextCache — the disk + Redis cache of the text extracted
+from uploaded files for "full" context mode.
+
+Redis is replaced by a dict-backed stand-in; the disk tier uses tmp_path.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_extracted_text_cache.py -v
+"""
+import os
+import sys
+import types
+
+import pytest
+
+
+# Stubbed only while the module under test is imported, then restored.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module("beyond_the_loop.config", CACHE_DIR="/tmp")
+_stub_module("beyond_the_loop.models.files", FileModel=types.SimpleNamespace)
+_stub_module("beyond_the_loop.retrieval.loaders.main", LOADER_VERSION=1)
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"RAG": "INFO"},
+    REDIS_URL=None,
+    EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES=1024,
+    EXTRACTED_TEXT_CACHE_TTL=60,
+)
+_saved_modules.setdefault(
+    "beyond_the_loop.retrieval.extracted_text_cache",
+    sys.modules.pop("beyond_the_loop.retrieval.extracted_text_cache", None),
+)
+
+from beyond_the_loop.retrieval.extracted_text_cache import ExtractedTextCache  # noqa: E402
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+
+class _BrokenRedis:
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+def _file(id="file-1", hash="abc", updated_at=100):
+    return types.SimpleNamespace(id=id, hash=hash, updated_at=updated_at)
+
+
+@pytest.fixture
+def redis_client():
+    return _FakeRedis()
+
+
+@pytest.fixture
+def cache(tmp_path, redis_client):
+    return ExtractedTextCache(directory=str(tmp_path / "a"), client=redis_client, max_disk_bytes=1024)
+
+
+def test_miss_then_hit(cache):
+    assert cache.get(_file()) is None
+
+    cache.put(_file(), "Grüße aus dem PDF")
+
+    assert cache.get(_file()) == "Grüße aus dem PDF"
+
+
+def test_new_hash_or_loader_version_misses(cache, redis_client):
+    cache.put(_file(hash="abc"), "old text")
+
+    assert cache.get(_file(hash="def")) is None
+    bumped = ExtractedTextCache(
+        directory=cache.directory, client=redis_client, loader_version=2
+    )
+    assert bumped.get(_file(hash="abc")) is None
+
+
+def test_unprocessed_file_is_keyed_by_upload_time(cache):
+    cache.put(_file(hash=None, updated_at=100), "text")
+
+    assert cache.get(_file(hash=None, updated_at=100)) == "text"
+    assert cache.get(_file(hash=None, updated_at=200)) is None
+
+
+def test_shared_tier_serves_other_pods_and_fills_their_disk(tmp_path, cache, redis_client):
+    cache.put(_file(), "shared text")
+    [(key, value)] = redis_client.data.items()
+    assert key.startswith("extracted_text:")
+    assert redis_client.expiry[key] == 60
+    assert value != b"shared text"  # compressed
+
+    other_pod = ExtractedTextCache(directory=str(tmp_path / "b"), client=redis_client)
+    assert other_pod.get(_file()) == "shared text"
+
+    redis_client.data.clear()
+    assert other_pod.get(_file()) == "shared text"
+
+
+def test_disk_tier_evicts_least_recently_read(cache):
+    cache.put(_file(id="first"), "x" * 400)
+    cache.put(_file(id="second"), "x" * 400)
+    first_path = cache._path(cache.key(_file(id="first")))
+    second_path = cache._path(cache.key(_file(id="second")))
+    os.utime(first_path, (1, 1))
+    os.utime(second_path, (2, 2))
+    assert cache.get(_file(id="first")) is not None  # now the most recent
+
+    cache.put(_file(id="third"), "x" * 400)
+
+    assert os.path.exists(first_path)
+    assert not os.path.exists(second_path)
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_redis_failures_fall_back_to_disk(tmp_path):
+    cache = ExtractedTextCache(directory=str(tmp_path), client=_BrokenRedis())
+
+    cache.put(_file(), "text")
+
+    assert cache.get(_file()) == "text"
+    assert cache.get(_file(id="other")) is None
+
+
+def test_without_redis_only_disk_is_used(tmp_path):
+    cache = ExtractedTextCache(directory=str(tmp_path), redis_url=None)
+
+    cache.put(_file(), "text")
+
+    assert cache.client is None
+    assert cache.get(_file()) == "text"
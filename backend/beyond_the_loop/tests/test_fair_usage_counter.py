@@ -0,0 +1,206 @@
+"""
+Tests for FairUsageCounter — the Redis sliding-window counts behind the
+3-hour fair-usage limit — and the FairModelUsageService checks using it.
+
+Redis is replaced by a small in-memory stand-in implementing the sorted-set
+and key commands the counter pipelines; the `completion` table by a stub.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_fair_usage_counter.py -v
+"""
+import sys
+import time
+import types
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+
+# Stubbed only while the module under test is imported, then restored: other
+# test modules import `Completions` lazily from their own stubs at run time.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+_Completions = MagicMock()
+_stub_module("open_webui.env", REDIS_URL=None, SRC_LOG_LEVELS={"MAIN": 20})
+_stub_module(
+    "beyond_the_loop.config",
+    LITELLM_MODEL_CONFIG={
+        "GPT-4o": {"allowed_messages_per_three_hours_free": 3},
+        "GPT-5": {"allowed_messages_per_three_hours_free": 10},
+    },
+)
+_stub_module("beyond_the_loop.models.completions", Completions=_Completions)
+_saved_modules.setdefault(
+    "beyond_the_loop.services.fair_model_usage_service",
+    sys.modules.pop("beyond_the_loop.services.fair_model_usage_service", None),
+)
+
+from beyond_the_loop.services.fair_model_usage_service import (  # noqa: E402
+    FairModelUsageService,
+    FairUsageCounter,
+)
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.zsets = {}
+        self.keys = {}
+        self.executed = 0
+        self.down = False
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self)
+
+    def _score_bound(self, bound):
+        if bound == "-inf":
+            return float("-inf"), False
+        if isinstance(bound, str) and bound.startswith("("):
+            return float(bound[1:]), True
+        return float(bound), False
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    def execute(self):
+        redis = self.redis
+        if redis.down:
+            raise ConnectionError("redis down")
+        redis.executed += 1
+        results = []
+        for name, args, kwargs in self.commands:
+            if name == "zadd":
+                redis.zsets.setdefault(args[0], {}).update(args[1])
+                results.append(1)
+            elif name == "zremrangebyscore":
+                key, low, high = args
+                high, exclusive = redis._score_bound(high)
+                members = redis.zsets.get(key, {})
+                stale = [m for m, score in members.items()
+                         if score < high or (score == high and not exclusive)]
+                for member in stale:
+                    del members[member]
+                results.append(len(stale))
+            elif name == "zcard":
+                results.append(len(redis.zsets.get(args[0], {})))
+            elif name == "exists":
+                results.append(int(args[0] in redis.keys))
+            elif name == "set":
+                redis.keys[args[0]] = args[1]
+                results.append(True)
+            elif name == "expire":
+                results.append(True)
+            else:
+                raise AssertionError(f"unexpected command {name}")
+        return results
+
+
+@pytest.fixture(autouse=True)
+def reset_completions():
+    _Completions.reset_mock()
+    _Completions.get_recent_completions_by_user_and_models.return_value = []
+    _Completions.get_completions_count_last_three_hours_by_user_and_models.return_value = {}
+    yield
+
+
+@pytest.fixture
+def redis():
+    return _FakeRedis()
+
+
+@pytest.fixture
+def counter(redis):
+    return FairUsageCounter(client=redis)
+
+
+def test_seeds_once_from_db_then_counts_in_redis(counter, redis):
+    now = int(time.time())
+    _Completions.get_recent_completions_by_user_and_models.return_value = [
+        ("c1", "GPT-4o", now - 60),
+        ("c2", "GPT-4o", now - 120),
+    ]
+
+    assert counter.counts("u1", ["GPT-4o"]) == {"GPT-4o": 2}
+    counter.record("u1", "GPT-4o", "c3", now)
+    assert counter.counts("u1", ["GPT-4o"]) == {"GPT-4o": 3}
+
+    _Completions.get_recent_completions_by_user_and_models.assert_called_once()
+    _Completions.get_completions_count_last_three_hours_by_user_and_models.assert_not_called()
+
+
+def test_entries_leave_the_window(redis):
+    counter = FairUsageCounter(client=redis, window=100)
+    now = int(time.time())
+    counter.counts("u1", ["GPT-4o"])
+
+    counter.record("u1", "GPT-4o", "old", now - 150)
+    counter.record("u1", "GPT-4o", "new", now - 10)
+
+    assert counter.counts("u1", ["GPT-4o"]) == {"GPT-4o": 1}
+
+
+def test_record_before_seed_is_not_double_counted(counter):
+    now = int(time.time())
+    counter.record("u1", "GPT-4o", "c1", now)
+    _Completions.get_recent_completions_by_user_and_models.return_value = [
+        ("c1", "GPT-4o", now),
+    ]
+
+    assert counter.counts("u1", ["GPT-4o"]) == {"GPT-4o": 1}
+
+
+def test_many_models_in_one_round_trip_once_seeded(counter, redis):
+    counter.counts("u1", ["GPT-4o", "GPT-5"])
+    redis.executed = 0
+
+    assert counter.counts("u1", ["GPT-4o", "GPT-5"]) == {"GPT-4o": 0, "GPT-5": 0}
+    assert redis.executed == 1
+
+
+def test_falls_back_to_db_count_when_redis_is_down(counter, redis):
+    redis.down = True
+    _Completions.get_completions_count_last_three_hours_by_user_and_models.return_value = {"GPT-4o": 4}
+
+    assert counter.counts("u1", ["GPT-4o"]) == {"GPT-4o": 4}
+    counter.record("u1", "GPT-4o", "c1", int(time.time()))  # logged, not raised
+
+
+def test_check_raises_429_at_the_limit(counter):
+    service = FairModelUsageService(counter=counter)
+    user = types.SimpleNamespace(id="u1")
+    counter.counts("u1", ["GPT-4o"])
+
+    for i in range(2):
+        counter.record("u1", "GPT-4o", f"c{i}", int(time.time()))
+    service.check_for_fair_model_usage(user, "GPT-4o", "free")
+
+    service.record_completion("u1", "GPT-4o", types.SimpleNamespace(id="c2", created_at=int(time.time())))
+    with pytest.raises(HTTPException) as exc_info:
+        service.check_for_fair_model_usage(user, "GPT-4o", "free")
+    assert exc_info.value.status_code == 429
+    assert service.get_fair_usage_limit_reached_models(user, ["GPT-4o", "GPT-5"], "free") == {"GPT-4o"}
@@ -0,0 +1,303 @@
+"""
+Tests for IngestionWorker — runs queued upload / knowledge-base ingestion
+jobs, reports their stages, retries failures with backoff.
+
+The job table, handlers, user lookup and socket emit are injected fakes, so no
+DB, vector store or socket server is involved.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_ingestion_worker.py -v
+"""
+import asyncio
+import sys
+import types
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+
+# Stubbed only while the module under test is imported, then restored.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+class _JobModel(BaseModel):
+    id: str
+    user_id: str
+    kind: str
+    payload: dict
+    status: str = "queued"
+    stage: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    run_after: int = 0
+    created_at: int = 0
+    updated_at: int = 0
+
+
+class _JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    stage: Optional[str] = None
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"RAG": "INFO"},
+    INGESTION_JOB_MAX_ATTEMPTS=3,
+    INGESTION_JOB_POLL_INTERVAL=1.0,
+    INGESTION_JOB_RETRY_DELAY=30,
+    INGESTION_JOB_STALE_SECONDS=300,
+    INGESTION_WORKER_CONCURRENCY=2,
+)
+_stub_module(
+    "beyond_the_loop.models.ingestion_jobs",
+    IngestionJobModel=_JobModel,
+    IngestionJobResponse=_JobResponse,
+    IngestionJobs=types.SimpleNamespace(),
+)
+_saved_modules.setdefault(
+    "beyond_the_loop.services.ingestion_worker",
+    sys.modules.pop("beyond_the_loop.services.ingestion_worker", None),
+)
+
+from beyond_the_loop.services.ingestion_worker import (  # noqa: E402
+    INGESTION_EVENT,
+    IngestionWorker,
+    _run_file_job,
+    report_ingestion_stage,
+)
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+class _FakeJobs:
+    """In-memory stand-in for IngestionJobsTable."""
+
+    def __init__(self, *jobs):
+        self.jobs = {job.id: job for job in jobs}
+        self.stages = []
+
+    def claim_next(self, stale_after):
+        for job in self.jobs.values():
+            if job.status == "queued":
+                job.status = "running"
+                job.stage = None
+                job.attempts += 1
+                return job.model_copy()
+        return None
+
+    def update_stage(self, id, stage):
+        self.stages.append(stage)
+        self.jobs[id].stage = stage
+
+    def heartbeat(self, id):
+        pass
+
+    def complete(self, id, result=None):
+        job = self.jobs[id]
+        job.status = "completed"
+        job.result = result
+        return job.model_copy()
+
+    def fail(self, id, error, retry_delay):
+        job = self.jobs[id]
+        job.status = "queued" if job.attempts < job.max_attempts else "failed"
+        job.error = error
+        job.run_after = retry_delay
+        return job.model_copy()
+
+
+class _HTTPError(Exception):
+    def __init__(self, detail):
+        self.detail = detail
+
+
+def _job(id="job-1", kind="file", **kwargs):
+    return _JobModel(id=id, user_id="user-1", kind=kind, payload={"file_id": "f1"}, **kwargs)
+
+
+def _worker(jobs, handlers, events, users=None, **kwargs):
+    users = {"user-1": types.SimpleNamespace(id="user-1")} if users is None else users
+
+    async def emit(user_id, event, data):
+        events.append((user_id, event, data))
+
+    return IngestionWorker(
+        app="app",
+        handlers=handlers,
+        jobs=jobs,
+        get_user=users.get,
+        emit=emit,
+        **kwargs,
+    )
+
+
+@pytest.mark.anyio
+async def test_job_runs_reports_stages_and_completes():
+    jobs = _FakeJobs(_job())
+    events = []
+    seen = {}
+
+    def handle_file(app, job, user):
+        seen.update(app=app, file_id=job.payload["file_id"], user=user.id)
+        report_ingestion_stage("extracting")
+        report_ingestion_stage("embedding")
+        return {"file_id": job.payload["file_id"]}
+
+    worker = _worker(jobs, {"file": handle_file}, events)
+
+    assert await worker.run_once() is True
+    await asyncio.sleep(0)  # stage events are scheduled from the handler thread
+
+    assert seen == {"app": "app", "file_id": "f1", "user": "user-1"}
+    assert jobs.stages == ["extracting", "embedding"]
+    assert jobs.jobs["job-1"].status == "completed"
+    assert jobs.jobs["job-1"].result == {"file_id": "f1"}
+
+    assert {user_id for user_id, _, _ in events} == {"user-1"}
+    assert {event for _, event, _ in events} == {INGESTION_EVENT}
+    reported = [(data["status"], data["stage"]) for _, _, data in events]
+    assert reported[0] == ("running", None)
+    assert reported[-1][0] == "completed"
+    assert ("running", "extracting") in reported
+    assert ("running", "embedding") in reported
+    assert "payload" not in events[0][2]
+
+
+@pytest.mark.anyio
+async def test_failed_job_is_retried_with_backoff_then_fails():
+    jobs = _FakeJobs(_job(max_attempts=2))
+    events = []
+
+    def handle_file(app, job, user):
+        raise _HTTPError("No pandoc was found")
+
+    worker = _worker(jobs, {"file": handle_file}, events, retry_delay=30)
+
+    assert await worker.run_once() is True
+    job = jobs.jobs["job-1"]
+    assert (job.status, job.error, job.run_after) == ("queued", "No pandoc was found", 30)
+
+    assert await worker.run_once() is True
+    assert (job.status, job.run_after) == ("failed", 60)
+    assert events[-1][2]["status"] == "failed"
+    assert events[-1][2]["error"] == "No pandoc was found"
+
+    assert await worker.run_once() is False
+
+
+@pytest.mark.anyio
+async def test_unknown_kind_or_user_fails_the_job():
+    jobs = _FakeJobs(_job(id="a", kind="video", max_attempts=1), _job(id="b", max_attempts=1))
+    worker = _worker(jobs, {"file": lambda app, job, user: {}}, [], users={})
+
+    await worker.run_once()
+    await worker.run_once()
+
+    assert "Unknown ingestion job kind" in jobs.jobs["a"].error
+    assert "not found" in jobs.jobs["b"].error
+
+
+def test_stage_report_outside_a_job_is_ignored():
+    report_ingestion_stage("extracting")
+
+
+@pytest.mark.anyio
+async def test_started_workers_drain_the_queue_and_stop():
+    jobs = _FakeJobs(*[_job(id=f"job-{i}") for i in range(5)])
+    worker = _worker(
+        jobs, {"file": lambda app, job, user: {}}, [], concurrency=2, poll_interval=0.01
+    )
+
+    worker.start()
+    for _ in range(100):
+        if all(job.status == "completed" for job in jobs.jobs.values()):
+            break
+        await asyncio.sleep(0.01)
+    await worker.stop()
+
+    assert all(job.status == "completed" for job in jobs.jobs.values())
+    assert worker._tasks == []
+
+
+@pytest.mark.anyio
+async def test_zero_concurrency_does_not_start_workers():
+    worker = _worker(_FakeJobs(_job()), {}, [], concurrency=0)
+
+    worker.start()
+
+    assert worker._tasks == []
+    await worker.stop()
+
+
+def _stub_file_processing(monkeypatch, process_file):
+    updates = []
+    monkeypatch.setitem(
+        sys.modules,
+        "open_webui.routers.retrieval",
+        types.SimpleNamespace(
+            ProcessFileForm=lambda file_id: file_id, process_file=process_file
+        ),
+    )
+    monkeypatch.setitem(
+        sys.modules,
+        "open_webui.constants",
+        types.SimpleNamespace(
+            ERROR_MESSAGES=types.SimpleNamespace(DUPLICATE_CONTENT="Duplicate content")
+        ),
+    )
+    monkeypatch.setitem(
+        sys.modules,
+        "beyond_the_loop.models.files",
+        types.SimpleNamespace(
+            Files=types.SimpleNamespace(
+                update_file_metadata_by_id=lambda id, meta: updates.append((id, meta))
+            )
+        ),
+    )
+    return updates
+
+
+def test_file_retry_after_embedding_counts_as_done(monkeypatch):
+    from fastapi import HTTPException
+
+    def process_file(request, form_data, user):
+        raise HTTPException(status_code=400, detail="Duplicate content")
+
+    updates = _stub_file_processing(monkeypatch, process_file)
+
+    assert _run_file_job(None, _job(attempts=2), None) == {"file_id": "f1"}
+    assert updates == [("f1", {"collection_name": "file-f1"})]
+
+
+def test_file_job_other_errors_still_fail(monkeypatch):
+    from fastapi import HTTPException
+
+    def process_file(request, form_data, user):
+        raise HTTPException(status_code=400, detail="No pandoc was found")
+
+    _stub_file_processing(monkeypatch, process_file)
+
+    with pytest.raises(HTTPException):
+        _run_file_job(None, _job(), None)
@@ -0,0 +1,136 @@
+"""
+Tests for MessageWriteBuffer — the write-behind coalescer used by the
+streaming response handler to persist assistant messages.
+
+The writer is a plain recording function, so no DB is involved.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_message_write_buffer.py -v
+"""
+import asyncio
+import sys
+import threading
+import types
+
+import pytest
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"MODELS": "INFO"},
+    CHAT_SAVE_FLUSH_INTERVAL=1.0,
+    CHAT_SAVE_MAX_PENDING_UPDATES=50,
+)
+
+from beyond_the_loop.utils.message_write_buffer import (  # noqa: E402
+    MessageWriteBuffer,
+    get_message_write_buffer,
+)
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.calls = []
+        self.threads = []
+
+    def __call__(self, chat_id, message_id, message):
+        self.calls.append((chat_id, message_id, dict(message)))
+        self.threads.append(threading.get_ident())
+
+
+@pytest.mark.anyio
+async def test_updates_are_merged_into_one_write_on_close():
+    writer = _RecordingWriter()
+    buffer = MessageWriteBuffer("c", "m", writer=writer, flush_interval=60)
+
+    buffer.update({"model": "gpt"})
+    buffer.update({"selectedModelId": "gpt-mini"})
+    buffer.update({"content": "Hel"})
+    buffer.update({"content": "Hello"})
+    await buffer.close()
+
+    assert writer.calls == [
+        ("c", "m", {"model": "gpt", "selectedModelId": "gpt-mini", "content": "Hello"})
+    ]
+
+
+@pytest.mark.anyio
+async def test_write_runs_off_the_event_loop_thread():
+    writer = _RecordingWriter()
+    buffer = MessageWriteBuffer("c", "m", writer=writer, flush_interval=60)
+
+    buffer.update({"content": "x"})
+    await buffer.close()
+
+    assert writer.threads and writer.threads[0] != threading.get_ident()
+
+
+@pytest.mark.anyio
+async def test_interval_flushes_without_close():
+    writer = _RecordingWriter()
+    buffer = MessageWriteBuffer("c", "m", writer=writer, flush_interval=0.01)
+
+    buffer.update({"content": "a"})
+    buffer.update({"content": "ab"})
+    await asyncio.sleep(0.1)
+
+    assert writer.calls == [("c", "m", {"content": "ab"})]
+    await buffer.close()
+    assert len(writer.calls) == 1
+
+
+@pytest.mark.anyio
+async def test_size_threshold_triggers_flush():
+    writer = _RecordingWriter()
+    buffer = MessageWriteBuffer(
+        "c", "m", writer=writer, flush_interval=60, max_pending_updates=3
+    )
+
+    for i in range(3):
+        buffer.update({"content": str(i)})
+    await asyncio.sleep(0.05)
+
+    assert writer.calls == [("c", "m", {"content": "2"})]
+    await buffer.close()
+
+
+@pytest.mark.anyio
+async def test_close_with_nothing_pending_writes_nothing():
+    writer = _RecordingWriter()
+    buffer = MessageWriteBuffer("c", "m", writer=writer)
+
+    await buffer.close()
+
+    assert writer.calls == []
+
+
+@pytest.mark.anyio
+async def test_writer_errors_are_swallowed():
+    def failing_writer(chat_id, message_id, message):
+        raise RuntimeError("db down")
+
+    buffer = MessageWriteBuffer("c", "m", writer=failing_writer, flush_interval=60)
+    buffer.update({"content": "x"})
+
+    await buffer.close()  # must not raise
+
+
+@pytest.mark.anyio
+async def test_registry_returns_same_buffer_until_closed():
+    first = get_message_write_buffer("chat", "msg")
+    assert get_message_write_buffer("chat", "msg") is first
+    assert get_message_write_buffer("chat", "other") is not first
+
+    first.writer = _RecordingWriter()
+    await first.close()
+
+    assert get_message_write_buffer("chat", "msg") is not first
@@ -37,6 +37,7 @@ _stub_module("stripe", api_key=None, Subscription=MagicMock(), Webhook=MagicMock
 _stub_module("beyond_the_loop.models.companies", Companies=MagicMock())
 _stub_module("beyond_the_loop.models.users", Users=MagicMock())
 _stub_module("beyond_the_loop.services.crm_service", crm_service=MagicMock())
+_stub_module("beyond_the_loop.services.entitlement_service", entitlement_service=MagicMock())
 _stub_module(
     "beyond_the_loop.socket.main",
     STRIPE_COMPANY_ACTIVE_SUBSCRIPTION_CACHE={},
@@ -115,6 +115,7 @@ _stub_module("beyond_the_loop.models.users", Users=MagicMock())
 
 # crm_service.
 _stub_module("beyond_the_loop.services.crm_service", crm_service=MagicMock())
+_stub_module("beyond_the_loop.services.entitlement_service", entitlement_service=MagicMock())
 
 # payments_service — the router reads .stripe_flex_credit_product_id from the
 # instance and calls is_flat_rate_plan; both need to be reachable.
@@ -0,0 +1,195 @@
+"""
+Tests for PDFLoader — single-pass, page-streaming PDF extraction that OCRs
+image pages only.
+
+Fixture PDFs are generated with pymupdf; OCR is a fake run in a thread pool,
+so tesseract is not needed.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_pdf_loader.py -v
+"""
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+import pytest
+
+
+# Stubbed only while the module under test is imported, then restored.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"RAG": "INFO"},
+    PDF_OCR_DPI=300,
+    PDF_OCR_WORKERS=2,
+)
+_saved_modules.setdefault(
+    "beyond_the_loop.retrieval.loaders.pdf",
+    sys.modules.pop("beyond_the_loop.retrieval.loaders.pdf", None),
+)
+
+from beyond_the_loop.retrieval.loaders.pdf import PDFLoader  # noqa: E402
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+def _scan_of(text: str) -> pymupdf.Pixmap:
+    """A raster of a page showing `text` — what a scanner would produce."""
+    with pymupdf.open() as source:
+        page = source.new_page(width=300, height=200)
+        page.insert_text((20, 50), text, fontsize=14)
+        return page.get_pixmap(dpi=72)
+
+
+def _make_pdf(path, pages):
+    """`pages`: ("text", content) | ("image", content) | ("blank", None)."""
+    with pymupdf.open() as pdf:
+        for kind, content in pages:
+            page = pdf.new_page(width=300, height=200)
+            if kind == "text":
+                page.insert_text((20, 50), content, fontsize=12)
+            elif kind == "image":
+                page.insert_image(page.rect, pixmap=_scan_of(content))
+        pdf.save(str(path))
+    return str(path)
+
+
+def _fake_ocr(file_path, page_number, dpi, lang):
+    return f"ocr page {page_number} at {dpi} dpi ({lang})"
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_only_image_pages_are_ocred_in_order(tmp_path, executor):
+    path = _make_pdf(
+        tmp_path / "mixed.pdf",
+        [
+            ("text", "The first page has a proper text layer on it."),
+            ("image", "Scanned page"),
+            ("blank", None),
+            ("text", "The last page has a proper text layer on it as well."),
+        ],
+    )
+    ocr_calls = []
+
+    def ocr(file_path, page_number, dpi, lang):
+        ocr_calls.append(page_number)
+        return _fake_ocr(file_path, page_number, dpi, lang)
+
+    docs = PDFLoader(path, executor=executor, ocr=ocr).load()
+
+    assert ocr_calls == [1]
+    assert [doc.metadata["page"] for doc in docs] == [0, 1, 2, 3]
+    assert "first page" in docs[0].page_content
+    assert docs[1].page_content == "ocr page 1 at 300 dpi (eng)"
+    assert docs[2].page_content == ""
+    assert "last page" in docs[3].page_content
+    assert docs[0].metadata == {"source": path, "page": 0, "total_pages": 4}
+
+
+def test_short_text_layer_over_a_scan_is_ocred(tmp_path, executor):
+    path = tmp_path / "stamped.pdf"
+    with pymupdf.open() as pdf:
+        page = pdf.new_page(width=300, height=200)
+        page.insert_image(page.rect, pixmap=_scan_of("Scanned page"))
+        page.insert_text((250, 190), "p. 1", fontsize=8)
+        pdf.save(str(path))
+
+    docs = PDFLoader(str(path), executor=executor, ocr=_fake_ocr).load()
+
+    assert docs[0].page_content.startswith("ocr page 0")
+
+
+def test_pages_stream_before_the_document_is_finished(tmp_path, executor):
+    path = _make_pdf(tmp_path / "long.pdf", [("text", f"Page {i} " * 10) for i in range(50)])
+
+    pages = PDFLoader(path, executor=executor, ocr=_fake_ocr).lazy_load()
+
+    assert next(pages).metadata == {"source": path, "page": 0, "total_pages": 50}
+    assert len(list(pages)) == 49
+
+
+def test_ocr_ahead_is_bounded(tmp_path, executor):
+    path = _make_pdf(tmp_path / "scan.pdf", [("image", f"Scan {i}") for i in range(8)])
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_ocr(file_path, page_number, dpi, lang):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return f"page {page_number}"
+
+    loader = PDFLoader(path, executor=executor, ocr=slow_ocr, max_pending=2)
+    submitted = []
+    original_submit = executor.submit
+
+    def submit(*args):
+        submitted.append(args[2])
+        return original_submit(*args)
+
+    executor.submit = submit
+    yielded = []
+    for doc in loader.lazy_load():
+        # Never more than max_pending pages queued beyond the one yielded.
+        assert len(submitted) - len(yielded) <= 3
+        yielded.append(doc.page_content)
+
+    assert yielded == [f"page {i}" for i in range(8)]
+    assert peak <= 2
+
+
+def test_failed_ocr_keeps_the_page(tmp_path, executor):
+    path = _make_pdf(tmp_path / "scan.pdf", [("image", "Scan"), ("text", "A page of text " * 5)])
+
+    def broken_ocr(file_path, page_number, dpi, lang):
+        raise RuntimeError("tesseract is not installed")
+
+    docs = PDFLoader(path, executor=executor, ocr=broken_ocr).load()
+
+    assert [doc.page_content for doc in docs][0] == ""
+    assert "A page of text" in docs[1].page_content
+
+
+def test_ocr_page_renders_the_page_in_grayscale(tmp_path, monkeypatch):
+    from beyond_the_loop.retrieval.loaders import ocr
+
+    path = _make_pdf(tmp_path / "scan.pdf", [("text", "x"), ("image", "Scan")])
+    seen = {}
+
+    def image_to_string(image, lang):
+        seen.update(mode=image.mode, size=image.size, lang=lang)
+        return "recognized"
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", image_to_string)
+
+    assert ocr.ocr_page(path, 1, 144, "deu") == "recognized"
+    assert seen == {"mode": "L", "size": (600, 400), "lang": "deu"}
@@ -0,0 +1,105 @@
+"""
+Tests for the PIISession analyze cache — hashed keys, packed spans, kept out
+of the persisted session JSON and capped per chat.
+
+The privacy-filter service is a fake that tags a fixed name, so no inference
+endpoint is needed.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_pii_analyze_cache.py -v
+"""
+import json
+
+import pytest
+
+from beyond_the_loop.pii.service import PiiSpan
+from beyond_the_loop.pii.session import InMemoryPIIStorage, PIISession
+
+_NAME = "Max Mustermann"
+
+
+class _FakeService:
+    def __init__(self):
+        self.calls = []
+
+    def analyze(self, text):
+        self.calls.append(text)
+        start = text.find(_NAME)
+        if start == -1:
+            return []
+        return [PiiSpan("private_person", start, start + len(_NAME), 0.987654321)]
+
+
+@pytest.fixture
+def service():
+    return _FakeService()
+
+
+@pytest.fixture
+def storage():
+    return InMemoryPIIStorage(max_cache_entries=2)
+
+
+def test_cache_is_shared_across_sessions_but_not_in_session_json(service, storage):
+    text = f"Hallo, ich bin {_NAME}."
+    first = PIISession("chat-1", storage=storage, service=service)
+    out, _ = first.anonymize(text)
+    first.save()
+
+    second = PIISession("chat-1", storage=storage, service=service)
+    assert second.anonymize(text)[0] == out
+    assert service.calls == [text]
+
+    persisted = json.dumps(storage.load("chat-1"))
+    assert "analyze_cache" not in persisted
+    packed = json.dumps(storage.load_analyze_cache("chat-1"))
+    assert text not in packed
+    assert json.loads(packed) == {
+        PIISession._text_hash(text): [["private_person", 15, 29, 0.9877]]
+    }
+
+
+def test_cache_is_per_chat(service, storage):
+    text = f"{_NAME} schreibt."
+    session = PIISession("chat-1", storage=storage, service=service)
+    session.anonymize(text)
+    session.save()
+
+    PIISession("chat-2", storage=storage, service=service).anonymize(text)
+    assert service.calls == [text, text]
+
+
+def test_least_recently_used_entries_are_evicted(service, storage):
+    session = PIISession("chat-1", storage=storage, service=service)
+    for text in ("a " + _NAME, "b " + _NAME):
+        session.anonymize(text)
+    session.save()
+
+    session = PIISession("chat-1", storage=storage, service=service)
+    session.anonymize("a " + _NAME)  # hit: "a" is now more recent than "b"
+    session.anonymize("c " + _NAME)
+    session.save()
+
+    cached = storage.load_analyze_cache("chat-1")
+    assert set(cached) == {
+        PIISession._text_hash("a " + _NAME),
+        PIISession._text_hash("c " + _NAME),
+    }
+
+
+def test_failing_cache_storage_does_not_break_anonymization(service):
+    class _BrokenCacheStorage(InMemoryPIIStorage):
+        def load_analyze_cache(self, chat_id):
+            raise RuntimeError("db down")
+
+        def save_analyze_cache(self, chat_id, entries, touched):
+            raise RuntimeError("db down")
+
+    storage = _BrokenCacheStorage()
+    session = PIISession("chat-1", storage=storage, service=service)
+    out, _ = session.anonymize(f"{_NAME} ist da.")
+    session.save()
+
+    assert out == "[[PERSON_1]] ist da."
+    assert storage.load("chat-1")["forward"] == {_NAME: "[[PERSON_1]]"}
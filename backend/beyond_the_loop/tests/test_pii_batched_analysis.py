@@ -0,0 +1,191 @@
+"""
+Tests for the batched PII analysis path — PrivacyFilterService.analyze_many,
+PIISession.prefetch and aanonymize_messages — against a local stand-in for
+the privacy-filter `/predict` endpoint.
+
+The stand-in tags a fixed set of names and e-mail addresses with BIOES
+token predictions in the same shape the Cloud Run container returns, and
+records every request so batching and concurrency can be asserted.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_pii_batched_analysis.py -v
+"""
+import copy
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import beyond_the_loop.pii.service as service_module
+from beyond_the_loop.pii.inference_client import PiiInferenceClient
+from beyond_the_loop.pii.service import PrivacyFilterService
+from beyond_the_loop.pii.session import (
+    InMemoryPIIStorage,
+    PIISession,
+    aanonymize_messages,
+    anonymize_messages,
+)
+
+_ENTITY_PATTERN = re.compile(
+    r"(?P<person>Max Mustermann|Anna Schmidt|Jonas Weber)|(?P<email>[\w.]+@[\w.]+\.\w+)"
+)
+
+
+def _predict_tokens(text: str) -> list:
+    tokens = []
+    for match in _ENTITY_PATTERN.finditer(text):
+        if match.group("email"):
+            tokens.append(
+                {"entity": "S-private_email", "score": 0.99,
+                 "start": match.start(), "end": match.end()}
+            )
+            continue
+        words = list(re.finditer(r"\S+", match.group(0)))
+        for i, word in enumerate(words):
+            prefix = "B" if i == 0 else "E" if i == len(words) - 1 else "I"
+            tokens.append(
+                {"entity": f"{prefix}-private_person", "score": 0.97,
+                 "start": match.start() + word.start(),
+                 "end": match.start() + word.end()}
+            )
+    return tokens
+
+
+class _StandInPredictServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.02):
+        super().__init__(("127.0.0.1", 0), _PredictHandler)
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/predict"
+
+
+class _PredictHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append(body["instances"])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            payload = json.dumps(
+                {"predictions": [_predict_tokens(text) for text in body["instances"]]}
+            ).encode()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = _StandInPredictServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(server):
+    return PrivacyFilterService(PiiInferenceClient(server.url, auth="none"))
+
+
+def _session(service):
+    return PIISession("chat-test", storage=InMemoryPIIStorage(), service=service)
+
+
+@pytest.mark.anyio
+async def test_analyze_many_dedupes_and_packs_instances(server, service, monkeypatch):
+    monkeypatch.setattr(service_module, "PREDICT_BATCH_SIZE", 4)
+    texts = [f"Nachricht {i} von Max Mustermann" for i in range(7)]
+    texts += [texts[0], texts[3], "", "   "]
+
+    results = await service.analyze_many(texts)
+
+    assert sorted(len(batch) for batch in server.requests) == [3, 4]
+    assert len(results) == len(texts)
+    assert results[7] == results[0] and results[10] == []
+    for text, spans in zip(texts, results):
+        assert spans == service.analyze(text)
+
+
+@pytest.mark.anyio
+async def test_analyze_many_bounds_requests_in_flight(server, service, monkeypatch):
+    monkeypatch.setattr(service_module, "PREDICT_BATCH_SIZE", 1)
+    monkeypatch.setattr(service_module, "PREDICT_CONCURRENCY", 2)
+    server.delay = 0.05
+
+    await service.analyze_many([f"Text {i} an anna@example.de" for i in range(6)])
+
+    assert len(server.requests) == 6
+    assert server.max_in_flight == 2
+
+
+@pytest.mark.anyio
+async def test_char_budget_splits_batches(server, service, monkeypatch):
+    monkeypatch.setattr(service_module, "PREDICT_BATCH_MAX_CHARS", 50)
+    texts = ["x" * 30 + f" {i} Jonas Weber" for i in range(3)]
+
+    await service.analyze_many(texts)
+
+    assert [len(batch) for batch in server.requests] == [1, 1, 1]
+
+
+@pytest.mark.anyio
+async def test_aanonymize_messages_matches_sync_path_in_one_request(server, service):
+    messages = [
+        {"role": "system", "content": "Du bist hilfreich. Max Mustermann"},
+        {"role": "user", "content": "Hallo, ich bin Max Mustermann."},
+        {"role": "assistant", "content": "Hallo Max Mustermann!"},
+        {"role": "user", "content": [
+            {"type": "text", "text": "Schreib an anna@example.de und Anna Schmidt."},
+            {"type": "image_url", "image_url": {"url": "data:..."}},
+        ]},
+        {"role": "user", "content": "Hallo, ich bin Max Mustermann."},
+    ]
+    expected = copy.deepcopy(messages)
+    anonymize_messages(expected, _session(service))
+    server.requests.clear()
+
+    await aanonymize_messages(messages, _session(service))
+
+    assert messages == expected
+    assert len(server.requests) == 1
+    assert sorted(server.requests[0]) == sorted(
+        ["Hallo, ich bin Max Mustermann.", "Schreib an anna@example.de und Anna Schmidt."]
+    )
+
+
+@pytest.mark.anyio
+async def test_prefetch_skips_cached_texts(server, service):
+    session = _session(service)
+    session.anonymize("Max Mustermann war hier.")
+    server.requests.clear()
+
+    await session.prefetch(["Max Mustermann war hier.", "Jonas Weber auch."])
+
+    assert server.requests == [["Jonas Weber auch."]]
+    await session.prefetch(["Jonas Weber auch."])
+    assert len(server.requests) == 1
@@ -0,0 +1,139 @@
+"""
+Tests for DraftPrefetcher — speculative PII analysis of composer drafts with
+dedupe, cancellation of superseded drafts and a bounded wait on send.
+
+The privacy-filter service is a fake with a slow async `analyze_many`, and
+sessions use in-memory storage.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_pii_draft_prefetch.py -v
+"""
+import asyncio
+
+import pytest
+
+from beyond_the_loop.pii.prefetch import DraftPrefetcher
+from beyond_the_loop.pii.session import InMemoryPIIStorage, PIISession
+
+
+class _SlowService:
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.started = []
+        self.finished = []
+
+    async def analyze_many(self, texts):
+        self.started.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("predict down")
+        self.finished.append(list(texts))
+        return [[] for _ in texts]
+
+
+@pytest.fixture
+def storage():
+    return InMemoryPIIStorage()
+
+
+def _prefetcher(storage, service, **kwargs):
+    kwargs.setdefault("debounce", 0.01)
+    return DraftPrefetcher(
+        open_session=lambda chat_id: PIISession(chat_id, storage=storage, service=service),
+        **kwargs,
+    )
+
+
+def _cached(storage, chat_id, text):
+    return PIISession._text_hash(text) in storage.load_analyze_cache(chat_id)
+
+
+@pytest.mark.anyio
+async def test_draft_is_analyzed_into_the_cache_only(storage):
+    service = _SlowService()
+    prefetcher = _prefetcher(storage, service)
+
+    assert prefetcher.schedule("chat", "k1", lambda: ["Hallo Max", "Datei"]) == "scheduled"
+    await prefetcher.wait("chat")
+
+    assert service.finished == [["Hallo Max", "Datei"]]
+    assert _cached(storage, "chat", "Hallo Max") and _cached(storage, "chat", "Datei")
+    # Placeholder maps are owned by the real request
+    assert storage.load("chat") is None
+
+
+@pytest.mark.anyio
+async def test_identical_draft_is_deduped(storage):
+    service = _SlowService()
+    prefetcher = _prefetcher(storage, service)
+
+    prefetcher.schedule("chat", "k1", lambda: ["Hallo"])
+    assert prefetcher.schedule("chat", "k1", lambda: ["Hallo"]) == "duplicate"
+    await prefetcher.wait("chat")
+    assert prefetcher.schedule("chat", "k1", lambda: ["Hallo"]) == "duplicate"
+
+    assert len(service.started) == 1
+
+
+@pytest.mark.anyio
+async def test_superseded_draft_is_cancelled(storage):
+    service = _SlowService(delay=0.2)
+    prefetcher = _prefetcher(storage, service)
+
+    # Within the debounce window: never reaches the service
+    prefetcher.schedule("chat", "k1", lambda: ["Hal"])
+    prefetcher.schedule("chat", "k2", lambda: ["Hallo"])
+    await asyncio.sleep(0.05)
+    # In flight: cancelled mid-predict, nothing cached for it
+    prefetcher.schedule("chat", "k3", lambda: ["Hallo Max"])
+    await prefetcher.wait("chat")
+
+    assert service.started == [["Hallo"], ["Hallo Max"]]
+    assert service.finished == [["Hallo Max"]]
+    assert not _cached(storage, "chat", "Hallo")
+    assert _cached(storage, "chat", "Hallo Max")
+
+
+@pytest.mark.anyio
+async def test_wait_is_bounded_and_other_chats_are_independent(storage):
+    service = _SlowService(delay=0.3)
+    prefetcher = _prefetcher(storage, service)
+
+    prefetcher.schedule("chat-a", "k", lambda: ["A"])
+    prefetcher.schedule("chat-b", "k", lambda: ["B"])
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await prefetcher.wait("chat-a", timeout=0.05)
+    assert loop.time() - started < 0.2
+
+    await prefetcher.wait("chat-a")
+    await prefetcher.wait("chat-b")
+    assert sorted(service.finished) == [["A"], ["B"]]
+    await prefetcher.wait("unknown-chat")
+
+
+@pytest.mark.anyio
+async def test_failed_draft_can_be_retried(storage):
+    service = _SlowService(delay=0, fail=True)
+    prefetcher = _prefetcher(storage, service)
+
+    prefetcher.schedule("chat", "k1", lambda: ["Hallo"])
+    await prefetcher.wait("chat")
+    service.fail = False
+
+    assert prefetcher.schedule("chat", "k1", lambda: ["Hallo"]) == "scheduled"
+    await prefetcher.wait("chat")
+    assert _cached(storage, "chat", "Hallo")
+
+
+@pytest.mark.anyio
+async def test_texts_beyond_the_char_budget_are_dropped(storage):
+    service = _SlowService(delay=0)
+    prefetcher = _prefetcher(storage, service, max_chars=10)
+
+    prefetcher.schedule("chat", "k1", lambda: ["12345", " ", "123456", "1"])
+    await prefetcher.wait("chat")
+
+    assert service.started == [["12345"]]
@@ -0,0 +1,122 @@
+"""
+Tests for the linear-time PII matchers — EntityMatcher (Aho-Corasick sweep)
+and placeholder replacement — checked against the per-entity regex /
+str.replace implementations they replace.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_pii_matcher.py -v
+"""
+import random
+import re
+
+import pytest
+
+from beyond_the_loop.pii.matcher import EntityMatcher, replace_placeholders
+from beyond_the_loop.pii.session import InMemoryPIIStorage, PIISession
+
+
+def _regex_sweep(text, forward, released=()):
+    originals = sorted(
+        (o for o in forward if o and o not in released), key=len, reverse=True
+    )
+    if not originals:
+        return text
+    pattern = re.compile(
+        r"(?<!\w)(?:" + "|".join(re.escape(o) for o in originals) + r")(?!\w)"
+    )
+    return pattern.sub(lambda m: forward[m.group(0)], text)
+
+
+def _per_placeholder_shift(forward, text, end, utf8):
+    enc = (lambda s: s.encode("utf-8")) if utf8 else (lambda s: s)
+    work = enc(text)
+    shift = 0
+    for original, placeholder in forward.items():
+        delta = len(enc(original)) - len(enc(placeholder))
+        search_from = 0
+        while delta:
+            idx = work.find(enc(placeholder), search_from)
+            if idx == -1 or idx >= end:
+                break
+            shift += delta
+            search_from = idx + len(enc(placeholder))
+    return end + shift
+
+
+_WORDS = ["Max", "Max Muster", "Müller", "Anna", "ann", "a.b@x.de", "Straße 5", "_id", "Zoë"]
+
+
+def _random_text(rng):
+    pieces = _WORDS + [" ", " ", ", ", "-", "x", "ä", "\n", "[[PERSON_1]]", "[["]
+    return "".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+
+
+def _forward(originals):
+    return {o: f"[[PERSON_{i}]]" for i, o in enumerate(originals, start=1)}
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_sweep_matches_regex_alternation(seed):
+    rng = random.Random(seed)
+    forward = _forward(rng.sample(_WORDS, rng.randint(1, len(_WORDS))))
+    released = set(rng.sample(list(forward), min(len(forward), rng.randint(0, 2))))
+    matcher = EntityMatcher(forward)
+    for _ in range(20):
+        text = _random_text(rng)
+        out, _ = matcher.replace_words(text, forward.__getitem__, exclude=released)
+        assert out == _regex_sweep(text, forward, released)
+
+
+def test_released_longer_original_falls_back_to_shorter():
+    forward = _forward(["Max", "Max Muster"])
+    matcher = EntityMatcher(forward)
+    out, matched = matcher.replace_words(
+        "Max Muster kam.", forward.__getitem__, exclude={"Max Muster"}
+    )
+    assert out == "[[PERSON_1]] Muster kam."
+    assert matched == ["Max"]
+
+
+def test_incremental_add_matches_fresh_build():
+    matcher = EntityMatcher(["Anna"])
+    assert matcher.find_words("Anna und Annabel") == [(0, 4, "Anna")]
+    matcher.add("Annabel")
+    matcher.add("bel")
+    assert matcher.find_words("Anna und Annabel") == [(0, 4, "Anna"), (9, 16, "Annabel")]
+    assert len(matcher) == 3
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_placeholder_replacement_and_shift_match_per_placeholder_scans(seed):
+    rng = random.Random(seed)
+    originals = rng.sample(_WORDS, 5)
+    forward = {o: f"[[PERSON_{i}]]" for i, o in zip([1, 11, 2, 12, 3], originals)}
+    reverse = {p: o for o, p in forward.items()}
+    session = PIISession("chat", storage=InMemoryPIIStorage(), service=object())
+    session.forward, session.reverse = forward, reverse
+
+    tokens = list(reverse) + ["[[PERSON_9]]", "[[", "]]", "ü", " text "]
+    text = "".join(rng.choice(tokens) for _ in range(30))
+
+    expected = text
+    for placeholder in sorted(reverse, key=len, reverse=True):
+        expected = expected.replace(placeholder, reverse[placeholder])
+    assert replace_placeholders(text, reverse) == expected
+    assert session.deanonymize(text) == expected
+
+    for utf8 in (False, True):
+        size = len(text.encode("utf-8")) if utf8 else len(text)
+        for end in range(0, size + 1, 7):
+            assert session.calculate_shifted_index(text, end, utf8=utf8) == (
+                _per_placeholder_shift(forward, text, end, utf8)
+            )
+
+
+def test_session_sweep_sees_forward_entries_added_directly():
+    session = PIISession("chat", storage=InMemoryPIIStorage(), service=object())
+    session.forward["Tarpen"] = "[[LOCATION_1]]"
+    assert session.replace_known("In Tarpen.")[0] == "In [[LOCATION_1]]."
+    session.forward["Hamburg"] = "[[LOCATION_2]]"
+    assert session.replace_known("Tarpen, Hamburg")[0] == "[[LOCATION_1]], [[LOCATION_2]]"
+    assert session.sources == {"Tarpen": {"prompt"}, "Hamburg": {"prompt"}}
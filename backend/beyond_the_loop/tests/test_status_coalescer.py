@@ -0,0 +1,98 @@
+"""
+Tests for StatusCoalescer — the per-request batching of status events that
+`get_event_emitter` puts in front of the room-based `chat-events` emit.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_status_coalescer.py -v
+"""
+import asyncio
+
+import pytest
+
+from beyond_the_loop.socket.utils import StatusCoalescer
+
+
+def _status(description):
+    return {"type": "status", "data": {"description": description, "done": False}}
+
+
+class _Recorder:
+    def __init__(self):
+        self.emitted = []
+
+    async def __call__(self, event_data):
+        self.emitted.append(event_data)
+
+
+@pytest.mark.anyio
+async def test_statuses_within_a_frame_go_out_as_one_batch():
+    emit = _Recorder()
+    coalescer = StatusCoalescer(emit, frame_seconds=0.05)
+
+    for i in range(3):
+        await coalescer.push(_status(f"step {i}"))
+    assert emit.emitted == []
+
+    await asyncio.sleep(0.1)
+
+    assert emit.emitted == [
+        {
+            "type": "status:batch",
+            "data": {"statuses": [_status(f"step {i}")["data"] for i in range(3)]},
+        }
+    ]
+
+
+@pytest.mark.anyio
+async def test_single_status_is_emitted_unchanged():
+    emit = _Recorder()
+    coalescer = StatusCoalescer(emit, frame_seconds=0.02)
+
+    await coalescer.push(_status("only"))
+    await asyncio.sleep(0.05)
+
+    assert emit.emitted == [_status("only")]
+
+
+@pytest.mark.anyio
+async def test_flush_keeps_order_before_other_events():
+    emit = _Recorder()
+    coalescer = StatusCoalescer(emit, frame_seconds=10)
+
+    await coalescer.push(_status("searching"))
+    await coalescer.flush()
+    await emit({"type": "message", "data": {"content": "Hi"}})
+    await coalescer.push(_status("done"))
+    await coalescer.flush()
+    await coalescer.flush()
+
+    assert [event["type"] for event in emit.emitted] == ["status", "message", "status"]
+    assert emit.emitted[-1] == _status("done")
+
+
+@pytest.mark.anyio
+async def test_zero_frame_disables_coalescing():
+    emit = _Recorder()
+    coalescer = StatusCoalescer(emit, frame_seconds=0)
+
+    await coalescer.push(_status("a"))
+    await coalescer.push(_status("b"))
+
+    assert emit.emitted == [_status("a"), _status("b")]
+
+
+@pytest.mark.anyio
+async def test_on_idle_once_nothing_is_queued_or_scheduled():
+    emit = _Recorder()
+    idle = []
+    coalescer = StatusCoalescer(emit, frame_seconds=0.05, on_idle=lambda: idle.append(1))
+
+    await coalescer.push(_status("a"))
+    await coalescer.flush()
+    # The timer is still scheduled.
+    assert idle == []
+
+    await asyncio.sleep(0.1)
+    assert idle == [1]
+    assert len(emit.emitted) == 1
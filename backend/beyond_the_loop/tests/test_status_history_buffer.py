@@ -0,0 +1,136 @@
+"""
+Tests for StatusHistoryBuffer — the per-message ring buffer that defers
+status persistence until the message completes.
+
+The writer is a plain recording function, so no DB is involved.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_status_history_buffer.py -v
+"""
+import asyncio
+import sys
+import threading
+import types
+
+import pytest
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"MODELS": "INFO"},
+    CHAT_SAVE_FLUSH_INTERVAL=1.0,
+    CHAT_SAVE_MAX_PENDING_UPDATES=50,
+    STATUS_HISTORY_MAX_ENTRIES=100,
+    STATUS_HISTORY_IDLE_FLUSH_SECONDS=30.0,
+)
+
+from beyond_the_loop.utils.status_history_buffer import (  # noqa: E402
+    StatusHistoryBuffer,
+    _buffers,
+    close_status_history_buffer,
+    get_status_history_buffer,
+)
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.calls = []
+        self.threads = []
+
+    def __call__(self, chat_id, message_id, statuses):
+        self.calls.append((chat_id, message_id, list(statuses)))
+        self.threads.append(threading.get_ident())
+
+
+def _status(action, done=False):
+    return {"action": action, "done": done}
+
+
+@pytest.mark.anyio
+async def test_statuses_are_written_once_on_close():
+    writer = _RecordingWriter()
+    buffer = StatusHistoryBuffer("c", "m", writer=writer, idle_flush_seconds=60)
+
+    buffer.add(_status("anonymizing"))
+    buffer.add(_status("anonymizing", done=True))
+    buffer.add(_status("web_search"))
+    assert writer.calls == []
+
+    await buffer.close()
+
+    assert writer.calls == [
+        ("c", "m", [
+            _status("anonymizing"),
+            _status("anonymizing", done=True),
+            _status("web_search"),
+        ])
+    ]
+    assert writer.threads[0] != threading.get_ident()
+
+
+@pytest.mark.anyio
+async def test_ring_buffer_keeps_the_newest_entries():
+    writer = _RecordingWriter()
+    buffer = StatusHistoryBuffer(
+        "c", "m", writer=writer, max_entries=3, idle_flush_seconds=60
+    )
+
+    for i in range(5):
+        buffer.add(_status(f"step-{i}"))
+    await buffer.close()
+
+    assert [s["action"] for s in writer.calls[0][2]] == ["step-2", "step-3", "step-4"]
+
+
+@pytest.mark.anyio
+async def test_idle_flush_persists_without_close():
+    writer = _RecordingWriter()
+    buffer = StatusHistoryBuffer("c", "m", writer=writer, idle_flush_seconds=0.02)
+
+    buffer.add(_status("querying_memory"))
+    await asyncio.sleep(0.01)
+    buffer.add(_status("querying_memory", done=True))
+    await asyncio.sleep(0.015)
+    assert writer.calls == []
+
+    await asyncio.sleep(0.05)
+
+    assert len(writer.calls) == 1
+    assert len(writer.calls[0][2]) == 2
+
+
+@pytest.mark.anyio
+async def test_close_without_statuses_does_not_write():
+    writer = _RecordingWriter()
+    buffer = StatusHistoryBuffer("c", "m", writer=writer, idle_flush_seconds=60)
+
+    await buffer.close()
+
+    assert writer.calls == []
+
+
+@pytest.mark.anyio
+async def test_registry_is_cleared_on_close(monkeypatch):
+    writer = _RecordingWriter()
+    monkeypatch.setattr(
+        "beyond_the_loop.utils.status_history_buffer._default_writer", writer
+    )
+
+    buffer = get_status_history_buffer("c1", "m1")
+    assert get_status_history_buffer("c1", "m1") is buffer
+    buffer.add(_status("generating_response"))
+
+    await close_status_history_buffer("c1", "m1")
+    await close_status_history_buffer("c1", "m1")
+
+    assert ("c1", "m1") not in _buffers
+    assert writer.calls == [("c1", "m1", [_status("generating_response")])]
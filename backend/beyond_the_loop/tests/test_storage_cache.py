@@ -0,0 +1,387 @@
+"""
+Tests for the object-store read cache — ObjectCache and its use in
+S3StorageProvider / GCSStorageProvider (ETag / generation validation, streamed
+and ranged reads) — and for the streaming upload path (size and hash while copying, multipart S3 uploads).
+
+S3 is replaced by an in-memory stand-in; the cache directory uses tmp_path.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_storage_cache.py -v
+"""
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+# Stubbed only while the modules under test are imported, then restored.
+_saved_modules = {}
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    _saved_modules.setdefault(name, sys.modules.get(name))
+    sys.modules[name] = mod
+    return mod
+
+
+_stub_module(
+    "beyond_the_loop.config",
+    CACHE_DIR="/tmp",
+    UPLOAD_DIR="/tmp",
+    STORAGE_PROVIDER="local",
+    S3_ACCESS_KEY_ID=None,
+    S3_BUCKET_NAME="bucket",
+    S3_ENDPOINT_URL=None,
+    S3_REGION_NAME=None,
+    S3_SECRET_ACCESS_KEY=None,
+    GCS_BUCKET_NAME=None,
+)
+_stub_module(
+    "open_webui.env",
+    SRC_LOG_LEVELS={"MODELS": "INFO"},
+    STORAGE_CACHE_MAX_BYTES=1024,
+    STORAGE_UPLOAD_CONCURRENCY=3,
+    STORAGE_UPLOAD_PART_SIZE=5 * 1024 * 1024,
+)
+for _name in ("beyond_the_loop.storage.cache", "beyond_the_loop.storage.provider"):
+    _saved_modules.setdefault(_name, sys.modules.pop(_name, None))
+
+from beyond_the_loop.storage.cache import ObjectCache  # noqa: E402
+from beyond_the_loop.storage import provider as provider_module  # noqa: E402
+from beyond_the_loop.storage.provider import (  # noqa: E402
+    GCSStorageProvider,
+    LocalStorageProvider,
+    S3StorageProvider,
+    _stream_download,
+)
+
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ObjectCache(directory=str(tmp_path / "cache"), max_bytes=1024)
+
+
+def _writer(content: bytes, calls: list):
+    def download(dest):
+        calls.append(dest)
+        with open(dest, "wb") as f:
+            f.write(content)
+
+    return download
+
+
+def _files(directory):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), directory)
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def test_miss_downloads_once_then_hits(cache):
+    calls = []
+
+    path = cache.fetch("f1_report.pdf", '"etag-1"', _writer(b"pdf", calls))
+    again = cache.fetch("f1_report.pdf", '"etag-1"', _writer(b"pdf", calls))
+
+    assert path == again
+    assert path.endswith("f1_report.pdf")
+    assert open(path, "rb").read() == b"pdf"
+    assert len(calls) == 1
+    assert cache.lookup("f1_report.pdf", '"etag-1"') == path
+
+
+def test_new_version_replaces_the_old_one(cache):
+    old = cache.fetch("f1_report.pdf", "v1", _writer(b"old", []))
+
+    new = cache.fetch("f1_report.pdf", "v2", _writer(b"new", []))
+
+    assert open(new, "rb").read() == b"new"
+    assert not os.path.exists(old)
+    assert cache.lookup("f1_report.pdf", "v1") is None
+
+
+def test_concurrent_misses_download_once(cache):
+    calls = []
+    started = threading.Event()
+
+    def slow_download(dest):
+        calls.append(dest)
+        started.set()
+        time.sleep(0.05)
+        with open(dest, "wb") as f:
+            f.write(b"data")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.fetch("k", "v", slow_download)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+
+def test_failed_download_leaves_nothing(cache):
+    def broken(dest):
+        with open(dest, "wb") as f:
+            f.write(b"partial")
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        cache.fetch("k", "v", broken)
+
+    assert _files(cache.directory) == []
+
+
+def test_tee_caches_only_a_stream_read_to_the_end(cache):
+    chunks = [b"ab", b"cd"]
+
+    abandoned = cache.tee("k", "v", iter(chunks))
+    assert next(abandoned) == b"ab"
+    abandoned.close()
+    assert _files(cache.directory) == []
+
+    assert list(cache.tee("k", "v", iter(chunks))) == chunks
+    assert open(cache.lookup("k", "v"), "rb").read() == b"abcd"
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    first = cache.fetch("first", "v", _writer(b"x" * 400, []))
+    second = cache.fetch("second", "v", _writer(b"x" * 400, []))
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+    cache.lookup("first", "v")  # now the most recent
+
+    cache.fetch("third", "v", _writer(b"x" * 400, []))
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+
+
+def test_discard_drops_all_versions(cache):
+    cache.fetch("k", "v1", _writer(b"a", []))
+
+    cache.discard("k")
+
+    assert cache.lookup("k", "v1") is None
+
+
+class _FakeS3:
+    def __init__(self, objects):
+        self.objects = objects  # key -> (etag, bytes)
+        self.downloads = 0
+        self.get_calls = []
+        self.upload_configs = []
+
+    def head_object(self, Bucket, Key):
+        etag, content = self.objects[Key]
+        return {"ETag": etag, "ContentLength": len(content)}
+
+    def upload_file(self, path, bucket, key, Config=None):
+        self.upload_configs.append(Config)
+        with open(path, "rb") as f:
+            self.objects[key] = (f'"{key}-etag"', f.read())
+
+    def download_file(self, bucket, key, dest):
+        self.downloads += 1
+        with open(dest, "wb") as f:
+            f.write(self.objects[key][1])
+
+    def get_object(self, Bucket, Key, IfMatch, Range=None):
+        self.get_calls.append((IfMatch, Range))
+        content = self.objects[Key][1]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            content = content[int(start): int(end) + 1 if end else None]
+        body = io.BytesIO(content)
+        return {
+            "Body": types.SimpleNamespace(
+                iter_chunks=lambda size: iter(lambda: body.read(size), b""),
+                close=body.close,
+            )
+        }
+
+
+@pytest.fixture
+def s3(cache):
+    provider = S3StorageProvider.__new__(S3StorageProvider)
+    provider.bucket_name = "bucket"
+    provider.s3_client = _FakeS3({"f1_a.txt": ('"e1"', b"0123456789")})
+    provider.cache = cache
+    provider.transfer_config = object()
+    return provider
+
+
+def test_s3_get_file_is_validated_by_etag(s3):
+    path = s3.get_file("s3://bucket/f1_a.txt")
+    assert s3.get_file("s3://bucket/f1_a.txt") == path
+    assert s3.s3_client.downloads == 1
+
+    s3.s3_client.objects["f1_a.txt"] = ('"e2"', b"changed")
+    assert open(s3.get_file("s3://bucket/f1_a.txt"), "rb").read() == b"changed"
+    assert s3.s3_client.downloads == 2
+
+
+def test_s3_open_streams_from_the_bucket_and_fills_the_cache(s3):
+    stored = s3.open("s3://bucket/f1_a.txt")
+    assert (stored.size, stored.local_path) == (10, None)
+
+    assert b"".join(stored.read(2, 4)) == b"234"
+    assert s3.s3_client.get_calls[-1] == ('"e1"', "bytes=2-4")
+    assert s3.open("s3://bucket/f1_a.txt").local_path is None  # ranges are not cached
+
+    assert b"".join(stored.read(0, None)) == b"0123456789"
+    assert s3.s3_client.get_calls[-1] == ('"e1"', None)
+
+    cached = s3.open("s3://bucket/f1_a.txt")
+    assert open(cached.local_path, "rb").read() == b"0123456789"
+    assert s3.s3_client.downloads == 0
+
+
+class _ChunkedReader(io.BytesIO):
+    """An upload stream that records how much it was asked for at once."""
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def test_local_upload_is_sized_and_hashed_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(provider_module, "UPLOAD_DIR", str(tmp_path))
+    content = os.urandom(3 * provider_module.STREAM_CHUNK_SIZE + 7)
+    reader = _ChunkedReader(content)
+
+    uploaded, path = LocalStorageProvider.upload_file(reader, "f1_big.bin")
+
+    assert path == f"{tmp_path}/f1_big.bin"
+    assert uploaded.size == len(content)
+    assert uploaded.sha256 == hashlib.sha256(content).hexdigest()
+    assert open(path, "rb").read() == content
+    assert set(reader.reads) == {provider_module.STREAM_CHUNK_SIZE}
+    assert os.listdir(tmp_path) == ["f1_big.bin"]
+
+
+def test_empty_upload_leaves_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(provider_module, "UPLOAD_DIR", str(tmp_path))
+
+    with pytest.raises(ValueError):
+        LocalStorageProvider.upload_file(io.BytesIO(b""), "f1_empty.txt")
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_s3_upload_is_multipart_and_fills_the_cache(s3):
+    uploaded, path = s3.upload_file(io.BytesIO(b"uploaded"), "f2_b.txt")
+
+    assert path == "s3://bucket/f2_b.txt"
+    assert uploaded.size == 8
+    assert s3.s3_client.upload_configs == [s3.transfer_config]
+    assert s3.s3_client.objects["f2_b.txt"][1] == b"uploaded"
+
+    # Processing right after the upload reads the local copy.
+    local_path = s3.get_file(path)
+    assert open(local_path, "rb").read() == b"uploaded"
+    assert s3.s3_client.downloads == 0
+    assert _files(s3.cache.directory) == [os.path.relpath(local_path, s3.cache.directory)]
+
+
+def test_failed_s3_upload_leaves_nothing(s3):
+    def broken(*args, **kwargs):
+        raise provider_module.ClientError({"Error": {"Code": "500"}}, "PutObject")
+
+    s3.s3_client.upload_file = broken
+
+    with pytest.raises(RuntimeError):
+        s3.upload_file(io.BytesIO(b"uploaded"), "f2_b.txt")
+
+    assert _files(s3.cache.directory) == []
+
+
+def _writes_in_pieces(content: bytes, piece: int = 8192):
+    def download(file_obj):
+        for start in range(0, len(content), piece):
+            file_obj.write(content[start : start + piece])
+
+    return download
+
+
+def test_stream_download_yields_large_chunks_in_order():
+    content = os.urandom(2 * provider_module.STREAM_CHUNK_SIZE + 100)
+
+    chunks = list(_stream_download(_writes_in_pieces(content)))
+
+    assert b"".join(chunks) == content
+    assert [len(c) for c in chunks[:2]] == [provider_module.STREAM_CHUNK_SIZE] * 2
+
+
+def test_stream_download_raises_the_download_error():
+    def broken(file_obj):
+        file_obj.write(b"partial")
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        list(_stream_download(broken))
+
+
+def test_closing_the_stream_aborts_the_download():
+    finished = threading.Event()
+
+    def endless(file_obj):
+        try:
+            while True:
+                file_obj.write(b"x" * 65536)
+        finally:
+            finished.set()
+
+    stream = _stream_download(endless)
+    next(stream)
+    stream.close()
+
+    assert finished.wait(timeout=5)
+
+
+class _FakeBlob:
+    def __init__(self, content):
+        self.name = "f3_c.bin"
+        self.size = len(content)
+        self.generation = 7
+        self.content = content
+        self.calls = []
+
+    def download_to_file(self, file_obj, start, end, if_generation_match):
+        self.calls.append((start, end, if_generation_match))
+        _writes_in_pieces(self.content[start : end + 1])(file_obj)
+
+
+def test_gcs_stream_is_one_ranged_request():
+    content = os.urandom(3 * provider_module.STREAM_CHUNK_SIZE)
+    blob = _FakeBlob(content)
+    gcs = GCSStorageProvider.__new__(GCSStorageProvider)
+
+    assert b"".join(gcs._iter_blob(blob, 0, None)) == content
+    assert b"".join(gcs._iter_blob(blob, 10, 19)) == content[10:20]
+    assert blob.calls == [(0, len(content) - 1, 7), (10, 19, 7)]
@@ -0,0 +1,134 @@
+"""
+Tests for the typed stream events between the LiteLLM proxy stream and
+process_chat_response: byte-level line splitting, payload parsing of plain
+SSE responses and the SSE encoding of EventStreamResponse at the edge.
+
+Run with:
+    cd backend
+    pytest beyond_the_loop/tests/test_stream_events.py -v
+"""
+import json
+
+import pytest
+from starlette.responses import StreamingResponse
+
+from beyond_the_loop.utils.stream_events import (
+    CitationEvent,
+    CodeExecutionEvent,
+    EventStreamResponse,
+    FileRefsEvent,
+    ReasoningDelta,
+    StatusEvent,
+    TextDelta,
+    UsageEvent,
+    as_chunk,
+    iter_lines,
+    stream_payloads,
+)
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+@pytest.mark.anyio
+async def test_lines_are_reassembled_across_chunks():
+    chunks = [b"event: a\r\nda", b"ta: {\"x\"", b": 1}\n\n", b"data: tail"]
+
+    lines = await _collect(iter_lines(_aiter(chunks)))
+
+    assert lines == [b"event: a", b'data: {"x": 1}', b"", b"data: tail"]
+
+
+@pytest.mark.anyio
+async def test_multibyte_characters_split_between_chunks_survive():
+    encoded = 'data: {"t": "Grüße"}\n'.encode()
+    split = encoded.index("ü".encode()) + 1
+
+    lines = await _collect(iter_lines(_aiter([encoded[:split], encoded[split:]])))
+
+    assert lines[0].decode() == 'data: {"t": "Grüße"}'
+
+
+@pytest.mark.anyio
+async def test_plain_sse_yields_parsed_data_payloads_only():
+    response = StreamingResponse(
+        _aiter([
+            b": keep-alive\n",
+            b'data: {"id": "c1", "choices": [{"delta": {"content": "Hi"}}]}\n\n',
+            b"data: not json\n\n",
+            b"data: [1, 2]\n\n",
+            b'data:{"id": "c1", "usage": {"total_tokens": 3}}\n\n',
+            b"data: [DONE]\n\n",
+        ])
+    )
+
+    payloads = await _collect(stream_payloads(response))
+
+    assert payloads == [
+        {"id": "c1", "choices": [{"delta": {"content": "Hi"}}]},
+        {"id": "c1", "usage": {"total_tokens": 3}},
+    ]
+
+
+@pytest.mark.anyio
+async def test_event_stream_hands_out_the_event_objects():
+    events = [TextDelta("Hi"), StatusEvent({"action": "web_search", "done": True})]
+    response = EventStreamResponse(_aiter(events), response_id="r1", model="GPT-5")
+
+    assert await _collect(stream_payloads(response)) == events
+
+
+def test_delta_events_become_chat_completion_chunks():
+    assert as_chunk(TextDelta("Hi")) == {
+        "choices": [{"index": 0, "delta": {"content": "Hi"}, "finish_reason": None}],
+    }
+    assert as_chunk(ReasoningDelta("hmm"))["choices"][0]["delta"] == {"thinking": "hmm"}
+    assert as_chunk(CitationEvent(queries_used=["q"]))["choices"][0]["delta"] == {
+        "openai_queries_used": ["q"],
+    }
+
+    stop = as_chunk(UsageEvent({"total_tokens": 3}), {"id": "r1"})
+    assert stop["id"] == "r1"
+    assert stop["usage"] == {"total_tokens": 3}
+    assert stop["choices"][0] == {"index": 0, "delta": {}, "finish_reason": "stop"}
+
+
+@pytest.mark.anyio
+async def test_body_is_encoded_as_sse_in_the_previous_wire_format():
+    events = [
+        StatusEvent({"action": "web_search", "done": False}),
+        TextDelta("Hi"),
+        CodeExecutionEvent({"id": "ci_1", "code": "1+1"}),
+        CitationEvent(url_citations=[{"url": "https://example.com"}]),
+        FileRefsEvent([{"file_id": "f1"}], "Hi (/api/v1/files/f1)"),
+        UsageEvent({"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}),
+    ]
+    response = EventStreamResponse(_aiter(events), response_id="r1", model="GPT-5")
+
+    body = b"".join(await _collect(response.body_iterator))
+
+    frames = body.split(b"\n\n")
+    assert frames[-2:] == [b"data: [DONE]", b""]
+    payloads = [json.loads(frame[len(b"data: "):]) for frame in frames[:-2]]
+
+    assert payloads[0] == {"status_event": {"action": "web_search", "done": False}}
+    assert payloads[1]["id"] == "r1"
+    assert payloads[1]["object"] == "chat.completion.chunk"
+    assert payloads[1]["model"] == "GPT-5"
+    assert payloads[1]["choices"][0]["delta"] == {"content": "Hi"}
+    assert payloads[2] == {"code_execution_event": {"id": "ci_1", "code": "1+1"}}
+    assert payloads[3]["choices"][0]["delta"] == {
+        "openai_url_citation": [{"url": "https://example.com"}],
+    }
+    assert payloads[4] == {
+        "file_refs": [{"file_id": "f1"}],
+        "content_replacement": "Hi (/api/v1/files/f1)",
+    }
+    assert payloads[5]["choices"][0]["finish_reason"] == "stop"
+    assert payloads[5]["usage"]["total_tokens"] == 3
@@ -395,10 +395,10 @@ async def build_continuation_seed(
         return None
 
     if pii_active and chat_id:
-        from beyond_the_loop.pii.session import PIISession, anonymize_messages
+        from beyond_the_loop.pii.session import PIISession, aanonymize_messages
 
         pii_session = PIISession(chat_id)
-        anonymize_messages(messages, pii_session)
+        await aanonymize_messages(messages, pii_session)
         pii_session.save()
 
     compression = {"messages": messages, "summary": None}
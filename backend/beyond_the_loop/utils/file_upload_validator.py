@@ -1,3 +1,4 @@
+import os
 import magic
 from pathlib import Path
 from fastapi import HTTPException, UploadFile, status
@@ -66,8 +67,9 @@ class FileValidator:
         """
 
         # --- Layer 0: Size check ---
-        head = file.file.read(MAX_FILE_SIZE_BYTES + 1)  # 1 Byte mehr als Limit lesen
-        if len(head) > MAX_FILE_SIZE_BYTES:
+        # Größe über seek/tell, ohne die Datei in den Speicher zu lesen
+        file.file.seek(0, os.SEEK_END)
+        if file.file.tell() > MAX_FILE_SIZE_BYTES:
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail="Hochgeladene Datei ist größer als die maximale Dateigröße von 25 MB",
@@ -0,0 +1,142 @@
+"""
+MessageWriteBuffer — write-behind coalescer for streamed assistant messages.
+
+Why: a single streamed response used to call
+`Chats.upsert_message_to_chat_by_id_and_message_id` several times (model id,
+events, selected model, search results, images, final content — and once per
+token with ENABLE_REALTIME_CHAT_SAVE), each one a synchronous DB round trip
+on the event loop thread. Upserts are shallow merges into the stored message,
+so consecutive updates for the same (chat_id, message_id) can be folded into
+one dict and written once.
+
+Updates are flushed when CHAT_SAVE_FLUSH_INTERVAL seconds have passed since
+the first pending update, when CHAT_SAVE_MAX_PENDING_UPDATES updates have
+piled up, or explicitly via `flush()` / `close()` at stream end, cancellation
+or error. The DB write itself runs in a worker thread.
+
+Usage:
+    buffer = get_message_write_buffer(chat_id, message_id)
+    buffer.update({"model": model_id})
+    ...
+    buffer.update({"content": final_content})
+    await buffer.close()
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from open_webui.env import (
+    CHAT_SAVE_FLUSH_INTERVAL,
+    CHAT_SAVE_MAX_PENDING_UPDATES,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS.get("MODELS", logging.INFO))
+
+MessageWriter = Callable[[str, str, dict], object]
+
+
+def _default_writer(chat_id: str, message_id: str, message: dict) -> object:
+    from beyond_the_loop.models.chats import Chats
+
+    return Chats.upsert_message_to_chat_by_id_and_message_id(
+        chat_id, message_id, message
+    )
+
+
+class MessageWriteBuffer:
+    def __init__(
+        self,
+        chat_id: str,
+        message_id: str,
+        writer: Optional[MessageWriter] = None,
+        flush_interval: float = CHAT_SAVE_FLUSH_INTERVAL,
+        max_pending_updates: int = CHAT_SAVE_MAX_PENDING_UPDATES,
+    ) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.writer = writer or _default_writer
+        self.flush_interval = flush_interval
+        self.max_pending_updates = max_pending_updates
+
+        self._pending: dict = {}
+        self._pending_updates = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> dict:
+        return dict(self._pending)
+
+    def update(self, message: dict) -> None:
+        """Merge `message` into the pending write. Never blocks on the DB."""
+        if not message:
+            return
+
+        self._pending.update(message)
+        self._pending_updates += 1
+
+        if self._pending_updates >= self.max_pending_updates:
+            self._schedule_flush_now()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_after_interval())
+
+    async def flush(self) -> None:
+        """Write whatever is pending. Safe to call with nothing pending."""
+        async with self._lock:
+            # Loop so updates that arrive while a write is in flight go out
+            # with this flush instead of waiting for the next trigger.
+            while self._pending:
+                message = self._pending
+                self._pending = {}
+                self._pending_updates = 0
+
+                try:
+                    await asyncio.to_thread(
+                        self.writer, self.chat_id, self.message_id, message
+                    )
+                except Exception:
+                    log.exception(
+                        f"Failed to persist message {self.message_id} of chat {self.chat_id}"
+                    )
+
+    async def close(self) -> None:
+        """Cancel the interval timer, wait for in-flight writes, flush the rest."""
+        _buffers.pop((self.chat_id, self.message_id), None)
+
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+
+        if self._flush_task is not None and not self._flush_task.done():
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+
+        await self.flush()
+
+    def _schedule_flush_now(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def _flush_after_interval(self) -> None:
+        # The timer only hands off to a flush task, so cancelling it in
+        # close() can never interrupt a write that is already running.
+        await asyncio.sleep(self.flush_interval)
+        self._schedule_flush_now()
+
+
+_buffers: Dict[Tuple[str, str], MessageWriteBuffer] = {}
+
+
+def get_message_write_buffer(chat_id: str, message_id: str) -> MessageWriteBuffer:
+    """Return the live buffer for (chat_id, message_id), creating it if needed."""
+    key = (chat_id, message_id)
+    buffer = _buffers.get(key)
+    if buffer is None:
+        buffer = MessageWriteBuffer(chat_id, message_id)
+        _buffers[key] = buffer
+    return buffer
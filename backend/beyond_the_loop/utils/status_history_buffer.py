@@ -0,0 +1,142 @@
+"""
+StatusHistoryBuffer — per-message ring buffer for status events.
+
+Why: every `status` event through `__event_emitter__` used to call
+`Chats.add_message_status_to_chat_by_id_and_message_id`, a chat row UPDATE on
+the request's critical path, and a single turn emits many of them
+(anonymizing, smart router, analyzing_results, web search, generating_response
+sub-steps, MCP connect). The events still reach the client immediately; only
+their persistence is deferred.
+
+Statuses are collected in memory and appended to the message's
+`statusHistory` in one write when the message completes (`close()`), or
+STATUS_HISTORY_IDLE_FLUSH_SECONDS after the last status for paths that never
+signal completion. A buffer keeps at most STATUS_HISTORY_MAX_ENTRIES
+statuses, dropping the oldest. The write itself runs in a worker thread.
+
+Usage:
+    get_status_history_buffer(chat_id, message_id).add(status)
+    ...
+    await close_status_history_buffer(chat_id, message_id)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from open_webui.env import (
+    SRC_LOG_LEVELS,
+    STATUS_HISTORY_IDLE_FLUSH_SECONDS,
+    STATUS_HISTORY_MAX_ENTRIES,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS.get("MODELS", logging.INFO))
+
+StatusWriter = Callable[[str, str, List[dict]], object]
+
+
+def _default_writer(chat_id: str, message_id: str, statuses: List[dict]) -> object:
+    from beyond_the_loop.models.chats import Chats
+
+    return Chats.add_message_statuses_to_chat_by_id_and_message_id(
+        chat_id, message_id, statuses
+    )
+
+
+class StatusHistoryBuffer:
+    def __init__(
+        self,
+        chat_id: str,
+        message_id: str,
+        writer: Optional[StatusWriter] = None,
+        max_entries: int = STATUS_HISTORY_MAX_ENTRIES,
+        idle_flush_seconds: float = STATUS_HISTORY_IDLE_FLUSH_SECONDS,
+    ) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.writer = writer or _default_writer
+        self.idle_flush_seconds = idle_flush_seconds
+
+        self._statuses: deque = deque(maxlen=max_entries)
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def statuses(self) -> List[dict]:
+        return list(self._statuses)
+
+    def add(self, status: dict) -> None:
+        """Record `status`. Never blocks on the DB."""
+        self._statuses.append(status)
+
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._flush_when_idle())
+
+    async def flush(self) -> None:
+        """Append whatever is buffered. Safe to call with nothing buffered."""
+        async with self._lock:
+            if not self._statuses:
+                return
+            statuses = list(self._statuses)
+            self._statuses.clear()
+
+            try:
+                await asyncio.to_thread(
+                    self.writer, self.chat_id, self.message_id, statuses
+                )
+            except Exception:
+                log.exception(
+                    f"Failed to persist status history of message {self.message_id} "
+                    f"of chat {self.chat_id}"
+                )
+
+    async def close(self) -> None:
+        """Cancel the idle timer, wait for an in-flight write, flush the rest."""
+        self._unregister()
+
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+
+        if self._flush_task is not None and not self._flush_task.done():
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+
+        await self.flush()
+
+    def _unregister(self) -> None:
+        key = (self.chat_id, self.message_id)
+        if _buffers.get(key) is self:
+            del _buffers[key]
+
+    async def _flush_when_idle(self) -> None:
+        # As in MessageWriteBuffer, the timer only hands off to a flush task,
+        # so cancelling it on the next status never interrupts a write.
+        await asyncio.sleep(self.idle_flush_seconds)
+        self._unregister()
+        self._flush_task = asyncio.create_task(self.flush())
+
+
+_buffers: Dict[Tuple[str, str], StatusHistoryBuffer] = {}
+
+
+def get_status_history_buffer(chat_id: str, message_id: str) -> StatusHistoryBuffer:
+    """Return the live buffer for (chat_id, message_id), creating it if needed."""
+    key = (chat_id, message_id)
+    buffer = _buffers.get(key)
+    if buffer is None:
+        buffer = StatusHistoryBuffer(chat_id, message_id)
+        _buffers[key] = buffer
+    return buffer
+
+
+async def close_status_history_buffer(chat_id: str, message_id: str) -> None:
+    """Persist and drop the buffer for (chat_id, message_id), if there is one."""
+    buffer = _buffers.get((chat_id, message_id))
+    if buffer is not None:
+        await buffer.close()
@@ -0,0 +1,217 @@
+"""
+Typed events between the LiteLLM proxy stream and `process_chat_response`.
+
+Why: for Responses-API models `generate_chat_completion` used to rebuild every
+upstream delta as a chat-completion-chunk JSON string and encode it to bytes,
+only for `process_chat_response` (usually in the same process) to decode and
+`json.loads` it again — two JSON round trips and several string copies per
+token.
+
+The Responses-API stream now yields the dataclasses below inside an
+`EventStreamResponse`. In-process consumers iterate `response.events` and get
+the objects as they were produced. SSE is only written when the response
+body itself is sent to an HTTP client (`body_iterator`), in the wire format
+the old stream used, encoded with orjson.
+
+`stream_payloads` gives the consumer one loop over both kinds of stream: the
+typed events of an `EventStreamResponse`, or the parsed `data:` payloads of a
+plain SSE `StreamingResponse` (chat-completions models), split into lines at
+the byte level without re-scanning or decoding the whole buffer.
+
+Usage:
+    return EventStreamResponse(events(), response_id=..., model=model_name)
+    ...
+    async for payload in stream_payloads(response):
+        if isinstance(payload, StatusEvent): ...
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+import orjson
+from starlette.responses import StreamingResponse
+
+log = logging.getLogger(__name__)
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+@dataclass(slots=True)
+class TextDelta:
+    text: str
+
+    @property
+    def delta(self) -> dict:
+        return {"content": self.text}
+
+
+@dataclass(slots=True)
+class ReasoningDelta:
+    text: str
+
+    @property
+    def delta(self) -> dict:
+        return {"thinking": self.text}
+
+
+@dataclass(slots=True)
+class CitationEvent:
+    """Web search results of an OpenAI response: the `url_citation`
+    annotations of its output and/or the queries it ran."""
+
+    url_citations: Optional[list] = None
+    queries_used: Optional[list] = None
+
+    @property
+    def delta(self) -> dict:
+        delta = {}
+        if self.url_citations:
+            delta["openai_url_citation"] = self.url_citations
+        if self.queries_used:
+            delta["openai_queries_used"] = self.queries_used
+        return delta
+
+
+@dataclass(slots=True)
+class UsageEvent:
+    """End of the response, with its usage in chat-completions terms
+    (`prompt_tokens`, `completion_tokens`, `total_tokens`)."""
+
+    usage: dict
+
+    @property
+    def delta(self) -> dict:
+        return {}
+
+
+@dataclass(slots=True)
+class StatusEvent:
+    status: dict
+
+
+@dataclass(slots=True)
+class CodeExecutionEvent:
+    execution: dict
+
+
+@dataclass(slots=True)
+class FileRefsEvent:
+    file_refs: list
+    content_replacement: str
+
+
+DeltaEvent = Union[TextDelta, ReasoningDelta, CitationEvent, UsageEvent]
+StreamEvent = Union[DeltaEvent, StatusEvent, CodeExecutionEvent, FileRefsEvent]
+STREAM_EVENT_TYPES = (
+    TextDelta, ReasoningDelta, CitationEvent, UsageEvent,
+    StatusEvent, CodeExecutionEvent, FileRefsEvent,
+)
+
+
+def as_chunk(event: DeltaEvent, envelope: Optional[dict] = None) -> dict:
+    """The chat-completion chunk a delta event stands for. `envelope` adds the
+    `id` / `object` / `created` / `model` fields clients get over the wire."""
+    finish_reason = "stop" if isinstance(event, UsageEvent) else None
+    chunk = {
+        **(envelope or {}),
+        "choices": [{"index": 0, "delta": event.delta, "finish_reason": finish_reason}],
+    }
+    if isinstance(event, UsageEvent):
+        chunk["usage"] = event.usage
+    return chunk
+
+
+def encode_sse(payload) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def encode_event(event: StreamEvent, response_id: str, model: str) -> bytes:
+    if isinstance(event, StatusEvent):
+        return encode_sse({"status_event": event.status})
+    if isinstance(event, CodeExecutionEvent):
+        return encode_sse({"code_execution_event": event.execution})
+    if isinstance(event, FileRefsEvent):
+        return encode_sse(
+            {"file_refs": event.file_refs, "content_replacement": event.content_replacement}
+        )
+    return encode_sse(
+        as_chunk(
+            event,
+            {
+                "id": response_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+            },
+        )
+    )
+
+
+class EventStreamResponse(StreamingResponse):
+    """A streaming chat completion made of typed events.
+
+    `events` is the event iterator itself, for consumers in this process;
+    `body_iterator` (what Starlette sends) encodes the same iterator as SSE.
+    Only one of the two may be consumed.
+    """
+
+    def __init__(
+        self,
+        events: AsyncIterator[StreamEvent],
+        response_id: str,
+        model: str,
+        **kwargs,
+    ) -> None:
+        self.events = events
+        self.response_id = response_id
+        self.model = model
+        super().__init__(self._encode(), **kwargs)
+
+    async def _encode(self) -> AsyncIterator[bytes]:
+        async for event in self.events:
+            yield encode_event(event, self.response_id, self.model)
+        yield SSE_DONE
+
+
+async def iter_lines(chunks: AsyncIterable[Union[bytes, str]]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines (without the line break). Each chunk is
+    scanned once; the unfinished tail is kept for the next one."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk.encode() if isinstance(chunk, str) else chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            if end > start and buffer[end - 1] == 0x0D:  # \r\n
+                yield bytes(buffer[start:end - 1])
+            else:
+                yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer.rstrip(b"\r"))
+
+
+async def stream_payloads(response: StreamingResponse) -> AsyncIterator[Union[StreamEvent, dict]]:
+    """Typed events of an `EventStreamResponse`, or the JSON objects in the
+    `data:` lines of any other SSE response."""
+    if isinstance(response, EventStreamResponse):
+        async for event in response.events:
+            yield event
+        return
+
+    async for line in iter_lines(response.body_iterator):
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == b"[DONE]":
+            continue
+        try:
+            payload = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            log.debug(f"Skipping undecodable stream line: {line[:200]!r}")
+            continue
+        if isinstance(payload, dict):
+            yield payload
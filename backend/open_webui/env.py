@@ -261,12 +261,260 @@ ENABLE_REALTIME_CHAT_SAVE = (
     os.environ.get("ENABLE_REALTIME_CHAT_SAVE", "False").lower() == "true"
 )
 
+# Write-behind for streamed message persistence: updates to the same message
+# are merged and written at most once per interval (seconds) or as soon as
+# this many updates are pending.
+CHAT_SAVE_FLUSH_INTERVAL = os.environ.get("CHAT_SAVE_FLUSH_INTERVAL", "1.0")
+
+try:
+    CHAT_SAVE_FLUSH_INTERVAL = float(CHAT_SAVE_FLUSH_INTERVAL)
+except Exception:
+    CHAT_SAVE_FLUSH_INTERVAL = 1.0
+
+CHAT_SAVE_MAX_PENDING_UPDATES = os.environ.get("CHAT_SAVE_MAX_PENDING_UPDATES", "50")
+
+try:
+    CHAT_SAVE_MAX_PENDING_UPDATES = int(CHAT_SAVE_MAX_PENDING_UPDATES)
+except Exception:
+    CHAT_SAVE_MAX_PENDING_UPDATES = 50
+
+# Status events are kept in a per-message ring buffer and appended to the
+# message's statusHistory in one write when the message completes, or this
+# many seconds after the last status if completion is never signalled.
+STATUS_HISTORY_MAX_ENTRIES = os.environ.get("STATUS_HISTORY_MAX_ENTRIES", "100")
+
+try:
+    STATUS_HISTORY_MAX_ENTRIES = int(STATUS_HISTORY_MAX_ENTRIES)
+except Exception:
+    STATUS_HISTORY_MAX_ENTRIES = 100
+
+STATUS_HISTORY_IDLE_FLUSH_SECONDS = os.environ.get(
+    "STATUS_HISTORY_IDLE_FLUSH_SECONDS", "30"
+)
+
+try:
+    STATUS_HISTORY_IDLE_FLUSH_SECONDS = float(STATUS_HISTORY_IDLE_FLUSH_SECONDS)
+except Exception:
+    STATUS_HISTORY_IDLE_FLUSH_SECONDS = 30.0
+
+# Streamed text events normally carry the full message next to the new
+# `added_content`. With delta events on, only every Nth event (and the first
+# one after any non-text update) carries the full snapshot.
+ENABLE_CHAT_STREAM_DELTA_EVENTS = (
+    os.environ.get("ENABLE_CHAT_STREAM_DELTA_EVENTS", "False").lower() == "true"
+)
+
+CHAT_STREAM_SNAPSHOT_INTERVAL = os.environ.get("CHAT_STREAM_SNAPSHOT_INTERVAL", "50")
+
+try:
+    CHAT_STREAM_SNAPSHOT_INTERVAL = max(1, int(CHAT_STREAM_SNAPSHOT_INTERVAL))
+except Exception:
+    CHAT_STREAM_SNAPSHOT_INTERVAL = 50
+
+####################################
+# RAG embeddings
+####################################
+
+# Document embeddings are sent as batches packed up to this many tokens
+# (the API caps a request at 300k), with this many requests in flight.
+RAG_EMBEDDING_BATCH_MAX_TOKENS = os.environ.get("RAG_EMBEDDING_BATCH_MAX_TOKENS", "100000")
+
+try:
+    RAG_EMBEDDING_BATCH_MAX_TOKENS = int(RAG_EMBEDDING_BATCH_MAX_TOKENS)
+except Exception:
+    RAG_EMBEDDING_BATCH_MAX_TOKENS = 100000
+
+RAG_EMBEDDING_CONCURRENCY = os.environ.get("RAG_EMBEDDING_CONCURRENCY", "4")
+
+try:
+    RAG_EMBEDDING_CONCURRENCY = max(1, int(RAG_EMBEDDING_CONCURRENCY))
+except Exception:
+    RAG_EMBEDDING_CONCURRENCY = 4
+
+# Attempts per batch on 429 responses before the whole call fails.
+RAG_EMBEDDING_MAX_RETRIES = os.environ.get("RAG_EMBEDDING_MAX_RETRIES", "6")
+
+try:
+    RAG_EMBEDDING_MAX_RETRIES = int(RAG_EMBEDDING_MAX_RETRIES)
+except Exception:
+    RAG_EMBEDDING_MAX_RETRIES = 6
+
+# Query embeddings (chat retrieval, memories) are kept in a per-process
+# LRU for this many seconds; regenerations and follow-ups reuse them.
+RAG_QUERY_EMBEDDING_CACHE_SIZE = os.environ.get("RAG_QUERY_EMBEDDING_CACHE_SIZE", "2048")
+
+try:
+    RAG_QUERY_EMBEDDING_CACHE_SIZE = int(RAG_QUERY_EMBEDDING_CACHE_SIZE)
+except Exception:
+    RAG_QUERY_EMBEDDING_CACHE_SIZE = 2048
+
+RAG_QUERY_EMBEDDING_CACHE_TTL = os.environ.get("RAG_QUERY_EMBEDDING_CACHE_TTL", "3600")
+
+try:
+    RAG_QUERY_EMBEDDING_CACHE_TTL = float(RAG_QUERY_EMBEDDING_CACHE_TTL)
+except Exception:
+    RAG_QUERY_EMBEDDING_CACHE_TTL = 3600.0
+
 ####################################
 # REDIS
 ####################################
 
 REDIS_URL = os.environ.get("REDIS_URL")
 
+# Per-process cache of parsed company configs. Invalidations are broadcast
+# over Redis pub/sub; the TTL only bounds staleness while a pod is
+# disconnected from Redis.
+COMPANY_CONFIG_CACHE_TTL = os.environ.get("COMPANY_CONFIG_CACHE_TTL", "60")
+
+try:
+    COMPANY_CONFIG_CACHE_TTL = int(COMPANY_CONFIG_CACHE_TTL)
+except Exception:
+    COMPANY_CONFIG_CACHE_TTL = 60
+
+COMPANY_CONFIG_CACHE_SIZE = os.environ.get("COMPANY_CONFIG_CACHE_SIZE", "1024")
+
+try:
+    COMPANY_CONFIG_CACHE_SIZE = int(COMPANY_CONFIG_CACHE_SIZE)
+except Exception:
+    COMPANY_CONFIG_CACHE_SIZE = 1024
+
+# Credit usage is appended to credit_ledger on the request path and applied
+# to company balances by a background settler every interval (seconds), at
+# most this many ledger entries per settle statement.
+CREDIT_LEDGER_SETTLE_INTERVAL = os.environ.get("CREDIT_LEDGER_SETTLE_INTERVAL", "2")
+
+try:
+    CREDIT_LEDGER_SETTLE_INTERVAL = float(CREDIT_LEDGER_SETTLE_INTERVAL)
+except Exception:
+    CREDIT_LEDGER_SETTLE_INTERVAL = 2.0
+
+CREDIT_LEDGER_SETTLE_BATCH_SIZE = os.environ.get("CREDIT_LEDGER_SETTLE_BATCH_SIZE", "5000")
+
+try:
+    CREDIT_LEDGER_SETTLE_BATCH_SIZE = int(CREDIT_LEDGER_SETTLE_BATCH_SIZE)
+except Exception:
+    CREDIT_LEDGER_SETTLE_BATCH_SIZE = 5000
+
+# Per-process cache of per-company entitlement snapshots (company row +
+# subscription) used by the completion preflight. Invalidated on Stripe
+# webhooks and credit updates; the TTL bounds seat-count staleness.
+ENTITLEMENT_CACHE_TTL = os.environ.get("ENTITLEMENT_CACHE_TTL", "30")
+
+try:
+    ENTITLEMENT_CACHE_TTL = int(ENTITLEMENT_CACHE_TTL)
+except Exception:
+    ENTITLEMENT_CACHE_TTL = 30
+
+ENTITLEMENT_CACHE_SIZE = os.environ.get("ENTITLEMENT_CACHE_SIZE", "1024")
+
+try:
+    ENTITLEMENT_CACHE_SIZE = int(ENTITLEMENT_CACHE_SIZE)
+except Exception:
+    ENTITLEMENT_CACHE_SIZE = 1024
+
+# Text extracted from uploaded files for "full" context mode: kept on local
+# disk (bounded, least recently used evicted first) and in Redis for this
+# many seconds, so chat turns don't re-download and re-parse the file.
+EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES = os.environ.get(
+    "EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES", str(1024 * 1024 * 1024)
+)
+
+try:
+    EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES = int(EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES)
+except Exception:
+    EXTRACTED_TEXT_CACHE_MAX_DISK_BYTES = 1024 * 1024 * 1024
+
+EXTRACTED_TEXT_CACHE_TTL = os.environ.get("EXTRACTED_TEXT_CACHE_TTL", str(7 * 24 * 60 * 60))
+
+try:
+    EXTRACTED_TEXT_CACHE_TTL = int(EXTRACTED_TEXT_CACHE_TTL)
+except Exception:
+    EXTRACTED_TEXT_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Uploads and knowledge-base adds with `?background=true` are queued as
+# ingestion jobs. This many run concurrently per process (0 disables the
+# in-process worker, e.g. when `python -m beyond_the_loop.services.ingestion_worker`
+# runs separately); idle workers poll the queue every interval (seconds).
+INGESTION_WORKER_CONCURRENCY = os.environ.get("INGESTION_WORKER_CONCURRENCY", "2")
+
+try:
+    INGESTION_WORKER_CONCURRENCY = int(INGESTION_WORKER_CONCURRENCY)
+except Exception:
+    INGESTION_WORKER_CONCURRENCY = 2
+
+INGESTION_JOB_POLL_INTERVAL = os.environ.get("INGESTION_JOB_POLL_INTERVAL", "1")
+
+try:
+    INGESTION_JOB_POLL_INTERVAL = float(INGESTION_JOB_POLL_INTERVAL)
+except Exception:
+    INGESTION_JOB_POLL_INTERVAL = 1.0
+
+# A failed job is retried after INGESTION_JOB_RETRY_DELAY seconds, doubling
+# per attempt, until it has run INGESTION_JOB_MAX_ATTEMPTS times.
+INGESTION_JOB_MAX_ATTEMPTS = os.environ.get("INGESTION_JOB_MAX_ATTEMPTS", "3")
+
+try:
+    INGESTION_JOB_MAX_ATTEMPTS = int(INGESTION_JOB_MAX_ATTEMPTS)
+except Exception:
+    INGESTION_JOB_MAX_ATTEMPTS = 3
+
+INGESTION_JOB_RETRY_DELAY = os.environ.get("INGESTION_JOB_RETRY_DELAY", "30")
+
+try:
+    INGESTION_JOB_RETRY_DELAY = int(INGESTION_JOB_RETRY_DELAY)
+except Exception:
+    INGESTION_JOB_RETRY_DELAY = 30
+
+# A running job whose worker has not sent a heartbeat for this many seconds
+# (pod killed mid-job) is claimed again by another worker.
+INGESTION_JOB_STALE_SECONDS = os.environ.get("INGESTION_JOB_STALE_SECONDS", "300")
+
+try:
+    INGESTION_JOB_STALE_SECONDS = int(INGESTION_JOB_STALE_SECONDS)
+except Exception:
+    INGESTION_JOB_STALE_SECONDS = 300
+
+# Scanned pages of PDFs are rendered at this DPI and OCR'd by a pool of this
+# many worker processes, shared by all uploads of the process.
+PDF_OCR_WORKERS = os.environ.get("PDF_OCR_WORKERS", "2")
+
+try:
+    PDF_OCR_WORKERS = int(PDF_OCR_WORKERS)
+except Exception:
+    PDF_OCR_WORKERS = 2
+
+PDF_OCR_DPI = os.environ.get("PDF_OCR_DPI", "300")
+
+try:
+    PDF_OCR_DPI = int(PDF_OCR_DPI)
+except Exception:
+    PDF_OCR_DPI = 300
+
+# Local copies of S3 / GCS files are kept under CACHE_DIR up to this many
+# bytes, least recently used evicted first.
+STORAGE_CACHE_MAX_BYTES = os.environ.get("STORAGE_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024))
+
+try:
+    STORAGE_CACHE_MAX_BYTES = int(STORAGE_CACHE_MAX_BYTES)
+except Exception:
+    STORAGE_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024
+
+# Uploads to S3 / GCS at or above this size go up in parts of this size,
+# STORAGE_UPLOAD_CONCURRENCY parts at a time.
+STORAGE_UPLOAD_PART_SIZE = os.environ.get("STORAGE_UPLOAD_PART_SIZE", str(16 * 1024 * 1024))
+
+try:
+    STORAGE_UPLOAD_PART_SIZE = int(STORAGE_UPLOAD_PART_SIZE)
+except Exception:
+    STORAGE_UPLOAD_PART_SIZE = 16 * 1024 * 1024
+
+STORAGE_UPLOAD_CONCURRENCY = os.environ.get("STORAGE_UPLOAD_CONCURRENCY", "4")
+
+try:
+    STORAGE_UPLOAD_CONCURRENCY = int(STORAGE_UPLOAD_CONCURRENCY)
+except Exception:
+    STORAGE_UPLOAD_CONCURRENCY = 4
+
 ####################################
 # MCP OAuth
 ####################################
@@ -355,6 +603,15 @@ ENABLE_WEBSOCKET_SUPPORT = (
 
 WEBSOCKET_MANAGER = os.environ.get("WEBSOCKET_MANAGER", "")
 
+# Max status-event frames per second per request: consecutive status events
+# within a frame go out as one `status:batch` emit. 0 disables coalescing.
+WEBSOCKET_STATUS_FPS = os.environ.get("WEBSOCKET_STATUS_FPS", "10")
+
+try:
+    WEBSOCKET_STATUS_FPS = float(WEBSOCKET_STATUS_FPS)
+except Exception:
+    WEBSOCKET_STATUS_FPS = 10.0
+
 AIOHTTP_CLIENT_TIMEOUT = os.environ.get("AIOHTTP_CLIENT_TIMEOUT", "300")
 
 if AIOHTTP_CLIENT_TIMEOUT == "":
@@ -118,6 +118,8 @@ from beyond_the_loop.routers import public_api
 from beyond_the_loop.routers import users
 from beyond_the_loop.routers.litellm import generate_chat_completion as chat_completion_handler
 from beyond_the_loop.services.credit_service import credit_service
+from beyond_the_loop.services.credit_ledger_settler import credit_ledger_settler
+from beyond_the_loop.services.ingestion_worker import ingestion_worker
 from beyond_the_loop.services.fair_model_usage_service import fair_model_usage_service
 from beyond_the_loop.services.payments_service import payments_service
 from beyond_the_loop.observability.metrics import start_metrics_server as _start_metrics_server
@@ -213,8 +215,14 @@ async def lifespan(app: FastAPI):
     # Service or Ingress — GMP scrapes the pod IP directly.
     _start_metrics_server()
 
+    credit_ledger_settler.start()
+    ingestion_worker.start(app)
+
     yield
 
+    await ingestion_worker.stop()
+    await credit_ledger_settler.stop()
+
 
 app = FastAPI(
     docs_url=None,
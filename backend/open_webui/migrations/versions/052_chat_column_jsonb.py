@@ -0,0 +1,47 @@
+"""Convert chat.chat from JSON to JSONB
+
+Streaming writes (`Chats.upsert_message_to_chat_by_id_and_message_id`) used
+to load the whole chat document into Python, merge one message and write the
+full document back. With realtime save on that is one full round trip of the
+chat blob per streamed token. JSONB lets those writes run as a single
+server-side `UPDATE` that merges only the touched message, and lets reads
+extract a single message or the active branch with path operators instead of
+shipping the whole `history.messages` map.
+
+JSONB rejects `\\u0000` inside strings, which plain JSON accepted, so those
+escapes are stripped during the conversion (NUL characters are stripped on
+write as well). Only unescaped ones go: `\\u0000` preceded by an even run of
+backslashes is a NUL, after an odd run it is the text "\\u0000" a user wrote.
+
+Revision ID: 052
+Revises: 051
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '052'
+down_revision: Union[str, None] = '051'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text(
+        "ALTER TABLE chat "
+        "ALTER COLUMN chat TYPE JSONB "
+        r"USING regexp_replace(chat::text, '(?<!\\)((?:\\\\)*)\\u0000', '\1', 'g')::jsonb;"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text(
+        "ALTER TABLE chat "
+        "ALTER COLUMN chat TYPE JSON "
+        "USING chat::json;"
+    ))
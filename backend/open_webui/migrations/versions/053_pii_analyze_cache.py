@@ -0,0 +1,56 @@
+"""Move the PII analyze cache out of chat.chat into pii_analyze_cache
+
+`PIISession` used to persist its analyze cache inside
+`chat.chat["pii_session"]["analyze_cache"]`, keyed by the full raw text of
+every analyzed message — a second copy of the chat's text in the same row,
+shipped with every chat load, list and export. The cache now lives in its
+own table keyed by (chat_id, sha256 of the text), with spans packed as
+`[entity_type, start, end, score]` arrays and a per-chat entry cap enforced
+on save via `last_used_at`.
+
+The old key is stripped from existing chat rows. Nothing is copied over:
+the hashes are not derivable in SQL the same way, and the cache refills
+on the next message of each chat.
+
+Revision ID: 053
+Revises: 052
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '053'
+down_revision: Union[str, None] = '052'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS pii_analyze_cache (
+            chat_id       VARCHAR NOT NULL REFERENCES chat(id) ON DELETE CASCADE,
+            text_hash     VARCHAR NOT NULL,
+            spans         JSON NOT NULL,
+            last_used_at  BIGINT NOT NULL,
+            PRIMARY KEY (chat_id, text_hash)
+        );
+    """))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS pii_analyze_cache_chat_last_used_idx "
+        "ON pii_analyze_cache (chat_id, last_used_at);"
+    ))
+
+    conn.execute(sa.text(
+        "UPDATE chat SET chat = chat #- '{pii_session,analyze_cache}' "
+        "WHERE chat->'pii_session' ? 'analyze_cache';"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS pii_analyze_cache;"))
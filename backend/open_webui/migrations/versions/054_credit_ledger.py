@@ -0,0 +1,51 @@
+"""Add the credit_ledger table
+
+Credit usage used to be subtracted from `company.credit_balance` inline on
+every completion, so bursts from one company serialized on its row. Usage
+is now appended to `credit_ledger` and a background settler folds pending
+rows into the company balance in periodic batches (`settled_at` set once
+applied). The partial index keeps the settler's scan to unsettled rows.
+
+Revision ID: 054
+Revises: 053
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '054'
+down_revision: Union[str, None] = '053'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS credit_ledger (
+            id          VARCHAR PRIMARY KEY,
+            company_id  VARCHAR NOT NULL REFERENCES company(id) ON DELETE CASCADE,
+            user_id     VARCHAR,
+            amount      DOUBLE PRECISION NOT NULL,
+            kind        TEXT NOT NULL,
+            created_at  BIGINT NOT NULL,
+            settled_at  BIGINT
+        );
+    """))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS credit_ledger_pending_idx "
+        "ON credit_ledger (created_at) WHERE settled_at IS NULL;"
+    ))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS credit_ledger_company_created_idx "
+        "ON credit_ledger (company_id, created_at);"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS credit_ledger;"))
@@ -0,0 +1,64 @@
+"""Add the ingestion_job table
+
+File uploads and knowledge-base adds used to load, split, embed and store
+documents inside the HTTP request. They can now be queued as ingestion jobs
+that a worker pool claims (`FOR UPDATE SKIP LOCKED` on the queued index),
+retries with backoff (`attempts`, `run_after`) and reports per stage.
+`idempotency_key` is unique so a retried request maps to the same job;
+`heartbeat_at` lets a worker reclaim jobs of a worker that died mid-run.
+
+Revision ID: 055
+Revises: 054
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '055'
+down_revision: Union[str, None] = '054'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS ingestion_job (
+            id               VARCHAR PRIMARY KEY,
+            user_id          VARCHAR NOT NULL,
+            kind             TEXT NOT NULL,
+            payload          JSON NOT NULL,
+            idempotency_key  VARCHAR UNIQUE,
+            status           TEXT NOT NULL,
+            stage            TEXT,
+            attempts         INTEGER NOT NULL DEFAULT 0,
+            max_attempts     INTEGER NOT NULL,
+            error            TEXT,
+            result           JSON,
+            run_after        BIGINT NOT NULL,
+            heartbeat_at     BIGINT,
+            created_at       BIGINT NOT NULL,
+            updated_at       BIGINT NOT NULL
+        );
+    """))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS ingestion_job_queued_idx "
+        "ON ingestion_job (run_after) WHERE status = 'queued';"
+    ))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS ingestion_job_running_idx "
+        "ON ingestion_job (heartbeat_at) WHERE status = 'running';"
+    ))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS ingestion_job_user_created_idx "
+        "ON ingestion_job (user_id, created_at);"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS ingestion_job;"))
@@ -24,6 +24,8 @@ from beyond_the_loop.models.files import FileModel, Files
 from beyond_the_loop.storage.provider import Storage
 
 from beyond_the_loop.retrieval.vector.connector import VECTOR_DB_CLIENT
+from beyond_the_loop.retrieval.extracted_text_cache import extracted_text_cache
+from beyond_the_loop.services.ingestion_worker import report_ingestion_stage
 
 # NOTE: `Loader` deliberately NOT imported at module top — it drags in
 # langchain_text_splitters → sentence_transformers → transformers → torch
@@ -391,6 +393,7 @@ def save_docs_to_vector_db(
             request.app.state.config.RAG_EMBEDDING_MODEL,
             request.app.state.ef,
             request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
+            cache=True,
         )
 
         embeddings = embedding_function(
@@ -431,6 +434,7 @@ def process_file(
 ):
     try:
         file = Files.get_file_by_id(form_data.file_id)
+        extracted_text = None
 
         collection_name = form_data.collection_name
 
@@ -495,6 +499,8 @@ def process_file(
             if file_path:
                 file_path = Storage.get_file(file_path)
 
+                report_ingestion_stage("extracting")
+
                 from beyond_the_loop.retrieval.loaders.main import Loader
                 loader = Loader(
                     engine=request.app.state.config.CONTENT_EXTRACTION_ENGINE,
@@ -503,6 +509,8 @@ def process_file(
                 docs = loader.load(
                     file.filename, file.meta.get("content_type"), file_path
                 )
+                # What the chat path uses for "full" context mode
+                extracted_text = "\n\n".join(doc.page_content for doc in docs)
 
                 docs = [
                     Document(
@@ -541,6 +549,11 @@ def process_file(
         hash = calculate_sha256_string(text_content)
         Files.update_file_hash_by_id(file.id, hash)
 
+        if extracted_text is not None:
+            extracted_text_cache.put(file.model_copy(update={"hash": hash}), extracted_text)
+
+        report_ingestion_stage("embedding")
+
         try:
             result = save_docs_to_vector_db(
                 request,
@@ -746,6 +759,7 @@ def process_files_batch(
 
     # Save all documents in one batch
     if all_docs:
+        report_ingestion_stage("embedding")
         try:
             save_docs_to_vector_db(
                 request=request,
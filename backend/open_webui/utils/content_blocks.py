@@ -0,0 +1,157 @@
+"""
+Incremental rendering of streamed content blocks into the message string.
+
+The stream handler keeps the response as a list of blocks (text, reasoning,
+code_interpreter, ...) and used to rebuild the whole message string from all
+blocks on every delta, which is quadratic in the response length. During a
+stream only the last block normally changes, so each block's rendered segment
+is cached and only re-rendered when its content, tag or duration changed.
+
+For the open reasoning block the `> ` quoting is also cached up to the last
+complete line, so a long chain of thought is not re-split on every token.
+
+`ContentBlockSerializer()(blocks)` returns exactly what the previous
+`serialize_content_blocks(blocks)` returned.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+
+def _quote_lines(text: str) -> str:
+    return "\n".join(
+        (f"> {line}" if not line.startswith(">") else line)
+        for line in text.splitlines()
+    )
+
+
+class _QuotedReasoning:
+    """Caches the quoted form of a growing reasoning text up to its last newline."""
+
+    def __init__(self) -> None:
+        self.raw_prefix = ""
+        self.quoted_prefix = ""
+
+    def render(self, text: str) -> str:
+        if not (self.raw_prefix and text.startswith(self.raw_prefix)):
+            self.raw_prefix = ""
+            self.quoted_prefix = ""
+
+        # Splitting at a "\n" is safe: splitlines() of the two halves equals
+        # splitlines() of the whole, since no line boundary spans the cut.
+        cut = text.rfind("\n") + 1
+        if cut > len(self.raw_prefix):
+            quoted_tail = _quote_lines(text[len(self.raw_prefix):cut])
+            self.quoted_prefix = _join_lines(
+                self.quoted_prefix,
+                quoted_tail,
+                self.raw_prefix,
+                text[len(self.raw_prefix):cut],
+            )
+            self.raw_prefix = text[:cut]
+
+        rest = text[len(self.raw_prefix):]
+        return _join_lines(self.quoted_prefix, _quote_lines(rest), self.raw_prefix, rest)
+
+
+def _join_lines(quoted_head: str, quoted_tail: str, raw_head: str, raw_tail: str) -> str:
+    # Empty raw text has no lines at all, unlike "" rendered from e.g. "\n".
+    if not raw_head:
+        return quoted_tail
+    if not raw_tail:
+        return quoted_head
+    return f"{quoted_head}\n{quoted_tail}"
+
+
+class _CachedSegment:
+    __slots__ = ("block", "key", "content", "segment", "reasoning")
+
+    def __init__(self, block: dict) -> None:
+        self.block = block
+        self.key = None
+        self.content = None
+        self.segment = ""
+        self.reasoning: Optional[_QuotedReasoning] = None
+
+
+class ContentBlockSerializer:
+    def __init__(self) -> None:
+        self._cache: list[_CachedSegment] = []
+        # "".join of the segments of self._cache[:self._prefix_len]
+        self._prefix = ""
+        self._prefix_len = 0
+
+    def __call__(self, content_blocks: list[dict], raw: bool = False) -> str:
+        segments = []
+        unchanged = 0
+        still_unchanged = True
+
+        for index, block in enumerate(content_blocks):
+            if index < len(self._cache) and self._cache[index].block is block:
+                cached = self._cache[index]
+            else:
+                cached = _CachedSegment(block)
+                del self._cache[index:]
+                self._cache.append(cached)
+
+            if self._refresh(cached, raw):
+                still_unchanged = False
+            elif still_unchanged:
+                unchanged += 1
+
+            segments.append(cached.segment)
+
+        del self._cache[len(content_blocks):]
+
+        # Everything but the last block counts as closed; keep their joined
+        # segments around as long as none of them changes.
+        closed = max(0, min(unchanged, len(segments) - 1))
+        if self._prefix_len and self._prefix_len <= unchanged:
+            if closed > self._prefix_len:
+                self._prefix += "".join(segments[self._prefix_len:closed])
+                self._prefix_len = closed
+        else:
+            self._prefix = "".join(segments[:closed])
+            self._prefix_len = closed
+
+        return (self._prefix + "".join(segments[self._prefix_len:])).strip()
+
+    @staticmethod
+    def _refresh(cached: _CachedSegment, raw: bool) -> bool:
+        block = cached.block
+        content = block["content"]
+        key = (block["type"], block.get("tag"), block.get("duration"), raw)
+
+        # Only immutable (str) content can be compared against the cache;
+        # anything else may have been mutated in place.
+        if (
+            isinstance(content, str)
+            and cached.key == key
+            and (cached.content is content or cached.content == content)
+        ):
+            return False
+
+        cached.key = key
+        cached.content = content
+
+        if block["type"] == "text":
+            cached.segment = f"{content.strip()}\n"
+        elif block["type"] == "reasoning":
+            if raw:
+                cached.segment = f'\n<{block["tag"]}>{content}</{block["tag"]}>\n'
+                return True
+
+            if cached.reasoning is None:
+                cached.reasoning = _QuotedReasoning()
+            reasoning_display_content = cached.reasoning.render(content)
+
+            reasoning_duration = block.get("duration", None)
+            if reasoning_duration is not None:
+                cached.segment = f'\n<details type="reasoning" done="true" duration="{reasoning_duration}">\n<summary>Thought for {reasoning_duration} seconds</summary>\n{reasoning_display_content}\n</details>\n'
+            else:
+                cached.segment = f'\n<details type="reasoning" done="false">\n<summary>Thinking…</summary>\n{reasoning_display_content}\n</details>\n'
+        else:
+            block_content = str(content).strip()
+            cached.segment = f"{block['type']}: {block_content}\n"
+
+        return True
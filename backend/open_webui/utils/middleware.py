@@ -45,6 +45,7 @@ from open_webui.routers.tasks import (
 )
 from beyond_the_loop.models.users import UserModel
 from beyond_the_loop.models.models import Models
+from beyond_the_loop.retrieval.extracted_text_cache import extracted_text_cache
 from beyond_the_loop.retrieval.utils import get_sources_from_files
 from beyond_the_loop.models.files import Files
 from beyond_the_loop.storage.provider import Storage
@@ -60,7 +61,6 @@ from open_webui.utils.task import (
     rag_template,
 )
 from open_webui.utils.misc import (
-    get_message_list,
     prepend_system_message,
     append_to_system_message,
     add_or_update_user_message,
@@ -68,6 +68,17 @@ from open_webui.utils.misc import (
     get_last_user_message_item,
 )
 from open_webui.tasks import create_task
+from open_webui.utils.content_blocks import ContentBlockSerializer
+from beyond_the_loop.utils.message_write_buffer import get_message_write_buffer
+from beyond_the_loop.utils.status_history_buffer import close_status_history_buffer
+from beyond_the_loop.utils.stream_events import (
+    STREAM_EVENT_TYPES,
+    CodeExecutionEvent,
+    FileRefsEvent,
+    StatusEvent,
+    as_chunk,
+    stream_payloads,
+)
 from beyond_the_loop.config import (
     LITELLM_MODEL_CONFIG,
     LITELLM_MODEL_MAP,
@@ -76,6 +87,8 @@ from open_webui.env import (
     SRC_LOG_LEVELS,
     GLOBAL_LOG_LEVEL,
     ENABLE_REALTIME_CHAT_SAVE,
+    ENABLE_CHAT_STREAM_DELTA_EVENTS,
+    CHAT_STREAM_SNAPSHOT_INTERVAL,
 )
 from open_webui.constants import TASKS
 from beyond_the_loop.utils.chat_compression import maybe_compress_chat
@@ -175,6 +188,10 @@ def extract_file_content_with_loader(file_id: str) -> str:
 
         # Get file path using Storage
         if file_record.path:
+            cached_content = extracted_text_cache.get(file_record)
+            if cached_content is not None:
+                return cached_content
+
             try:
                 storage = Storage()
                 file_path = storage.get_file(file_record.path)
@@ -189,6 +206,7 @@ def extract_file_content_with_loader(file_id: str) -> str:
 
                 # Combine all document content
                 combined_content = "\n\n".join([doc.page_content for doc in documents])
+                extracted_text_cache.put(file_record, combined_content)
                 return combined_content
 
             except Exception as e:
@@ -349,9 +367,10 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
     pii_released_used: list = []
     if chat_id and form_data.get("messages"):
         try:
+            from beyond_the_loop.pii.prefetch import get_draft_prefetcher
             from beyond_the_loop.pii.session import (
                 PIISession,
-                anonymize_messages,
+                aanonymize_messages,
                 is_pii_filter_enabled,
             )
             from beyond_the_loop.prompts import PII_SYSTEM_PROMPT
@@ -385,10 +404,10 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
                 pii_session = PIISession(chat_id)
                 for entity in client_manual_entities:
                     pii_session.register_manual(entity)
-                # Surface the anonymization step in the UI — the work can
-                # take a few seconds on long histories / many RAG chunks
-                # under MAX_CONCURRENT_ANALYZES=1, and an unannotated spinner
-                # in that window feels broken.
+                # Surface the anonymization step in the UI — even batched,
+                # NER over a long history / many RAG chunks can take a
+                # moment, and an unannotated spinner in that window feels
+                # broken.
                 await event_emitter(
                     {
                         "type": "status",
@@ -399,8 +418,12 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
                         },
                     }
                 )
+                # A draft of this prompt may still be analyzing in the
+                # background (POST /pii/prefetch); its results are cheaper to
+                # wait for than to recompute.
+                await get_draft_prefetcher().wait(chat_id)
                 try:
-                    ru = anonymize_messages(
+                    ru = await aanonymize_messages(
                         form_data["messages"], pii_session,
                         released=pii_released_entities, source="prompt",
                     )
@@ -832,7 +855,7 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
                 }
             )
         try:
-            file_contents = []
+            extracted = []
 
             for file_item in files:
                 if isinstance(file_item, dict):
@@ -852,24 +875,37 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
                                 content_type = file_record.meta.get("content_type", "")
                                 # Skip image files
                                 if not content_type.startswith("image/"):
-                                    content = extract_file_content_with_loader(file_id)
-                                    if pii_session is not None:
-                                        try:
-                                            content, _ru = pii_session.anonymize(
-                                                content, pii_released_entities,
-                                                source=f"file:{file_record.filename}",
-                                            )
-                                            pii_released_used.extend(_ru)
-                                        except Exception:
-                                            log.exception(
-                                                "[pii] failed to anonymize extracted content of %s; sending unredacted",
-                                                file_record.filename,
-                                            )
-                                    file_contents.append(
-                                        f"\n\n--- Content of {file_record.filename} ---\n{content}\n--- End of {file_record.filename} ---")
+                                    extracted.append(
+                                        (file_record.filename, extract_file_content_with_loader(file_id))
+                                    )
                         except Exception as e:
                             log.debug(f"Error processing file {file_id}: {e}")
 
+            if pii_session is not None and extracted:
+                # Analyze every file in batched predict calls up front; the
+                # per-file anonymize() below then only hits the cache.
+                try:
+                    await pii_session.prefetch(content for _, content in extracted)
+                except Exception:
+                    log.exception("[pii] batched analysis of file contents failed; analyzing per file")
+
+            file_contents = []
+            for filename, content in extracted:
+                if pii_session is not None:
+                    try:
+                        content, _ru = pii_session.anonymize(
+                            content, pii_released_entities,
+                            source=f"file:{filename}",
+                        )
+                        pii_released_used.extend(_ru)
+                    except Exception:
+                        log.exception(
+                            "[pii] failed to anonymize extracted content of %s; sending unredacted",
+                            filename,
+                        )
+                file_contents.append(
+                    f"\n\n--- Content of {filename} ---\n{content}\n--- End of {filename} ---")
+
             # Append file contents to the last user message
             if file_contents:
                 combined_content = "".join(file_contents)
@@ -911,6 +947,17 @@ async def process_chat_payload(request, form_data, metadata, user, model: ModelM
                     },
                 }
             )
+        if pii_session is not None:
+            # Analyze every snippet in batched predict calls up front; the
+            # per-chunk anonymize() below then only hits the cache.
+            try:
+                await pii_session.prefetch(
+                    snippet
+                    for source in sources
+                    for snippet in source.get("snippets", [])
+                )
+            except Exception:
+                log.exception("[pii] batched analysis of RAG chunks failed; analyzing per chunk")
         context_string = ""
         for source_idx, source in enumerate(sources):
             source_id = source.get("name", "")
@@ -1068,12 +1115,14 @@ async def process_chat_response(
         request, response, form_data, user, events, metadata, tasks, model
 ):
     async def background_tasks_handler():
-        message_map = Chats.get_messages_by_chat_id(metadata["chat_id"])
-        message = message_map.get(metadata["message_id"]) if message_map else None
+        # Only the active branch is needed for title generation; siblings
+        # from regenerations/edits stay in the database.
+        messages = Chats.get_message_branch_by_id_and_message_id(
+            metadata["chat_id"], metadata["message_id"]
+        )
+        message = messages[-1] if messages else None
 
         if message:
-            messages = get_message_list(message_map, message.get("id"))
-
             if tasks and messages:
                 if TASKS.TITLE_GENERATION in tasks:
                     if tasks[TASKS.TITLE_GENERATION]:
@@ -1086,12 +1135,12 @@ async def process_chat_response(
                         try:
                             from beyond_the_loop.pii.session import (
                                 PIISession,
-                                anonymize_messages,
+                                aanonymize_messages,
                                 is_pii_filter_enabled,
                             )
                             if is_pii_filter_enabled(user.company_id):
                                 pii_session = PIISession(metadata["chat_id"])
-                                anonymize_messages(messages, pii_session)
+                                await aanonymize_messages(messages, pii_session)
                                 pii_session.save()
                         except Exception:
                             log.exception(
@@ -1204,6 +1253,9 @@ async def process_chat_response(
                             "content": content,
                         },
                     )
+                    await close_status_history_buffer(
+                        metadata["chat_id"], metadata["message_id"]
+                    )
 
                     await background_tasks_handler()
 
@@ -1224,44 +1276,17 @@ async def process_chat_response(
         if metadata.get("selected_model_id"):
             message_update["selectedModelId"] = metadata["selected_model_id"]
 
-        Chats.upsert_message_to_chat_by_id_and_message_id(
-            metadata["chat_id"],
-            metadata["message_id"],
-            message_update,
+        # All message writes of this stream are coalesced and written off the
+        # event loop; closed (= flushed) on completion, cancellation or error.
+        message_buffer = get_message_write_buffer(
+            metadata["chat_id"], metadata["message_id"]
         )
+        message_buffer.update(message_update)
 
         # Handle as a background task
         async def post_response_handler(response, events):
-            def serialize_content_blocks(content_blocks, raw=False):
-                content = ""
-
-                for block in content_blocks:
-                    if block["type"] == "text":
-                        content = f"{content}{block['content'].strip()}\n"
-                    elif block["type"] == "reasoning":
-                        reasoning_display_content = "\n".join(
-                            (f"> {line}" if not line.startswith(">") else line)
-                            for line in block["content"].splitlines()
-                        )
-
-                        reasoning_duration = block.get("duration", None)
-
-                        if reasoning_duration is not None:
-                            if raw:
-                                content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
-                            else:
-                                content = f'{content}\n<details type="reasoning" done="true" duration="{reasoning_duration}">\n<summary>Thought for {reasoning_duration} seconds</summary>\n{reasoning_display_content}\n</details>\n'
-                        else:
-                            if raw:
-                                content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
-                            else:
-                                content = f'{content}\n<details type="reasoning" done="false">\n<summary>Thinking…</summary>\n{reasoning_display_content}\n</details>\n'
-
-                    else:
-                        block_content = str(block["content"]).strip()
-                        content = f"{content}{block['type']}: {block_content}\n"
-
-                return content.strip()
+            # Re-renders only blocks that changed since the previous call.
+            serialize_content_blocks = ContentBlockSerializer()
 
             def format_reasoning_content(text):
                 """Adds \n after each ** Pair in Reasoning Summaries, to adjust for Litellms OpenAI Formatting. Can hopefully be removed in future LiteLLM Updates"""
@@ -1486,13 +1511,7 @@ async def process_chat_response(
                     )
 
                     # Save message in the database
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
-                        metadata["chat_id"],
-                        metadata["message_id"],
-                        {
-                            **event,
-                        },
-                    )
+                    message_buffer.update({**event})
 
                 async def stream_body_handler(response):
                     nonlocal content
@@ -1508,6 +1527,13 @@ async def process_chat_response(
 
                     generating_response = True
 
+                    # Delta-only mode: text events carry just `added_content`,
+                    # with a full `content` snapshot every
+                    # CHAT_STREAM_SNAPSHOT_INTERVAL events and whenever the
+                    # client's copy was replaced by some other event. 0 forces
+                    # a snapshot on the next text event.
+                    text_deltas_since_snapshot = 0
+
                     # PII deanonymizer: buffers chunks so placeholders split across
                     # SSE boundaries aren't leaked as "[[PER". None = pass-through.
                     # Gated by the same per-company feature flag as the payload hook.
@@ -1524,25 +1550,55 @@ async def process_chat_response(
                     except Exception as e:
                         log.exception(f"[pii] failed to init streaming deanonymizer: {e}")
 
-                    async for line in response.body_iterator:
-                        line = line.decode("utf-8") if isinstance(line, bytes) else line
-                        data = line
+                    # Typed events (Responses-API models) or parsed SSE chunks.
+                    async for data in stream_payloads(response):
+                        try:
+                            if isinstance(data, STREAM_EVENT_TYPES):
+                                if isinstance(data, StatusEvent):
+                                    await event_emitter(
+                                        {
+                                            "type": "status",
+                                            "data": data.status,
+                                        }
+                                    )
+                                    continue
 
-                        # Skip empty lines
-                        if not data.strip():
-                            continue
+                                if isinstance(data, CodeExecutionEvent):
+                                    await event_emitter(
+                                        {
+                                            "type": "source",
+                                            "data": {
+                                                "type": "code_execution",
+                                                **data.execution,
+                                            },
+                                        }
+                                    )
+                                    continue
 
-                        # "data:" is the prefix for each event
-                        if not data.startswith("data:"):
-                            continue
+                                if isinstance(data, FileRefsEvent):
+                                    await event_emitter(
+                                        {
+                                            "type": "file_refs",
+                                            "data": data.file_refs,
+                                        }
+                                    )
 
-                        # Remove the prefix
-                        data = data[len("data:"):].strip()
+                                    content = data.content_replacement
+                                    content_blocks.clear()
+                                    content_blocks.append(
+                                        {"type": "text", "content": content}
+                                    )
+                                    text_deltas_since_snapshot = 0
+                                    continue
 
-                        try:
-                            data = json.loads(data)
+                                # Text, reasoning, citations and usage take the
+                                # chat-completion path below as a chunk dict.
+                                data = as_chunk(data)
+                                chunk_started = True
+                            else:
+                                chunk_started = bool(data.get("id"))
 
-                            if data.get("id") and generating_response:
+                            if chunk_started and generating_response:
                                 await event_emitter(
                                     {
                                         "type": "status",
@@ -1567,51 +1623,12 @@ async def process_chat_response(
                                     })
                                 sources = perplexity_sources
 
-                            if "status_event" in data:
-                                await event_emitter(
-                                    {
-                                        "type": "status",
-                                        "data": data["status_event"],
-                                    }
-                                )
-                                continue
-
-                            if "code_execution_event" in data:
-                                await event_emitter(
-                                    {
-                                        "type": "source",
-                                        "data": {
-                                            "type": "code_execution",
-                                            **data["code_execution_event"],
-                                        },
-                                    }
-                                )
-                                continue
-
-                            if "file_refs" in data:
-                                await event_emitter(
-                                    {
-                                        "type": "file_refs",
-                                        "data": data["file_refs"],
-                                    }
-                                )
-
-                                if "content_replacement" in data:
-                                    content = data["content_replacement"]
-                                    content_blocks.clear()
-                                    content_blocks.append(
-                                        {"type": "text", "content": content}
-                                    )
-                                continue
-
                             if "selected_model_id" in data:
                                 model_id = data["selected_model_id"]
-                                Chats.upsert_message_to_chat_by_id_and_message_id(
-                                    metadata["chat_id"],
-                                    metadata["message_id"],
+                                message_buffer.update(
                                     {
                                         "selectedModelId": model_id,
-                                    },
+                                    }
                                 )
                             else:
                                 choices = data.get("choices", [])
@@ -1693,6 +1710,7 @@ async def process_chat_response(
                                                         },
                                                     }
                                                 )
+                                                text_deltas_since_snapshot = 0
                                             pending_search_index = None  # fertig, nicht nochmal feuern
                                         except json.JSONDecodeError:
                                             pass  # arguments noch unvollständig, weiter 
@@ -1728,6 +1746,7 @@ async def process_chat_response(
                                         )),
                                         "type": "reasoning",
                                     }
+                                    text_deltas_since_snapshot = 0
                                 if used_search_queries == []:
                                     used_search_queries = get_used_search_queries(delta, data)
 
@@ -1786,6 +1805,7 @@ async def process_chat_response(
                                             },
                                         }
                                     )
+                                    text_deltas_since_snapshot = 0
 
                                 value = delta.get("content")
                                 if value:
@@ -1842,14 +1862,12 @@ async def process_chat_response(
 
                                     if ENABLE_REALTIME_CHAT_SAVE:
                                         # Save message in the database
-                                        Chats.upsert_message_to_chat_by_id_and_message_id(
-                                            metadata["chat_id"],
-                                            metadata["message_id"],
+                                        message_buffer.update(
                                             {
                                                 "content": serialize_content_blocks(
                                                     content_blocks
                                                 ),
-                                            },
+                                            }
                                         )
                                     elif (content_blocks[-1][
                                               "type"] == "reasoning"):  # In case reasoning summary was detected in tag_content_handler
@@ -1859,7 +1877,18 @@ async def process_chat_response(
                                             ),
                                             "type": "reasoning",
                                         }
+                                        text_deltas_since_snapshot = 0
+                                    elif (
+                                        ENABLE_CHAT_STREAM_DELTA_EVENTS
+                                        and 0 < text_deltas_since_snapshot < CHAT_STREAM_SNAPSHOT_INTERVAL
+                                    ):
+                                        text_deltas_since_snapshot += 1
+                                        data = {
+                                            "type": "text",
+                                            "added_content": value,
+                                        }
                                     else:
+                                        text_deltas_since_snapshot = 1
                                         data = {
                                             "content": serialize_content_blocks(
                                                 content_blocks
@@ -1875,12 +1904,8 @@ async def process_chat_response(
                                 }
                             )
                         except Exception as e:
-                            done = "data: [DONE]" in line
-                            if done:
-                                pass
-                            else:
-                                log.debug("Error: ", e)
-                                continue
+                            log.debug(f"Error processing stream chunk: {e}")
+                            continue
 
                     # Flush any remainder left in the deanonymizer buffer (e.g. a
                     # placeholder that started but never closed). This is emitted
@@ -2036,11 +2061,12 @@ async def process_chat_response(
                     if response_images:
                         message["files"] = response_images
 
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
-                        metadata["chat_id"],
-                        metadata["message_id"],
-                        message
-                    )
+                    message_buffer.update(message)
+
+                await message_buffer.close()
+                await close_status_history_buffer(
+                    metadata["chat_id"], metadata["message_id"]
+                )
 
                 await event_emitter(
                     {
@@ -2069,11 +2095,15 @@ async def process_chat_response(
                             },
                         })
 
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
-                        metadata["chat_id"],
-                        metadata["message_id"],
-                        message
+                    message_buffer.update(message)
+
+                # Shielded so a second cancel can't drop the final write.
+                await asyncio.shield(message_buffer.close())
+                await asyncio.shield(
+                    close_status_history_buffer(
+                        metadata["chat_id"], metadata["message_id"]
                     )
+                )
 
                 raise
             except Exception as e:
@@ -2101,11 +2131,12 @@ async def process_chat_response(
                     }
                     if sources:
                         message["sources"] = sources
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
-                        metadata["chat_id"],
-                        metadata["message_id"],
-                        message
-                    )
+                    message_buffer.update(message)
+
+                await message_buffer.close()
+                await close_status_history_buffer(
+                    metadata["chat_id"], metadata["message_id"]
+                )
 
             if response.background is not None:
                 await response.background()
@@ -1,11 +1,14 @@
+import type { Socket } from 'socket.io-client';
 import { WEBUI_API_BASE_URL } from '$lib/constants';
 
-export const uploadFile = async (token: string, file: File) => {
+// With `background`, the file is processed by an ingestion job: the response
+// carries `job` and returns before the content is extracted and embedded.
+export const uploadFile = async (token: string, file: File, background: boolean = false) => {
 	const data = new FormData();
 	data.append('file', file);
 	let error = null;
 
-	const res = await fetch(`${WEBUI_API_BASE_URL}/files/`, {
+	const res = await fetch(`${WEBUI_API_BASE_URL}/files/${background ? '?background=true' : ''}`, {
 		method: 'POST',
 		headers: {
 			Accept: 'application/json',
@@ -30,6 +33,66 @@ export const uploadFile = async (token: string, file: File) => {
 	return res;
 };
 
+export const getIngestionJobById = async (token: string, jobId: string) => {
+	let error = null;
+
+	const res = await fetch(`${WEBUI_API_BASE_URL}/files/jobs/${jobId}`, {
+		method: 'GET',
+		headers: {
+			Accept: 'application/json',
+			'Content-Type': 'application/json',
+			authorization: `Bearer ${token}`
+		}
+	})
+		.then(async (res) => {
+			if (!res.ok) throw await res.json();
+			return res.json();
+		})
+		.catch((err) => {
+			error = err.detail;
+			console.log(err);
+			return null;
+		});
+
+	if (error) {
+		throw error;
+	}
+
+	return res;
+};
+
+// Resolves with the job once it has completed, rejects with its error once it
+// has failed. Follows the "ingestion-events" of the socket and polls as well,
+// in case the socket is down or an event was missed.
+export const waitForIngestionJob = (
+	token: string,
+	jobId: string,
+	socket: Socket | null = null,
+	onUpdate: ((job) => void) | null = null,
+	pollInterval: number = 5000
+) =>
+	new Promise((resolve, reject) => {
+		let done = false;
+
+		const handler = (job) => {
+			if (done || job?.id !== jobId) return;
+			onUpdate?.(job);
+
+			if (job.status === 'completed' || job.status === 'failed') {
+				done = true;
+				socket?.off('ingestion-events', handler);
+				clearInterval(timer);
+				job.status === 'completed' ? resolve(job) : reject(job.error ?? 'Processing failed');
+			}
+		};
+
+		socket?.on('ingestion-events', handler);
+		const timer = setInterval(async () => {
+			const job = await getIngestionJobById(token, jobId).catch(() => null);
+			if (job) handler(job);
+		}, pollInterval);
+	});
+
 export const uploadDir = async (token: string) => {
 	let error = null;
 
@@ -34,3 +34,34 @@ export const analyzePII = async (
 
 	return res.json();
 };
+
+export type PIIPrefetchResponse = {
+	status: 'scheduled' | 'duplicate' | 'skipped';
+};
+
+// Speculatively analyzes the composer draft of an existing chat so the
+// anonymization step on send is mostly cache hits. Fire-and-forget.
+export const prefetchPII = async (
+	token: string,
+	chatId: string,
+	text: string,
+	fileIds: string[],
+	signal?: AbortSignal
+): Promise<PIIPrefetchResponse> => {
+	const res = await fetch(`${WEBUI_API_BASE_URL}/pii/prefetch`, {
+		method: 'POST',
+		signal,
+		headers: {
+			Accept: 'application/json',
+			'Content-Type': 'application/json',
+			...(token && { authorization: `Bearer ${token}` })
+		},
+		body: JSON.stringify({ chat_id: chatId, text, file_ids: fileIds })
+	});
+
+	if (!res.ok) {
+		throw await res.json().catch(() => ({ detail: res.statusText }));
+	}
+
+	return res.json();
+};